@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+키워드 백필 스크립트
+conversations 테이블의 과거 사용자 메시지에서 키워드를 추출해 user_keywords에 채워 넣습니다.
+(키워드 추출이 도입되기 전 대화나, 패턴을 바꾼 뒤 다시 추출할 때 사용)
+
+이미 있는 키워드는 save_keywords와 같은 규칙으로 신뢰도만 올라가므로,
+같은 구간을 두 번 실행하면 신뢰도가 한 번 더 오릅니다.
+
+사용법:
+    python backfill_keywords.py                 # 전체 대화
+    python backfill_keywords.py --days 30       # 최근 30일만
+    python backfill_keywords.py --dry-run       # 추출 결과만 집계 (기록하지 않음)
+"""
+
+import argparse
+import time
+from database_manager import get_db_manager
+from keyword_manager import KeywordManager
+
+def main():
+    parser = argparse.ArgumentParser(description="과거 대화에서 user_keywords 백필")
+    parser.add_argument("--days", type=int, default=None, help="최근 N일 대화만 처리합니다 (기본: 전체)")
+    parser.add_argument("--batch-size", type=int, default=2000, help="한 번에 읽어 추출할 메시지 수")
+    parser.add_argument("--after-id", type=int, default=0, help="이 conversations.id 다음부터 처리합니다 (중단 후 재개용)")
+    parser.add_argument("--dry-run", action="store_true", help="DB에 기록하지 않고 추출 결과만 출력합니다")
+    args = parser.parse_args()
+
+    print("🔄 키워드 백필을 시작합니다...")
+    print("=" * 50)
+
+    db = get_db_manager()
+    keyword_manager = KeywordManager()
+    after_id = args.after_id
+    messages = found = 0
+    start = time.perf_counter()
+
+    while True:
+        rows = db.get_user_messages_page(after_id=after_id, limit=args.batch_size, days=args.days)
+        if not rows:
+            break
+        results = keyword_manager.extract_keywords_batch([content for _, _, _, content, _ in rows])
+        for (_, user_id, character_name, _, _), keywords in zip(rows, results):
+            if keywords and not args.dry_run:
+                keyword_manager.save_keywords(user_id, character_name, keywords)
+            found += len(keywords)
+        messages += len(rows)
+        after_id = rows[-1][0]
+        elapsed = time.perf_counter() - start
+        print(f"  ... {messages}개 메시지 처리 (마지막 id {after_id}), 키워드 {found}개, {messages / elapsed:.0f} 메시지/초")
+
+    if not args.dry_run:
+        db.flush_writes()
+
+    print("=" * 50)
+    print(f"✅ 메시지 {messages}개에서 키워드 {found}개를 {'찾았습니다 (dry run)' if args.dry_run else '기록했습니다'}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+백그라운드 작업 파이프라인
+답장을 보낸 뒤의 부수 작업(키워드 저장, 감정 로그, 등급 변경/마일스톤 알림, 메모리 요약 등)을
+대화 핸들러 밖에서 실행합니다. 핸들러는 작업을 넣고 바로 끝나므로 턴 시간이 "LLM 답장 + 전송"에 가까워집니다.
+
+- 동시에 실행하는 작업 수는 BACKGROUND_WORKERS개로 제한 (워커는 처음 작업이 들어올 때 시작)
+- 대기열은 BACKGROUND_QUEUE_SIZE개까지. 가득 차면 작업을 버리고 dead letter로 기록
+- 실패한 작업은 retries번까지 BACKGROUND_RETRY_DELAY * 2^(시도-1)초 뒤 다시 실행하고,
+  끝내 실패하면 dead letter로 기록 (로그 출력 + 최근 항목 보관)
+- 메시지를 보내는 작업처럼 두 번 실행되면 안 되는 작업은 retries=0으로 넣으세요
+"""
+import asyncio
+import os
+import time
+import traceback
+from collections import deque
+
+BACKGROUND_WORKERS = int(os.environ.get("BACKGROUND_WORKERS", 4))
+BACKGROUND_QUEUE_SIZE = int(os.environ.get("BACKGROUND_QUEUE_SIZE", 1000))
+BACKGROUND_MAX_RETRIES = int(os.environ.get("BACKGROUND_MAX_RETRIES", 2))
+BACKGROUND_RETRY_DELAY = float(os.environ.get("BACKGROUND_RETRY_DELAY", 1.0))
+# 보관하는 최근 dead letter 수
+DEAD_LETTER_HISTORY = 100
+
+
+class Job:
+    __slots__ = ('name', 'func', 'args', 'kwargs', 'retries', 'attempts', 'submitted_at')
+
+    def __init__(self, name: str, func, args: tuple, kwargs: dict, retries: int):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.retries = retries
+        self.attempts = 0
+        self.submitted_at = time.perf_counter()
+
+
+class JobPipeline:
+    """비동기 작업을 제한된 워커로 실행합니다. (이벤트 루프 한 곳에서만 사용)"""
+
+    def __init__(self, workers: int = BACKGROUND_WORKERS, queue_size: int = BACKGROUND_QUEUE_SIZE,
+                 max_retries: int = BACKGROUND_MAX_RETRIES, retry_delay: float = BACKGROUND_RETRY_DELAY):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._queue = None
+        self._workers = []
+        self._retrying = {}  # Job -> 재시도 예약 핸들
+        self.dead_letters = deque(maxlen=DEAD_LETTER_HISTORY)
+        self.metrics = {
+            'submitted': 0, 'runs': 0, 'completed': 0, 'retried': 0, 'dead_lettered': 0, 'dropped_full': 0,
+            'run_seconds': 0.0, 'queue_wait_seconds': 0.0, 'max_queue_wait_ms': 0.0,
+        }
+
+    def submit(self, name: str, func, *args, retries: int = None, **kwargs) -> bool:
+        """func(*args, **kwargs) 코루틴 작업을 대기열에 넣습니다. 대기열이 가득 차면 False."""
+        self._ensure_workers()
+        job = Job(name, func, args, kwargs, self.max_retries if retries is None else retries)
+        self.metrics['submitted'] += 1
+        return self._enqueue(job)
+
+    def _enqueue(self, job: Job) -> bool:
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except asyncio.QueueFull:
+            self.metrics['dropped_full'] += 1
+            self._dead_letter(job, "queue full")
+            return False
+
+    def _ensure_workers(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        loop = asyncio.get_running_loop()
+        while len(self._workers) < self.workers:
+            self._workers.append(loop.create_task(self._worker()))
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        start = time.perf_counter()
+        if job.attempts == 0:
+            waited = start - job.submitted_at
+            self.metrics['queue_wait_seconds'] += waited
+            self.metrics['max_queue_wait_ms'] = max(self.metrics['max_queue_wait_ms'], round(waited * 1000, 1))
+        job.attempts += 1
+        self.metrics['runs'] += 1
+        try:
+            await job.func(*job.args, **job.kwargs)
+            self.metrics['completed'] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if job.attempts <= job.retries:
+                self.metrics['retried'] += 1
+                delay = self.retry_delay * (2 ** (job.attempts - 1))
+                print(f"[Jobs] {job.name} failed (attempt {job.attempts}), retrying in {delay:.1f}s: {e}")
+                self._retrying[job] = asyncio.get_running_loop().call_later(delay, self._retry, job)
+            else:
+                self._dead_letter(job, f"{type(e).__name__}: {e}", traceback.format_exc())
+        finally:
+            self.metrics['run_seconds'] += time.perf_counter() - start
+
+    def _retry(self, job: Job):
+        self._retrying.pop(job, None)
+        self._enqueue(job)
+
+    def _dead_letter(self, job: Job, reason: str, trace: str = None):
+        self.metrics['dead_lettered'] += 1
+        self.dead_letters.append({
+            'name': job.name,
+            'args': repr(job.args)[:200],
+            'attempts': job.attempts,
+            'reason': reason,
+            'time': time.time(),
+        })
+        print(f"[Jobs][DeadLetter] {job.name} after {job.attempts} attempt(s): {reason}")
+        if trace:
+            print(trace)
+
+    async def drain(self, timeout: float = 10):
+        """대기 중인 작업이 끝날 때까지 최대 timeout초 기다립니다."""
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"[Jobs] Drain timed out with {self._queue.qsize()} job(s) pending")
+
+    async def aclose(self, timeout: float = 10):
+        """남은 작업을 기다린 뒤 워커를 멈춥니다. (예약된 재시도는 취소)"""
+        for job, handle in self._retrying.items():
+            handle.cancel()
+            self._dead_letter(job, "shutdown before retry")
+        self._retrying.clear()
+        await self.drain(timeout)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def get_metrics(self) -> dict:
+        completed = self.metrics['completed']
+        runs = self.metrics['runs']
+        started = self.metrics['submitted'] - self.metrics['dropped_full']
+        return {
+            'submitted': self.metrics['submitted'],
+            'completed': completed,
+            'retried': self.metrics['retried'],
+            'dead_lettered': self.metrics['dead_lettered'],
+            'dropped_full': self.metrics['dropped_full'],
+            'pending': self._queue.qsize() if self._queue is not None else 0,
+            'workers': len(self._workers),
+            'avg_queue_wait_ms': round(self.metrics['queue_wait_seconds'] / started * 1000, 1) if started else 0.0,
+            'max_queue_wait_ms': self.metrics['max_queue_wait_ms'],
+            'avg_run_ms': round(self.metrics['run_seconds'] / runs * 1000, 1) if runs else 0.0,
+        }
+
+
+jobs = JobPipeline()
+
+
+def submit(name: str, func, *args, retries: int = None, **kwargs) -> bool:
+    return jobs.submit(name, func, *args, retries=retries, **kwargs)
+
+
+async def aclose(timeout: float = 10):
+    await jobs.aclose(timeout)
+
+
+def get_metrics() -> dict:
+    return jobs.get_metrics()
@@ -0,0 +1,113 @@
+"""
+이벤트 루프 지연(lag) 벤치마크
+
+동시 사용자 N명이 각자 DB 쿼리를 연속으로 보낼 때,
+1) 동기 호출을 이벤트 루프에서 그대로 실행한 경우와
+2) 비동기 파사드(`await db.aget_*`)처럼 DB 전용 스레드 풀로 넘긴 경우의
+루프 지연을 비교합니다.
+
+DATABASE_URL이 설정되어 있으면 실제 연결 풀에서 `SELECT pg_sleep(...)`을 실행하고,
+없으면 같은 크기의 스레드 풀에서 time.sleep으로 네트워크 왕복을 흉내냅니다.
+
+사용법:
+    python benchmarks/event_loop_lag.py --users 50 --queries 5 --latency-ms 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+TICK_INTERVAL = 0.01
+
+
+async def measure_lag(stop: asyncio.Event, samples: list):
+    """TICK_INTERVAL마다 깨어나 예정 시각과의 차이를 기록합니다."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + TICK_INTERVAL
+        await asyncio.sleep(TICK_INTERVAL)
+        samples.append(max(0.0, loop.time() - expected) * 1000)
+
+
+def make_backend(latency: float, workers: int):
+    """(동기 쿼리 함수, 오프로딩 코루틴 함수, 종료 함수)를 반환합니다."""
+    if os.environ.get("DATABASE_URL"):
+        from db_pool import get_async_pool
+        async_pool = get_async_pool(sslmode='require')
+
+        def query():
+            with async_pool.pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_sleep(%s)", (latency,))
+
+        return query, lambda: async_pool.run_sync(query), async_pool.shutdown
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db-pool")
+
+    def query():
+        time.sleep(latency)
+
+    async def offloaded():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, query)
+
+    return query, offloaded, lambda: executor.shutdown(wait=True)
+
+
+async def run_scenario(mode: str, users: int, queries: int, query, offloaded):
+    samples = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(measure_lag(stop, samples))
+
+    async def user():
+        for _ in range(queries):
+            if mode == "blocking":
+                query()
+            else:
+                await offloaded()
+            await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(users)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticker
+
+    samples = samples or [0.0]
+    samples.sort()
+    return {
+        "mode": mode,
+        "elapsed_s": elapsed,
+        "lag_avg_ms": statistics.mean(samples),
+        "lag_p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+        "lag_max_ms": samples[-1],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="DB 호출이 이벤트 루프 지연에 미치는 영향 측정")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("DB_POOL_MAX_SIZE", 10)))
+    args = parser.parse_args()
+
+    query, offloaded, shutdown = make_backend(args.latency_ms / 1000, args.workers)
+    try:
+        print(f"users={args.users} queries/user={args.queries} latency={args.latency_ms}ms workers={args.workers}")
+        for mode in ("blocking", "offloaded"):
+            r = await run_scenario(mode, args.users, args.queries, query, offloaded)
+            print(f"{r['mode']:>10}: total {r['elapsed_s']:.2f}s | "
+                  f"loop lag avg {r['lag_avg_ms']:.1f}ms, p99 {r['lag_p99_ms']:.1f}ms, max {r['lag_max_ms']:.1f}ms")
+    finally:
+        shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+"""
+키워드 추출 처리량 벤치마크
+
+다국어 사용자 메시지에 대해
+1) 기존 방식 (타입 x 패턴마다 re.finditer로 메시지 전체를 다시 훑음)과
+2) keyword_extractor (언어별 통합 패턴, 한 번 훑기)의
+처리량(메시지/초)과 결과 일치 여부를 비교합니다. 언어는 미리 정해 두어 감지 시간은 제외합니다.
+
+사용법:
+    python benchmarks/keyword_extraction.py --messages 20000
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from keyword_extractor import KEYWORD_PATTERNS, KeywordExtractor
+
+SAMPLES = {
+    'ko': ["오늘 너무 피곤했어", "내 취미는 독서랑 등산이야", "좋아하는 음식은 김치찌개!", "생일은 5월 3일이야",
+           "고향은 부산인데 지금 사는 곳은 서울", "회사에서 야근했어 ㅠㅠ", "그냥 심심해서 왔어"],
+    'en': ["hey how was your day?", "I like to eat pizza on weekends", "my birthday is May 5",
+           "I love hiking and I enjoy reading", "I'm a student at a company school lol", "I live in Seattle.",
+           "good night, see you tomorrow"],
+    'ja': ["今日はとても疲れた", "趣味は読書です", "好きな食べ物は寿司！", "誕生日は5月3日です", "出身は大阪です"],
+    'zh': ["今天好累啊", "我的爱好是看书", "我喜欢的食物是饺子", "生日是5月3日", "我来自北京。"],
+}
+
+
+def make_messages(count: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        language = rng.choice(list(SAMPLES))
+        text = " ".join(rng.choice(SAMPLES[language]) for _ in range(rng.randint(1, 4)))
+        messages.append((text, language))
+    return messages
+
+
+def legacy_extract(text: str, language: str) -> list:
+    """기존 KeywordManager.extract_keywords의 반복 구조 (감지된 언어 사용)."""
+    keywords = []
+    for keyword_type, patterns in KEYWORD_PATTERNS.items():
+        if language in patterns:
+            for pattern in patterns[language]:
+                for match in re.finditer(pattern, text, re.IGNORECASE):
+                    value = match.group(1).strip()
+                    if len(value) > 1 and len(value) < 100:
+                        keywords.append({'type': keyword_type, 'value': value, 'language': language,
+                                         'context': text[:200]})
+    return keywords
+
+
+def run(name: str, extract, messages: list) -> list:
+    start = time.perf_counter()
+    results = extract(messages)
+    elapsed = time.perf_counter() - start
+    print(f"[{name}] {len(messages) / elapsed:10.0f} messages/s   ({elapsed * 1000:.1f} ms, "
+          f"{sum(len(r) for r in results)} keywords)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="키워드 추출 처리량 비교")
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    messages = make_messages(args.messages)
+    print(f"messages: {len(messages)}\n")
+
+    start = time.perf_counter()
+    extractor = KeywordExtractor()
+    print(f"compile all languages: {(time.perf_counter() - start) * 1000:.2f} ms\n")
+
+    expected = run("legacy finditer", lambda ms: [legacy_extract(t, l) for t, l in ms], messages)
+    actual = run("single pass", lambda ms: [extractor.extract(t, l) for t, l in ms], messages)
+    batch = run("extract_batch", lambda ms: extractor.extract_batch([t for t, _ in ms], [l for _, l in ms]), messages)
+    print(f"\nidentical results: {expected == actual == batch}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+언어 감지 마이크로 벤치마크
+
+Discord 메시지와 비슷한 짧은 다국어 문장으로
+1) 기존 방식 (메시지마다 langdetect.detect, 첫 호출에 프로필 적재)과
+2) language_id.detect_language (문자 범위 빠른 경로 + 미리 적재한 모델 + LRU 캐시)의
+메시지당 시간과 두 결과의 일치율을 비교합니다.
+
+--repeat는 같은 문장이 다시 나오는 비율을 흉내냅니다. (봇 응답/최근 대화를 여러 곳에서 다시 감지)
+
+사용법:
+    python benchmarks/language_id.py --messages 2000 --repeat 4
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+SAMPLES = [
+    "안녕! 오늘 하루 어땠어?", "나 오늘 너무 피곤해 ㅠㅠ", "(웃으며) 고마워, 정말 기뻐!",
+    "今日はとても楽しかったです", "(微笑んで) ありがとう、また話そうね", "カガリちゃん、元気？",
+    "你今天过得怎么样？", "我真的很喜欢和你聊天", "（点头）好的，我明白了",
+    "Hey, how was your day?", "I really missed you today (smiling)", "lol that's so funny",
+    "Can you tell me a story about the shrine?", "ok", "Bonjour, comment ça va ?",
+    "I'm learning 한국어 these days", "Good night~ see you tomorrow!!",
+]
+
+
+def make_messages(count: int, repeat: int, seed: int = 7) -> list:
+    """SAMPLES를 조금씩 바꿔 count개의 메시지를 만들고, 각 메시지가 repeat번 나오도록 섞습니다."""
+    rng = random.Random(seed)
+    unique = [f"{rng.choice(SAMPLES)} {rng.choice(SAMPLES)}" if rng.random() < 0.3 else f"{rng.choice(SAMPLES)} #{i}"
+              for i in range(max(1, count // max(1, repeat)))]
+    messages = (unique * repeat)[:count]
+    rng.shuffle(messages)
+    return messages
+
+
+def bench(name: str, detect, messages: list) -> list:
+    timings = []
+    results = []
+    for text in messages:
+        start = time.perf_counter()
+        results.append(detect(text))
+        timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    print(f"[{name}]")
+    print(f"  mean {statistics.mean(timings):8.1f} µs   p50 {timings[len(timings) // 2]:8.1f} µs   "
+          f"p99 {timings[int(len(timings) * 0.99) - 1]:8.1f} µs   total {sum(timings) / 1000:8.1f} ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="langdetect와 language_id의 언어 감지 속도 비교")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=4, help="같은 메시지가 반복되는 횟수")
+    args = parser.parse_args()
+
+    messages = make_messages(args.messages, args.repeat)
+    print(f"messages: {len(messages)} (each repeated ~{args.repeat}x)\n")
+
+    import langdetect
+
+    def baseline(text):
+        try:
+            detected = langdetect.detect(text)
+        except Exception:
+            return 'en'
+        return {'zh-cn': 'zh', 'zh-tw': 'zh'}.get(detected, detected)
+
+    # 기존 코드처럼 프로필 적재가 첫 메시지에 포함되도록 language_id보다 먼저 실행
+    start = time.perf_counter()
+    baseline(messages[0])
+    print(f"langdetect cold first call: {(time.perf_counter() - start) * 1000:.1f} ms")
+    import language_id
+    print()
+
+    expected = bench("langdetect", baseline, messages)
+    actual = bench("language_id", language_id.detect_language, messages)
+    agree = sum(a == b for a, b in zip(expected, actual)) / len(messages)
+    print(f"\nagreement with langdetect: {agree:.1%}")
+    print(f"language_id metrics: {language_id.get_metrics()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+메모리 검색 인덱스 벤치마크
+사용자 한 명(캐릭터 하나)의 메모리 수를 늘려가며
+1) 전체 임베딩/저장 시간, 2) 재시작 후 디스크 인덱스(memmap)를 여는 시간,
+3) 검색 지연 시간 (질의 임베딩 + 행렬 곱 + 상위 k개 + 토큰 예산, p50/p99),
+4) 새 요약 1개를 반영하는 갱신 시간, 5) 심어 둔 메모리를 상위 k개 안에서 찾는 비율을 측정합니다.
+
+사용법:
+    python benchmarks/memory_index.py --memories 1000 10000 50000 --queries 1000
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from memory_index import MEMORY_RETRIEVAL_K, build_index, load_index, save_index
+
+WORDS = [
+    "학교", "시험", "고양이", "강아지", "여행", "바다", "커피", "비", "음악", "기타", "게임", "친구", "가족", "생일",
+    "케이크", "영화", "도서관", "산책", "회사", "야근", "요리", "라면", "축구", "노래", "그림", "꿈", "봄", "겨울",
+    "coffee", "exam", "guitar", "travel", "movie", "birthday", "rain", "ocean", "library", "soccer", "dream", "cat",
+    "猫", "旅行", "音楽", "誕生日", "映画",
+]
+PARTICLES = ["을", "를", "이", "가", "에서", "랑", "도", ""]
+# 찾아야 할 메모리: 다른 메모리에 없는 (장소, 음식)
+PLANTED = [("제주도", "감귤"), ("부산", "밀면"), ("교토", "말차"), ("파리", "크루아상"), ("뉴욕", "베이글"),
+           ("강릉", "순두부"), ("오사카", "타코야키"), ("런던", "스콘"), ("전주", "비빔밥"), ("하와이", "포케")]
+
+
+def make_memory(rng: random.Random) -> str:
+    words = rng.sample(WORDS, 6)
+    return "User talked about " + ", ".join(word + rng.choice(PARTICLES) for word in words) + "."
+
+
+def make_documents(count: int, rng: random.Random):
+    start = datetime(2025, 1, 1)
+    return [(f"s:{i}", make_memory(rng), start + timedelta(minutes=i)) for i in range(count)]
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run(memories: int, queries: int, rng: random.Random):
+    documents = make_documents(memories, rng)
+    for i, (place, food) in enumerate(PLANTED):
+        documents.insert(rng.randrange(len(documents)), (f"e:{i}", f"유저는 {place}에 가서 {food}을 먹었다고 했다", None))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        index, _ = build_index(documents)
+        save_index(index, tmp, 1, "Kagari")
+        build_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        index = load_index(tmp, 1, "Kagari")
+        open_ms = (time.perf_counter() - start) * 1000
+
+        texts = [make_memory(rng).replace("User talked about", "요즘") for _ in range(queries)]
+        index.search(texts[0], MEMORY_RETRIEVAL_K, 400)  # 페이지를 읽어 둠
+        latencies = []
+        for text in texts:
+            start = time.perf_counter()
+            index.search(text, MEMORY_RETRIEVAL_K, 400)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        found = 0
+        for place, food in PLANTED:
+            results = index.search(f"{place}에서 {food} 먹었던 거 기억나?", MEMORY_RETRIEVAL_K, 400)
+            found += any(food in summary for summary, _, _ in results)
+        recall = found / len(PLANTED)
+
+        start = time.perf_counter()
+        documents.append((f"s:{memories + 1}", make_memory(rng), datetime(2026, 1, 1)))
+        index, embedded = build_index(documents, index)
+        save_index(index, tmp, 1, "Kagari")
+        refresh_ms = (time.perf_counter() - start) * 1000
+        assert embedded == 1
+    return build_ms, open_ms, percentile(latencies, 0.5), percentile(latencies, 0.99), refresh_ms, recall
+
+
+def main():
+    parser = argparse.ArgumentParser(description="메모리 검색 인덱스 지연 시간 측정")
+    parser.add_argument("--memories", type=int, nargs="+", default=[1000, 10000, 50000], help="사용자 한 명의 메모리 수")
+    parser.add_argument("--queries", type=int, default=1000, help="측정할 검색 수")
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    print(f"{'memories':>9} {'build ms':>9} {'open ms':>8} {'p50 ms':>7} {'p99 ms':>7} {'refresh ms':>11} {'recall@k':>9}")
+    for memories in args.memories:
+        build_ms, open_ms, p50, p99, refresh_ms, recall = run(memories, args.queries, rng)
+        print(f"{memories:>9} {build_ms:9.1f} {open_ms:8.1f} {p50:7.3f} {p99:7.3f} {refresh_ms:11.1f} {recall:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+세션 스냅샷 저장/복원 벤치마크
+세션 수를 늘려가며 (SQLite 디스크 저장소 기준)
+1) 처음 전체 저장, 2) 1%만 바뀐 뒤의 증분 저장,
+3) 재시작 후 첫 요청을 처리할 수 있을 때까지의 시간 (맵 하나를 지연 복원), 4) 모든 맵 복원 시간을 측정합니다.
+(재시작 전에는 세션이 모두 사라져 사용자가 /bot, /story를 다시 실행해야 했습니다)
+
+사용법:
+    python benchmarks/session_restore.py --sessions 1000 10000 50000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("SESSION_SNAPSHOT_BACKEND", "off")
+
+from session_registry import SessionRegistry
+from session_snapshots import SessionSnapshotter, SqliteSnapshotStore
+
+MAPS = ('story', 'dm', 'active_channels:Kagari')
+
+
+def make_session(name: str, i: int, rng: random.Random):
+    if name == 'story':
+        return {"user_id": i, "character_name": "Kagari", "stage_num": rng.randint(1, 3), "turn_count": rng.randint(0, 30),
+                "is_active": True, "history": [{"role": "user", "content": "hello " * 5}] * 4, "hints_shown": [0, 1]}
+    if name == 'dm':
+        return {"last_activity": time.time(), "character_name": "Eros"}
+    return {"user_id": i, "history": []}
+
+
+def populate(registry: SessionRegistry, sessions: int, rng: random.Random):
+    for name in MAPS:
+        session_map = registry.create(name, ttl=3600, max_size=sessions * 2)
+        for i in range(sessions):
+            session_map[1_000_000 + i] = make_session(name.split(':')[0], i, rng)
+
+
+async def run(sessions: int, rng: random.Random):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "snapshots.sqlite3")
+        registry = SessionRegistry()
+        snapshotter = SessionSnapshotter(SqliteSnapshotStore(path), registry=registry).install()
+        populate(registry, sessions, rng)
+
+        start = time.perf_counter()
+        await snapshotter.flush()
+        full_ms = (time.perf_counter() - start) * 1000
+
+        snapshotter._last_flush = time.monotonic()
+        story = registry.create('story')
+        for i in rng.sample(range(sessions), max(1, sessions // 100)):
+            story[1_000_000 + i]["turn_count"] += 1
+        start = time.perf_counter()
+        await snapshotter.flush()
+        incremental_ms = (time.perf_counter() - start) * 1000
+        upserted = snapshotter.metrics['upserted']
+
+        # 재시작: 새 레지스트리와 스냅샷 저장소
+        start = time.perf_counter()
+        restarted = SessionRegistry()
+        SessionSnapshotter(SqliteSnapshotStore(path), registry=restarted).install()
+        channels = restarted.create('active_channels:Kagari', ttl=3600, max_size=sessions * 2)
+        assert 1_000_000 in channels
+        first_ms = (time.perf_counter() - start) * 1000
+        for name in MAPS:
+            len(restarted.create(name, ttl=3600, max_size=sessions * 2))
+        all_ms = (time.perf_counter() - start) * 1000
+        assert restarted.create('story').peek(1_000_000)['hints_shown'] == [0, 1]
+        return full_ms, incremental_ms, upserted - len(MAPS) * sessions, first_ms, all_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="세션 스냅샷 저장/복원 시간 측정")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1000, 10000, 50000], help="맵별 세션 수")
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    print(f"{'sessions/map':>12} {'full save ms':>13} {'1% save ms':>11} {'rows':>6} {'first serve ms':>15} {'all maps ms':>12}")
+    for sessions in args.sessions:
+        full_ms, incremental_ms, rows, first_ms, all_ms = asyncio.run(run(sessions, rng))
+        print(f"{sessions:>12} {full_ms:13.1f} {incremental_ms:11.1f} {rows:>6} {first_ms:15.1f} {all_ms:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+스팸 감지 비용 벤치마크
+
+1) 기존 방식 (사용자별 무제한 리스트 + 최근 메시지마다 difflib.SequenceMatcher, 매번 이모지 정규식 컴파일)과
+2) safety_guard.SpamDetector (고정 크기 링 버퍼 + MinHash 스케치)의
+메시지당 처리 시간을 사용자별 기록 길이와 활성 사용자 수를 늘려가며 비교합니다.
+SpamDetector는 기록/사용자 수가 늘어도 메시지당 시간이 거의 일정해야 합니다.
+
+사용법:
+    python benchmarks/spam_detector.py --messages 2000
+"""
+import argparse
+import random
+import re
+import statistics
+import sys
+import time
+from difflib import SequenceMatcher
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from safety_guard import SpamDetector
+
+WORDS = ("hello", "kagari", "today", "tired", "shrine", "tea", "music", "rain", "story", "why", "really",
+         "안녕", "오늘", "피곤해", "今日は", "楽しい", "我们", "😀", "lol", "ok", "the", "you", "and")
+
+
+def make_message(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 30)))
+
+
+def legacy_is_spam(user_id, message, now, user_message_buffers):
+    """character_bot.is_spam (제거 전 구현)."""
+    recent = [msg for msg, ts in user_message_buffers.get(user_id, []) if now - ts < 5]
+    if any(SequenceMatcher(None, message, msg).ratio() > 0.85 for msg in recent):
+        return True, "similar"
+    same_count = sum(1 for msg, _ in user_message_buffers.get(user_id, [])[-10:] if message == msg)
+    if same_count >= 5:
+        return True, "repeated"
+    emoji_pattern = re.compile("[\U00010000-\U0010ffff]", flags=re.UNICODE)
+    emoji_msgs = [msg for msg, _ in user_message_buffers.get(user_id, [])[-10:] if emoji_pattern.fullmatch(msg.strip())]
+    if len(emoji_msgs) >= 5:
+        return True, "emoji"
+    return False, ""
+
+
+def bench_legacy(users: int, history: int, messages: int, rng: random.Random) -> float:
+    # 모든 기록이 5초 안에 들어온 최악의 경우 (빠르게 연달아 보내는 사용자)
+    buffers = {user_id: [(make_message(rng), 0.0) for _ in range(history)] for user_id in range(users)}
+    timings = []
+    for _ in range(messages):
+        user_id = rng.randrange(users)
+        message = make_message(rng)
+        start = time.perf_counter()
+        legacy_is_spam(user_id, message, 1.0, buffers)
+        buffers[user_id].append((message, 1.0))
+        timings.append(time.perf_counter() - start)
+    return statistics.mean(timings) * 1e6
+
+
+def bench_detector(users: int, history: int, messages: int, rng: random.Random) -> float:
+    clock = [0.0]
+    detector = SpamDetector(clock=lambda: clock[0])
+    for user_id in range(users):
+        for _ in range(min(history, detector.history_size)):
+            detector.check(user_id, make_message(rng))
+    timings = []
+    for _ in range(messages):
+        user_id = rng.randrange(users)
+        message = make_message(rng)
+        clock[0] += 0.001
+        start = time.perf_counter()
+        detector.check(user_id, message)
+        timings.append(time.perf_counter() - start)
+    return statistics.mean(timings) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="스팸 감지 메시지당 비용 비교")
+    parser.add_argument("--messages", type=int, default=2000, help="측정할 메시지 수")
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    print(f"{'users':>8} {'history':>8} {'legacy µs/msg':>15} {'detector µs/msg':>16}")
+    for users, history in ((10, 10), (10, 100), (10, 1000), (1000, 10), (10000, 10), (100000, 10)):
+        # 기존 방식은 기록이 길면 너무 느려서 메시지 수를 줄여 측정
+        legacy_messages = max(20, args.messages // history)
+        legacy = bench_legacy(users, history, legacy_messages, rng) if users * history <= 100000 else None
+        detector = bench_detector(users, history, args.messages, rng)
+        legacy_text = f"{legacy:15.1f}" if legacy is not None else f"{'(skipped)':>15}"
+        print(f"{users:>8} {history:>8} {legacy_text} {detector:16.1f}")
+
+
+if __name__ == "__main__":
+    main()
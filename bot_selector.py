@@ -31,7 +31,7 @@ import sys
 from datetime import datetime, timezone
 from pathlib import Path
 import re
-import langdetect
+import language_id
 from deep_translator import GoogleTranslator
 import random
 from math import ceil
@@ -40,7 +40,11 @@ from character_bot import CharacterBot
 import character_bot
 from story_mode import story_sessions, get_chapter_info
 from story_mode import start_story_stage, process_story_message, handle_chapter3_gift_usage, handle_serve_command
-import openai
+import llm_gateway
+import session_history
+from session_registry import get_session_map
+import session_snapshots
+from streaming_reply import STREAM_REPLIES, stream_to_channel
 import traceback
 import importlib
 
@@ -147,25 +151,25 @@ class RankingSelect(discord.ui.Select):
             guild = interaction.guild
 
             if ranking_type == "kagari":
-                rankings = self.view.db.get_character_ranking("Kagari")
+                rankings = await self.view.db.aget_character_ranking("Kagari")
                 embed.title = "🌸 Kagari Chat Ranking"
-                user_rank = self.view.db.get_user_character_rank(user_id, "Kagari")
-                user_stats = self.view.db.get_user_stats(user_id, "Kagari")
+                user_rank = await self.view.db.aget_user_character_rank(user_id, "Kagari")
+                user_stats = await self.view.db.aget_ranking_stats(user_id, "Kagari")
             elif ranking_type == "eros":
-                rankings = self.view.db.get_character_ranking("Eros")
+                rankings = await self.view.db.aget_character_ranking("Eros")
                 embed.title = "💝 Eros Chat Ranking"
-                user_rank = self.view.db.get_user_character_rank(user_id, "Eros")
-                user_stats = self.view.db.get_user_stats(user_id, "Eros")
+                user_rank = await self.view.db.aget_user_character_rank(user_id, "Eros")
+                user_stats = await self.view.db.aget_ranking_stats(user_id, "Eros")
             elif ranking_type == "elysia":
-                rankings = self.view.db.get_character_ranking("Elysia")
+                rankings = await self.view.db.aget_character_ranking("Elysia")
                 embed.title = "🦋 Elysia Chat Ranking"
-                user_rank = self.view.db.get_user_character_rank(user_id, "Elysia")
-                user_stats = self.view.db.get_user_stats(user_id, "Elysia")
+                user_rank = await self.view.db.aget_user_character_rank(user_id, "Elysia")
+                user_stats = await self.view.db.aget_ranking_stats(user_id, "Elysia")
             else:  # total
-                rankings = self.view.db.get_total_ranking()
+                rankings = await self.view.db.aget_total_ranking()
                 embed.title = "👑 Total Chat Ranking"
-                user_rank = self.view.db.get_user_total_rank(user_id)
-                user_stats = self.view.db.get_user_stats(user_id)
+                user_rank = await self.view.db.aget_user_total_rank(user_id)
+                user_stats = await self.view.db.aget_ranking_stats(user_id)
 
             # top20 표시
             if not rankings or len(rankings) == 0:
@@ -281,7 +285,7 @@ class RoleplayModal(discord.ui.Modal, title="Roleplay Settings"):
             try:
                 bot_selector = interaction.client
                 if not hasattr(bot_selector, "roleplay_sessions"):
-                    bot_selector.roleplay_sessions = {}
+                    bot_selector.roleplay_sessions = get_session_map('roleplay')
 
                 # 1. Create new roleplay channel
                 guild = interaction.guild
@@ -305,7 +309,7 @@ class RoleplayModal(discord.ui.Modal, title="Roleplay Settings"):
                 session_id = f"rp_{interaction.user.id}_{self.character_name}_{int(datetime.now().timestamp())}"
                 
                 # Save session to database
-                bot_selector.db.create_roleplay_session(
+                await bot_selector.db.acreate_roleplay_session(
                     session_id, interaction.user.id, self.character_name, 
                     self.mode.value.lower(), self.user_role.value, 
                     self.character_role.value, self.story_line.value
@@ -485,7 +489,7 @@ class LanguageSelect(discord.ui.Select):
 
             # Save language settings to database
             try:
-                self.db.set_channel_language(
+                await self.db.aset_channel_language(
                     interaction.channel_id,
                     self.user_id,
                     self.character_name,
@@ -741,9 +745,9 @@ class BotSelector(commands.Bot):
         self.settings_manager = SettingsManager()
         self.active_channels: Dict[int, str] = {}
         self.user_languages: Dict[int, str] = {}
-        self.roleplay_sessions = {}
-        self.story_sessions = {}
-        self.dm_sessions = {}  # DM 세션 관리
+        self.roleplay_sessions = get_session_map('roleplay')
+        self.story_sessions = story_sessions
+        self.dm_sessions = get_session_map('dm')  # DM 세션 관리 (30분 유휴 시 제거)
         
         # Admin-only channel settings
         self.admin_channels = set()  # Channel IDs allowed for admin commands
@@ -815,14 +819,16 @@ class BotSelector(commands.Bot):
         except Exception as e:
             print(f"⚠️ Failed to save admin channels: {e}")
         
-        # 안전장치 모듈 임포트 및 초기화
+        # 안전장치 (스팸 감지) - 모니터링 모듈(psutil 필요)과 별개로 항상 사용
+        from safety_guard import safety_guard
+        self.safety_guard = safety_guard
+
+        # 오류 처리/모니터링 모듈 임포트 및 초기화
         try:
             from error_handler import ErrorHandler
-            from safety_guard import safety_guard
             from monitor import BotMonitor
             
             self.error_handler = ErrorHandler(self)
-            self.safety_guard = safety_guard
             self.monitor = BotMonitor(self)
             
             # 모니터링 시작
@@ -831,7 +837,6 @@ class BotSelector(commands.Bot):
         except ImportError as e:
             print(f"Warning: Safety modules not available: {e}")
             self.error_handler = None
-            self.safety_guard = None
             self.monitor = None
 
     async def check_story_quests(self, user_id: int) -> list:
@@ -839,7 +844,7 @@ class BotSelector(commands.Bot):
         quests = []
         try:
             # Kagari (3챕터)
-            kagari_completed = self.db.get_completed_chapters(user_id, 'Kagari')
+            kagari_completed = await self.db.aget_completed_chapters(user_id, 'Kagari')
             quests.append({
                 'id': 'story_kagari_all_chapters',
                 'name': '🌸 Kagari Story Complete',
@@ -848,11 +853,11 @@ class BotSelector(commands.Bot):
                 'max_progress': 3,
                 'completed': len(kagari_completed) >= 3,
                 'reward': 'Epic Gifts x3',
-                'claimed': self.db.is_story_quest_claimed(user_id, 'Kagari', 'all_chapters')
+                'claimed': await self.db.ais_story_quest_claimed(user_id, 'Kagari', 'all_chapters')
             })
 
             # Eros (3챕터)
-            eros_completed = self.db.get_completed_chapters(user_id, 'Eros')
+            eros_completed = await self.db.aget_completed_chapters(user_id, 'Eros')
             quests.append({
                 'id': 'story_eros_all_chapters',
                 'name': '💝 Eros Story Complete',
@@ -861,11 +866,11 @@ class BotSelector(commands.Bot):
                 'max_progress': 3,
                 'completed': len(eros_completed) >= 3,
                 'reward': 'Epic Gifts x3',
-                'claimed': self.db.is_story_quest_claimed(user_id, 'Eros', 'all_chapters')
+                'claimed': await self.db.ais_story_quest_claimed(user_id, 'Eros', 'all_chapters')
             })
 
             # Elysia (1챕터)
-            elysia_completed = self.db.get_completed_chapters(user_id, 'Elysia')
+            elysia_completed = await self.db.aget_completed_chapters(user_id, 'Elysia')
             quests.append({
                 'id': 'story_elysia_all_chapters',
                 'name': '🦋 Elysia Story Complete',
@@ -874,7 +879,7 @@ class BotSelector(commands.Bot):
                 'max_progress': 1,
                 'completed': len(elysia_completed) >= 1,
                 'reward': 'Epic Gifts x3',
-                'claimed': self.db.is_story_quest_claimed(user_id, 'Elysia', 'all_chapters')
+                'claimed': await self.db.ais_story_quest_claimed(user_id, 'Elysia', 'all_chapters')
             })
         except Exception as e:
             print(f"Error in check_story_quests: {e}")
@@ -891,6 +896,9 @@ class BotSelector(commands.Bot):
         # 자동 블랙리스트 정리 작업 시작
         asyncio.create_task(self.blacklist_cleanup_task())
 
+        # 세션 스냅샷 주기 저장 시작 (복원은 run_all_bots에서 봇을 시작하기 전에)
+        session_snapshots.start()
+
     async def blacklist_cleanup_task(self):
         """자동 블랙리스트 정리 작업 (매 시간마다 실행)"""
         while True:
@@ -899,7 +907,7 @@ class BotSelector(commands.Bot):
                 await asyncio.sleep(3600)
                 
                 # 만료된 블랙리스트 정리
-                cleaned_count = self.db.cleanup_expired_blacklist()
+                cleaned_count = await self.db.acleanup_expired_blacklist()
                 if cleaned_count > 0:
                     print(f"✅ Cleaned up {cleaned_count} expired blacklist entries.")
                     
@@ -907,12 +915,14 @@ class BotSelector(commands.Bot):
                 print(f"Error in blacklist cleanup task: {e}")
 
     def load_active_channels(self):
-        """데이터베이스에서 활성 채널 정보를 불러옵니다."""
+        """캐릭터 봇들의 활성 채널(재시작 전 스냅샷에서 복원)을 channel_id -> 캐릭터 이름으로 모읍니다."""
         try:
-            # 현재는 빈 딕셔너리로 초기화
-            # 나중에 데이터베이스에서 저장된 채널 정보를 불러올 수 있음
-            self.active_channels = {}
-            print("✅ Active channels loaded successfully")
+            self.active_channels = {
+                channel_id: char_name
+                for char_name, bot in self.character_bots.items()
+                for channel_id in getattr(bot, 'active_channels', {})
+            }
+            print(f"✅ Active channels loaded successfully ({len(self.active_channels)} channels)")
         except Exception as e:
             print(f"⚠️ Error loading active channels: {e}")
             self.active_channels = {}
@@ -1037,7 +1047,7 @@ class BotSelector(commands.Bot):
         async def status_command(interaction: discord.Interaction):
             """Check bot status"""
             try:
-                if not self.db.is_user_admin(interaction.user.id):
+                if not await self.db.ais_user_admin(interaction.user.id):
                     await interaction.response.send_message("This command is for administrators only.", ephemeral=True)
                     return
                 
@@ -1228,7 +1238,7 @@ class BotSelector(commands.Bot):
                         return
                     
                     # 메시지 지급
-                    success = self.db.add_user_messages(user_id, quantity)
+                    success = await self.db.aadd_user_messages(user_id, quantity)
                     
                     if success:
                         await interaction.response.send_message(
@@ -1301,7 +1311,7 @@ class BotSelector(commands.Bot):
                     # 카드 지급
                     success_count = 0
                     for _ in range(quantity):
-                        success = self.db.add_user_card(user_id, f"{character.lower()}_card_1")
+                        success = await self.db.aadd_user_card(user_id, f"{character.lower()}_card_1")
                         if success:
                             success_count += 1
                     
@@ -1370,7 +1380,7 @@ class BotSelector(commands.Bot):
                         return
                     
                     # 선물 지급
-                    success = self.db.add_user_gift(user_id, gift_id, quantity)
+                    success = await self.db.aadd_user_gift(user_id, gift_id, quantity)
                     
                     if success:
                         await interaction.response.send_message(
@@ -1437,7 +1447,7 @@ class BotSelector(commands.Bot):
                         return
                     
                     # 호감도 추가
-                    success = self.db.update_affinity(user_id, character, points, f"Admin gave {points} affinity points")
+                    success = await self.db.aupdate_affinity(user_id, character, points, f"Admin gave {points} affinity points")
                     
                     if success:
                         await interaction.response.send_message(
@@ -1834,7 +1844,7 @@ class BotSelector(commands.Bot):
             async def on_submit(self, interaction: discord.Interaction):
                 try:
                     user_id = int(self.children[0].value)
-                    self.db.reset_story_progress(user_id)
+                    await self.db.areset_story_progress(user_id)
                     await interaction.response.send_message(f"✅ Story progress has been reset for user {user_id}.", ephemeral=True)
                 except ValueError:
                     await interaction.response.send_message("❌ Invalid user ID format.", ephemeral=True)
@@ -1866,7 +1876,7 @@ class BotSelector(commands.Bot):
                     if count < 1:
                         await interaction.response.send_message("❌ Message count must be at least 1.", ephemeral=True)
                         return
-                    self.db.add_user_messages(user_id, count)
+                    await self.db.aadd_user_messages(user_id, count)
                     await interaction.response.send_message(f"✅ Added {count} messages to user {user_id}.", ephemeral=True)
                 except ValueError:
                     await interaction.response.send_message("❌ Please enter valid numbers.", ephemeral=True)
@@ -1888,7 +1898,7 @@ class BotSelector(commands.Bot):
             async def on_submit(self, interaction: discord.Interaction):
                 try:
                     user_id = int(self.children[0].value)
-                    self.db.reset_quest_claims(user_id)
+                    await self.db.areset_quest_claims(user_id)
                     await interaction.response.send_message(f"✅ Quest claims have been reset for user {user_id}.", ephemeral=True)
                 except ValueError:
                     await interaction.response.send_message("❌ Invalid user ID format.", ephemeral=True)
@@ -1911,11 +1921,11 @@ class BotSelector(commands.Bot):
                 try:
                     user_input = self.children[0].value.lower()
                     if user_input == "all":
-                        cleaned = self.db.cleanup_duplicate_cards()
+                        cleaned = await self.db.acleanup_duplicate_cards()
                         await interaction.response.send_message(f"✅ Cleaned up duplicate cards for all users. Removed {cleaned} duplicates.", ephemeral=True)
                     else:
                         user_id = int(user_input)
-                        cleaned = self.db.cleanup_duplicate_cards(user_id)
+                        cleaned = await self.db.acleanup_duplicate_cards(user_id)
                         await interaction.response.send_message(f"✅ Cleaned up duplicate cards for user {user_id}. Removed {cleaned} duplicates.", ephemeral=True)
                 except ValueError:
                     await interaction.response.send_message("❌ Invalid user ID format. Use a number or 'all'.", ephemeral=True)
@@ -2009,10 +2019,10 @@ class BotSelector(commands.Bot):
             async def view_blacklist(self, interaction: discord.Interaction, button: discord.ui.Button):
                 try:
                     # 만료된 블랙리스트 정리
-                    self.db.cleanup_expired_blacklist()
+                    await self.db.acleanup_expired_blacklist()
                     
                     # 현재 블랙리스트 조회
-                    blacklist_users = self.db.get_blacklist_users()
+                    blacklist_users = await self.db.aget_blacklist_users()
                     
                     if not blacklist_users:
                         embed = discord.Embed(
@@ -2123,7 +2133,7 @@ class BotSelector(commands.Bot):
                         return
                     
                     # 블랙리스트에 추가
-                    success = self.db.add_to_blacklist(
+                    success = await self.db.aadd_to_blacklist(
                         user_id=user_id,
                         username=username,
                         reason=reason,
@@ -2169,7 +2179,7 @@ class BotSelector(commands.Bot):
                         return
                     
                     # 블랙리스트에서 제거
-                    success = self.db.remove_from_blacklist(user_id)
+                    success = await self.db.aremove_from_blacklist(user_id)
                     
                     if success:
                         await interaction.response.send_message(
@@ -2510,7 +2520,7 @@ class BotSelector(commands.Bot):
                         return
                     
                     # 메시지 수 추가
-                    success = self.db.add_user_messages(user_id, message_count)
+                    success = await self.db.aadd_user_messages(user_id, message_count)
                     if success:
                         await interaction.response.send_message(
                             f"✅ Added {message_count} messages to user {user.mention}.",
@@ -2591,7 +2601,7 @@ class BotSelector(commands.Bot):
                             await interaction.response.send_message("❌ User not found.", ephemeral=True)
                             return
                         
-                        success = self.db.cleanup_duplicate_cards(user_id)
+                        success = await self.db.acleanup_duplicate_cards(user_id)
                         if success:
                             await interaction.response.send_message(
                                 f"✅ Cleaned up duplicate cards for user {user.mention}.",
@@ -2601,7 +2611,7 @@ class BotSelector(commands.Bot):
                             await interaction.response.send_message("❌ Failed to cleanup cards.", ephemeral=True)
                     else:
                         # 모든 사용자 카드 정리
-                        success = self.db.cleanup_duplicate_cards()
+                        success = await self.db.acleanup_duplicate_cards()
                         if success:
                             await interaction.response.send_message(
                                 "✅ Cleaned up duplicate cards for all users.",
@@ -2706,7 +2716,7 @@ class BotSelector(commands.Bot):
                 return
             
             try:
-                self.db.add_user_messages(user.id, count)
+                await self.db.aadd_user_messages(user.id, count)
                 await interaction.response.send_message(f"✅ Added {count} messages to {user.mention}.", ephemeral=True)
             except Exception as e:
                 print(f"Error in message_add_command: {e}")
@@ -2747,7 +2757,7 @@ class BotSelector(commands.Bot):
             
             try:
                 if user:
-                    deleted_count = self.db.cleanup_duplicate_cards(user.id)
+                    deleted_count = await self.db.acleanup_duplicate_cards(user.id)
                     await interaction.response.send_message(f"✅ Cleaned up {deleted_count} duplicate cards for {user.mention}", ephemeral=True)
                 else:
                     deleted_count = self.db.cleanup_all_duplicate_cards()
@@ -2881,7 +2891,7 @@ class BotSelector(commands.Bot):
             
             try:
                 # 블랙리스트에 추가
-                success = self.db.add_to_blacklist(
+                success = await self.db.aadd_to_blacklist(
                     user_id=user.id,
                     username=user.display_name or user.name,
                     reason=reason,
@@ -2918,7 +2928,7 @@ class BotSelector(commands.Bot):
             
             try:
                 # 블랙리스트에서 제거
-                success = self.db.remove_from_blacklist(user.id)
+                success = await self.db.aremove_from_blacklist(user.id)
                 
                 if success:
                     await interaction.response.send_message(
@@ -2948,10 +2958,10 @@ class BotSelector(commands.Bot):
             
             try:
                 # 만료된 블랙리스트 정리
-                self.db.cleanup_expired_blacklist()
+                await self.db.acleanup_expired_blacklist()
                 
                 # 현재 블랙리스트 조회
-                blacklist_users = self.db.get_blacklist_users()
+                blacklist_users = await self.db.aget_blacklist_users()
                 
                 if not blacklist_users:
                     embed = discord.Embed(
@@ -3032,11 +3042,9 @@ class BotSelector(commands.Bot):
         except:
             return 0
 
-    async def get_ai_response(self, messages: list, emotion_score: int = 0) -> str:
-        if not OPENAI_API_KEY:
-            return "OpenAI API key is not set."
+    def _dm_system_message(self, emotion_score: int = 0) -> dict:
         grade = get_affinity_grade(emotion_score)
-        system_message = {
+        return {
             "role": "system",
             "content": (
                 "You are Kagari, a bright, kind, and slightly shy teenage girl. "
@@ -3055,59 +3063,44 @@ class BotSelector(commands.Bot):
                 + ("If your affinity grade is Silver or higher, your replies should be longer (at least 30 characters) and include more diverse and rich emotional expressions in parentheses." if grade in ["Silver", "Gold"] else "")
             )
         }
-        formatted_messages = [system_message] + messages
-
-        max_retries = 3
-        base_delay = 1.0
-
-        for attempt in range(max_retries):
-            try:
-                response = openai.chat.completions.create(
-                    model="gpt-4o",
-                    messages=formatted_messages,
-                    temperature=0.7,
-                    max_tokens=150
-                )
-                ai_response = response.choices[0].message.content.strip()
-                return ai_response
-            except Exception as e:
-                print(f"Error in get_ai_response (attempt {attempt + 1}/{max_retries}): {e}")
-
-                # 네트워크 관련 에러인지 확인
-                is_network_error = (
-                    "Connection reset by peer" in str(e) or
-                    "Connection reset" in str(e) or
-                    "Connection closed" in str(e) or
-                    "Connection timeout" in str(e) or
-                    "ClientOSError" in str(e) or
-                    "aiohttp.client_exceptions.ClientOSError" in str(e) or
-                    "aiohttp.client_exceptions.ClientConnectorError" in str(e) or
-                    "aiohttp.client_exceptions.ServerDisconnectedError" in str(e) or
-                    "aiohttp.client_exceptions.ClientResponseError" in str(e)
-                )
-
-                # 기존 서버 에러 체크
-                is_server_error = (
-                    (hasattr(e, 'http_status') and e.http_status == 500) or
-                    (hasattr(e, 'status_code') and e.status_code == 500) or
-                    (hasattr(e, 'args') and 'server had an error' in str(e.args[0]))
-                )
 
-                # 마지막 시도가 아니고 (네트워크 에러 또는 서버 에러)인 경우 재시도
-                if attempt < max_retries - 1 and (is_network_error or is_server_error):
-                    delay = base_delay * (2 ** attempt)  # 지수 백오프
-                    print(f"Network/Server error detected, retrying in {delay} seconds...")
-                    await asyncio.sleep(delay)
-                    continue
-                else:
-                    # 에러가 아니거나 마지막 시도인 경우
-                    if is_network_error:
-                        return "Sorry, there was a temporary network issue. Please try again in a moment."
-                    else:
-                        return "There was a temporary issue with the AI server. Please try again in a moment."
+    async def get_ai_response(self, messages: list, emotion_score: int = 0) -> str:
+        if not OPENAI_API_KEY:
+            return "OpenAI API key is not set."
+        formatted_messages = [self._dm_system_message(emotion_score)] + messages
 
+        try:
+            ai_response = await llm_gateway.chat_completion(
+                formatted_messages,
+                model="gpt-4o",
+                temperature=0.7,
+                max_tokens=150
+            )
+            return ai_response.strip()
+        except llm_gateway.LLMError as e:
+            return self._ai_error_text(e)
+
+    def _ai_error_text(self, e: llm_gateway.LLMError) -> str:
+        if isinstance(e, llm_gateway.LLMOverloaded):
+            return f"I'm getting a lot of messages right now (you're #{e.queue_position} in line). Please try again in a moment!"
+        print(f"Error in get_ai_response: {e}")
+        if e.is_network_error:
+            return "Sorry, there was a temporary network issue. Please try again in a moment."
         return "There was a temporary issue with the AI server. Please try again in a moment."
 
+    async def stream_ai_response(self, channel, messages: list, emotion_score: int = 0, prefix: str = "", finalize=None) -> str:
+        """get_ai_response와 같은 요청을 스트리밍으로 보내고 channel에 점진적으로 표시합니다."""
+        if not OPENAI_API_KEY:
+            await channel.send(prefix + "OpenAI API key is not set.")
+            return "OpenAI API key is not set."
+        chunks = llm_gateway.stream_chat_completion(
+            [self._dm_system_message(emotion_score)] + messages,
+            model="gpt-4o",
+            temperature=0.7,
+            max_tokens=150
+        )
+        return await stream_to_channel(channel, chunks, prefix=prefix, finalize=finalize, error_text=self._ai_error_text)
+
     def setup_commands(self):
         # 관리자 명령어들은 setup_admin_commands에서 처리하므로 여기서는 일반 명령어만 정의
         @self.tree.command(
@@ -3118,7 +3111,7 @@ class BotSelector(commands.Bot):
             try:
                 # 블랙리스트 체크
                 try:
-                    blacklist_info = self.db.is_user_blacklisted(interaction.user.id)
+                    blacklist_info = await self.db.ais_user_blacklisted(interaction.user.id)
                 except AttributeError:
                     # 데이터베이스 연결 실패 시 블랙리스트 체크 건너뛰기
                     blacklist_info = {'is_blacklisted': False}
@@ -3398,7 +3391,7 @@ class BotSelector(commands.Bot):
                 print(f"Character name: {character_name}")
 
                 # Get affinity info
-                affinity_info = self.db.get_affinity(interaction.user.id, character_name)
+                affinity_info = await self.db.aget_affinity(interaction.user.id, character_name)
                 print(f"Affinity info: {affinity_info}")
 
                 if not affinity_info:
@@ -3426,7 +3419,7 @@ class BotSelector(commands.Bot):
                 
                 if character_name:
                     # 특정 캐릭터의 카드만 조회
-                    all_user_cards = self.db.get_user_cards(user_id, character_name)
+                    all_user_cards = await self.db.aget_user_cards(user_id, character_name)
                     print(f"[DEBUG] /info 명령어 - {character_name} 카드 수: {len(all_user_cards)}")
                     
                     # 카드 데이터 형식 변환 (특정 캐릭터: card_id, acquired_at)
@@ -3441,7 +3434,7 @@ class BotSelector(commands.Bot):
                             user_cards.append(card_data)
                 else:
                     # 모든 캐릭터의 카드 조회
-                    all_user_cards = self.db.get_user_cards(user_id)
+                    all_user_cards = await self.db.aget_user_cards(user_id)
                     print(f"[DEBUG] /info 명령어 - 전체 카드 수: {len(all_user_cards)}")
                     
                     # 카드 데이터 형식 변환 (모든 캐릭터: character_name, card_id, acquired_at)
@@ -3622,7 +3615,7 @@ class BotSelector(commands.Bot):
                     await interaction.response.send_message("Invalid language code. Please use: en (English), zh (Chinese), or ja (Japanese)", ephemeral=True)
                     return
 
-                success = self.db.set_channel_language(
+                success = await self.db.aset_channel_language(
                     channel_id=channel_id,
                     user_id=user_id,
                     character_name=current_bot.character_name,
@@ -3656,7 +3649,7 @@ class BotSelector(commands.Bot):
 
                 channel_id = interaction.channel.id
                 user_id = interaction.user.id
-                current_lang = self.db.get_channel_language(
+                current_lang = await self.db.aget_channel_language(
                     channel_id=channel_id,
                     user_id=user_id,
                     character_name=current_bot.character_name
@@ -3715,7 +3708,7 @@ class BotSelector(commands.Bot):
                 
                 if character_name:
                     # 현재 캐릭터의 호감도 체크 (100 이상 필요)
-                    affinity_info = self.db.get_affinity(user_id, character_name)
+                    affinity_info = await self.db.aget_affinity(user_id, character_name)
                     affinity = affinity_info['emotion_score'] if affinity_info else 0
                     
                     if affinity < 100:
@@ -3743,7 +3736,7 @@ class BotSelector(commands.Bot):
                         return
                     
                     # 현재 캐릭터의 스토리 진행 상황 가져오기
-                    progress = self.db.get_story_progress(user_id, character_name)
+                    progress = await self.db.aget_story_progress(user_id, character_name)
                     story_info = STORY_CHAPTERS.get(character_name)
                     
                     if not story_info:
@@ -3766,7 +3759,7 @@ class BotSelector(commands.Bot):
             available_characters = []
             
             for char_name in CHARACTER_INFO.keys():
-                affinity_info = self.db.get_affinity(user_id, char_name)
+                affinity_info = await self.db.aget_affinity(user_id, char_name)
                 affinity = affinity_info['emotion_score'] if affinity_info else 0
                 print(f"[DEBUG] {char_name} affinity: {affinity}")
                 
@@ -3925,7 +3918,7 @@ class BotSelector(commands.Bot):
                     return
 
                 # 2. 호감도 체크 (Silver 이상만 허용)
-                affinity_info = current_bot.db.get_affinity(interaction.user.id, current_bot.character_name)
+                affinity_info = await current_bot.db.aget_affinity(interaction.user.id, current_bot.character_name)
                 affinity = affinity_info['emotion_score'] if affinity_info else 0
                 affinity_grade = get_affinity_grade(affinity)
                 if affinity < 50:
@@ -3964,7 +3957,7 @@ class BotSelector(commands.Bot):
 
         @self.tree.command(name="inventory", description="Check your gift inventory.")
         async def inventory(interaction: discord.Interaction):
-            user_gifts = self.db.get_user_gifts(interaction.user.id)
+            user_gifts = await self.db.aget_user_gifts(interaction.user.id)
 
             if not user_gifts:
                 embed = discord.Embed(
@@ -3985,7 +3978,7 @@ class BotSelector(commands.Bot):
             try:
                 # get_db_manager()를 통해 안정적으로 DB 인스턴스 획득
                 db = get_db_manager()
-                user_gifts = db.get_user_gifts(interaction.user.id)
+                user_gifts = await db.aget_user_gifts(interaction.user.id)
 
                 choices = []
                 if user_gifts:
@@ -4043,7 +4036,7 @@ class BotSelector(commands.Bot):
                 user_id = interaction.user.id
                 print(f"[DEBUG] character={character}, user_id={user_id}")
                 # 보유 수량 체크
-                user_gifts = self.db.get_user_gifts(user_id)
+                user_gifts = await self.db.aget_user_gifts(user_id)
                 print(f"[DEBUG] user_gifts: {user_gifts}")
                 gift_info = next((g for g in user_gifts if g[0] == item), None)
                 if not gift_info:
@@ -4058,7 +4051,7 @@ class BotSelector(commands.Bot):
                     return
                 # DB 차감
                 print(f"[DEBUG] Attempting to use_user_gift: {item}, quantity={quantity}")
-                result = self.db.use_user_gift(user_id, item, quantity)
+                result = await self.db.ause_user_gift(user_id, item, quantity)
                 print(f"[DEBUG] use_user_gift result: {result}")
                 if not result:
                     await interaction.followup.send("The gift could not be used. Please check the quantity or contact the administrator..", ephemeral=True)
@@ -4073,11 +4066,11 @@ class BotSelector(commands.Bot):
                 affinity_change = base_affinity * quantity
                 print(f"[DEBUG] is_preferred: {is_preferred}, affinity_change: {affinity_change}")
                 # 호감도 업데이트
-                affinity_info = self.db.get_affinity(user_id, character)
+                affinity_info = await self.db.aget_affinity(user_id, character)
                 highest_milestone = 0
                 if affinity_info and 'highest_milestone_achieved' in affinity_info:
                     highest_milestone = affinity_info['highest_milestone_achieved']
-                self.db.update_affinity(
+                await self.db.aupdate_affinity(
                     user_id=user_id,
                     character_name=character,
                     last_message=f"Gave {quantity} of '{gift_details['name']}'.",
@@ -4286,7 +4279,7 @@ class BotSelector(commands.Bot):
                     interaction.client.db.add_user_message_balance(user.id, quantity)
                     
                     # Log the transaction
-                    interaction.client.db.log_admin_give_item(
+                    await interaction.client.db.alog_admin_give_item(
                         admin_id=interaction.user.id,
                         user_id=user.id,
                         item_type="messages",
@@ -4366,10 +4359,10 @@ class BotSelector(commands.Bot):
                         return
                     
                     # Give card to user
-                    interaction.client.db.add_user_card(user.id, character, card_id)
+                    await interaction.client.db.aadd_user_card(user.id, character, card_id)
                     
                     # Log the transaction
-                    interaction.client.db.log_admin_give_item(
+                    await interaction.client.db.alog_admin_give_item(
                         admin_id=interaction.user.id,
                         user_id=user.id,
                         item_type="card",
@@ -4451,10 +4444,10 @@ class BotSelector(commands.Bot):
                         return
 
                     # Give gift to user
-                    interaction.client.db.add_user_gift(user.id, gift_id, quantity)
+                    await interaction.client.db.aadd_user_gift(user.id, gift_id, quantity)
 
                     # Log the transaction
-                    interaction.client.db.log_admin_give_item(
+                    await interaction.client.db.alog_admin_give_item(
                         admin_id=interaction.user.id,
                         user_id=user.id,
                         item_type="gift",
@@ -4534,14 +4527,14 @@ class BotSelector(commands.Bot):
                         return
                     
                     # Get current affinity
-                    current_affinity = interaction.client.db.get_affinity(user.id, character)
+                    current_affinity = await interaction.client.db.aget_affinity(user.id, character)
                     if not current_affinity:
-                        interaction.client.db.update_affinity(user.id, character, "", datetime.utcnow(), 0, 0)
+                        await interaction.client.db.aupdate_affinity(user.id, character, "", datetime.utcnow(), 0, 0)
                         current_affinity = {"emotion_score": 0}
                     
                     # Add affinity points
                     new_score = current_affinity["emotion_score"] + affinity_points
-                    interaction.client.db.update_affinity(
+                    await interaction.client.db.aupdate_affinity(
                         user_id=user.id,
                         character_name=character,
                         last_message="Admin given affinity",
@@ -4551,7 +4544,7 @@ class BotSelector(commands.Bot):
                     )
                     
                     # Log the transaction
-                    interaction.client.db.log_admin_give_item(
+                    await interaction.client.db.alog_admin_give_item(
                         admin_id=interaction.user.id,
                         user_id=user.id,
                         item_type="affinity",
@@ -4587,7 +4580,7 @@ class BotSelector(commands.Bot):
         async def quest_command(interaction: discord.Interaction):
             try:
                 user_id = interaction.user.id
-                self.db.update_login_streak(user_id)
+                await self.db.aupdate_login_streak(user_id)
                 # 먼저 interaction 응답을 지연시킴
                 await interaction.response.defer(ephemeral=True)
 
@@ -4728,7 +4721,7 @@ class BotSelector(commands.Bot):
                     user_id = interaction.user.id
                     if gift_ids:
                         for gift_id in gift_ids:
-                            self.db.add_user_gift(user_id, gift_id, 1)
+                            await self.db.aadd_user_gift(user_id, gift_id, 1)
                         gift_names = [get_gift_details(g)['name'] for g in gift_ids if get_gift_details(g)]
                         reward_text = f"You received: **{', '.join(gift_names)}**\nCheck your inventory with `/inventory`."
                     else:
@@ -4740,7 +4733,7 @@ class BotSelector(commands.Bot):
                     )
                     await interaction.followup.send(embed=complete_embed)
                     # 챕터2 클리어 기록 및 챕터3 오픈 안내
-                    self.db.complete_story_stage(user_id, 'Eros', 2)
+                    await self.db.acomplete_story_stage(user_id, 'Eros', 2)
                     transition_embed = discord.Embed(
                         title="🔓 Chapter 3 is now unlocked!",
                         description="Congratulations! You have unlocked Chapter 3: Find the Café Culprit!\nUse `/story` to start Chapter 3!",
@@ -4788,10 +4781,10 @@ class BotSelector(commands.Bot):
             try:
                 # 사용자 현재 상태 확인
                 user_id = interaction.user.id
-                balance = self.db.get_user_message_balance(user_id)
-                daily_count = self.db.get_user_daily_message_count(user_id)
-                is_admin = self.db.is_user_admin(user_id)
-                is_subscribed = self.db.is_user_subscribed(user_id)
+                balance = await self.db.aget_user_message_balance(user_id)
+                daily_count = await self.db.aget_user_daily_message_count(user_id)
+                is_admin = await self.db.ais_user_admin(user_id)
+                is_subscribed = await self.db.ais_user_subscribed(user_id)
                 
                 embed = discord.Embed(
                     title="🛒 ZeroLink Store",
@@ -4903,10 +4896,10 @@ class BotSelector(commands.Bot):
             """Check your message balance and usage."""
             try:
                 user_id = interaction.user.id
-                balance = self.db.get_user_message_balance(user_id)
-                daily_count = self.db.get_user_daily_message_count(user_id)
-                is_admin = self.db.is_user_admin(user_id)
-                is_subscribed = self.db.is_user_subscribed(user_id)
+                balance = await self.db.aget_user_message_balance(user_id)
+                daily_count = await self.db.aget_user_daily_message_count(user_id)
+                is_admin = await self.db.ais_user_admin(user_id)
+                is_subscribed = await self.db.ais_user_subscribed(user_id)
                 
                 embed = discord.Embed(
                     title="💬 Message Balance",
@@ -4921,7 +4914,7 @@ class BotSelector(commands.Bot):
                     )
                 elif is_subscribed:
                     # 구독 사용자
-                    subscription_daily_messages = self.db.get_subscription_daily_messages(user_id)
+                    subscription_daily_messages = await self.db.aget_subscription_daily_messages(user_id)
                     max_daily_messages = 20 + subscription_daily_messages
                     remaining = max(0, max_daily_messages - daily_count)
                     
@@ -4991,7 +4984,7 @@ class BotSelector(commands.Bot):
             """Check your payment and delivery history."""
             try:
                 user_id = interaction.user.id
-                activity = self.db.get_user_recent_activity(user_id, limit=5)
+                activity = await self.db.aget_user_recent_activity(user_id, limit=5)
                 
                 embed = discord.Embed(
                     title="📋 Payment & Delivery Log",
@@ -5173,12 +5166,12 @@ class BotSelector(commands.Bot):
 
         # 1. 대화 20회 퀘스트
         # --- 오늘의 실제 대화 수를 get_total_daily_messages로 계산 (모든 언어 포함) ---
-        total_daily_messages = self.db.get_total_daily_messages(user_id)
+        total_daily_messages = await self.db.aget_total_daily_messages(user_id)
         quest_id = 'daily_conversation'
-        claimed = self.db.is_quest_claimed(user_id, quest_id)
+        claimed = await self.db.ais_quest_claimed(user_id, quest_id)
         reward_name = None
         if claimed:
-            user_gifts = self.db.get_user_gifts(user_id)
+            user_gifts = await self.db.aget_user_gifts(user_id)
             reward_name = user_gifts[0][0] if user_gifts else None
         quests.append({
             'id': quest_id,
@@ -5192,12 +5185,12 @@ class BotSelector(commands.Bot):
         })
 
         # 2. 호감도 +5 퀘스트
-        affinity_gain = self.db.get_today_affinity_gain(user_id)
+        affinity_gain = await self.db.aget_today_affinity_gain(user_id)
         quest_id = 'daily_affinity_gain'
-        claimed = self.db.is_quest_claimed(user_id, quest_id)
+        claimed = await self.db.ais_quest_claimed(user_id, quest_id)
         reward_name = None
         if claimed:
-            user_gifts = self.db.get_user_gifts(user_id)
+            user_gifts = await self.db.aget_user_gifts(user_id)
             reward_name = user_gifts[0][0] if user_gifts else None
         quests.append({
             'id': quest_id,
@@ -5211,12 +5204,12 @@ class BotSelector(commands.Bot):
         })
 
         # 3. 신규 카드 1장 획득 퀘스트
-        daily_cards = self.db.get_user_daily_card_count(user_id)
+        daily_cards = await self.db.aget_user_daily_card_count(user_id)
         quest_id = 'daily_card_obtain'
-        claimed = self.db.is_quest_claimed(user_id, quest_id)
+        claimed = await self.db.ais_quest_claimed(user_id, quest_id)
         reward_name = None
         if claimed:
-            user_gifts = self.db.get_user_gifts(user_id)
+            user_gifts = await self.db.aget_user_gifts(user_id)
             reward_name = user_gifts[0][0] if user_gifts else None
         quests.append({
             'id': quest_id,
@@ -5236,10 +5229,10 @@ class BotSelector(commands.Bot):
         quests = []
 
         # 1. 7일 연속 로그인 퀘스트
-        login_streak = self.db.get_login_streak(user_id)
+        login_streak = await self.db.aget_login_streak(user_id)
         quest_id = 'weekly_login'
         # --- weekly claimed는 이번주 내 수령 여부로 판단 ---
-        claimed = self.db.is_weekly_quest_claimed(user_id, quest_id)
+        claimed = await self.db.ais_weekly_quest_claimed(user_id, quest_id)
         quests.append({
             'id': quest_id,
             'name': '📅 7-Day Login Streak',
@@ -5251,10 +5244,10 @@ class BotSelector(commands.Bot):
             'claimed': claimed
         })
         # 2. 카드 공유 퀘스트
-        card_shared = self.db.get_card_shared_this_week(user_id)
+        card_shared = await self.db.aget_card_shared_this_week(user_id)
         quest_id = 'weekly_share'
         # --- weekly claimed는 이번주 내 수령 여부로 판단 ---
-        claimed = self.db.is_weekly_quest_claimed(user_id, quest_id)
+        claimed = await self.db.ais_weekly_quest_claimed(user_id, quest_id)
         
         print(f"[DEBUG] 주간 카드 공유 퀘스트 체크 - 사용자: {user_id}, 공유 횟수: {card_shared}, 수령 여부: {claimed}")
         quests.append({
@@ -5276,13 +5269,13 @@ class BotSelector(commands.Bot):
             # 각 캐릭터별 골드 달성 퀘스트만 생성
             characters = ['Kagari', 'Eros', 'Elysia']
             for character in characters:
-                affinity_info = self.db.get_affinity(user_id, character)
+                affinity_info = await self.db.aget_affinity(user_id, character)
                 if not affinity_info:
                     continue
                 current_score = affinity_info['emotion_score']
                 current_grade = get_affinity_grade(current_score)
                 # 골드 달성 여부만 체크
-                has_claimed = self.db.has_levelup_flag(user_id, character, 'Gold')
+                has_claimed = await self.db.ahas_levelup_flag(user_id, character, 'Gold')
                 quest = {
                     'id': f'levelup_{character}_Gold',
                     'name': f'⭐ {character} Level-up',
@@ -5316,14 +5309,14 @@ class BotSelector(commands.Bot):
                 return False, "Only Gold level-up quests are supported."
             
             # 이미 수령했는지 확인
-            if self.db.is_quest_claimed(user_id, quest_id):
+            if await self.db.ais_quest_claimed(user_id, quest_id):
                 print(f"[DEBUG] claim_levelup_reward - Quest already claimed")
                 return False, "You have already claimed this reward!"
             
-            self.db.add_levelup_flag(user_id, character, grade)
+            await self.db.aadd_levelup_flag(user_id, character, grade)
             from gift_manager import get_gifts_by_rarity_v2, get_gift_details, GIFT_RARITY
             # 유저가 이미 받은 아이템 목록 조회
-            user_gifts = set(g[0] for g in self.db.get_user_gifts(user_id))
+            user_gifts = set(g[0] for g in await self.db.aget_user_gifts(user_id))
             print(f"[DEBUG] claim_levelup_reward - user_gifts count: {len(user_gifts)}")
             reward_candidates = get_gifts_by_rarity_v2(GIFT_RARITY['EPIC'], 3)
             print(f"[DEBUG] claim_levelup_reward - reward_candidates count: {len(reward_candidates)}")
@@ -5336,8 +5329,8 @@ class BotSelector(commands.Bot):
             selected_rewards = random.sample(available_rewards, min(3, len(available_rewards)))
             print(f"[DEBUG] claim_levelup_reward - selected_rewards: {selected_rewards}")
             for gift_id in selected_rewards:
-                self.db.add_user_gift(user_id, gift_id, 1)
-            self.db.claim_quest(user_id, quest_id)
+                await self.db.aadd_user_gift(user_id, gift_id, 1)
+            await self.db.aclaim_quest(user_id, quest_id)
             reward_names = [get_gift_details(g)['name'] + ' x1' for g in selected_rewards]
             print(f"[DEBUG] claim_levelup_reward - reward_names: {reward_names}")
             return True, ", ".join(reward_names)
@@ -5484,7 +5477,7 @@ class BotSelector(commands.Bot):
         print(f"[DEBUG] claim_daily_reward called with user_id: {user_id}, quest_id: '{quest_id}'")
         
         # 이미 오늘 수령했는지 확인 (날짜 기준)
-        if self.db.is_quest_claimed(user_id, quest_id):
+        if await self.db.ais_quest_claimed(user_id, quest_id):
             print(f"[DEBUG] Quest already claimed today for user_id: {user_id}, quest_id: '{quest_id}'")
             return False, "You have already claimed this reward today!"
         
@@ -5507,10 +5500,10 @@ class BotSelector(commands.Bot):
                 return False, "No rewards available for this quest!"
             import random
             reward_id = random.choice(reward_candidates)
-            self.db.add_user_gift(user_id, reward_id, 1)
-            self.db.claim_quest(user_id, quest_id)
+            await self.db.aadd_user_gift(user_id, reward_id, 1)
+            await self.db.aclaim_quest(user_id, quest_id)
             # --- 일일 퀘스트 진행/보상 기록 추가 ---
-            self.db.record_daily_quest_progress(user_id, quest_id, completed=True, reward_claimed=True)
+            await self.db.arecord_daily_quest_progress(user_id, quest_id, completed=True, reward_claimed=True)
             reward_name = get_gift_details(reward_id)['name']
             return True, f"{reward_name} x1"
         except Exception as e:
@@ -5541,7 +5534,7 @@ class BotSelector(commands.Bot):
 
         try:
             # 주간 퀘스트: 이번 주 내에 이미 수령했는지 체크
-            if self.db.is_weekly_quest_claimed(user_id, quest_id):
+            if await self.db.ais_weekly_quest_claimed(user_id, quest_id):
                 return False, "You have already claimed this weekly reward!"
             from gift_manager import get_gifts_by_rarity_v2, get_gift_details, GIFT_RARITY
             reward_candidates = get_gifts_by_rarity_v2(GIFT_RARITY[reward_rarity.upper()], reward_quantity)
@@ -5549,8 +5542,8 @@ class BotSelector(commands.Bot):
                 return False, "No rewards available for this quest!"
             import random
             reward_id = random.choice(reward_candidates)
-            self.db.add_user_gift(user_id, reward_id, 1)
-            self.db.claim_quest(user_id, quest_id)
+            await self.db.aadd_user_gift(user_id, reward_id, 1)
+            await self.db.aclaim_quest(user_id, quest_id)
             reward_name = get_gift_details(reward_id)['name']
             return True, f"{reward_name} x1"
         except Exception as e:
@@ -5584,7 +5577,7 @@ class BotSelector(commands.Bot):
             print(f"[DEBUG] claim_story_reward - character: '{character}', quest_type: '{quest_type}'")
             
             from gift_manager import get_gifts_by_rarity_v2, get_gift_details, GIFT_RARITY
-            user_gifts = set(g[0] for g in self.db.get_user_gifts(user_id))
+            user_gifts = set(g[0] for g in await self.db.aget_user_gifts(user_id))
             print(f"[DEBUG] claim_story_reward - user_gifts: {user_gifts}")
             reward_candidates = get_gifts_by_rarity_v2(GIFT_RARITY['EPIC'], 3)
             print(f"[DEBUG] claim_story_reward - reward_candidates: {reward_candidates}")
@@ -5600,37 +5593,37 @@ class BotSelector(commands.Bot):
             # Kagari 스토리 퀘스트 (3챕터 완료)
             if character == 'Kagari' and quest_type == 'all_chapters':
                 print(f"[DEBUG] claim_story_reward - Processing Kagari story quest")
-                completed_chapters = self.db.get_completed_chapters(user_id, 'Kagari')
+                completed_chapters = await self.db.aget_completed_chapters(user_id, 'Kagari')
                 print(f"[DEBUG] claim_story_reward - Kagari completed chapters: {completed_chapters}")
                 if len(completed_chapters) < 3:
                     return False, "You need to complete all 3 chapters of Kagari's story first"
-                if self.db.is_story_quest_claimed(user_id, 'Kagari', 'all_chapters'):
+                if await self.db.ais_story_quest_claimed(user_id, 'Kagari', 'all_chapters'):
                     return False, "You have already claimed this reward"
                 for gift_id in selected_rewards:
-                    self.db.add_user_gift(user_id, gift_id, 1)
-                self.db.claim_story_quest(user_id, 'Kagari', 'all_chapters')
+                    await self.db.aadd_user_gift(user_id, gift_id, 1)
+                await self.db.aclaim_story_quest(user_id, 'Kagari', 'all_chapters')
                 reward_names = [get_gift_details(g_id)['name'] for g_id in selected_rewards]
                 return True, f"Congratulations! You completed all Kagari story chapters! You received: **{', '.join(reward_names)}**"
             
             # Eros 스토리 퀘스트 (3챕터 완료)
             if character == 'Eros' and quest_type == 'all_chapters':
                 print(f"[DEBUG] claim_story_reward - Processing Eros story quest")
-                completed_chapters = self.db.get_completed_chapters(user_id, 'Eros')
+                completed_chapters = await self.db.aget_completed_chapters(user_id, 'Eros')
                 print(f"[DEBUG] claim_story_reward - Eros completed chapters: {completed_chapters}")
                 if len(completed_chapters) < 3:
                     return False, "You need to complete all 3 chapters of Eros's story first"
-                if self.db.is_story_quest_claimed(user_id, 'Eros', 'all_chapters'):
+                if await self.db.ais_story_quest_claimed(user_id, 'Eros', 'all_chapters'):
                     return False, "You have already claimed this reward"
                 for gift_id in selected_rewards:
-                    self.db.add_user_gift(user_id, gift_id, 1)
-                self.db.claim_story_quest(user_id, 'Eros', 'all_chapters')
+                    await self.db.aadd_user_gift(user_id, gift_id, 1)
+                await self.db.aclaim_story_quest(user_id, 'Eros', 'all_chapters')
                 reward_names = [get_gift_details(g_id)['name'] for g_id in selected_rewards]
                 return True, f"Congratulations! You completed all Eros story chapters! You received: **{', '.join(reward_names)}**"
             
             # Elysia 스토리 퀘스트 (1챕터 완료)
             if character == 'Elysia' and quest_type == 'all_chapters':
                 print(f"[DEBUG] claim_story_reward - Processing Elysia story quest")
-                completed_chapters = self.db.get_completed_chapters(user_id, 'Elysia')
+                completed_chapters = await self.db.aget_completed_chapters(user_id, 'Elysia')
                 print(f"[DEBUG] claim_story_reward - Elysia completed chapters: {completed_chapters}")
                 print(f"[DEBUG] claim_story_reward - Elysia completed chapters count: {len(completed_chapters)}")
                 
@@ -5638,7 +5631,7 @@ class BotSelector(commands.Bot):
                     print(f"[DEBUG] claim_story_reward - Elysia: Not enough chapters completed")
                     return False, "You need to complete chapter 1 of Elysia's story first"
                 
-                is_claimed = self.db.is_story_quest_claimed(user_id, 'Elysia', 'all_chapters')
+                is_claimed = await self.db.ais_story_quest_claimed(user_id, 'Elysia', 'all_chapters')
                 print(f"[DEBUG] claim_story_reward - Elysia quest already claimed: {is_claimed}")
                 
                 if is_claimed:
@@ -5647,10 +5640,10 @@ class BotSelector(commands.Bot):
                 
                 print(f"[DEBUG] claim_story_reward - Elysia: Adding rewards: {selected_rewards}")
                 for gift_id in selected_rewards:
-                    success = self.db.add_user_gift(user_id, gift_id, 1)
+                    success = await self.db.aadd_user_gift(user_id, gift_id, 1)
                     print(f"[DEBUG] claim_story_reward - Elysia: Added gift {gift_id}: {success}")
                 
-                self.db.claim_story_quest(user_id, 'Elysia', 'all_chapters')
+                await self.db.aclaim_story_quest(user_id, 'Elysia', 'all_chapters')
                 print(f"[DEBUG] claim_story_reward - Elysia: Marked quest as claimed")
                 
                 reward_names = [get_gift_details(g_id)['name'] for g_id in selected_rewards]
@@ -5667,12 +5660,15 @@ class BotSelector(commands.Bot):
 
     async def on_message(self, message: discord.Message):
         user_id = message.author.id
-        self.db.update_login_streak(user_id)
-        
+
         # 봇이 보낸 메시지는 무시
         if message.author == self.user:
             return
 
+        # 연속 로그인 기록 (다른 봇의 메시지는 제외)
+        if not message.author.bot:
+            await self.db.aqueue_login_streak(user_id)
+
         # DM에서의 메시지 처리
         if isinstance(message.channel, discord.DMChannel):
             await self.handle_dm_message(message)
@@ -6127,7 +6123,7 @@ class BotSelector(commands.Bot):
         # 데이터베이스에 메시지 카운트 업데이트
         session_id = session.get("session_id")
         if session_id:
-            self.db.update_roleplay_message_count(session_id, session["turn_count"])
+            await self.db.aupdate_roleplay_message_count(session_id, session["turn_count"])
 
         turn_str = f"({session['turn_count']}/100)"
 
@@ -6224,32 +6220,30 @@ class BotSelector(commands.Bot):
             f"Remember: This is a roleplay session. You are {character_name} acting in the specific scenario the user requested. Focus on their prompt and maintain your character's unique traits while developing an engaging story."
         )
 
-        # 대화 기록 세션에 저장
-        if "history" not in session:
-            session["history"] = []
-        session["history"].append({"role": "user", "content": message.content})
+        # OpenAI 호출 (최근 대화 + 이전 줄거리 요약만 전송)
+        messages = session_history.build_messages(session, system_prompt, message.content)
 
-        # OpenAI 호출
-        messages = [
-            {"role": "system", "content": system_prompt}
-        ] + session["history"]
-        ai_response = await self.get_ai_response(messages)
+        def finalize(ai_response):
+            # 답장에 캐릭터 이름 prefix 보장 (혹시라도 누락될 경우)
+            if not ai_response.strip().startswith(f"{character_name}:"):
+                ai_response = f"{character_name}: {ai_response.strip()}"
 
-        # 답장에 캐릭터 이름 prefix 보장 (혹시라도 누락될 경우)
-        if not ai_response.strip().startswith(f"{character_name}:"):
-            ai_response = f"{character_name}: {ai_response.strip()}"
+            # (n/30) 중복 방지: 여러 번 등장하면 1개만 남기고 모두 제거
+            ai_response = re.sub(r"(\(\d{1,2}/30\))(?=.*\(\d{1,2}/30\))", "", ai_response)
+            if not re.search(r"\(\d{1,2}/30\)", ai_response):
+                ai_response = f"{ai_response} {turn_str}"
+            return ai_response
 
-        # (n/30) 중복 방지: 여러 번 등장하면 1개만 남기고 모두 제거
-        ai_response = re.sub(r"(\(\d{1,2}/30\))(?=.*\(\d{1,2}/30\))", "", ai_response)
-        if not re.search(r"\(\d{1,2}/30\)", ai_response):
-            ai_response = f"{ai_response} {turn_str}"
-
-        await message.channel.send(ai_response)
-        session["history"].append({"role": "assistant", "content": ai_response})
+        if STREAM_REPLIES:
+            ai_response = await self.stream_ai_response(message.channel, messages, finalize=finalize)
+        else:
+            ai_response = finalize(await self.get_ai_response(messages))
+            await message.channel.send(ai_response)
+        session_history.append_turn(session, message.content, ai_response)
         
         # 데이터베이스에 대화 저장
         if session_id:
-            self.db.save_roleplay_message(session_id, message.content, ai_response, session["turn_count"])
+            await self.db.asave_roleplay_message(session_id, message.content, ai_response, session["turn_count"])
 
         # 100턴 종료 처리
         if session["turn_count"] >= 100:
@@ -6273,7 +6267,7 @@ class BotSelector(commands.Bot):
             
             # 데이터베이스 세션 종료
             if session_id:
-                self.db.end_roleplay_session(session_id)
+                await self.db.aend_roleplay_session(session_id)
             
             # 10초 후 채널 삭제
             await asyncio.sleep(10)
@@ -6324,7 +6318,7 @@ class BotSelector(commands.Bot):
             language = self.detect_language(message.content)
             
             # 데이터베이스에 메시지 저장
-            self.db.add_message(
+            await self.db.aadd_message(
                 channel_id=message.channel.id,
                 user_id=user_id,
                 character_name=character_name,
@@ -6335,15 +6329,19 @@ class BotSelector(commands.Bot):
             
             # 감정 분석 및 호감도 업데이트
             emotion_score = await self.get_ai_response([{"role": "user", "content": message.content}])
-            self.db.add_emotion_log(user_id, character_name, emotion_score, message.content)
-            
-            # AI 응답 생성
-            ai_response = await self.get_ai_response([
-                {"role": "user", "content": message.content}
-            ], emotion_score)
+            await self.db.aadd_emotion_log(user_id, character_name, emotion_score, message.content)
             
-            # 응답 전송
-            await message.channel.send(f"**{character_name}**: {ai_response}")
+            # AI 응답 생성 및 전송
+            if STREAM_REPLIES:
+                ai_response = await self.stream_ai_response(
+                    message.channel, [{"role": "user", "content": message.content}], emotion_score,
+                    prefix=f"**{character_name}**: "
+                )
+            else:
+                ai_response = await self.get_ai_response([
+                    {"role": "user", "content": message.content}
+                ], emotion_score)
+                await message.channel.send(f"**{character_name}**: {ai_response}")
             
             # 랜덤 카드 획득 체크
             card_type, card_id = self.get_random_card(character_name, user_id)
@@ -6384,19 +6382,7 @@ class BotSelector(commands.Bot):
 
     def detect_language(self, text: str) -> str:
         """텍스트의 언어를 감지합니다."""
-        try:
-            from langdetect import detect
-            lang = detect(text)
-            if lang in ['ko', 'ko-KR']:
-                return 'ko'
-            elif lang in ['zh', 'zh-CN', 'zh-TW']:
-                return 'zh'
-            elif lang in ['ja', 'ja-JP']:
-                return 'ja'
-            else:
-                return 'en'
-        except:
-            return 'en'
+        return language_id.detect_language(text, supported=language_id.SUPPORTED_LANGUAGES)
 
     def get_random_card(self, character_name: str, user_id: int) -> tuple[str, str]:
         """호감도 등급에 따른 랜덤 카드 획득 (중복 방지, 티어별 분배)"""
@@ -6677,11 +6663,11 @@ class ShareCardButton(discord.ui.Button):
         try:
             print(f"[DEBUG] 카드 공유 기록 시작 - 사용자: {interaction.user.id}, 캐릭터: {self.character_name}, 카드: {self.card_id}")
             # self.view.db를 사용하여 DB에 기록
-            result = self.view.db.record_card_share(interaction.user.id, self.character_name, self.card_id)
+            result = await self.view.db.arecord_card_share(interaction.user.id, self.character_name, self.card_id)
             print(f"[DEBUG] 카드 공유 기록 완료 - 결과: {result}")
             
             # 기록 후 주간 카드 공유 상태 확인
-            card_shared = self.view.db.get_card_shared_this_week(interaction.user.id)
+            card_shared = await self.view.db.aget_card_shared_this_week(interaction.user.id)
             print(f"[DEBUG] 주간 카드 공유 횟수: {card_shared}")
             
         except Exception as e:
@@ -6878,7 +6864,7 @@ class GiftConfirmButton(discord.ui.Button['GiftView']):
         gift_id = view.selected_gift
         character_name = view.character_name
 
-        success = view.db.use_user_gift(user_id, gift_id)
+        success = await view.db.ause_user_gift(user_id, gift_id)
 
         if not success:
             await interaction.response.edit_message(content="Failed to use the gift. Please try again.", view=None, embed=None)
@@ -6889,7 +6875,7 @@ class GiftConfirmButton(discord.ui.Button['GiftView']):
 
         affinity_change = 5 if is_preferred else 1
 
-        view.db.update_affinity(
+        await view.db.aupdate_affinity(
             user_id=user_id,
             character_name=character_name,
             score_change=affinity_change,
@@ -6916,7 +6902,7 @@ class GiftConfirmButton(discord.ui.Button['GiftView']):
         Prevents duplicate card rewards.
         """
         try:
-            affinity_info = self.db.get_affinity(user_id, character_name)
+            affinity_info = await self.db.aget_affinity(user_id, character_name)
             if not affinity_info:
                 return
 
@@ -6948,7 +6934,7 @@ class GiftConfirmButton(discord.ui.Button['GiftView']):
                     # 먼저 마일스톤 카드 확인 (고정 카드)
                     milestone_card = milestone_to_card_id(threshold, character_name)
                     if milestone_card:
-                        user_cards = self.db.get_user_cards(user_id, character_name)
+                        user_cards = await self.db.aget_user_cards(user_id, character_name)
                         has_milestone_card = any(card[0].upper() == milestone_card.upper() for card in user_cards)
                         
                         if not has_milestone_card:
@@ -7244,7 +7230,7 @@ class NewStoryCharacterSelect(discord.ui.Select):
 
             # 스토리 진행 상황 가져오기
             print(f"[DEBUG] Getting story progress for user {user_id} and character {character_name}...")
-            progress = self.bot.db.get_story_progress(user_id, character_name)
+            progress = await self.bot.db.aget_story_progress(user_id, character_name)
             print(f"[DEBUG] Story progress received: {progress}")
 
             # 새로운 임베드 생성 (요청사항 반영)
@@ -7422,7 +7408,7 @@ class NewStoryChapterSelect(discord.ui.Select):
         user = interaction.user
 
         # 호감도 체크
-        affinity_info = self.bot.db.get_affinity(user.id, self.character_name)
+        affinity_info = await self.bot.db.aget_affinity(user.id, self.character_name)
         current_affinity = affinity_info.get('emotion_score', 0) if affinity_info else 0
 
         chapter_info = next((c for c in STORY_CHAPTERS[self.character_name]['chapters'] if c['id'] == stage_num), None)
@@ -7456,13 +7442,13 @@ class CardClaimView(discord.ui.View):
                 return
 
             # Check if user already has this card
-            user_cards = self.db.get_user_cards(self.user_id, self.character_name)
+            user_cards = await self.db.aget_user_cards(self.user_id, self.character_name)
             if any(card[0].upper() == self.card_id.upper() for card in user_cards):
                 await interaction.response.send_message("❌ You already have this card!", ephemeral=True)
                 return
 
             # Add card to user's collection
-            success = self.db.add_user_card(self.user_id, self.character_name, self.card_id)
+            success = await self.db.aadd_user_card(self.user_id, self.character_name, self.card_id)
             if not success:
                 await interaction.response.send_message("❌ Failed to add card to your collection.", ephemeral=True)
                 return
@@ -23,23 +23,33 @@ from config import (
     CLOUDFLARE_IMAGE_BASE_URL
 )
 from database_manager import DatabaseManager
-from keyword_manager import KeywordManager
+from keyword_manager import KeywordManager, KEYWORD_CONTEXT_HEADER
 from typing import Dict, TYPE_CHECKING, Any
 import json
 import sys
+from collections.abc import MutableMapping
 from datetime import datetime
 from pathlib import Path
 import re
-import langdetect
+import language_id
 from deep_translator import GoogleTranslator
 import random
 from vision_manager import VisionManager
 import logging
 from story_mode import process_story_message, start_story_stage
-import openai
+import llm_gateway
+from llm_scheduler import PRIORITY_BACKGROUND
+from session_registry import get_session_map
+from context_budget import ContextBuilder
+from persona_prompt import build_persona_blocks
+from streaming_reply import STREAM_REPLIES, stream_to_channel
+from message_coalescer import coalescer
+from user_actors import user_actors, MailboxFull
+import background_jobs
+from summary_scheduler import summary_scheduler
+from memory_index import memory_retriever, MEMORY_RETRIEVAL_K
 from openai_manager import analyze_emotion_with_gpt_and_pattern
 import time
-from difflib import SequenceMatcher
 
 # 절대 경로 설정
 current_dir = Path(__file__).resolve().parent
@@ -102,6 +112,9 @@ print("\n=== Initialization Complete ===\n")
 
 print(f"[DEBUG] character_bot.py loaded from:", __file__)
 
+# LLM 대기 순번이 이 값 이상이면 채널에 대기 안내 메시지를 보냄
+QUEUE_NOTICE_POSITION = int(os.environ.get("LLM_QUEUE_NOTICE_POSITION", 3))
+
 from config import CHARACTER_INFO
 character_choices = [
     app_commands.Choice(name=char, value=char)
@@ -144,7 +157,7 @@ class LanguageSelect(discord.ui.Select):
 
             # 데이터베이스에 언어 설정 저장
             try:
-                self.db.set_channel_language(
+                await self.db.aset_channel_language(
                     interaction.channel_id,
                     self.user_id,
                     self.character_name,
@@ -364,16 +377,17 @@ class CharacterBot(commands.Bot):
         super().__init__(command_prefix='/', intents=intents)
         self.character_name = character_name
         self.bot_selector = bot_selector
-        self.active_channels = {}
+        self.active_channels = get_session_map(f'active_channels:{character_name}')
         self.db = DatabaseManager()
         self.keyword_manager = KeywordManager()
+        self.context_builder = ContextBuilder()
         self.story_mode_users = {}  # user_id: {channel_id, character_name}
-        self.last_bot_messages = {}  # user_id별 최근 챗봇 메시지 리스트
+        self.last_bot_messages = get_session_map(f'last_bot_messages:{character_name}')  # user_id별 최근 챗봇 메시지 리스트
         self.vision_manager = VisionManager(api_key=OPENAI_API_KEY)
-        self.user_message_buffers = {}  # (user_id) -> list of (msg, timestamp)
         self.nickname_setup_sessions = {}  # user_id: {step, nickname}
         self.user_message_counts = {}  # user_id: message_count
         self.memory_summary_interval = 20  # Assuming a default value
+        summary_scheduler.register(character_name, self.summarize_messages)
 
     async def setup_hook(self):
         # 기존 setup_hook 코드가 있다면 유지
@@ -437,15 +451,21 @@ class CharacterBot(commands.Bot):
             return
 
         try:
-            # 1:1 대화 모드: 바로 메시지 처리
+            # 1:1 대화 모드: 연달아 온 메시지를 묶어 한 턴으로 처리
             user_id = message.author.id
             character = self.character_name
+            burst = await coalescer.submit((user_id, message.channel.id), message)
+            if burst is None:
+                return  # 처리 중인 묶음에 합쳐짐
 
             # 닉네임이 설정되어 있는지 확인
-            nickname = self.db.get_user_nickname(user_id, character)
+            nickname = await self.db.aget_user_nickname(user_id, character)
             if nickname:
-                # 닉네임이 있으면 바로 대화 처리
-                await self.process_normal_message(message)
+                # 닉네임이 있으면 대화 처리 (같은 사용자의 턴은 도착 순서대로 하나씩)
+                try:
+                    await user_actors.run(user_id, self.process_normal_message, burst[-1], burst=burst)
+                except MailboxFull:
+                    await message.channel.send("⏳ I'm still replying to your earlier messages. Please wait a moment.")
             else:
                 # 닉네임이 없으면 무시 (add_channel에서 이미 처리됨)
                 return
@@ -455,10 +475,16 @@ class CharacterBot(commands.Bot):
             import traceback
             print(traceback.format_exc())
 
-    async def process_normal_message(self, message):
+    async def process_normal_message(self, message, burst: list = None):
+        """
+        대화 한 턴을 처리합니다.
+        burst는 연달아 와서 묶인 메시지 목록(도착 순, 마지막이 message)이며,
+        안전장치와 메시지 한도는 메시지마다 적용하고 답장은 한 번만 생성합니다.
+        """
         user_id = message.author.id
         character = self.character_name
         now = datetime.utcnow()
+        messages = burst or [message]
 
         # 첫 대화 체크 및 호감도 레벨별 인사 메시지
         await self.check_and_send_greeting(message, user_id, character)
@@ -468,70 +494,76 @@ class CharacterBot(commands.Bot):
             self.bot_selector is not None and 
             hasattr(self.bot_selector, 'safety_guard') and 
             self.bot_selector.safety_guard is not None):
-            try:
-                safety_check = await self.bot_selector.safety_guard.is_safe_to_process(
-                    user_id, message.guild.id if message.guild else 0, message.content
-                )
-                
-                if not safety_check['safe']:
-                    # 안전장치에 의해 차단된 경우
-                    blocked_reasons = safety_check['blocked_reasons']
-                    if 'spam_detection' in blocked_reasons:
-                        await message.channel.send("🚫 Spam detected. Please wait before sending another message.")
-                    elif 'user_rate_limit' in blocked_reasons:
-                        await message.channel.send("🚫 Too many requests. Please slow down.")
-                    elif 'daily_limit' in blocked_reasons:
-                        await message.channel.send("🚫 Daily message limit exceeded.")
-                    elif 'guild_rate_limit' in blocked_reasons:
-                        await message.channel.send("🚫 Server rate limit exceeded.")
-                    return
-            except Exception as e:
-                print(f"Error in safety guard check: {e}")
-                # 안전장치 에러가 발생해도 메시지 처리를 계속 진행
-
-        # 메시지 제한 확인
-        daily_used = self.db.get_user_daily_message_count(user_id)
-        paid_used = self.db.get_user_paid_message_count(user_id)
-        paid_balance = self.db.get_user_message_balance(user_id)
-        is_admin = self.db.is_user_admin(user_id)
-        is_subscribed = self.db.is_user_subscribed(user_id)
-        
-        # 메시지 사용 가능 여부 확인
-        can_send = False
-        message_type = None  # 'daily' 또는 'paid'
+            safe_messages = []
+            blocked_reasons = []
+            for item in messages:
+                try:
+                    safety_check = await self.bot_selector.safety_guard.is_safe_to_process(
+                        user_id, message.guild.id if message.guild else 0, item.content
+                    )
+                except Exception as e:
+                    print(f"Error in safety guard check: {e}")
+                    # 안전장치 에러가 발생해도 메시지 처리를 계속 진행
+                    safe_messages.append(item)
+                    continue
+                if safety_check['safe']:
+                    safe_messages.append(item)
+                else:
+                    blocked_reasons.extend(safety_check['blocked_reasons'])
+
+            if blocked_reasons:
+                # 안전장치에 의해 차단된 메시지가 있는 경우
+                if 'spam_detection' in blocked_reasons:
+                    await message.channel.send("🚫 Spam detected. Please wait before sending another message.")
+                elif 'user_rate_limit' in blocked_reasons:
+                    await message.channel.send("🚫 Too many requests. Please slow down.")
+                elif 'daily_limit' in blocked_reasons:
+                    await message.channel.send("🚫 Daily message limit exceeded.")
+                elif 'guild_rate_limit' in blocked_reasons:
+                    await message.channel.send("🚫 Server rate limit exceeded.")
+            if not safe_messages:
+                return
+            messages = safe_messages
+
+        # 메시지 제한 확인 및 턴 상태를 한 번의 쿼리로 조회
+        snapshot = await self.db.aget_turn_snapshot(user_id, character)
+        daily_used = snapshot['daily_used']
+        paid_used = snapshot['paid_used']
+        paid_balance = snapshot['paid_balance']
+        is_admin = snapshot['is_admin']
+        is_subscribed = snapshot['is_subscribed']
+        subscription_daily_messages = snapshot['subscription_daily_messages']
         
-        if is_admin:
-            # 관리자는 제한 없음
-            can_send = True
-            message_type = 'daily'
-        elif is_subscribed:
-            # 구독 사용자는 일일 20개 + 구독 추가 메시지 사용 가능
-            subscription_daily_messages = self.db.get_subscription_daily_messages(user_id)
-            max_daily_messages = 20 + subscription_daily_messages
-            if daily_used < max_daily_messages:
-                can_send = True
+        # 메시지마다 사용 가능 여부 확인 (묶인 메시지도 하나씩 차감)
+        allowed = []  # [(메시지, 'daily' 또는 'paid'), ...]
+        for item in messages:
+            if is_admin:
+                # 관리자는 제한 없음
                 message_type = 'daily'
-            else:
-                can_send = False
-        else:
-            # 일반 사용자: 일일 20개 먼저, 그 다음 유료 메시지
-            if daily_used < 20:
-                # 일일 메시지가 남아있으면 일일 메시지 사용
-                can_send = True
+            elif is_subscribed:
+                # 구독 사용자는 일일 20개 + 구독 추가 메시지 사용 가능
+                message_type = 'daily' if daily_used < 20 + subscription_daily_messages else None
+            elif daily_used < 20:
+                # 일반 사용자: 일일 메시지가 남아있으면 일일 메시지 사용
                 message_type = 'daily'
-            elif daily_used >= 20 and paid_balance > 0:
+            elif paid_balance > 0:
                 # 일일 메시지를 모두 사용했지만 유료 메시지가 있으면 유료 메시지 사용
-                can_send = True
                 message_type = 'paid'
             else:
                 # 일일 메시지도 모두 사용하고 유료 메시지도 없으면 사용 불가
-                can_send = False
+                message_type = None
+            if message_type is None:
+                break
+            if message_type == 'daily':
+                daily_used += 1
+            else:
+                paid_balance -= 1
+            allowed.append((item, message_type))
         
-        # 메시지 사용 불가능한 경우
-        if not can_send:
+        # 한도를 넘은 메시지가 있는 경우 (묶음 전체가 넘었으면 처리 종료)
+        if len(allowed) < len(messages):
             if is_subscribed:
                 # 구독 사용자 제한
-                subscription_daily_messages = self.db.get_subscription_daily_messages(user_id)
                 max_daily_messages = 20 + subscription_daily_messages
                 embed = discord.Embed(
                     title="🚫 Daily Message Limit",
@@ -557,38 +589,35 @@ class CharacterBot(commands.Bot):
                 )
             
             await message.channel.send(embed=embed)
-            return
+            if not allowed:
+                return
 
-        # 언어 감지
-        detected_language = self.detect_language(message.content)
-        
-        # 유저 메시지 DB 저장 (conversations 테이블)
-        is_daily = (message_type == 'daily')
-        self.db.add_message(
-            message.channel.id,   # channel_id
-            user_id,              # user_id
-            character,            # character_name
-            "user",              # role
-            message.content,      # content
-            detected_language,    # 감지된 언어
-            is_daily             # 일일 메시지 여부
-        )
+        # 유저 메시지 DB 저장 (conversations 테이블) 및 메시지 사용 처리
+        for item, message_type in allowed:
+            await self.db.aadd_message(
+                item.channel.id,                     # channel_id
+                user_id,                             # user_id
+                character,                           # character_name
+                "user",                              # role
+                item.content,                        # content
+                self.detect_language(item.content),  # 감지된 언어
+                message_type == 'daily'              # 일일 메시지 여부
+            )
+            if not is_admin and message_type == 'paid':
+                # 유료 메시지 사용 시 잔액 차감 (일일 메시지는 자동으로 카운트됨)
+                await self.db.ause_user_message(user_id)
+        if not is_admin:
+            print(f"Used {len(allowed)} message(s) for user {user_id}, daily used: {daily_used}, paid balance: {paid_balance}")
 
-        # 메시지 사용 처리
-        if not self.db.is_user_admin(user_id):
-            if message_type == 'paid':
-                # 유료 메시지 사용 시 잔액 차감
-                self.db.use_user_message(user_id)
-                print(f"Used paid message for user {user_id}, remaining balance: {self.db.get_user_message_balance(user_id)}")
-            else:
-                # 일일 메시지 사용 시 차감 없음 (자동으로 카운트됨)
-                print(f"Used daily message for user {user_id}, daily used: {self.db.get_user_daily_message_count(user_id)}")
+        # 묶인 메시지는 한 턴의 사용자 발화로 합쳐서 처리
+        content = "\n".join(item.content for item, _ in allowed)
 
-        affinity_before = self.db.get_affinity(user_id, character)
+        affinity_before = snapshot['affinity']
         if not affinity_before:
             # 이전에 기록이 없는 신규 사용자일 경우 초기값 설정
-            self.db.update_affinity(user_id, character, "", now, 0, 0)
-            affinity_before = self.db.get_affinity(user_id, character)
+            await self.db.aupdate_affinity(user_id, character, "", now, 0, 0)
+            affinity_before = await self.db.aget_affinity(user_id, character)
+            snapshot['affinity'] = affinity_before
 
         prev_grade = get_affinity_grade(affinity_before['emotion_score'])
         prev_score = affinity_before['emotion_score']
@@ -596,67 +625,53 @@ class CharacterBot(commands.Bot):
 
         try:
             # 감정 분석과 컨텍스트 생성을 병렬로 처리
-            emotion_task = asyncio.create_task(self.analyze_emotion(message.content))
-            context_task = asyncio.create_task(self.build_conversation_context(user_id, character, message.content))
+            emotion_task = asyncio.create_task(self.analyze_emotion(content))
+            context_task = asyncio.create_task(self.build_conversation_context(user_id, character, content, snapshot=snapshot))
             emotion_score, context = await asyncio.gather(emotion_task, context_task)
 
-            # [추가] 감정 로그 DB 기록 (모든 캐릭터 공통)
-            self.db.add_emotion_log(user_id, character, emotion_score, message.content, now)
-
-            response = await self.get_ai_response(context)
-            await self.send_bot_message(message.channel, response, user_id)
+            if STREAM_REPLIES:
+                response = await self.stream_bot_message(message.channel, context, user_id, on_queued=self._notify_queued(message.channel))
+            else:
+                response = await self.get_ai_response(context, on_queued=self._notify_queued(message.channel))
+                await self.send_bot_message(message.channel, response, user_id)
 
             # 새로운 점수 및 마일스톤 계산
             new_score = prev_score + emotion_score
             new_grade = get_affinity_grade(new_score)
-
-            # [추가] 키워드 추출 (Silver, Gold 등급에서만)
-            if new_grade in ['Silver', 'Gold']:
-                try:
-                    keywords = self.keyword_manager.extract_keywords(message.content)
-                    if keywords:
-                        self.keyword_manager.save_keywords(user_id, character, keywords)
-                        print(f"[키워드] {character} - {len(keywords)}개 키워드 추출됨")
-                except Exception as e:
-                    print(f"[키워드 에러] {e}")
             new_milestone = (new_score // 10) * 10
 
             # 갱신할 최고 마일스톤 계산 (이전 값과 새 마일스톤 중 더 큰 값)
             highest_milestone_to_update = max(highest_milestone_before, new_milestone)
 
             # 데이터베이스에 친밀도 및 최고 마일스톤 업데이트
-            self.db.update_affinity(
+            # (같은 사용자의 다음 턴이 갱신된 점수를 읽도록 턴 안에서 처리)
+            await self.db.aupdate_affinity(
                 user_id=user_id,
                 character_name=character,
-                last_message=message.content,
+                last_message=content,
                 last_message_time=now,
                 score_change=emotion_score,
                 highest_milestone=highest_milestone_to_update
             )
 
-            # 등급 변경 체크
-            if prev_grade != new_grade:
-                if new_score > prev_score:
-                    # 점수가 올랐을 때만 레벨업 메시지 전송
-                    embed = self.create_level_up_embed(character, prev_grade, new_grade)
-                    await message.channel.send(embed=embed)
-                else:
-                    # 점수가 내렸을 때 다운그레이드 메시지 전송
-                    embed = self.create_level_down_embed(character, prev_grade, new_grade)
-                    await message.channel.send(embed=embed)
+            # 나머지 부수 작업은 백그라운드 파이프라인에서 처리
+            # [추가] 감정 로그 DB 기록 (모든 캐릭터 공통)
+            background_jobs.submit('emotion_log', self.db.aadd_emotion_log, user_id, character, emotion_score, content, now)
 
-            # 새로운 최고 마일스톤 달성 시에만 보상 로직 실행
-            if new_milestone > highest_milestone_before:
-                await self.handle_milestone_reward(message, character, user_id, new_milestone)
+            # [추가] 키워드 추출 (Silver, Gold 등급에서만)
+            if new_grade in ['Silver', 'Gold']:
+                background_jobs.submit('keywords', self.save_turn_keywords, user_id, character, content)
+
+            # 등급 변경 / 새로운 최고 마일스톤 알림 (메시지 전송이므로 재시도하지 않음)
+            if prev_grade != new_grade or new_milestone > highest_milestone_before:
+                background_jobs.submit(
+                    'affinity_notifications', self.send_affinity_notifications,
+                    message, character, user_id, prev_score, new_score, highest_milestone_before,
+                    retries=0
+                )
 
-            # [추가] 서머리 생성 (10개 메시지마다)
-            try:
-                recent_message_count = self.db.get_user_recent_message_count(user_id, character, 10)
-                if recent_message_count >= 10:
-                    # 10개 메시지마다 서머리 생성
-                    await self.create_memory_summary(user_id, character)
-            except Exception as e:
-                print(f"[서머리 에러] {e}")
+            # [추가] 서머리 생성 (마지막 요약 이후 사용자 메시지가 충분히 쌓였을 때, summary_scheduler 참고)
+            background_jobs.submit('summary_watermark', summary_scheduler.note_messages, user_id, character, len(allowed))
 
         except Exception as e:
             print(f"Error in process_normal_message: {e}")
@@ -679,16 +694,45 @@ class CharacterBot(commands.Bot):
             
             await message.channel.send("❌ An error occurred while processing the response.")
 
+    async def save_turn_keywords(self, user_id: int, character: str, content: str):
+        """턴의 사용자 발화에서 키워드를 추출해 저장합니다. (백그라운드 작업)"""
+        keywords = self.keyword_manager.extract_keywords(content)
+        if keywords:
+            await self.keyword_manager.asave_keywords(user_id, character, keywords)
+            print(f"[키워드] {character} - {len(keywords)}개 키워드 추출됨")
+
+    async def send_affinity_notifications(self, message, character: str, user_id: int, prev_score: int,
+                                          new_score: int, highest_milestone_before: int):
+        """등급 변경 메시지와 새로운 최고 마일스톤 보상을 보냅니다. (백그라운드 작업)"""
+        prev_grade = get_affinity_grade(prev_score)
+        new_grade = get_affinity_grade(new_score)
+        new_milestone = (new_score // 10) * 10
+
+        # 등급 변경 체크
+        if prev_grade != new_grade:
+            if new_score > prev_score:
+                # 점수가 올랐을 때만 레벨업 메시지 전송
+                embed = self.create_level_up_embed(character, prev_grade, new_grade)
+                await message.channel.send(embed=embed)
+            else:
+                # 점수가 내렸을 때 다운그레이드 메시지 전송
+                embed = self.create_level_down_embed(character, prev_grade, new_grade)
+                await message.channel.send(embed=embed)
+
+        # 새로운 최고 마일스톤 달성 시에만 보상 로직 실행
+        if new_milestone > highest_milestone_before:
+            await self.handle_milestone_reward(message, character, user_id, new_milestone)
+
     async def handle_daily_quest_reward(self, message, character_name: str, user_id: int):
         """[수정된 함수] 일일 퀘스트 보상(선물)을 처리합니다. (대화 횟수 기반)"""
         try:
             # DB 매니저를 통해 랜덤 선물을 지급하고, 선물 이름을 받아옴
-            reward_gift_name = self.db.add_random_gift_to_user(user_id, character_name)
+            reward_gift_name = await self.db.aadd_random_gift_to_user(user_id, character_name)
             if not reward_gift_name:
                 print(f"[Quest Error] Failed to give a random gift.")
                 return
 
-            self.db.mark_quest_reward_claimed(user_id, character_name)
+            await self.db.amark_quest_reward_claimed(user_id, character_name)
 
             embed = discord.Embed(
                 title="🎁 Daily Quest Complete!",
@@ -712,14 +756,14 @@ class CharacterBot(commands.Bot):
         """10, 20, 30, 40, 50, 60 등 10의 배수마다 등급별 확률표로 카드 지급. 중복 지급 방지."""
         try:
             from config import get_card_tier_by_affinity, get_available_cards
-            affinity = self.db.get_affinity(user_id, character)["emotion_score"]
+            affinity = (await self.db.aget_affinity(user_id, character))["emotion_score"]
             tier_probs = get_card_tier_by_affinity(affinity)
             import random
             tiers, probs = zip(*tier_probs)
             chosen_tier = random.choices(tiers, weights=probs, k=1)[0]
             
             # 사용자가 보유한 카드 목록 가져오기 (카드 ID만)
-            user_cards = self.db.get_user_cards(user_id, character)
+            user_cards = await self.db.aget_user_cards(user_id, character)
             user_card_ids = [card[0] for card in user_cards] if user_cards else []
             
             # 중복되지 않은 카드만 선택
@@ -771,29 +815,7 @@ class CharacterBot(commands.Bot):
         return embed
 
     def detect_language(self, text: str) -> str:
-        try:
-            # 시도 1: 괄호 제거 후 언어 감지
-            text_without_brackets = re.sub(r'\([^)]*\)', '', text)
-            text_to_detect = text_without_brackets
-        except re.error:
-            # 정규식 오류(짝이 맞지 않는 괄호 등) 발생 시 원본 텍스트 사용
-            text_to_detect = text
-
-        try:
-            text_clean = re.sub(r'[^a-zA-Z\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\s]', '', text_to_detect)
-            text_clean = text_clean.strip()
-            if not text_clean:
-                return 'en'
-            detected = langdetect.detect(text_clean)
-            lang_map = {
-                'zh-cn': 'zh', 'zh-tw': 'zh', 'zh': 'zh',
-                'ja': 'ja',
-                'en': 'en'
-            }
-            return lang_map.get(detected, detected)
-        except Exception as e:
-            print(f"Language detection error: {e}")
-            return 'en'
+        return language_id.detect_language(text)
 
     def translate_to_target_language(self, text: str, target_language: str) -> str:
         try:
@@ -821,7 +843,7 @@ class CharacterBot(commands.Bot):
         # recent_messages 필터링
         filtered_recent = [
             m for m in recent_messages
-            if self.detect_language(m["content"]) == channel_language
+            if (m.get("language") or self.detect_language(m["content"])) == channel_language
         ]
         # recent_messages가 비어있으면, 맥락 없이 대화 시작
 
@@ -870,26 +892,40 @@ class CharacterBot(commands.Bot):
         text = text.strip().lower()
         return text
 
+    def accept_bot_line(self, user_id, line: str) -> bool:
+        """최근 봇 메시지와 겹치지 않는 줄이면 기록하고 True를 반환합니다. (최근 5줄 기준)"""
+        last_msgs = self.last_bot_messages.get(user_id, [])
+        norm_line = self.normalize_text(line)
+        if norm_line in [self.normalize_text(msg) for msg in last_msgs]:
+            return False
+        last_msgs.append(line)
+        self.last_bot_messages[user_id] = last_msgs[-5:]
+        return True
+
     async def send_bot_message(self, channel, message, user_id=None):
         """봇 메시지를 전송하고, 필요한 경우 최근 메시지 목록을 업데이트합니다."""
         if user_id is not None:
-            last_msgs = self.last_bot_messages.get(user_id, [])
             lines = [line.strip() for line in message.split('\n') if line.strip()]
-            filtered_lines = []
-            for line in lines:
-                norm_line = self.normalize_text(line)
-                norm_last = [self.normalize_text(msg) for msg in last_msgs]
-                if norm_line not in norm_last:
-                    filtered_lines.append(line)
-                    last_msgs.append(line)
-            if len(last_msgs) > 5:
-                last_msgs = last_msgs[-5:]
-            self.last_bot_messages[user_id] = last_msgs
+            filtered_lines = [line for line in lines if self.accept_bot_line(user_id, line)]
             if not filtered_lines:
                 return
             message = '\n'.join(filtered_lines)
         await channel.send(message)
 
+    async def stream_bot_message(self, channel, messages: list, user_id=None, on_queued=None) -> str:
+        """응답을 스트리밍으로 받아 표시합니다. (send_bot_message와 같은 중복 줄 필터를 줄 단위로 적용)"""
+        chunks = llm_gateway.stream_chat_completion(
+            messages,
+            model="gpt-4o",
+            temperature=0.6,
+            max_tokens=512,
+            presence_penalty=0.3,
+            frequency_penalty=0.1,
+            on_queued=on_queued
+        )
+        line_filter = (lambda line: self.accept_bot_line(user_id, line)) if user_id is not None else None
+        return await stream_to_channel(channel, chunks, line_filter=line_filter, error_text=self._ai_error_text)
+
     def remove_channel(self, channel_id):
         """활성 채널 목록에서 채널을 제거합니다."""
         if channel_id in self.active_channels:
@@ -898,17 +934,12 @@ class CharacterBot(commands.Bot):
 
     async def summarize_messages(self, messages: list) -> str:
         """메시지 목록을 요약합니다."""
-        max_retries = 3
-        base_delay = 1.0
-
-        for attempt in range(max_retries):
-            try:
-                messages_text = "\n".join([
-                    f"{'User' if msg['role'] == 'user' else self.character_name}: {msg['content']}"
-                    for msg in messages
-                ])
+        messages_text = "\n".join([
+            f"{'User' if msg['role'] == 'user' else self.character_name}: {msg['content']}"
+            for msg in messages
+        ])
 
-                prompt = f"""Please summarize the following conversation between User and {self.character_name} in 2-3 sentences.
+        prompt = f"""Please summarize the following conversation between User and {self.character_name} in 2-3 sentences.
                 Focus on key points, emotional changes, and important information shared.
                 Format: [YYYY-MM-DD HH:MM] User: message / Character: message
 
@@ -916,42 +947,18 @@ class CharacterBot(commands.Bot):
                 {messages_text}
                 """
 
-                response = await openai.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[{"role": "system", "content": prompt}],
-                    max_tokens=200,
-                    temperature=0.7
-                )
-
-                return response.choices[0].message.content.strip()
-            except Exception as e:
-                print(f"Error in summarize_messages (attempt {attempt + 1}/{max_retries}): {e}")
-
-                # 네트워크 관련 에러인지 확인
-                is_network_error = (
-                    "Connection reset by peer" in str(e) or
-                    "Connection reset" in str(e) or
-                    "Connection closed" in str(e) or
-                    "Connection timeout" in str(e) or
-                    "ClientOSError" in str(e) or
-                    "aiohttp.client_exceptions.ClientOSError" in str(e) or
-                    "aiohttp.client_exceptions.ClientConnectorError" in str(e) or
-                    "aiohttp.client_exceptions.ServerDisconnectedError" in str(e) or
-                    "aiohttp.client_exceptions.ClientResponseError" in str(e)
-                )
-
-                # 마지막 시도가 아니고 네트워크 에러인 경우 재시도
-                if attempt < max_retries - 1 and is_network_error:
-                    delay = base_delay * (2 ** attempt)  # 지수 백오프
-                    print(f"Network error detected in message summarization, retrying in {delay} seconds...")
-                    await asyncio.sleep(delay)
-                    continue
-                else:
-                    # 네트워크 에러가 아니거나 마지막 시도인 경우
-                    print(f"Message summarization failed after {max_retries} attempts")
-                    return None
-
-        return None
+        try:
+            summary = await llm_gateway.chat_completion(
+                [{"role": "system", "content": prompt}],
+                model="gpt-4o",
+                max_tokens=200,
+                temperature=0.7,
+                priority=PRIORITY_BACKGROUND
+            )
+            return summary.strip()
+        except llm_gateway.LLMError as e:
+            print(f"Message summarization failed: {e}")
+            return None
 
     async def analyze_emotion(self, text):
         """메시지의 감정을 분석하여 -1, 0, +1 점수를 반환 (70% GPT + 30% 패턴)"""
@@ -966,9 +973,9 @@ class CharacterBot(commands.Bot):
             print(f"User ID: {user_id}")
             print(f"Current active_channels: {self.active_channels}")
 
-            if not isinstance(self.active_channels, dict):
-                print(f"Converting active_channels from {type(self.active_channels)} to dict")
-                self.active_channels = {}
+            if not isinstance(self.active_channels, MutableMapping):
+                print(f"Converting active_channels from {type(self.active_channels)} to session map")
+                self.active_channels = get_session_map(f'active_channels:{self.character_name}')
 
             if channel_id in self.active_channels:
                 print(f"Channel {channel_id} already exists")
@@ -1005,7 +1012,7 @@ class CharacterBot(commands.Bot):
                 return
 
             # 닉네임 확인
-            nickname = self.db.get_user_nickname(user_id, self.character_name)
+            nickname = await self.db.aget_user_nickname(user_id, self.character_name)
             print(f"[DEBUG] get_user_nickname({user_id}, {self.character_name}) -> {nickname}")
 
             if nickname:
@@ -1031,52 +1038,35 @@ class CharacterBot(commands.Bot):
             import traceback
             print(traceback.format_exc())
 
-    async def get_ai_response(self, messages: list) -> str:
-        """OpenAI API를 통한 응답 생성"""
-        max_retries = 3
-        base_delay = 1.0
-
-        for attempt in range(max_retries):
-            try:
-                client = openai.AsyncOpenAI()
-                response = await client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=messages,
-                    temperature=0.6,
-                    max_tokens=512,
-                    presence_penalty=0.3,
-                    frequency_penalty=0.1
-                )
-                return response.choices[0].message.content
-            except Exception as e:
-                print(f"Error in AI response generation (attempt {attempt + 1}/{max_retries}): {e}")
-
-                # 네트워크 관련 에러인지 확인
-                is_network_error = (
-                    "Connection reset by peer" in str(e) or
-                    "Connection reset" in str(e) or
-                    "Connection closed" in str(e) or
-                    "Connection timeout" in str(e) or
-                    "ClientOSError" in str(e) or
-                    "aiohttp.client_exceptions.ClientOSError" in str(e) or
-                    "aiohttp.client_exceptions.ClientConnectorError" in str(e) or
-                    "aiohttp.client_exceptions.ServerDisconnectedError" in str(e) or
-                    "aiohttp.client_exceptions.ClientResponseError" in str(e)
-                )
-
-                # 마지막 시도가 아니고 네트워크 에러인 경우 재시도
-                if attempt < max_retries - 1 and is_network_error:
-                    delay = base_delay * (2 ** attempt)  # 지수 백오프
-                    print(f"Network error detected, retrying in {delay} seconds...")
-                    await asyncio.sleep(delay)
-                    continue
-                else:
-                    # 네트워크 에러가 아니거나 마지막 시도인 경우
-                    if is_network_error:
-                        return "Sorry, there was a temporary network issue. Please try again in a moment."
-                    else:
-                        return "Sorry, an error occurred while generating a response."
+    def _notify_queued(self, channel):
+        """LLM 대기열이 길 때 사용자에게 대기 순번을 알려주는 콜백을 만듭니다."""
+        async def on_queued(position: int):
+            if position >= QUEUE_NOTICE_POSITION:
+                await channel.send(f"⏳ Lots of people are chatting right now — you're #{position} in line. I'll reply shortly!")
+        return on_queued
 
+    async def get_ai_response(self, messages: list, on_queued=None) -> str:
+        """OpenAI API를 통한 응답 생성"""
+        try:
+            return await llm_gateway.chat_completion(
+                messages,
+                model="gpt-4o",
+                temperature=0.6,
+                max_tokens=512,
+                presence_penalty=0.3,
+                frequency_penalty=0.1,
+                on_queued=on_queued
+            )
+        except llm_gateway.LLMError as e:
+            return self._ai_error_text(e)
+
+    def _ai_error_text(self, e: llm_gateway.LLMError) -> str:
+        """LLM 호출 실패 시 사용자에게 보여줄 메시지입니다."""
+        if isinstance(e, llm_gateway.LLMOverloaded):
+            return f"I'm getting a lot of messages right now (you're #{e.queue_position} in line). Please try again in a moment!"
+        print(f"Error in AI response generation: {e}")
+        if e.is_network_error:
+            return "Sorry, there was a temporary network issue. Please try again in a moment."
         return "Sorry, an error occurred while generating a response."
 
     def create_level_up_embed(self, character_name: str, prev_grade: str, new_grade: str) -> discord.Embed:
@@ -1127,28 +1117,8 @@ class CharacterBot(commands.Bot):
         return embed
 
     async def create_memory_summary(self, user_id: int, character: str):
-        """메모리 요약을 생성합니다."""
-        try:
-            # 최근 메시지 가져오기
-            recent_messages = self.db.get_user_character_messages(user_id, character, limit=self.memory_summary_interval)
-            if not recent_messages:
-                return
-
-            # 요약 생성
-            summary = await self.summarize_messages(recent_messages)
-            if summary:
-                # 품질 점수 계산 (간단한 휴리스틱)
-                quality_score = min(1.0, len(summary) / 200.0)  # 200자 기준
-                token_count = len(summary.split())
-
-                # 요약 저장
-                self.db.add_memory_summary(user_id, character, summary, quality_score, token_count)
-
-                # 오래된 요약 삭제
-                self.db.delete_old_memory_summaries(user_id, character)
-
-        except Exception as e:
-            print(f"Error creating memory summary: {e}")
+        """마지막 요약 이후의 대화로 메모리 요약을 바로 생성합니다. (평소에는 summary_scheduler가 예약)"""
+        await summary_scheduler.summarize_now(user_id, character)
 
     async def analyze_user_emotion(self, message: str) -> str:
         """사용자 메시지의 감정을 분석합니다."""
@@ -1332,21 +1302,17 @@ class CharacterBot(commands.Bot):
                 return True
         return False
     
-    async def build_conversation_context(self, user_id: int, character: str, current_message: str, call_nickname: bool = False) -> list:
-        """대화 컨텍스트를 구성합니다."""
-        context = []
-        from config import CHARACTER_INFO, CHARACTER_PROMPTS, CHARACTER_AFFINITY_SPEECH, CHARACTER_PERSONALITIES, CHARACTER_EMOTION_REACTIONS, CHARACTER_TOPIC_REACTIONS, CHARACTER_TIME_REACTIONS
-        
-        character_info = CHARACTER_INFO.get(character, {})
-        character_prompt = CHARACTER_PROMPTS.get(character, "")
-        character_personality = CHARACTER_PERSONALITIES.get(character, {})
-        nickname = self.db.get_user_nickname(user_id, character)
-        affinity_info = self.db.get_affinity(user_id, character)
+    async def build_conversation_context(self, user_id: int, character: str, current_message: str, call_nickname: bool = False, snapshot: dict = None) -> list:
+        """
+        대화 컨텍스트를 구성합니다.
+        snapshot(get_turn_snapshot 결과)이 주어지면 DB를 다시 조회하지 않고 그 값을 사용합니다.
+        """
+        if snapshot is None:
+            snapshot = await self.db.aget_turn_snapshot(user_id, character)
+        nickname = snapshot['nickname']
+        affinity_info = snapshot['affinity'] or {'emotion_score': 0}
         affinity_grade = get_affinity_grade(affinity_info['emotion_score'])
-        affinity_speech = CHARACTER_AFFINITY_SPEECH.get(character, {}).get(affinity_grade, {})
-        tone = affinity_speech.get("tone", "")
-        example = affinity_speech.get("example", "")
-        
+
         # 감정 및 주제 분석
         user_emotion = await self.analyze_user_emotion(current_message)
         detected_topic = await self.detect_topic(current_message)
@@ -1357,114 +1323,48 @@ class CharacterBot(commands.Bot):
         time_info = None
         if time_question:
             time_info = await self.get_current_time_info(user_id)
-        
-        # 캐릭터 개성 정보 추출
-        core_traits = character_personality.get("core_traits", [])
-        speech_patterns = character_personality.get("speech_patterns", [])
-        interests = character_personality.get("interests", [])
-        quirks = character_personality.get("quirks", [])
-        response_style = character_personality.get("response_style", "")
-        
-        # 감정별 반응 정보
-        emotion_reactions = CHARACTER_EMOTION_REACTIONS.get(character, {}).get(user_emotion, {})
-        emotion_reaction = ""
-        if emotion_reactions:
-            import random
-            emotion_reaction = random.choice(emotion_reactions.get("reactions", [""]))
-            emotion_follow_up = emotion_reactions.get("follow_up", "")
-        
-        # 주제별 반응 정보
-        topic_reaction = CHARACTER_TOPIC_REACTIONS.get(character, {}).get(detected_topic, "")
-        
-        # 시간대별 반응 정보
-        time_reactions = CHARACTER_TIME_REACTIONS.get(character, {}).get(time_period, {})
-        time_greeting = time_reactions.get("greeting", "")
-        time_mood = time_reactions.get("mood", "")
-        time_activity = time_reactions.get("activity", "")
-        
-        nickname_instruction = f"In this response, naturally incorporate the user's nickname '{nickname}' in a way that feels genuine and matches the emotional context. Only use the nickname if it flows naturally with your response." if nickname and call_nickname else "For this response, avoid using the user's nickname and focus on creating a natural conversation flow."
-        
-        system_message = f"""{character_prompt}
-
-Character Status:
-- User's nickname: {nickname if nickname else 'Not set'}
-- Affinity grade: {affinity_grade}
-- Current tone: {tone}
-- Example response: {example}
-
-Character Personality:
-- Core traits: {', '.join(core_traits)}
-- Speech patterns: {', '.join(speech_patterns)}
-- Interests: {', '.join(interests)}
-- Quirks: {', '.join(quirks)}
-- Response style: {response_style}
-
-Context Analysis:
-- User's detected emotion: {user_emotion}
-- Detected topic: {detected_topic}
-- Current time period: {time_period}
-{f"- Current time: {time_info['time']} ({time_info['period_kr']})" if time_info else ""}
-{f"- Date: {time_info['date']}" if time_info else ""}
-{f"- Timezone: {time_info['timezone']}" if time_info else ""}
-
-Emotion-based Response:
-{emotion_reaction if emotion_reaction else "Respond naturally to the user's emotional state"}
-
-Topic-based Response:
-{topic_reaction if topic_reaction else "Respond naturally to the conversation topic"}
-
-Time-based Response:
-- Time greeting: {time_greeting}
-- Time mood: {time_mood}
-- Time activity: {time_activity}
-
-{nickname_instruction}
-
-[IMPORTANT] For this conversation:
-1. Use the specified tone and nuance based on affinity level
-2. Keep responses natural and in character - embody the core traits and quirks
-3. Show appropriate emotions and actions in parentheses
-4. Maintain the character's unique personality and speech patterns
-5. Reference the character's interests when relevant
-6. Respond to the user's emotional state with empathy and understanding
-7. Incorporate topic-specific responses when relevant
-8. Consider the time of day in your response
-9. NEVER mention being an AI, bot, or program
-10. Always respond in the same language as the user
-11. Use informal speech style
-12. Add emotional expressions in parentheses like (smiles), (looks away), etc.
-13. Follow the character's response style and incorporate their quirks naturally
-14. Pay attention to the user's message context and respond appropriately
-15. Make the conversation feel personal and engaging
-{f"16. TIME QUESTION DETECTED: The user is asking about the current time. Provide the specific time information naturally in your response: {time_info['time']} ({time_info['period_kr']}) on {time_info['date']}" if time_question and time_info else ""}
-"""
-        context.append({"role": "system", "content": system_message})
-        # Silver, Gold, Platinum 등급에서만 최대 3개 메모리 요약
+
+        # 페르소나 블록 (우선순위 0은 필수, 예산을 넘으면 숫자가 큰 블록부터 제외)
+        persona_blocks = build_persona_blocks(
+            character, nickname, affinity_grade, user_emotion, detected_topic, time_period,
+            time_question=time_question, time_info=time_info, call_nickname=call_nickname,
+        )
+
+        # Silver, Gold, Platinum 등급에서만 최대 MEMORY_RETRIEVAL_K개 메모리
+        # 현재 메시지와 관련 있는 요약/에피소드를 먼저, 모자라면 품질 점수 순 요약으로 채움
+        memory_lines = []
         if affinity_grade.lower() in ['silver', 'gold', 'platinum']:
-            memory_summaries = self.db.get_memory_summaries_by_affinity(user_id, character, affinity_grade)
-            if memory_summaries:
-                memory_context = "Previous conversations:\n"
-                for summary, created_at, quality_score in memory_summaries[:3]:
-                    date_str = created_at.strftime('%Y-%m-%d %H:%M')
-                    memory_context += f"[{date_str}] {summary}\n"
-                context.append({"role": "system", "content": memory_context})
+            relevant = await memory_retriever.search(
+                user_id, character, current_message, MEMORY_RETRIEVAL_K, self.context_builder.budgets['memory']
+            ) or []
+            seen = {summary for summary, _ in relevant}
+            fallback = [
+                (summary, created_at)
+                for summary, created_at, quality_score in self.db.select_memory_summaries(snapshot['memory_summaries'], affinity_grade)
+                if summary not in seen
+            ]
+            for summary, created_at in (relevant + fallback)[:MEMORY_RETRIEVAL_K]:
+                if created_at:
+                    memory_lines.append(f"[{created_at.strftime('%Y-%m-%d %H:%M')}] {summary}")
+                else:
+                    memory_lines.append(summary)
         # Silver, Gold 등급에서만 키워드 정보
+        keyword_parts = []
         if affinity_grade in ['Silver', 'Gold']:
-            try:
-                keyword_context = self.keyword_manager.format_keywords_for_context(user_id, character)
-                if keyword_context:
-                    context.append({"role": "system", "content": keyword_context})
-            except Exception as e:
-                print(f"[ERROR] 키워드 컨텍스트 생성 중 오류: {e}")
-        # 최근 메시지 5개만 추가
-        recent_messages = self.db.get_user_character_messages(user_id, character, limit=5)
-        for msg in recent_messages:
-            context.append({
-                "role": "user" if msg["role"] == "user" else "assistant",
-                "content": msg["content"]
-            })
-        context.append({"role": "user", "content": current_message})
-        return context
+            keyword_parts = snapshot['keyword_parts']
+        # 최근 메시지 (예산을 넘으면 오래된 것부터 제외)
+        history = [
+            {"role": "user" if msg["role"] == "user" else "assistant", "content": msg["content"]}
+            for msg in snapshot['recent_messages']
+        ]
+        return self.context_builder.build(
+            persona_blocks,
+            current_message,
+            memory_lines=memory_lines,
+            keyword_parts=keyword_parts,
+            history=history,
+            keyword_header=KEYWORD_CONTEXT_HEADER,
+        )
 
     async def validate_nickname(self, nickname: str, interaction_or_channel) -> bool:
         """닉네임 유효성을 검사합니다."""
@@ -1535,7 +1435,7 @@ Time-based Response:
         try:
             # 오늘 첫 대화인지 확인 (UTC 기준)
             today = datetime.utcnow().date()
-            recent_messages = self.db.get_user_recent_messages(user_id, character, 1)
+            recent_messages = await self.db.aget_user_recent_messages(user_id, character, 1)
             
             if not recent_messages:
                 # 첫 대화인 경우 호감도 레벨별 인사 메시지 전송
@@ -1550,7 +1450,7 @@ Time-based Response:
             from utils import get_affinity_grade
             
             # 호감도 정보 가져오기
-            affinity_info = self.db.get_affinity(user_id, character)
+            affinity_info = await self.db.aget_affinity(user_id, character)
             if not affinity_info:
                 # 호감도 정보가 없으면 Rookie로 설정
                 affinity_grade = "Rookie"
@@ -1558,7 +1458,7 @@ Time-based Response:
                 affinity_grade = get_affinity_grade(affinity_info['emotion_score'])
             
             # 닉네임 가져오기
-            nickname = self.db.get_user_nickname(user_id, character)
+            nickname = await self.db.aget_user_nickname(user_id, character)
             if not nickname:
                 nickname = message.author.display_name
             
@@ -1607,7 +1507,7 @@ class CardClaimButton(discord.ui.Button):
 
         try:
             # 카드 추가
-            success = self.db.add_user_card(self.user_id, self.character_name, self.milestone)
+            success = await self.db.aadd_user_card(self.user_id, self.character_name, self.milestone)
 
             if success:
                 embed = discord.Embed(
@@ -1643,7 +1543,7 @@ class CardClaimView(discord.ui.View):
             await interaction.response.defer(ephemeral=True)
             
             # 실제로 카드를 데이터베이스에 추가
-            success = self.db.add_user_card(self.user_id, self.character_name, self.card_id)
+            success = await self.db.aadd_user_card(self.user_id, self.character_name, self.card_id)
             
             if success:
                 button.disabled = True
@@ -1657,7 +1557,7 @@ class CardClaimView(discord.ui.View):
         except Exception as e:
             print(f"Error in claim_card: {e}")
             # 에러가 발생해도 카드가 저장되었을 수 있으므로 확인
-            if self.db.has_user_card(self.user_id, self.character_name, self.card_id):
+            if await self.db.ahas_user_card(self.user_id, self.character_name, self.card_id):
                 button.disabled = True
                 button.label = "Claimed"
                 await interaction.message.edit(view=self)
@@ -1783,8 +1683,8 @@ class NicknameInputModal(discord.ui.Modal, title="Enter Nickname"):
                 return
 
             # 닉네임 저장
-            self.bot.db.set_user_nickname(self.user_id, self.character, nickname)
-            self.bot.db.update_user_conversation_state(
+            await self.bot.db.aset_user_nickname(self.user_id, self.character, nickname)
+            await self.bot.db.aupdate_user_conversation_state(
                 self.user_id, self.character,
                 has_nickname=True,
                 language_set=True,
@@ -1804,25 +1704,3 @@ class NicknameInputModal(discord.ui.Modal, title="Enter Nickname"):
             print(traceback.format_exc())
             if not interaction.response.is_done():
                 await interaction.response.send_message("A server error occurred.", ephemeral=True)
-
-def is_similar(a, b):
-    return SequenceMatcher(None, a, b).ratio() > 0.85
-
-def is_spam(user_id, message, now, user_message_buffers):
-    # 1. Short interval repeated/similar message
-    recent = [msg for msg, ts in user_message_buffers.get(user_id, []) if now - ts < 5]
-    if any(is_similar(message, msg) for msg in recent):
-        return True, "Spam detected: Repeated or similar message in a short time interval."
-    # 2. Same sentence/word repeated 5+ times
-    same_count = sum(1 for msg, _ in user_message_buffers.get(user_id, [])[-10:] if message == msg)
-    if same_count >= 5:
-        return True, "Spam detected: Same message repeated 5 or more times."
-    # 3. Short message (1~5 chars)
-    if 1 <= len(message.strip()) <= 5:
-        return True, "Spam detected: Message too short (1-5 characters)."
-    # 4. Emoji/special char repeated 5+ times
-    emoji_pattern = re.compile("[\U00010000-\U0010ffff]", flags=re.UNICODE)
-    emoji_msgs = [msg for msg, _ in user_message_buffers.get(user_id, [])[-10:] if emoji_pattern.fullmatch(msg.strip())]
-    if len(emoji_msgs) >= 5:
-        return True, "Spam detected: Emoji or special character repeated 5 or more times."
-    return False, ""
\ No newline at end of file
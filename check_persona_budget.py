@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+페르소나 토큰 예산 확인 스크립트
+배포하는 캐릭터마다 가장 긴 경우(호감도 등급, 감정, 주제, 시간대, 닉네임/시간 질문 포함)의 페르소나 블록을 만들어
+기본 예산(CONTEXT_PERSONA_TOKENS) 안에 모두 들어가는지 확인합니다. 넘으면 종료 코드 1.
+(예산을 넘으면 ContextBuilder가 선택 블록을 매 턴 빼므로 봇의 말투가 조용히 바뀝니다)
+
+사용법:
+    python check_persona_budget.py                 # tiktoken(o200k_base)을 쓸 수 있으면 사용
+    python check_persona_budget.py --approximate   # 근사 토크나이저로 확인 (오프라인 환경과 같음)
+"""
+import argparse
+import sys
+
+import context_budget
+from config import (
+    CHARACTER_PROMPTS, CHARACTER_AFFINITY_SPEECH, CHARACTER_EMOTION_REACTIONS, CHARACTER_TOPIC_REACTIONS,
+    CHARACTER_TIME_REACTIONS,
+)
+from context_budget import CONTEXT_BUDGETS, count_tokens
+from persona_prompt import build_persona_blocks
+
+WORST_TIME_INFO = {'time': '11:59 PM', 'period_kr': '밤', 'date': '2025-12-31 (Wednesday)', 'timezone': 'America/Los_Angeles'}
+
+
+def longest(options):
+    return max(options, key=count_tokens)
+
+
+def worst_case_tokens(character: str) -> int:
+    """가장 긴 조합의 페르소나 블록 전체 토큰 수 (ContextBuilder._fit_persona와 같은 방식으로 셈)."""
+    grades = list(CHARACTER_AFFINITY_SPEECH.get(character, {})) or ['Rookie']
+    emotions = list(CHARACTER_EMOTION_REACTIONS.get(character, {})) or ['neutral']
+    topics = list(CHARACTER_TOPIC_REACTIONS.get(character, {})) or ['general']
+    periods = list(CHARACTER_TIME_REACTIONS.get(character, {})) or ['day']
+
+    def size(**choice):
+        defaults = dict(affinity_grade=grades[0], user_emotion=emotions[0], detected_topic=topics[0], time_period=periods[0])
+        blocks = build_persona_blocks(character, "닉네임열다섯글자까지가능해요", time_question=True,
+                                      time_info=WORST_TIME_INFO, call_nickname=True, pick=longest,
+                                      **{**defaults, **choice})
+        return sum(count_tokens(text) for _, text in blocks if text and text.strip())
+
+    # 각 항목은 서로 다른 블록에 들어가므로 항목별 최댓값을 더하면 가장 긴 조합
+    base = size()
+    total = base
+    for name, values in (('affinity_grade', grades), ('user_emotion', emotions),
+                         ('detected_topic', topics), ('time_period', periods)):
+        total += max(size(**{name: value}) for value in values) - base
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="페르소나가 기본 토큰 예산에 들어가는지 확인")
+    parser.add_argument("--approximate", action="store_true", help="tiktoken을 쓰지 않고 근사 토크나이저로 셈")
+    args = parser.parse_args()
+    if not args.approximate:
+        context_budget.load_encoding()
+    tokenizer = 'tiktoken/o200k_base' if context_budget._get_encoding() is not None else 'approximate'
+
+    budget = CONTEXT_BUDGETS['persona']
+    failed = False
+    print(f"persona budget: {budget} tokens ({tokenizer})")
+    for character in CHARACTER_PROMPTS:
+        tokens = worst_case_tokens(character)
+        ok = tokens <= budget
+        failed = failed or not ok
+        print(f"{character:>10} {tokens:6d} {'OK' if ok else 'OVER BUDGET'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+토큰 예산 기반 대화 컨텍스트 구성
+GPT에 보내는 프롬프트를 섹션(페르소나, 메모리, 키워드, 최근 대화)별 토큰 예산 안으로 맞춥니다.
+
+- 토큰 수는 로컬 토크나이저로 계산 (tiktoken이 있으면 gpt-4o와 같은 o200k_base, 없으면 근사치)
+  인코딩은 시작할 때 load_encoding()으로 한 번만 불러옴 (스레드에서 호출). 실패하면 다시 시도하지 않고 근사치 사용
+- 예산을 넘으면 가치가 낮은 내용부터 제거
+  페르소나: 우선순위가 낮은 블록부터 / 메모리: 마지막(덜 중요한) 요약부터 /
+  키워드: 마지막 항목부터 / 최근 대화: 오래된 메시지부터
+- 섹션별 토큰 수와 잘린 항목 수를 metrics에 기록
+"""
+import os
+import re
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+CONTEXT_MAX_TOKENS = int(os.environ.get("CONTEXT_MAX_TOKENS", 4000))
+CONTEXT_BUDGETS = {
+    # 배포 페르소나 중 가장 긴 경우(Kagari, 근사 토크나이저 기준 약 2.6k)가 모두 들어가는 크기
+    # 프롬프트를 바꾸면 check_persona_budget.py로 확인
+    'persona': int(os.environ.get("CONTEXT_PERSONA_TOKENS", 2800)),
+    'memory': int(os.environ.get("CONTEXT_MEMORY_TOKENS", 400)),
+    'keywords': int(os.environ.get("CONTEXT_KEYWORD_TOKENS", 200)),
+    # 최근 대화는 다른 섹션이 쓰고 남은 예산을 모두 사용하며, 최소 이만큼은 보장
+    'history': int(os.environ.get("CONTEXT_HISTORY_TOKENS", 600)),
+    'current': int(os.environ.get("CONTEXT_CURRENT_MESSAGE_TOKENS", 500)),
+}
+# 채팅 메시지 하나당 붙는 형식 토큰 (role, 구분자 등)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SECTIONS = ('persona', 'memory', 'keywords', 'history', 'current')
+
+_encoding = None
+# 인코딩을 불러오지 못했으면 True (오프라인에서 매 호출마다 다운로드를 다시 시도하지 않도록)
+_encoding_unavailable = False
+# tiktoken이 없을 때: CJK 문자는 글자당 1토큰, 나머지는 단어/기호 단위로 대략 4글자당 1토큰
+_APPROX_TOKEN = re.compile(r'[가-힣ぁ-んァ-ン一-龯]|[A-Za-z0-9]+|\S')
+
+
+def load_encoding():
+    """
+    tiktoken 인코딩을 한 번 불러옵니다. (처음에는 네트워크에서 내려받을 수 있으므로 이벤트 루프 밖에서 호출)
+    불러오지 못하면 근사치로 고정하고 한 번만 알립니다.
+    """
+    global _encoding, _encoding_unavailable
+    if _encoding is not None or _encoding_unavailable:
+        return _encoding
+    if tiktoken is None:
+        _encoding_unavailable = True
+        print("[Context] tiktoken not installed, using approximate token counts")
+        return None
+    try:
+        _encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        _encoding_unavailable = True
+        print(f"[Context] tiktoken encoding unavailable, using approximate token counts: {e}")
+    return _encoding
+
+
+def _get_encoding():
+    # 토큰을 셀 때는 불러오지 않음: load_encoding() 전이거나 실패했으면 근사치
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """텍스트의 토큰 수를 반환합니다."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return sum((len(t) + 3) // 4 if t[0].isascii() and t[0].isalnum() else 1 for t in _APPROX_TOKEN.findall(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """텍스트를 max_tokens 이하로 자릅니다. (앞부분 유지)"""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    # 말줄임표(…)도 한 토큰으로 셈
+    max_tokens -= 1
+    encoding = _get_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens]) + "…"
+    # 근사 토크나이저: 이진 탐색으로 들어가는 가장 긴 앞부분을 찾음
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low] + "…"
+
+
+metrics = {
+    'builds': 0,
+    'trimmed_builds': 0,
+    'tokens': {name: 0 for name in SECTIONS},
+    'dropped': {name: 0 for name in SECTIONS},
+    'last': {},
+}
+
+
+class ContextBuilder:
+    """섹션별 예산으로 채팅 메시지 목록을 만듭니다."""
+
+    def __init__(self, max_tokens: int = CONTEXT_MAX_TOKENS, budgets: dict = None):
+        self.max_tokens = max_tokens
+        self.budgets = {**CONTEXT_BUDGETS, **(budgets or {})}
+
+    def _fit_persona(self, blocks, stats):
+        """blocks: [(우선순위, 텍스트), ...]. 0은 필수, 숫자가 클수록 먼저 제거합니다."""
+        budget = self.budgets['persona']
+        blocks = [(priority, text) for priority, text in blocks if text and text.strip()]
+        sizes = [count_tokens(text) for _, text in blocks]
+        total = sum(sizes)
+        removable = sorted((i for i, (priority, _) in enumerate(blocks) if priority > 0),
+                           key=lambda i: (-blocks[i][0], -i))
+        dropped = set()
+        for i in removable:
+            if total <= budget:
+                break
+            dropped.add(i)
+            total -= sizes[i]
+        stats['dropped']['persona'] += len(dropped)
+        kept = [text for i, (_, text) in enumerate(blocks) if i not in dropped]
+        prompt = "\n\n".join(kept)
+        if total > budget and kept:
+            # 필수 블록만으로도 넘치면 뒤쪽 블록을 빼서 첫 블록(캐릭터 기본 프롬프트)이 들어갈 자리를 만든 뒤 자름
+            first_size = count_tokens(kept[0])
+            rest = kept[1:]
+            rest_size = total - first_size
+            while rest and rest_size >= budget:
+                rest_size -= count_tokens(rest.pop())
+                stats['dropped']['persona'] += 1
+            first = truncate_to_tokens(kept[0], max(0, budget - rest_size))
+            prompt = "\n\n".join(text for text in [first] + rest if text)
+            stats['dropped']['persona'] += 1
+        return prompt
+
+    def _fit_items(self, header: str, items: list, separator: str, budget: int, section: str, stats):
+        """header + 앞에서부터 예산에 들어가는 항목까지만 남깁니다."""
+        if not items:
+            return ""
+        used = count_tokens(header)
+        kept = []
+        for item in items:
+            size = count_tokens(item) + count_tokens(separator)
+            if used + size > budget:
+                stats['dropped'][section] += len(items) - len(kept)
+                break
+            kept.append(item)
+            used += size
+        if not kept:
+            return ""
+        return header + separator.join(kept)
+
+    def _fit_history(self, history: list, budget: int, stats):
+        """최근 메시지부터 거꾸로 채우고, 예산을 넘는 오래된 메시지는 버립니다."""
+        kept = []
+        used = 0
+        for message in reversed(history):
+            size = count_tokens(message['content']) + MESSAGE_OVERHEAD_TOKENS
+            if used + size > budget:
+                remaining = budget - used - MESSAGE_OVERHEAD_TOKENS
+                # 가장 최근 메시지 하나가 너무 길면 잘라서라도 넣음
+                if not kept and remaining > 0:
+                    kept.append({**message, 'content': truncate_to_tokens(message['content'], remaining)})
+                    used = budget
+                stats['dropped']['history'] += len(history) - len(kept)
+                break
+            kept.append(message)
+            used += size
+        kept.reverse()
+        return kept, used
+
+    def build(self, persona_blocks: list, current_message: str, memory_lines: list = None,
+              keyword_parts: list = None, history: list = None,
+              memory_header: str = "Previous conversations:\n", keyword_header: str = "") -> list:
+        """
+        예산에 맞춘 메시지 목록을 반환합니다.
+        memory_lines와 keyword_parts는 중요한 것부터, history는 오래된 것부터 정렬되어 있어야 합니다.
+        """
+        stats = {'tokens': {}, 'dropped': {name: 0 for name in SECTIONS}}
+        context = []
+
+        persona = self._fit_persona(persona_blocks, stats)
+        context.append({"role": "system", "content": persona})
+
+        memory = self._fit_items(memory_header, memory_lines or [], "\n", self.budgets['memory'], 'memory', stats)
+        if memory:
+            context.append({"role": "system", "content": memory + "\n"})
+
+        keywords = self._fit_items(keyword_header, keyword_parts or [], "; ", self.budgets['keywords'], 'keywords', stats)
+        if keywords:
+            context.append({"role": "system", "content": keywords})
+
+        current = truncate_to_tokens(current_message, self.budgets['current'])
+        if current != current_message:
+            stats['dropped']['current'] += 1
+
+        for name, text in (('persona', persona), ('memory', memory), ('keywords', keywords), ('current', current)):
+            stats['tokens'][name] = count_tokens(text) + (MESSAGE_OVERHEAD_TOKENS if text else 0)
+        used = sum(stats['tokens'].values())
+        history_budget = max(self.budgets['history'], self.max_tokens - used)
+        history_messages, stats['tokens']['history'] = self._fit_history(history or [], history_budget, stats)
+        context.extend(history_messages)
+        context.append({"role": "user", "content": current})
+
+        _record(stats)
+        return context
+
+
+def _record(stats: dict):
+    metrics['builds'] += 1
+    if any(stats['dropped'].values()):
+        metrics['trimmed_builds'] += 1
+    for name in SECTIONS:
+        metrics['tokens'][name] += stats['tokens'].get(name, 0)
+        metrics['dropped'][name] += stats['dropped'][name]
+    metrics['last'] = {**stats['tokens'], 'total': sum(stats['tokens'].values())}
+
+
+def get_metrics() -> dict:
+    builds = metrics['builds']
+    return {
+        'builds': builds,
+        'trimmed_builds': metrics['trimmed_builds'],
+        'avg_tokens': {name: round(total / builds, 1) if builds else 0.0 for name, total in metrics['tokens'].items()},
+        'dropped': dict(metrics['dropped']),
+        'last': metrics['last'],
+        'tokenizer': 'tiktoken/o200k_base' if _encoding is not None else 'approximate',
+    }
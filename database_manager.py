@@ -1,15 +1,25 @@
 from datetime import datetime, date, timedelta
+import inspect
 import json
 import os
+import threading
+import time
 import psycopg2
 import gift_manager
+from db_pool import get_pool, get_async_pool
 from init_db import create_all_tables
+from schema_migrations import run_migrations
+from ttl_cache import TTLCache, MISSING
+from leaderboard import LeaderboardEngine, TOTAL
+from keyword_extractor import KEYWORDS_PER_TYPE, format_keyword_parts
+from write_behind import get_write_behind
 from pytz import timezone
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 from typing import Optional, Dict, Any
 
 # --- CST 시간대 객체 ---
 CST = timezone('Asia/Shanghai')
+UTC = timezone('UTC')
 
 def get_today_cst():
     """중국 시간 기준의 오늘 날짜를 반환합니다."""
@@ -31,6 +41,159 @@ create_all_tables()
 # 환경변수에서 DATABASE_URL 읽기
 DATABASE_URL = os.environ.get("DATABASE_URL")
 
+# --- 사용자 상태 캐시 (모든 DatabaseManager 인스턴스가 공유) ---
+# 사용자가 직접 바꾸기 전까지 거의 변하지 않는 값들이며, 해당 setter에서 즉시 무효화됩니다.
+CACHE_TTL = float(os.environ.get("DB_CACHE_TTL", 600))
+CACHE_MAX_SIZE = int(os.environ.get("DB_CACHE_MAX_SIZE", 10000))
+_nickname_cache = TTLCache('nickname', CACHE_MAX_SIZE, CACHE_TTL)
+_language_cache = TTLCache('channel_language', CACHE_MAX_SIZE, CACHE_TTL)
+_timezone_cache = TTLCache('timezone', CACHE_MAX_SIZE, CACHE_TTL)
+# 구독 만료/블랙리스트 만료는 시간이 지나면 바뀌므로 더 짧게 유지
+_subscription_cache = TTLCache('subscription', CACHE_MAX_SIZE, min(CACHE_TTL, 300))
+_blacklist_cache = TTLCache('blacklist', CACHE_MAX_SIZE, min(CACHE_TTL, 60))
+# (user_id, character_name) -> 대화 컨텍스트용 키워드 항목 목록 (키워드가 기록되면 무효화)
+_keyword_context_cache = TTLCache('keyword_context', CACHE_MAX_SIZE, CACHE_TTL)
+# 키워드가 기록될 때마다 증가. 조회 도중 기록이 있었으면 조회 결과를 캐시하지 않음 (무효화 직후 옛 값이 다시 들어가는 것 방지)
+_keyword_generation = 0
+_caches = (_nickname_cache, _language_cache, _timezone_cache, _subscription_cache, _blacklist_cache,
+           _keyword_context_cache)
+
+# --- Write-behind 큐 (추가 전용 로그 쓰기를 모아서 기록) ---
+def _register_write_behind_kinds(queue):
+    queue.register('conversation', """
+        INSERT INTO conversations (channel_id, user_id, character_name, message_role, content, language, timestamp, is_daily_message)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """)
+    queue.register('emotion_log', """
+        INSERT INTO affinity_log (user_id, character_name, score_change, message, timestamp)
+        VALUES (%s, %s, %s, %s, %s)
+    """)
+    # 로컬 감정 분류기 학습/평가용 GPT 라벨 (사용자와 무관하게 메시지와 점수만 기록)
+    queue.register('emotion_label', """
+        INSERT INTO emotion_log (score, message) VALUES (%s, %s)
+    """)
+    # 같은 배치 안의 중복 (user_id, 날짜)는 한 번만 반영
+    queue.register('login_streak', """
+        INSERT INTO user_login_streaks (user_id, last_login_date, current_streak)
+        VALUES (%s, %s, 1)
+        ON CONFLICT (user_id) DO UPDATE SET
+            current_streak = CASE
+                WHEN user_login_streaks.last_login_date = EXCLUDED.last_login_date THEN user_login_streaks.current_streak
+                WHEN user_login_streaks.last_login_date = EXCLUDED.last_login_date - 1 THEN user_login_streaks.current_streak + 1
+                ELSE 1
+            END,
+            last_login_date = EXCLUDED.last_login_date
+    """, prepare=lambda rows: list(dict.fromkeys(rows)))
+    # 키워드: 배치 전체를 INSERT ... ON CONFLICT 한 문장으로 기록
+    # 새 키워드는 1.0에서 시작하고, 언급될 때마다 신뢰도 +0.5 (최대 5.0)
+    # 배치 안에서 n번 언급된 키워드는 EXCLUDED.confidence_score = 1.0 + 0.5 * (n - 1)로 넘어오므로
+    # 기존 키워드에는 EXCLUDED.confidence_score - 0.5 = 0.5 * n을 더함
+    queue.register('keywords', """
+        INSERT INTO user_keywords (user_id, character_name, keyword_type, keyword_value, context, language, confidence_score)
+        VALUES %s
+        ON CONFLICT (user_id, character_name, keyword_type, keyword_value) DO UPDATE SET
+            confidence_score = LEAST(COALESCE(user_keywords.confidence_score, 1.0) + EXCLUDED.confidence_score - 0.5, 5.0),
+            updated_at = CURRENT_TIMESTAMP
+    """, prepare=_merge_keyword_rows, after_write=_invalidate_keyword_rows, multi_row=True)
+
+
+# 타입별 신뢰도 상위 KEYWORDS_PER_TYPE개 키워드 (전체는 신뢰도 순, format_keyword_parts 입력 형식)
+KEYWORD_CONTEXT_SUBQUERY = """
+    (SELECT COALESCE(json_agg(k), '[]'::json) FROM (
+        SELECT keyword_type, keyword_value FROM (
+            SELECT keyword_type, keyword_value, confidence_score, created_at,
+                   ROW_NUMBER() OVER (PARTITION BY keyword_type
+                                      ORDER BY confidence_score DESC, created_at DESC) AS type_rank
+              FROM user_keywords
+             WHERE user_id = %(user_id)s AND character_name = %(character_name)s) ranked
+         WHERE type_rank <= %(keywords_per_type)s
+         ORDER BY confidence_score DESC, created_at DESC) k)
+"""
+
+
+def _merge_keyword_rows(rows: list) -> list:
+    """같은 키워드를 한 행으로 합칩니다. (한 문장 안에서 같은 행을 두 번 갱신할 수 없음)"""
+    merged = {}
+    for row in rows:
+        key = (row['user_id'], row['character_name'], row['keyword_type'], row['keyword_value'])
+        if key in merged:
+            merged[key][1] += 1
+        else:
+            merged[key] = [row, 1]
+    return [
+        (*key, row['context'], row['language'], min(1.0 + 0.5 * (mentions - 1), 5.0))
+        for key, (row, mentions) in merged.items()
+    ]
+
+
+def _invalidate_keyword_rows(rows: list):
+    for user_id, character_name in {(row[0], row[1]) for row in rows}:
+        invalidate_keyword_context(user_id, character_name)
+
+
+def invalidate_keyword_context(user_id: int, character_name: str):
+    """키워드가 바뀐 (사용자, 캐릭터)의 컨텍스트 캐시를 비웁니다."""
+    global _keyword_generation
+    _keyword_generation += 1
+    _keyword_context_cache.invalidate((user_id, character_name))
+
+
+def _cache_keyword_parts(key, parts: list, generation: int):
+    if generation == _keyword_generation:
+        _keyword_context_cache.set(key, parts)
+
+
+def get_write_queue():
+    """로그성 쓰기에 사용하는 전역 write-behind 큐를 반환합니다."""
+    return get_write_behind(
+        getconn=lambda: get_pool(DATABASE_URL, sslmode='require').getconn(),
+        putconn=lambda conn: get_pool(DATABASE_URL, sslmode='require').putconn(conn),
+        setup=_register_write_behind_kinds,
+    )
+
+# --- 메모리 내 랭킹 (affinity를 한 번 읽은 뒤 update_affinity에서 갱신) ---
+LEADERBOARD_TOP_N = 20
+
+
+def _load_leaderboard_rows():
+    pool = get_pool(DATABASE_URL, sslmode='require')
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT user_id, character_name, emotion_score, daily_message_count FROM affinity")
+            rows = cursor.fetchall()
+        conn.commit()
+        return rows
+    finally:
+        pool.putconn(conn)
+
+
+_leaderboard = LeaderboardEngine(_load_leaderboard_rows)
+
+# update_affinity의 SELECT ... FOR UPDATE 행 잠금 대기 시간 (스레드 풀에서 갱신)
+_affinity_lock_metrics = {'updates': 0, 'wait_seconds': 0.0, 'max_wait_ms': 0.0, 'slow_waits': 0}
+_affinity_lock_metrics_lock = threading.Lock()
+# 이보다 오래 기다린 잠금은 slow_waits로 셈 (같은 사용자의 턴이 겹친 경우)
+AFFINITY_LOCK_SLOW_MS = 50
+
+
+def _record_affinity_lock_wait(waited: float):
+    with _affinity_lock_metrics_lock:
+        _affinity_lock_metrics['updates'] += 1
+        _affinity_lock_metrics['wait_seconds'] += waited
+        _affinity_lock_metrics['max_wait_ms'] = max(_affinity_lock_metrics['max_wait_ms'], round(waited * 1000, 1))
+        if waited * 1000 >= AFFINITY_LOCK_SLOW_MS:
+            _affinity_lock_metrics['slow_waits'] += 1
+
+# --- 호감도 등급별 메모리 요약 개수 ---
+MEMORY_SUMMARY_COUNTS = {
+    'Rookie': 1,
+    'Iron': 2,
+    'Bronze': 3,
+    'Silver': 4,
+    'Gold': 5
+}
+
 class DatabaseManager:
     def __init__(self):
         # 이미 인스턴스가 생성되었다면 중복 실행 방지
@@ -46,43 +209,67 @@ class DatabaseManager:
         # blacklist 테이블이 이제 setup_database에서 생성됩니다
 
     def get_connection(self):
-        """데이터베이스 연결을 가져옵니다."""
-        return psycopg2.connect(DATABASE_URL, sslmode='require')
+        """연결 풀에서 데이터베이스 연결을 대여합니다."""
+        return get_pool(DATABASE_URL, sslmode='require').getconn()
 
     def return_connection(self, conn):
-        """사용한 데이터베이스 연결을 닫습니다."""
+        """사용한 데이터베이스 연결을 풀로 반환합니다."""
         if conn:
-            conn.close()
+            get_pool(DATABASE_URL, sslmode='require').putconn(conn)
+
+    @property
+    def async_pool(self):
+        """코루틴에서 사용할 비동기 연결 풀을 반환합니다."""
+        return get_async_pool(DATABASE_URL, sslmode='require')
+
+    def get_pool_metrics(self) -> dict:
+        """연결 풀 상태(대여 중/유휴 연결 수, 대기 시간 등)를 반환합니다."""
+        return get_pool(DATABASE_URL, sslmode='require').get_metrics()
+
+    def get_write_queue_metrics(self) -> dict:
+        """write-behind 큐의 대기/기록/실패 행 수를 반환합니다."""
+        return get_write_queue().get_metrics()
+
+    def flush_writes(self):
+        """write-behind 큐에 남은 쓰기를 즉시 기록합니다."""
+        get_write_queue().flush()
+
+    def get_cache_metrics(self) -> dict:
+        """사용자 상태 캐시별 적중/미스 횟수와 크기를 반환합니다."""
+        return {cache.name: cache.get_metrics() for cache in _caches}
+
+    def clear_caches(self):
+        """모든 사용자 상태 캐시를 비웁니다. (DB를 직접 수정한 경우 등)"""
+        for cache in _caches:
+            cache.clear()
+
+    def __getattr__(self, name):
+        """
+        비동기 파사드: 동기 메서드 이름 앞에 'a'를 붙여 호출하면
+        (예: `await db.aget_affinity(user_id, character)`)
+        같은 메서드를 DB 전용 스레드 풀에서 실행하여 이벤트 루프를 막지 않습니다.
+        기존 동기 API는 그대로 유지되므로 스크립트에서는 계속 직접 호출하면 됩니다.
+        """
+        if name.startswith('a') and not name.startswith('__'):
+            method = getattr(type(self), name[1:], None)
+            if callable(method) and not inspect.iscoroutinefunction(method):
+                bound = method.__get__(self, type(self))
+
+                async def _offloaded(*args, **kwargs):
+                    return await self.async_pool.run_sync(bound, *args, **kwargs)
+
+                _offloaded.__name__ = name
+                _offloaded.__doc__ = method.__doc__
+                return _offloaded
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
 
     def setup_database(self):
-        """데이터베이스 초기화 및 필요한 컬럼 추가를 담당합니다."""
+        """데이터베이스 스키마를 최신 버전으로 맞춥니다. (최신이면 DDL 없이 버전만 확인)"""
         print("Setting up database tables for PostgreSQL...")
         conn = None
         try:
             conn = self.get_connection()
-            with conn.cursor() as cursor:
-                # blacklist 테이블 생성
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS blacklist (
-                        id SERIAL PRIMARY KEY,
-                        user_id BIGINT,
-                        username TEXT,
-                        reason TEXT,
-                        duration_days INTEGER, -- NULL이면 무제한
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        expires_at TIMESTAMP,
-                        created_by BIGINT, -- 관리자 ID
-                        is_active BOOLEAN DEFAULT TRUE,
-                        UNIQUE(user_id)
-                    )
-                ''')
-                
-                self._add_column_if_not_exists(cursor, 'affinity', 'last_quest_reward_date', 'DATE')
-                self._add_column_if_not_exists(cursor, 'user_cards', 'acquired_at', 'TIMESTAMP WITH TIME ZONE')
-                self._add_column_if_not_exists(cursor, 'affinity', 'highest_milestone_achieved', 'INTEGER DEFAULT 0')
-                self._add_column_if_not_exists(cursor, 'user_quest_events', 'character_name', 'TEXT')
-                self._add_column_if_not_exists(cursor, 'user_quest_events', 'card_id', 'TEXT')
-            conn.commit()
+            run_migrations(conn)
             print("Database setup completed.")
         except Exception as e:
             print(f"Error setting up database: {e}")
@@ -90,18 +277,12 @@ class DatabaseManager:
         finally:
             self.return_connection(conn)
 
-    def _add_column_if_not_exists(self, cursor, table, column, col_type):
-        """테이블에 특정 컬럼이 없으면 추가합니다."""
-        cursor.execute(f"""
-            SELECT 1 FROM information_schema.columns 
-            WHERE table_name='{table}' AND column_name='{column}'
-        """)
-        if not cursor.fetchone():
-            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
-            print(f"Column '{column}' added to table '{table}'.")
-
     # 언어 관련 함수
     def get_channel_language(self, channel_id: int, user_id: int, character_name: str) -> str:
+        cache_key = (channel_id, user_id, character_name)
+        cached = _language_cache.get(cache_key)
+        if cached is not MISSING:
+            return cached
         conn = None
         try:
             conn = self.get_connection()
@@ -111,7 +292,9 @@ class DatabaseManager:
                     (channel_id, user_id, character_name)
                 )
                 result = cursor.fetchone()
-                return result[0] if result else self.default_language
+                language = result[0] if result else self.default_language
+                _language_cache.set(cache_key, language)
+                return language
         except Exception as e:
             print(f"Error getting channel language: {e}")
             return self.default_language
@@ -130,6 +313,7 @@ class DatabaseManager:
                     DO UPDATE SET language = EXCLUDED.language, updated_at = EXCLUDED.updated_at;
                 """, (channel_id, user_id, character_name, language, datetime.now()))
             conn.commit()
+            _language_cache.set((channel_id, user_id, character_name), language)
             return True
         except Exception as e:
             print(f"Error in set_channel_language: {e}")
@@ -140,7 +324,17 @@ class DatabaseManager:
 
     # 메시지 관련 함수
     def add_message(self, channel_id: int, user_id: int, character_name: str, role: str, content: str, language: str = None, is_daily_message: bool = True):
+        """
+        대화 메시지를 저장합니다.
+        사용자 메시지는 메시지 한도 카운터와 함께 즉시 기록하고,
+        그 외(봇 응답 등)는 write-behind 큐로 모아서 기록합니다.
+        """
         print(f"[DEBUG] add_message called: channel_id={channel_id}, user_id={user_id}, character_name={character_name}, role={role}, content={content}, language={language}, is_daily_message={is_daily_message}")
+        if role != 'user':
+            get_write_queue().submit('conversation', (
+                channel_id, user_id, character_name, role, content, language, datetime.now(CST), is_daily_message
+            ))
+            return
         conn = None
         try:
             conn = self.get_connection()
@@ -153,15 +347,8 @@ class DatabaseManager:
                     "INSERT INTO conversations (channel_id, user_id, character_name, message_role, content, language, timestamp, is_daily_message) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
                     (channel_id, user_id, character_name, role, content, language, now_cst, is_daily_message)
                 )
-                
-                # INSERT 후 실제로 저장된 데이터 확인
-                cursor.execute(
-                    "SELECT timestamp, is_daily_message FROM conversations WHERE user_id = %s ORDER BY id DESC LIMIT 1",
-                    (user_id,)
-                )
-                saved_data = cursor.fetchone()
-                print(f"[DEBUG] add_message - saved timestamp: {saved_data[0]}, is_daily_message: {saved_data[1]}")
-                
+                # 같은 트랜잭션에서 일일 사용량 카운터 갱신
+                self._increment_daily_usage(cursor, user_id, language, is_daily_message, now_cst)
             conn.commit()
             print(f"[DEBUG] add_message DB INSERT SUCCESS for user_id={user_id}, character_name={character_name}, timestamp={now_cst}, is_daily_message={is_daily_message}")
         except Exception as e:
@@ -170,6 +357,174 @@ class DatabaseManager:
         finally:
             self.return_connection(conn)
 
+    def _increment_daily_usage(self, cursor, user_id: int, language: str, is_daily_message: bool, now: datetime):
+        """user_daily_usage 카운터를 UTC(메시지 한도)/CST(퀘스트) 날짜 기준으로 1 증가시킵니다."""
+        daily_inc, paid_inc = (1, 0) if is_daily_message else (0, 1)
+        rows = [
+            (user_id, 'UTC', now.astimezone(UTC).date(), language or '', daily_inc, paid_inc),
+            (user_id, 'CST', now.astimezone(CST).date(), language or '', daily_inc, paid_inc),
+        ]
+        cursor.executemany("""
+            INSERT INTO user_daily_usage (user_id, calendar, usage_date, language, daily_count, paid_count)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (user_id, calendar, usage_date, language) DO UPDATE SET
+                daily_count = user_daily_usage.daily_count + EXCLUDED.daily_count,
+                paid_count = user_daily_usage.paid_count + EXCLUDED.paid_count
+        """, rows)
+
+    def _get_daily_usage(self, user_id: int, calendar: str, usage_date: date, column: str, language: str = None) -> int:
+        """user_daily_usage에서 하루 사용량 합계를 조회합니다. column은 카운터 컬럼 표현식입니다."""
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cursor:
+                query = f"SELECT COALESCE(SUM({column}), 0) FROM user_daily_usage WHERE user_id = %s AND calendar = %s AND usage_date = %s"
+                params = [user_id, calendar, usage_date]
+                if language is not None:
+                    query += " AND language = %s"
+                    params.append(language)
+                cursor.execute(query, params)
+                return cursor.fetchone()[0]
+        finally:
+            self.return_connection(conn)
+
+    def rebuild_daily_usage_counters(self, days: int = None) -> int:
+        """
+        conversations 테이블로부터 user_daily_usage 카운터를 다시 계산합니다. (백필/복구용)
+        days가 주어지면 최근 N일만 다시 계산하고, 없으면 전체를 재구성합니다.
+        재구성된 카운터 행 수를 반환합니다.
+        """
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cursor:
+                # 다시 계산하는 동안 add_message(_increment_daily_usage)의 증가를 막음
+                # (INSERT ... ON CONFLICT가 잡는 ROW EXCLUSIVE와 충돌하므로 증가는 재구성이 커밋된 뒤에 반영되고,
+                #  이미 커밋된 메시지는 아래 SELECT에 포함되어 빠지거나 두 번 세는 일이 없음)
+                cursor.execute("LOCK TABLE user_daily_usage IN SHARE ROW EXCLUSIVE MODE")
+                since = None
+                if days is not None:
+                    since = datetime.utcnow().date() - timedelta(days=days)
+                    cursor.execute("DELETE FROM user_daily_usage WHERE usage_date >= %s", (since,))
+                else:
+                    cursor.execute("DELETE FROM user_daily_usage")
+                day_expressions = {
+                    'UTC': "DATE(timestamp AT TIME ZONE 'UTC' AT TIME ZONE 'UTC')",
+                    'CST': "DATE(timestamp AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Shanghai')",
+                }
+                rebuilt = 0
+                for calendar, day_expr in day_expressions.items():
+                    cursor.execute(f"""
+                        INSERT INTO user_daily_usage (user_id, calendar, usage_date, language, daily_count, paid_count)
+                        SELECT user_id, %s, {day_expr}, COALESCE(language, ''),
+                               COUNT(*) FILTER (WHERE is_daily_message IS NOT FALSE),
+                               COUNT(*) FILTER (WHERE is_daily_message = false)
+                        FROM conversations
+                        WHERE message_role = 'user' AND user_id IS NOT NULL
+                          AND (%s::date IS NULL OR {day_expr} >= %s::date)
+                        GROUP BY user_id, {day_expr}, COALESCE(language, '')
+                    """, (calendar, since, since))
+                    rebuilt += cursor.rowcount
+            conn.commit()
+            print(f"[DailyUsage] Rebuilt {rebuilt} counter rows" + (f" since {since}" if since else ""))
+            return rebuilt
+        except Exception as e:
+            print(f"Error rebuilding daily usage counters: {e}")
+            if conn: conn.rollback()
+            return 0
+        finally:
+            self.return_connection(conn)
+
+    def get_user_messages_page(self, after_id: int = 0, limit: int = 1000, days: int = None) -> list:
+        """
+        사용자 메시지를 id 순으로 after_id 다음부터 limit개 반환합니다. (키워드 백필용 키셋 페이지네이션)
+        [(id, user_id, character_name, content, language), ...]
+        """
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cursor:
+                since = datetime.utcnow() - timedelta(days=days) if days is not None else None
+                cursor.execute("""
+                    SELECT id, user_id, character_name, content, language
+                    FROM conversations
+                    WHERE id > %s AND message_role = 'user' AND user_id IS NOT NULL
+                      AND content IS NOT NULL AND content <> ''
+                      AND (%s::timestamp IS NULL OR timestamp >= %s::timestamp)
+                    ORDER BY id
+                    LIMIT %s
+                """, (after_id, since, since, limit))
+                return cursor.fetchall()
+        except Exception as e:
+            print(f"Error getting user messages page: {e}")
+            return []
+        finally:
+            if conn:
+                self.return_connection(conn)
+
+    def load_session_snapshots(self, map_name: str) -> list:
+        """세션 맵 스냅샷을 반환합니다. [(session_key, payload, last_access), ...]"""
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT session_key, payload, last_access FROM session_snapshots WHERE map_name = %s",
+                    (map_name,)
+                )
+                return cursor.fetchall()
+        except Exception as e:
+            print(f"Error loading session snapshots for {map_name}: {e}")
+            return []
+        finally:
+            if conn:
+                self.return_connection(conn)
+
+    def load_all_session_snapshots(self) -> list:
+        """모든 세션 맵의 스냅샷을 반환합니다. [(map_name, session_key, payload, last_access), ...] (시작할 때 한 번)"""
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT map_name, session_key, payload, last_access FROM session_snapshots")
+                return cursor.fetchall()
+        except Exception as e:
+            print(f"Error loading session snapshots: {e}")
+            return []
+        finally:
+            if conn:
+                self.return_connection(conn)
+
+    def save_session_snapshots(self, map_name: str, upserts: list, deletes: list) -> bool:
+        """바뀐 세션만 업서트하고 사라진 세션은 삭제합니다. upserts: [(session_key, payload, last_access), ...]"""
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cursor:
+                if upserts:
+                    execute_values(cursor, """
+                        INSERT INTO session_snapshots (map_name, session_key, payload, last_access)
+                        VALUES %s
+                        ON CONFLICT (map_name, session_key) DO UPDATE
+                        SET payload = EXCLUDED.payload, last_access = EXCLUDED.last_access,
+                            updated_at = CURRENT_TIMESTAMP
+                    """, [(map_name, key, payload, last_access) for key, payload, last_access in upserts])
+                if deletes:
+                    cursor.execute(
+                        "DELETE FROM session_snapshots WHERE map_name = %s AND session_key = ANY(%s)",
+                        (map_name, list(deletes))
+                    )
+            conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error saving session snapshots for {map_name}: {e}")
+            if conn:
+                conn.rollback()
+            return False
+        finally:
+            if conn:
+                self.return_connection(conn)
+
     def get_recent_messages(self, channel_id: int, limit: int = 10):
         conn = None
         try:
@@ -217,8 +572,10 @@ class DatabaseManager:
             with conn.cursor() as cursor:
                 today = get_today_cst()
 
+                lock_start = time.perf_counter()
                 cursor.execute("SELECT emotion_score, daily_message_count, last_daily_reset FROM affinity WHERE user_id = %s AND character_name = %s FOR UPDATE", (user_id, character_name))
                 result = cursor.fetchone()
+                _record_affinity_lock_wait(time.perf_counter() - lock_start)
 
                 if result:
                     current_score, daily_count, last_reset = result
@@ -231,12 +588,14 @@ class DatabaseManager:
                     """, (new_score, daily_count, today, last_message_time, last_message, highest_milestone, user_id, character_name))
                 else:
                     new_score = score_change
+                    daily_count = 1
                     cursor.execute("""
                         INSERT INTO affinity (user_id, character_name, emotion_score, daily_message_count, last_daily_reset, last_message_time, last_message_content, highest_milestone_achieved)
                         VALUES (%s, %s, %s, 1, %s, %s, %s, %s)
                     """, (user_id, character_name, new_score, today, last_message_time, last_message, highest_milestone))
 
                 conn.commit()
+                _leaderboard.update(user_id, character_name, new_score, daily_count)
                 return new_score
         except Exception as e:
             print(f"Error updating affinity: {e}")
@@ -302,41 +661,50 @@ class DatabaseManager:
         finally:
             self.return_connection(conn)
 
-    def get_character_ranking(self, character_name: str):
-        """특정 캐릭터의 랭킹을 반환합니다 (user_id, emotion_score, daily_message_count)"""
-        EXCLUDE_BOT_IDS = [1363156675959460061]
-        conn = None
+    def get_character_ranking(self, character_name: str, limit: int = LEADERBOARD_TOP_N):
+        """특정 캐릭터의 상위 랭킹을 반환합니다 (user_id, emotion_score, daily_message_count)"""
         try:
-            conn = self.get_connection()
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    "SELECT user_id, emotion_score, daily_message_count FROM affinity WHERE character_name = %s AND user_id NOT IN %s ORDER BY emotion_score DESC",
-                    (character_name, tuple(EXCLUDE_BOT_IDS))
-                )
-                return cursor.fetchall()
+            return _leaderboard.top(character_name, limit)
         except Exception as e:
             print(f"Error getting character ranking: {e}")
             return []
-        finally:
-            self.return_connection(conn)
 
     def get_user_character_rank(self, user_id: int, character_name: str) -> int:
         """특정 캐릭터에서 유저의 랭킹을 반환합니다"""
-        conn = None
         try:
-            conn = self.get_connection()
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    "SELECT COUNT(*) + 1 FROM affinity WHERE character_name = %s AND emotion_score > (SELECT emotion_score FROM affinity WHERE user_id = %s AND character_name = %s)",
-                    (character_name, user_id, character_name)
-                )
-                result = cursor.fetchone()
-                return result[0] if result else 999999
+            rank = _leaderboard.rank(user_id, character_name)
+            return rank if rank is not None else 999999
         except Exception as e:
             print(f"Error getting user character rank: {e}")
             return 999999
-        finally:
-            self.return_connection(conn)
+
+    def get_ranking_stats(self, user_id: int, character_name: str = None) -> dict:
+        """랭킹 화면용 유저 점수/메시지 수를 메모리 랭킹에서 반환합니다. (get_user_stats와 같은 형태)"""
+        try:
+            entry = _leaderboard.entry(user_id, character_name or TOTAL)
+        except Exception as e:
+            print(f"Error getting ranking stats: {e}")
+            return self.get_user_stats(user_id, character_name)
+        score, messages = entry or (0, 0)
+        if character_name:
+            return {'affinity': score, 'messages': messages}
+        return {'total_emotion': score, 'total_messages': messages}
+
+    def get_affinity_lock_metrics(self) -> dict:
+        """update_affinity의 행 잠금(SELECT ... FOR UPDATE) 대기 시간 통계를 반환합니다."""
+        with _affinity_lock_metrics_lock:
+            metrics = dict(_affinity_lock_metrics)
+        updates = metrics.pop('updates')
+        wait_seconds = metrics.pop('wait_seconds')
+        return {
+            'updates': updates,
+            'avg_wait_ms': round(wait_seconds / updates * 1000, 2) if updates else 0.0,
+            **metrics,
+        }
+
+    def get_leaderboard_metrics(self) -> dict:
+        """메모리 랭킹의 적재/갱신/조회 횟수와 보드별 사용자 수를 반환합니다."""
+        return _leaderboard.get_metrics()
 
     def get_user_stats(self, user_id: int, character_name: str = None) -> dict:
         """유저의 통계 정보를 반환합니다"""
@@ -376,41 +744,22 @@ class DatabaseManager:
         finally:
             self.return_connection(conn)
 
-    def get_total_ranking(self):
-        """전체 랭킹을 반환합니다 (user_id, total_emotion_score, total_messages)"""
-        EXCLUDE_BOT_IDS = [1363156675959460061]
-        conn = None
+    def get_total_ranking(self, limit: int = LEADERBOARD_TOP_N):
+        """전체 상위 랭킹을 반환합니다 (user_id, total_emotion_score, total_messages)"""
         try:
-            conn = self.get_connection()
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    "SELECT user_id, SUM(emotion_score) as total_score, SUM(daily_message_count) as total_messages FROM affinity WHERE user_id NOT IN %s GROUP BY user_id ORDER BY total_score DESC",
-                    (tuple(EXCLUDE_BOT_IDS),)
-                )
-                return cursor.fetchall()
+            return _leaderboard.top(TOTAL, limit)
         except Exception as e:
             print(f"Error getting total ranking: {e}")
             return []
-        finally:
-            self.return_connection(conn)
 
     def get_user_total_rank(self, user_id: int) -> int:
         """전체 랭킹에서 유저의 순위를 반환합니다"""
-        conn = None
         try:
-            conn = self.get_connection()
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    "SELECT COUNT(*) + 1 FROM (SELECT user_id, SUM(emotion_score) as total_score FROM affinity GROUP BY user_id) ranked WHERE total_score > (SELECT SUM(emotion_score) FROM affinity WHERE user_id = %s)",
-                    (user_id,)
-                )
-                result = cursor.fetchone()
-                return result[0] if result else 999999
+            rank = _leaderboard.rank(user_id, TOTAL)
+            return rank if rank is not None else 999999
         except Exception as e:
             print(f"Error getting user total rank: {e}")
             return 999999
-        finally:
-            self.return_connection(conn)
 
     # 카드 관련 함수
     def get_user_cards(self, user_id: int, character_name: str = None) -> list:
@@ -672,13 +1021,18 @@ class DatabaseManager:
 
     # 닉네임 및 키워드 관련 함수
     def get_user_nickname(self, user_id: int, character_name: str) -> str | None:
+        cached = _nickname_cache.get((user_id, character_name))
+        if cached is not MISSING:
+            return cached
         conn = None
         try:
             conn = self.get_connection()
             with conn.cursor() as cursor:
                 cursor.execute("SELECT nickname FROM user_nicknames WHERE user_id = %s AND character_name = %s", (user_id, character_name))
                 result = cursor.fetchone()
-                return result[0] if result else None
+                nickname = result[0] if result else None
+                _nickname_cache.set((user_id, character_name), nickname)
+                return nickname
         except Exception as e:
             print(f"Error getting user nickname: {e}")
             return None
@@ -697,6 +1051,7 @@ class DatabaseManager:
                     ON CONFLICT (user_id, character_name) DO UPDATE SET nickname = EXCLUDED.nickname, updated_at = NOW()
                 """, (user_id, character_name, nickname, True))
             conn.commit()
+            _nickname_cache.set((user_id, character_name), nickname)
             return True
         except Exception as e:
             print(f"[ERROR] Error setting user nickname: {e}")
@@ -718,6 +1073,36 @@ class DatabaseManager:
         finally:
             self.return_connection(conn)
 
+    def get_keyword_context_parts(self, user_id: int, character_name: str) -> list:
+        """
+        대화 컨텍스트용 키워드 항목("타입: 값1, 값2")을 반환합니다.
+        (user_id, character_name)별로 캐시하며, 키워드가 기록되면 무효화됩니다.
+        """
+        key = (user_id, character_name)
+        cached = _keyword_context_cache.get(key)
+        if cached is not MISSING:
+            return cached
+        generation = _keyword_generation
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cursor:
+                cursor.execute(f"SELECT {KEYWORD_CONTEXT_SUBQUERY}", {
+                    'user_id': user_id,
+                    'character_name': character_name,
+                    'keywords_per_type': KEYWORDS_PER_TYPE,
+                })
+                rows = cursor.fetchone()[0]
+            parts = format_keyword_parts([{'type': k['keyword_type'], 'value': k['keyword_value']} for k in rows])
+            _cache_keyword_parts(key, parts, generation)
+            return parts
+        except Exception as e:
+            print(f"Error getting keyword context: {e}")
+            return []
+        finally:
+            if conn:
+                self.return_connection(conn)
+
     def add_user_keyword(self, user_id: int, character_name: str, keyword: str, context: str):
         print(f"[DEBUG] add_user_keyword called: user_id={user_id}, character_name={character_name}, keyword={keyword}, context={context}")
         conn = None
@@ -725,10 +1110,15 @@ class DatabaseManager:
             conn = self.get_connection()
             with conn.cursor() as cursor:
                 cursor.execute(
-                    "INSERT INTO user_keywords (user_id, character_name, keyword_type, keyword_value, context) VALUES (%s, %s, %s, %s, %s)",
+                    """
+                    INSERT INTO user_keywords (user_id, character_name, keyword_type, keyword_value, context) VALUES (%s, %s, %s, %s, %s)
+                    ON CONFLICT (user_id, character_name, keyword_type, keyword_value) DO UPDATE SET
+                        context = EXCLUDED.context, updated_at = CURRENT_TIMESTAMP
+                    """,
                     (user_id, character_name, 'default', keyword, context)
                 )
             conn.commit()
+            invalidate_keyword_context(user_id, character_name)
             print(f"[DEBUG] add_user_keyword DB INSERT SUCCESS for user_id={user_id}, character_name={character_name}, keyword={keyword}")
         except Exception as e:
             print(f"Error adding user keyword to DB: {e}")
@@ -834,14 +1224,7 @@ class DatabaseManager:
             conn = self.get_connection()
             with conn.cursor() as cursor:
                 # 호감도 등급에 따른 요약 개수 결정
-                summary_counts = {
-                    'Rookie': 1,
-                    'Iron': 2,
-                    'Bronze': 3,
-                    'Silver': 4,
-                    'Gold': 5
-                }
-                limit = summary_counts.get(affinity_grade, 2)
+                limit = MEMORY_SUMMARY_COUNTS.get(affinity_grade, 2)
 
                 cursor.execute('''
                     SELECT summary, created_at, quality_score
@@ -901,6 +1284,99 @@ class DatabaseManager:
         finally:
             self.return_connection(conn)
 
+    def count_messages_since_summary(self, user_id: int, character_name: str) -> int:
+        """마지막 메모리 요약(워터마크) 이후 쌓인 사용자 메시지 수를 반환합니다."""
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT COUNT(*) FROM conversations
+                    WHERE user_id = %s AND character_name = %s AND message_role = 'user'
+                      AND id > COALESCE((SELECT last_message_id FROM memory_summary_watermarks
+                                         WHERE user_id = %s AND character_name = %s), 0)
+                """, (user_id, character_name, user_id, character_name))
+                result = cursor.fetchone()
+                return result[0] if result else 0
+        except Exception as e:
+            print(f"Error counting messages since summary: {e}")
+            return 0
+        finally:
+            self.return_connection(conn)
+
+    def get_messages_since_summary(self, user_id: int, character_name: str, limit: int = 40) -> list:
+        """
+        워터마크 이후 대화 중 가장 오래된 limit개를 오래된 순으로 반환합니다.
+        (밀린 대화는 워터마크를 옮기며 앞에서부터 차례로 요약하므로 건너뛰는 대화가 없음)
+        [{"id", "role", "content"}, ...]
+        """
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT id, message_role, content FROM conversations
+                    WHERE user_id = %s AND character_name = %s
+                      AND id > COALESCE((SELECT last_message_id FROM memory_summary_watermarks
+                                         WHERE user_id = %s AND character_name = %s), 0)
+                    ORDER BY id ASC
+                    LIMIT %s
+                """, (user_id, character_name, user_id, character_name, limit))
+                rows = cursor.fetchall()
+                return [{"id": row[0], "role": row[1], "content": row[2]} for row in rows]
+        except Exception as e:
+            print(f"Error getting messages since summary: {e}")
+            return []
+        finally:
+            self.return_connection(conn)
+
+    def advance_summary_watermark(self, user_id: int, character_name: str, message_id: int) -> bool:
+        """마지막으로 요약한 대화 id를 기록합니다. (뒤로 가지 않음)"""
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO memory_summary_watermarks (user_id, character_name, last_message_id)
+                    VALUES (%s, %s, %s)
+                    ON CONFLICT (user_id, character_name) DO UPDATE
+                    SET last_message_id = GREATEST(memory_summary_watermarks.last_message_id, EXCLUDED.last_message_id),
+                        updated_at = CURRENT_TIMESTAMP
+                """, (user_id, character_name, message_id))
+            conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error advancing summary watermark: {e}")
+            if conn: conn.rollback()
+            return False
+        finally:
+            self.return_connection(conn)
+
+    def get_memory_documents(self, user_id: int, character_name: str):
+        """
+        검색 인덱스(memory_index)에 넣을 메모리 요약과 에피소드를 오래된 순으로 가져옵니다.
+        [(문서 id, 내용, 시각), ...] 문서 id는 's:<요약 id>' 또는 'e:<에피소드 id>'.
+        오류가 나면 인덱스를 비우지 않도록 None을 반환합니다.
+        """
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT 's:' || id, summary, created_at FROM memory_summaries
+                     WHERE user_id = %s AND character_name = %s
+                    UNION ALL
+                    SELECT 'e:' || episode_id, summary, timestamp FROM episodes
+                     WHERE user_id = %s AND character = %s AND summary IS NOT NULL
+                    ORDER BY 3
+                """, (user_id, character_name, user_id, character_name))
+                return cursor.fetchall()
+        except Exception as e:
+            print(f"Error getting memory documents: {e}")
+            return None
+        finally:
+            self.return_connection(conn)
+
     def get_user_character_messages(self, user_id: int, character_name: str, limit: int = 20):
         """특정 캐릭터와의 메시지 기록을 가져옵니다."""
         conn = None
@@ -927,6 +1403,126 @@ class DatabaseManager:
         finally:
             self.return_connection(conn)
 
+    def get_turn_snapshot(self, user_id: int, character_name: str, recent_limit: int = 5) -> dict:
+        """
+        한 턴 처리에 필요한 사용자 상태를 단일 쿼리로 가져옵니다.
+        (메시지 사용량/잔액, 구독, 호감도, 닉네임, 메모리 요약, 키워드, 최근 메시지)
+        각 값의 형식은 개별 조회 메서드(get_affinity, get_user_character_messages 등)와 같습니다.
+        keyword_parts는 컨텍스트용으로 포맷된 키워드 항목이며, 캐시에 있으면 키워드는 조회하지 않습니다.
+        """
+        keyword_key = (user_id, character_name)
+        keyword_parts = _keyword_context_cache.get(keyword_key)
+        keyword_generation = _keyword_generation
+        snapshot = {
+            'daily_used': 0,
+            'paid_used': 0,
+            'paid_balance': 0,
+            'is_admin': self.is_user_admin(user_id),
+            'is_subscribed': False,
+            'subscription_daily_messages': 0,
+            'affinity': None,
+            'nickname': None,
+            'memory_summaries': [],
+            'keyword_parts': [] if keyword_parts is MISSING else keyword_parts,
+            'recent_messages': [],
+        }
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(f"""
+                    SELECT
+                        (SELECT COALESCE(SUM(daily_count), 0) FROM user_daily_usage
+                          WHERE user_id = %(user_id)s AND calendar = 'UTC'
+                            AND usage_date = %(today_utc)s) AS daily_used,
+                        (SELECT COALESCE(SUM(paid_count), 0) FROM user_daily_usage
+                          WHERE user_id = %(user_id)s AND calendar = 'UTC'
+                            AND usage_date = %(today_utc)s) AS paid_used,
+                        (SELECT total_messages FROM user_message_balance
+                          WHERE user_id = %(user_id)s) AS paid_balance,
+                        EXISTS (SELECT 1 FROM user_subscriptions
+                          WHERE user_id = %(user_id)s AND is_active = TRUE AND end_date > NOW()) AS is_subscribed,
+                        (SELECT p.rewards FROM user_subscriptions us
+                           JOIN products p ON us.product_id = p.id
+                          WHERE us.user_id = %(user_id)s AND us.is_active = true AND us.end_date > NOW()
+                          ORDER BY (p.rewards->>'daily_messages')::int DESC
+                          LIMIT 1) AS subscription_rewards,
+                        a.user_id IS NOT NULL AS has_affinity,
+                        a.emotion_score, a.daily_message_count, a.last_daily_reset,
+                        a.last_quest_reward_date, a.highest_milestone_achieved, a.last_message_time,
+                        n.nickname,
+                        (SELECT COALESCE(json_agg(m), '[]'::json) FROM (
+                            SELECT summary, created_at, quality_score FROM memory_summaries
+                             WHERE user_id = %(user_id)s AND character_name = %(character_name)s
+                             ORDER BY quality_score DESC, created_at DESC
+                             LIMIT %(summary_limit)s) m) AS memory_summaries,
+                        {KEYWORD_CONTEXT_SUBQUERY if keyword_parts is MISSING else 'NULL'} AS keywords,
+                        (SELECT COALESCE(json_agg(r), '[]'::json) FROM (
+                            SELECT message_role, content, language FROM conversations
+                             WHERE user_id = %(user_id)s AND character_name = %(character_name)s
+                             ORDER BY timestamp DESC
+                             LIMIT %(recent_limit)s) r) AS recent_messages
+                    FROM (SELECT 1) AS one
+                    LEFT JOIN affinity a ON a.user_id = %(user_id)s AND a.character_name = %(character_name)s
+                    LEFT JOIN user_nicknames n ON n.user_id = %(user_id)s AND n.character_name = %(character_name)s
+                """, {
+                    'user_id': user_id,
+                    'character_name': character_name,
+                    'summary_limit': max(MEMORY_SUMMARY_COUNTS.values()),
+                    'recent_limit': recent_limit,
+                    'keywords_per_type': KEYWORDS_PER_TYPE,
+                    'today_utc': datetime.utcnow().date(),
+                })
+                row = cursor.fetchone()
+
+            snapshot['daily_used'] = row['daily_used'] or 0
+            snapshot['paid_used'] = row['paid_used'] or 0
+            snapshot['paid_balance'] = row['paid_balance'] or 0
+            snapshot['is_subscribed'] = row['is_subscribed']
+            rewards = row['subscription_rewards']
+            if rewards:
+                rewards_data = json.loads(rewards) if isinstance(rewards, str) else rewards
+                snapshot['subscription_daily_messages'] = rewards_data.get('daily_messages', 0)
+            if row['has_affinity']:
+                affinity = {
+                    key: row[key] for key in (
+                        'emotion_score', 'daily_message_count', 'last_daily_reset',
+                        'last_quest_reward_date', 'highest_milestone_achieved', 'last_message_time'
+                    )
+                }
+                # last_daily_reset 날짜를 CST 기준으로 오늘과 비교 (get_affinity와 동일)
+                if affinity['last_daily_reset'] != get_today_cst():
+                    affinity['daily_message_count'] = 0
+                snapshot['affinity'] = affinity
+            snapshot['nickname'] = row['nickname']
+            snapshot['memory_summaries'] = [
+                (m['summary'], datetime.fromisoformat(m['created_at']), m['quality_score'])
+                for m in row['memory_summaries']
+            ]
+            if row['keywords'] is not None:
+                snapshot['keyword_parts'] = format_keyword_parts(
+                    [{'type': k['keyword_type'], 'value': k['keyword_value']} for k in row['keywords']]
+                )
+                _cache_keyword_parts(keyword_key, snapshot['keyword_parts'], keyword_generation)
+            snapshot['recent_messages'] = [
+                {
+                    "role": r['message_role'],
+                    "content": r['content'],
+                    "language": r['language'] if r['language'] else "ko"
+                }
+                for r in row['recent_messages']
+            ]
+            return snapshot
+        except Exception as e:
+            print(f"Error getting turn snapshot: {e}")
+            return snapshot
+        finally:
+            self.return_connection(conn)
+
+    def select_memory_summaries(self, summaries: list, affinity_grade: str) -> list:
+        """get_turn_snapshot의 메모리 요약 중 호감도 등급에 맞는 개수만 반환합니다."""
+        return summaries[:MEMORY_SUMMARY_COUNTS.get(affinity_grade, 2)]
+
     def get_user_messages(self, user_id: int, limit: int = 20):
         """사용자의 모든 캐릭터와의 최근 대화 기록 조회"""
         conn = None
@@ -1031,78 +1627,19 @@ class DatabaseManager:
 
     def get_total_daily_messages(self, user_id: int) -> int:
         """CST 기준으로 오늘 하루 동안 사용자가 보낸 총 메시지 수를 반환합니다."""
-        conn = None
         try:
-            conn = self.get_connection()
-            with conn.cursor() as cursor:
-                today_cst = get_today_cst()
-                print(f"[DEBUG] get_total_daily_messages - user_id={user_id}, today_cst={today_cst}")
-                
-                # 먼저 해당 사용자의 모든 메시지를 확인
-                cursor.execute(
-                    "SELECT timestamp, message_role FROM conversations WHERE user_id = %s ORDER BY timestamp DESC LIMIT 5",
-                    (user_id,)
-                )
-                recent_messages = cursor.fetchall()
-                print(f"[DEBUG] get_total_daily_messages - recent messages: {recent_messages}")
-                
-                # 전체 메시지 수도 확인
-                cursor.execute(
-                    "SELECT COUNT(*) FROM conversations WHERE user_id = %s",
-                    (user_id,)
-                )
-                total_count = cursor.fetchone()[0]
-                print(f"[DEBUG] get_total_daily_messages - total messages for user: {total_count}")
-                
-                # 오늘 날짜의 메시지 수 확인 (단순 날짜 비교)
-                cursor.execute(
-                    "SELECT COUNT(*) FROM conversations WHERE user_id = %s AND DATE(timestamp) = %s AND message_role = 'user'",
-                    (user_id, today_cst)
-                )
-                count_simple = cursor.fetchone()[0]
-                print(f"[DEBUG] get_total_daily_messages - count (simple date): {count_simple}")
-                
-                # CST 시간대 변환을 사용한 정확한 계산
-                try:
-                    cursor.execute(
-                        "SELECT COUNT(*) FROM conversations WHERE user_id = %s AND DATE(timestamp AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Shanghai') = %s AND message_role = 'user'",
-                        (user_id, today_cst)
-                    )
-                    count = cursor.fetchone()[0]
-                    print(f"[DEBUG] get_total_daily_messages - count (with timezone): {count}")
-                    
-                    # 시간대 변환이 성공하고 결과가 있으면 사용
-                    if count > 0:
-                        return count
-                except Exception as timezone_error:
-                    print(f"[DEBUG] get_total_daily_messages - timezone conversion failed: {timezone_error}")
-                
-                # 시간대 변환이 실패하거나 결과가 없으면 단순 날짜 비교 사용
-                print(f"[DEBUG] get_total_daily_messages - using simple date count as fallback")
-                return count_simple
+            return self._get_daily_usage(user_id, 'CST', get_today_cst(), 'daily_count + paid_count')
         except Exception as e:
             print(f"Error getting total daily messages: {e}")
             return 0
-        finally:
-            self.return_connection(conn)
 
     def get_english_daily_messages(self, user_id: int) -> int:
         """CST 기준으로 오늘 하루 동안 사용자가 보낸 영어 메시지 수를 반환합니다. (데일리 퀘스트용)"""
-        conn = None
         try:
-            conn = self.get_connection()
-            with conn.cursor() as cursor:
-                today_cst = get_today_cst()
-                cursor.execute(
-                    "SELECT COUNT(*) FROM conversations WHERE user_id = %s AND DATE(timestamp AT TIME ZONE 'Asia/Shanghai') = %s AND message_role = 'user' AND language = 'en'",
-                    (user_id, today_cst)
-                )
-                return cursor.fetchone()[0]
+            return self._get_daily_usage(user_id, 'CST', get_today_cst(), 'daily_count + paid_count', language='en')
         except Exception as e:
             print(f"Error getting English daily messages: {e}")
             return 0
-        finally:
-            self.return_connection(conn)
 
     def get_today_cards(self, user_id: int) -> int:
         """CST 기준으로 오늘 하루 동안 사용자가 획득한 카드 수를 반환합니다."""
@@ -1122,6 +1659,23 @@ class DatabaseManager:
         finally:
             self.return_connection(conn)
 
+    def queue_login_streak(self, user_id: int):
+        """
+        연속 로그인 기록 갱신을 write-behind 큐에 넣습니다.
+        매 메시지마다 호출되는 경로용이며, 즉시 결과가 필요하면 update_login_streak을 사용합니다.
+        """
+        try:
+            get_write_queue().submit('login_streak', (user_id, get_today_cst()))
+        except Exception as e:
+            print(f"Error queueing login streak: {e}")
+
+    async def aqueue_login_streak(self, user_id: int):
+        """queue_login_streak의 코루틴 버전. 큐가 가득 차도 이벤트 루프를 막지 않고 워커 스레드에서 기다립니다."""
+        try:
+            await get_write_queue().enqueue('login_streak', (user_id, get_today_cst()))
+        except Exception as e:
+            print(f"Error queueing login streak: {e}")
+
     def update_login_streak(self, user_id: int):
         """
         사용자의 연속 로그인 기록을 업데이트합니다.
@@ -1416,23 +1970,43 @@ class DatabaseManager:
         return len(completed) >= total_chapters
 
     def add_emotion_log(self, user_id: int, character_name: str, score: int, message: str, timestamp: datetime = None):
+        """감정 로그를 write-behind 큐에 넣습니다. (잠시 후 일괄 기록)"""
         print(f"[DEBUG] add_emotion_log called: user_id={user_id}, character_name={character_name}, score={score}, message={message}, timestamp={timestamp}")
-        conn = None
         try:
             if timestamp is None:
                 timestamp = datetime.utcnow()
+            get_write_queue().submit('emotion_log', (user_id, character_name, score, message, timestamp))
+        except Exception as e:
+            print(f"Error adding emotion log: {e}")
+
+    def get_emotion_training_samples(self, limit: int = 50000, gpt_only: bool = False) -> list:
+        """
+        감정 분류기 학습/평가용 (메시지, 점수) 목록을 최신순으로 반환합니다.
+        emotion_log에는 GPT가 매긴 라벨이, affinity_log에는 실제로 반영된 점수가 있습니다.
+        gpt_only=True면 emotion_log의 GPT 라벨만 사용합니다.
+        """
+        conn = None
+        try:
             conn = self.get_connection()
             with conn.cursor() as cursor:
-                cursor.execute(
-                    "INSERT INTO affinity_log (user_id, character_name, score_change, message, timestamp) VALUES (%s, %s, %s, %s, %s)",
-                    (user_id, character_name, score, message, timestamp)
-                )
-            conn.commit()
+                query = """
+                    SELECT message, score, timestamp FROM emotion_log
+                    WHERE message IS NOT NULL AND message <> '' AND score BETWEEN -1 AND 1
+                """
+                if not gpt_only:
+                    query += """
+                    UNION ALL
+                    SELECT message, score_change, timestamp FROM affinity_log
+                    WHERE message IS NOT NULL AND message <> '' AND score_change BETWEEN -1 AND 1
+                    """
+                cursor.execute(f"SELECT message, score FROM ({query}) s ORDER BY timestamp DESC LIMIT %s", (limit,))
+                return [(message, score) for message, score in cursor.fetchall()]
         except Exception as e:
-            print(f"Error adding emotion log: {e}")
-            if conn: conn.rollback()
+            print(f"Error getting emotion training samples: {e}")
+            return []
         finally:
-            self.return_connection(conn)
+            if conn:
+                self.return_connection(conn)
 
     def get_card_shared_today(self, user_id: int) -> int:
         """
@@ -1641,24 +2215,11 @@ class DatabaseManager:
 
     def get_user_daily_message_count(self, user_id: int) -> int:
         """사용자의 오늘 일일 메시지 사용 수를 반환합니다 (UTC+0 기준)."""
-        conn = None
         try:
-            conn = self.get_connection()
-            with conn.cursor() as cursor:
-                cursor.execute("""
-                    SELECT COUNT(*) FROM conversations 
-                    WHERE user_id = %s 
-                    AND message_role = 'user' 
-                    AND DATE(timestamp AT TIME ZONE 'UTC') = CURRENT_DATE
-                    AND is_daily_message = true
-                """, (user_id,))
-                result = cursor.fetchone()
-                return result[0] if result else 0
+            return self._get_daily_usage(user_id, 'UTC', datetime.utcnow().date(), 'daily_count')
         except Exception as e:
             print(f"Error getting daily message count: {e}")
             return 0
-        finally:
-            self.return_connection(conn)
 
     def get_user_recent_message_count(self, user_id: int, character_name: str, limit: int) -> int:
         """사용자의 최근 메시지 수를 반환합니다."""
@@ -1704,24 +2265,11 @@ class DatabaseManager:
 
     def get_user_paid_message_count(self, user_id: int) -> int:
         """사용자의 오늘 유료 메시지 사용 수를 반환합니다 (UTC+0 기준)."""
-        conn = None
         try:
-            conn = self.get_connection()
-            with conn.cursor() as cursor:
-                cursor.execute("""
-                    SELECT COUNT(*) FROM conversations 
-                    WHERE user_id = %s 
-                    AND message_role = 'user' 
-                    AND DATE(timestamp AT TIME ZONE 'UTC') = CURRENT_DATE
-                    AND is_daily_message = false
-                """, (user_id,))
-                result = cursor.fetchone()
-                return result[0] if result else 0
+            return self._get_daily_usage(user_id, 'UTC', datetime.utcnow().date(), 'paid_count')
         except Exception as e:
             print(f"Error getting paid message count: {e}")
             return 0
-        finally:
-            self.return_connection(conn)
 
     def can_user_send_message_new(self, user_id: int) -> bool:
         """새로운 메시지 사용 가능 여부 확인 로직"""
@@ -1790,6 +2338,7 @@ class DatabaseManager:
                     VALUES (%s, %s, %s, %s)
                 """, (user_id, product_id, start_date, end_date))
             conn.commit()
+            _subscription_cache.invalidate(user_id)
             return True
         except Exception as e:
             print(f"Error adding user subscription: {e}")
@@ -1817,11 +2366,17 @@ class DatabaseManager:
 
     def is_user_subscribed(self, user_id: int) -> bool:
         """사용자가 활성 구독을 가지고 있는지 확인합니다."""
+        cached = _subscription_cache.get(user_id)
+        if cached is not MISSING:
+            return cached
         subscriptions = self.get_active_subscriptions(user_id)
-        return len(subscriptions) > 0
+        is_subscribed = len(subscriptions) > 0
+        _subscription_cache.set(user_id, is_subscribed)
+        return is_subscribed
 
     def get_subscription_daily_messages(self, user_id: int) -> int:
         """구독 사용자의 일일 추가 메시지 수를 반환합니다."""
+        conn = None
         try:
             conn = self.get_connection()
             with conn.cursor() as cursor:
@@ -1849,6 +2404,7 @@ class DatabaseManager:
 
     def process_daily_subscription_rewards(self, user_id: int) -> bool:
         """구독 사용자에게 일일 보상을 지급합니다."""
+        conn = None
         try:
             conn = self.get_connection()
             with conn.cursor() as cursor:
@@ -1906,6 +2462,7 @@ class DatabaseManager:
                               amount: float, currency: str, status: str, 
                               payment_method: str, timestamp: int) -> str:
         """결제 거래를 기록합니다."""
+        conn = None
         try:
             conn = self.get_connection()
             with conn.cursor() as cursor:
@@ -1932,6 +2489,7 @@ class DatabaseManager:
 
     def get_transaction_by_id(self, transaction_id: str) -> Optional[Dict]:
         """거래 ID로 거래 정보를 조회합니다."""
+        conn = None
         try:
             conn = self.get_connection()
             with conn.cursor() as cursor:
@@ -1964,6 +2522,7 @@ class DatabaseManager:
                                delivery_type: str, quantity: Dict, delivered_at: datetime,
                                status: str) -> str:
         """상품 지급 로그를 기록합니다."""
+        conn = None
         try:
             conn = self.get_connection()
             with conn.cursor() as cursor:
@@ -2181,32 +2740,41 @@ class DatabaseManager:
     
     async def set_user_timezone(self, user_id: int, timezone: str) -> bool:
         """사용자의 시간대를 설정합니다."""
+        def _set(conn):
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO user_settings (user_id, setting_key, setting_value, updated_at)
+                    VALUES (%s, 'timezone', %s, NOW())
+                    ON CONFLICT (user_id, setting_key)
+                    DO UPDATE SET setting_value = %s, updated_at = NOW()
+                """, (user_id, timezone, timezone))
+            conn.commit()
+            _timezone_cache.set(user_id, timezone)
+            return True
         try:
-            with self.get_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute("""
-                        INSERT INTO user_settings (user_id, setting_key, setting_value, updated_at)
-                        VALUES (%s, 'timezone', %s, NOW())
-                        ON CONFLICT (user_id, setting_key)
-                        DO UPDATE SET setting_value = %s, updated_at = NOW()
-                    """, (user_id, timezone, timezone))
-                    conn.commit()
-                    return True
+            return await self.async_pool.run(_set)
         except Exception as e:
             print(f"Error setting user timezone: {e}")
             return False
     
     async def get_user_timezone(self, user_id: int) -> str:
         """사용자의 시간대를 가져옵니다."""
+        cached = _timezone_cache.get(user_id)
+        if cached is not MISSING:
+            return cached
+
+        def _get(conn):
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT setting_value FROM user_settings
+                    WHERE user_id = %s AND setting_key = 'timezone'
+                """, (user_id,))
+                result = cursor.fetchone()
+                return result[0] if result else None
         try:
-            with self.get_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute("""
-                        SELECT setting_value FROM user_settings
-                        WHERE user_id = %s AND setting_key = 'timezone'
-                    """, (user_id,))
-                    result = cursor.fetchone()
-                    return result[0] if result else None
+            timezone_name = await self.async_pool.run(_get)
+            _timezone_cache.set(user_id, timezone_name)
+            return timezone_name
         except Exception as e:
             print(f"Error getting user timezone: {e}")
             return None
@@ -2335,6 +2903,7 @@ class DatabaseManager:
     
     def add_to_blacklist(self, user_id: int, username: str, reason: str, duration_days: int, created_by: int):
         """사용자를 블랙리스트에 추가합니다."""
+        conn = None
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
@@ -2372,14 +2941,17 @@ class DatabaseManager:
             
             conn.commit()
             cursor.close()
-            self.return_connection(conn)
+            _blacklist_cache.invalidate(user_id)
             return True
         except Exception as e:
             print(f"Error adding to blacklist: {e}")
             return False
+        finally:
+            self.return_connection(conn)
     
     def remove_from_blacklist(self, user_id: int):
         """사용자를 블랙리스트에서 제거합니다."""
+        conn = None
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
@@ -2392,14 +2964,20 @@ class DatabaseManager:
             
             conn.commit()
             cursor.close()
-            self.return_connection(conn)
+            _blacklist_cache.invalidate(user_id)
             return True
         except Exception as e:
             print(f"Error removing from blacklist: {e}")
             return False
+        finally:
+            self.return_connection(conn)
     
     def is_user_blacklisted(self, user_id: int):
         """사용자가 블랙리스트에 있는지 확인합니다."""
+        cached = _blacklist_cache.get(user_id)
+        if cached is not MISSING:
+            return cached
+        conn = None
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
@@ -2426,10 +3004,9 @@ class DatabaseManager:
             result = cursor.fetchone()
             conn.commit()
             cursor.close()
-            self.return_connection(conn)
             
             if result:
-                return {
+                status = {
                     'is_blacklisted': True,
                     'username': result[1],
                     'reason': result[2],
@@ -2437,13 +3014,19 @@ class DatabaseManager:
                     'expires_at': result[4],
                     'created_at': result[5]
                 }
-            return {'is_blacklisted': False}
+            else:
+                status = {'is_blacklisted': False}
+            _blacklist_cache.set(user_id, status)
+            return status
         except Exception as e:
             print(f"Error checking blacklist: {e}")
             return {'is_blacklisted': False}
+        finally:
+            self.return_connection(conn)
     
     def get_blacklist_users(self):
         """현재 블랙리스트에 있는 모든 사용자를 반환합니다."""
+        conn = None
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
@@ -2471,7 +3054,6 @@ class DatabaseManager:
             results = cursor.fetchall()
             conn.commit()
             cursor.close()
-            self.return_connection(conn)
             
             return [{
                 'user_id': row[0],
@@ -2485,9 +3067,12 @@ class DatabaseManager:
         except Exception as e:
             print(f"Error getting blacklist users: {e}")
             return []
+        finally:
+            self.return_connection(conn)
     
     def cleanup_expired_blacklist(self):
         """만료된 블랙리스트를 정리합니다."""
+        conn = None
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
@@ -2506,10 +3091,13 @@ class DatabaseManager:
             affected_rows = cursor.rowcount
             conn.commit()
             cursor.close()
-            self.return_connection(conn)
+            if affected_rows:
+                _blacklist_cache.clear()
             
             return affected_rows
         except Exception as e:
             print(f"Error cleaning up expired blacklist: {e}")
             return 0
+        finally:
+            self.return_connection(conn)
     
\ No newline at end of file
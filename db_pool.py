@@ -0,0 +1,406 @@
+# db_pool.py
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from functools import partial
+
+import psycopg2
+import psycopg2.extensions
+
+# --- 풀 설정 (환경변수로 조정 가능) ---
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.environ.get("DB_POOL_ACQUIRE_TIMEOUT", "10"))
+DB_POOL_IDLE_TIMEOUT = float(os.environ.get("DB_POOL_IDLE_TIMEOUT", "300"))
+DB_POOL_MAX_LIFETIME = float(os.environ.get("DB_POOL_MAX_LIFETIME", "3600"))
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.environ.get("DB_POOL_HEALTH_CHECK_INTERVAL", "30"))
+
+
+class PoolTimeoutError(Exception):
+    """풀에서 제한 시간 내에 연결을 얻지 못했을 때 발생합니다."""
+
+
+class PooledConnection:
+    """
+    풀에서 대여한 psycopg2 연결을 감싸는 래퍼입니다.
+    close() 또는 with 블록 종료 시 실제로 닫지 않고 풀로 반환합니다.
+    나머지 속성(cursor, commit, rollback 등)은 원본 연결로 위임됩니다.
+    """
+    __slots__ = ("_conn", "_pool", "created_at", "last_used", "_checked_out")
+
+    def __init__(self, conn, pool):
+        self._conn = conn
+        self._pool = pool
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self._checked_out = False
+
+    def __getattr__(self, name):
+        if name in PooledConnection.__slots__:
+            raise AttributeError(name)
+        return getattr(self._conn, name)
+
+    @property
+    def raw(self):
+        """원본 psycopg2 연결을 반환합니다."""
+        return self._conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # psycopg2의 `with conn:` 동작(commit/rollback)을 유지하되, 연결은 풀로 반환
+        try:
+            if not self._conn.closed:
+                if exc_type is None:
+                    self._conn.commit()
+                else:
+                    self._conn.rollback()
+        finally:
+            self.close()
+        return False
+
+    def close(self):
+        if self._checked_out:
+            self._pool.putconn(self)
+
+    def __del__(self):
+        # 반환되지 않은 채 버려진 연결이 풀 슬롯을 영구히 점유하지 않도록 회수
+        try:
+            if self._checked_out:
+                self._pool.putconn(self, discard=True)
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    스레드 안전한 PostgreSQL 연결 풀입니다.
+    - min_size/max_size: 유지할 최소 연결 수와 동시에 열 수 있는 최대 연결 수
+    - 대여 시 헬스체크(SELECT 1), 반환 시 미완료 트랜잭션 롤백
+    - idle_timeout을 넘긴 유휴 연결과 max_lifetime을 넘긴 연결 정리
+    - get_metrics()로 풀 상태 조회
+    """
+
+    def __init__(self, dsn, min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE,
+                 acquire_timeout=DB_POOL_ACQUIRE_TIMEOUT, idle_timeout=DB_POOL_IDLE_TIMEOUT,
+                 max_lifetime=DB_POOL_MAX_LIFETIME, health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL,
+                 **connect_kwargs):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min_size={min_size}, max_size={max_size}")
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self.connect_kwargs = connect_kwargs
+
+        self._idle = deque()  # LIFO: 최근 사용한 연결을 먼저 재사용
+        self._size = 0        # 열려 있는 전체 연결 수 (대여 중 + 유휴)
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+        self._last_reap = time.monotonic()
+
+        self.metrics = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "checkout_waits": 0,
+            "checkout_wait_seconds": 0.0,
+            "checkout_timeouts": 0,
+            "health_check_failures": 0,
+            "idle_reaped": 0,
+            "peak_in_use": 0,
+        }
+
+        for _ in range(min_size):
+            with self._cond:
+                self._size += 1
+            try:
+                conn = self._open()
+            except Exception as e:
+                print(f"[DB Pool] Failed to pre-open connection: {e}")
+                break
+            with self._cond:
+                self._idle.append(conn)
+
+    # --- 내부 헬퍼 ---
+    def _open(self):
+        """새 연결을 엽니다. 호출 전에 _size 슬롯을 미리 예약해야 합니다."""
+        try:
+            raw = psycopg2.connect(self.dsn, **self.connect_kwargs)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        self.metrics["connections_created"] += 1
+        return PooledConnection(raw, self)
+
+    def _discard(self, conn):
+        try:
+            if not conn.raw.closed:
+                conn.raw.close()
+        except Exception:
+            pass
+        self.metrics["connections_closed"] += 1
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.raw.closed:
+            return False
+        if time.monotonic() - conn.created_at > self.max_lifetime:
+            return False
+        if time.monotonic() - conn.last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.raw.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.raw.rollback()
+            return True
+        except Exception as e:
+            print(f"[DB Pool] Health check failed, discarding connection: {e}")
+            self.metrics["health_check_failures"] += 1
+            return False
+
+    def _maybe_reap(self):
+        if time.monotonic() - self._last_reap >= min(self.idle_timeout, 60.0):
+            self.reap_idle()
+
+    # --- 공개 API ---
+    def getconn(self, timeout: float = None) -> PooledConnection:
+        """풀에서 연결을 대여합니다. 풀이 가득 차 있으면 timeout 동안 대기합니다."""
+        if self._closed:
+            raise psycopg2.InterfaceError("connection pool is closed")
+        self._maybe_reap()
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        waited = False
+        wait_start = time.monotonic()
+
+        while True:
+            conn = None
+            open_new = False
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.metrics["checkout_timeouts"] += 1
+                        raise PoolTimeoutError(
+                            f"Timed out after {timeout:.1f}s waiting for a database connection "
+                            f"(max_size={self.max_size})"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+                if self._idle:
+                    conn = self._idle.pop()
+                else:
+                    # 락 안에서 슬롯을 예약해야 max_size를 넘지 않음
+                    self._size += 1
+                    open_new = True
+
+            if open_new:
+                conn = self._open()
+            elif not self._is_healthy(conn):
+                self._discard(conn)
+                continue
+
+            with self._cond:
+                self._in_use += 1
+                self.metrics["checkouts"] += 1
+                if self._in_use > self.metrics["peak_in_use"]:
+                    self.metrics["peak_in_use"] = self._in_use
+                if waited:
+                    self.metrics["checkout_waits"] += 1
+                    self.metrics["checkout_wait_seconds"] += time.monotonic() - wait_start
+            conn._checked_out = True
+            return conn
+
+    def putconn(self, conn: PooledConnection, discard: bool = False):
+        """대여한 연결을 풀로 반환합니다. 열린 트랜잭션은 롤백됩니다."""
+        if conn is None or not conn._checked_out:
+            return
+        conn._checked_out = False
+        with self._cond:
+            self._in_use -= 1
+
+        raw = conn.raw
+        if not discard and not raw.closed:
+            try:
+                status = raw.info.transaction_status
+                if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    discard = True
+                elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    raw.rollback()
+            except Exception:
+                discard = True
+
+        if discard or raw.closed or self._closed:
+            self._discard(conn)
+            return
+
+        conn.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: float = None):
+        """with 문으로 연결을 대여/반환합니다. 커밋은 호출자가 직접 수행합니다."""
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def reap_idle(self) -> int:
+        """idle_timeout을 넘긴 유휴 연결을 min_size까지 정리합니다."""
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            self._last_reap = now
+            keep = deque()
+            # 가장 오래 쉬고 있던 연결(deque 왼쪽)부터 검사
+            while self._idle:
+                conn = self._idle.popleft()
+                too_old = now - conn.created_at > self.max_lifetime
+                too_idle = now - conn.last_used > self.idle_timeout
+                if (too_old or too_idle) and self._size - len(expired) > self.min_size:
+                    expired.append(conn)
+                else:
+                    keep.append(conn)
+            self._idle = keep
+        for conn in expired:
+            self._discard(conn)
+        self.metrics["idle_reaped"] += len(expired)
+        return len(expired)
+
+    def close_all(self):
+        """풀을 닫고 모든 유휴 연결을 종료합니다. 대여 중인 연결은 반환 시 닫힙니다."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn in idle:
+            self._discard(conn)
+
+    def get_metrics(self) -> dict:
+        """풀 상태와 누적 통계를 반환합니다."""
+        with self._cond:
+            snapshot = dict(self.metrics)
+            snapshot.update({
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+            })
+        checkouts = snapshot["checkouts"]
+        snapshot["avg_checkout_wait_ms"] = (
+            snapshot["checkout_wait_seconds"] / snapshot["checkout_waits"] * 1000
+            if snapshot["checkout_waits"] else 0.0
+        )
+        snapshot["reuse_ratio"] = (
+            1 - snapshot["connections_created"] / checkouts if checkouts else 0.0
+        )
+        return snapshot
+
+
+class AsyncConnectionPool:
+    """
+    ConnectionPool의 비동기 래퍼입니다.
+    연결 대여와 쿼리 실행을 풀 크기만큼의 전용 스레드에서 수행하므로
+    코루틴에서 호출해도 이벤트 루프가 막히지 않습니다.
+    """
+
+    def __init__(self, pool: ConnectionPool, max_workers: int = None):
+        self.pool = pool
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or pool.max_size,
+            thread_name_prefix="db-pool",
+        )
+
+    async def getconn(self) -> PooledConnection:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.pool.getconn)
+
+    async def putconn(self, conn: PooledConnection, discard: bool = False):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.pool.putconn, conn, discard)
+
+    @asynccontextmanager
+    async def connection(self):
+        conn = await self.getconn()
+        try:
+            yield conn
+        finally:
+            await self.putconn(conn)
+
+    async def run(self, func, *args, **kwargs):
+        """func(conn, *args, **kwargs)를 워커 스레드에서 풀 연결과 함께 실행합니다."""
+        def _call():
+            with self.pool.connection() as conn:
+                return func(conn, *args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, _call)
+
+    async def run_sync(self, func, *args, **kwargs):
+        """연결을 스스로 관리하는 동기 함수 func(*args, **kwargs)를 워커 스레드에서 실행합니다."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    def get_metrics(self) -> dict:
+        return self.pool.get_metrics()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+        self.pool.close_all()
+
+
+# --- 프로세스 전역 풀 (모든 DatabaseManager 인스턴스가 공유) ---
+_pool = None
+_async_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(dsn: str = None, **connect_kwargs) -> ConnectionPool:
+    """전역 연결 풀을 반환합니다. 최초 호출 시 생성됩니다."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(dsn or os.environ.get("DATABASE_URL"), **connect_kwargs)
+                print(f"[DB Pool] Connection pool created (min={_pool.min_size}, max={_pool.max_size})")
+    return _pool
+
+
+def get_async_pool(dsn: str = None, **connect_kwargs) -> AsyncConnectionPool:
+    """전역 연결 풀의 비동기 래퍼를 반환합니다."""
+    global _async_pool
+    if _async_pool is None:
+        pool = get_pool(dsn, **connect_kwargs)
+        with _pool_lock:
+            if _async_pool is None:
+                _async_pool = AsyncConnectionPool(pool)
+    return _async_pool
+
+
+def close_pool():
+    """전역 풀을 닫습니다. (종료 시 호출)"""
+    global _pool, _async_pool
+    with _pool_lock:
+        if _async_pool is not None:
+            _async_pool.shutdown()
+        elif _pool is not None:
+            _pool.close_all()
+        _pool = None
+        _async_pool = None
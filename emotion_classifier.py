@@ -0,0 +1,272 @@
+"""
+로컬 감정 분류기
+메시지마다 GPT를 호출하지 않고 CPU에서 바로 -1 / 0 / +1 감정 점수를 계산합니다.
+
+- LexiconEmotionModel: get_emotion_keywords()의 다국어 키워드와 이모지로 점수를 매기는 기본 모델
+- LinearEmotionModel: emotion_log/affinity_log에 쌓인 라벨로 학습하는 작은 로지스틱 회귀 모델
+  (단어/문자 n-gram 해싱 + 키워드/이모지 특징)
+- EmotionScorer: 로컬 모델의 확신도가 낮을 때만 GPT를 호출
+
+학습/평가는 emotion_eval.py를 사용하세요.
+"""
+import json
+import math
+import os
+import random
+import re
+import zlib
+from pathlib import Path
+
+import language_id
+from openai_manager import (
+    get_emotion_keywords, analyze_emotion_with_patterns, analyze_emojis, analyze_emotion_with_gpt,
+)
+
+EMOTION_MODEL_PATH = os.environ.get(
+    "EMOTION_MODEL_PATH", str(Path(__file__).resolve().parent / "emotion_model.json")
+)
+# 로컬 모델의 확신도가 이 값보다 낮으면 GPT에 물어봄 (1.0이면 항상 GPT, 0이면 GPT 사용 안 함)
+EMOTION_CONFIDENCE_THRESHOLD = float(os.environ.get("EMOTION_CONFIDENCE_THRESHOLD", 0.7))
+EMOTION_HASH_BUCKETS = 1 << 18
+
+LABELS = (-1, 0, 1)
+
+_WORD = re.compile(r"[a-z0-9']+")
+_CJK_RUN = re.compile(r'[가-힣ぁ-んァ-ン一-龯]+')
+
+
+def script_language(text: str) -> str:
+    """문자 범위만으로 키워드 언어를 고릅니다. (langdetect보다 훨씬 빠름)"""
+    return language_id.script_language(text) or 'en'
+
+
+def _compile_keywords(words, word_boundary: bool):
+    words = sorted(set(words), key=len, reverse=True)
+    body = '|'.join(re.escape(w) for w in words)
+    return re.compile(rf"\b(?:{body})\b" if word_boundary else f"(?:{body})")
+
+
+# 언어별 (긍정, 부정, 부정어) 정규식. 영어는 'hell' ⊂ 'hello' 같은 오탐을 막기 위해 단어 경계를 사용
+_LEXICON = {
+    lang: tuple(_compile_keywords(groups[key], lang == 'en') for key in ('positive', 'negative', 'negation'))
+    for lang, groups in get_emotion_keywords().items()
+}
+# 부정어가 긍정어 앞 이 글자 수 안에 있으면 긍정어를 부정으로 뒤집음
+NEGATION_WINDOW = 12
+
+
+def lexicon_counts(text: str) -> dict:
+    """키워드/이모지 적중 수를 셉니다."""
+    lang = script_language(text)
+    positive, negative, negation = _LEXICON[lang]
+    lowered = text.lower()
+    negation_ends = [m.end() for m in negation.finditer(lowered)]
+
+    pos = neg = negated = 0
+    for m in positive.finditer(lowered):
+        if any(0 <= m.start() - end <= NEGATION_WINDOW for end in negation_ends):
+            negated += 1
+        else:
+            pos += 1
+    neg = sum(1 for _ in negative.finditer(lowered))
+    emojis = analyze_emojis(text)
+    return {
+        'lang': lang,
+        'positive': pos,
+        'negative': neg,
+        'negated': negated,
+        'emoji_positive': emojis['positive'],
+        'emoji_negative': emojis['negative'],
+    }
+
+
+class LexiconEmotionModel:
+    """키워드 사전 기반 모델. 한쪽 감정 키워드만 있을 때 확신도가 높습니다."""
+
+    name = 'lexicon'
+
+    def predict(self, text: str):
+        """(점수, 확신도)를 반환합니다."""
+        c = lexicon_counts(text)
+        positive = c['positive'] + c['emoji_positive']
+        negative = c['negative'] + c['negated'] + c['emoji_negative']
+        if positive and not negative:
+            return 1, min(0.95, 0.6 + 0.15 * positive)
+        if negative and not positive:
+            return -1, min(0.95, 0.6 + 0.15 * negative)
+        if positive or negative:
+            # 양쪽 키워드가 섞여 있으면 많은 쪽으로 기울이되 확신도는 낮게
+            score = (positive > negative) - (negative > positive)
+            return score, 0.4
+        # 키워드가 없으면 중립일 가능성이 높지만 사전만으로는 알 수 없음
+        return 0, 0.5
+
+
+def extract_features(text: str) -> list:
+    """해싱 전 특징 이름 목록을 반환합니다."""
+    lowered = text.lower()
+    features = ['bias']
+    words = _WORD.findall(lowered)
+    features.extend('w:' + w for w in words)
+    features.extend(f'b:{a}_{b}' for a, b in zip(words, words[1:]))
+    for run in _CJK_RUN.findall(lowered):
+        features.extend('c:' + run[i:i + 2] for i in range(max(1, len(run) - 1)))
+
+    c = lexicon_counts(text)
+    for key in ('positive', 'negative', 'negated', 'emoji_positive', 'emoji_negative'):
+        if c[key]:
+            features.append(f'lex:{key}:{min(c[key], 3)}')
+    features.append('lang:' + c['lang'])
+    length = len(words) + len(lowered) // 4 if c['lang'] != 'en' else len(words)
+    features.append('len:' + ('short' if length <= 2 else 'long' if length >= 10 else 'mid'))
+    return features
+
+
+def _hash(feature: str) -> int:
+    return zlib.crc32(feature.encode('utf-8')) % EMOTION_HASH_BUCKETS
+
+
+def _softmax(logits):
+    top = max(logits)
+    exps = [math.exp(x - top) for x in logits]
+    total = sum(exps)
+    return [x / total for x in exps]
+
+
+class LinearEmotionModel:
+    """해싱 특징 위의 다항 로지스틱 회귀. 가중치는 {버킷: [w(-1), w(0), w(+1)]} 형태입니다."""
+
+    name = 'linear'
+
+    def __init__(self, weights: dict = None, trained_on: int = 0):
+        self.weights = weights or {}
+        self.trained_on = trained_on
+
+    def _probabilities(self, buckets):
+        logits = [0.0, 0.0, 0.0]
+        for bucket in buckets:
+            w = self.weights.get(bucket)
+            if w:
+                logits[0] += w[0]
+                logits[1] += w[1]
+                logits[2] += w[2]
+        return _softmax(logits)
+
+    def predict(self, text: str):
+        probs = self._probabilities([_hash(f) for f in extract_features(text)])
+        best = max(range(3), key=probs.__getitem__)
+        return LABELS[best], probs[best]
+
+    @classmethod
+    def train(cls, samples, epochs: int = 8, learning_rate: float = 0.2, l2: float = 1e-5, seed: int = 0):
+        """(메시지, 점수) 목록으로 SGD 학습합니다. 라벨 불균형은 클래스 가중치로 보정합니다."""
+        samples = [(text, score) for text, score in samples if text and score in LABELS]
+        if not samples:
+            return cls()
+        encoded = [([_hash(f) for f in extract_features(text)], LABELS.index(score)) for text, score in samples]
+        counts = [sum(1 for _, y in encoded if y == k) for k in range(3)]
+        class_weight = [len(encoded) / (3 * c) if c else 0.0 for c in counts]
+
+        model = cls(trained_on=len(encoded))
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(encoded)
+            rate = learning_rate / (1 + epoch)
+            for buckets, y in encoded:
+                probs = model._probabilities(buckets)
+                scale = rate * class_weight[y]
+                for bucket in buckets:
+                    w = model.weights.setdefault(bucket, [0.0, 0.0, 0.0])
+                    for k in range(3):
+                        gradient = probs[k] - (1.0 if k == y else 0.0)
+                        w[k] -= scale * gradient + rate * l2 * w[k]
+        return model
+
+    def save(self, path: str = EMOTION_MODEL_PATH):
+        data = {
+            'version': 1,
+            'buckets': EMOTION_HASH_BUCKETS,
+            'trained_on': self.trained_on,
+            'weights': {str(k): [round(x, 5) for x in v] for k, v in self.weights.items()},
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+    @classmethod
+    def load(cls, path: str = EMOTION_MODEL_PATH):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('buckets') != EMOTION_HASH_BUCKETS:
+            raise ValueError("emotion model was trained with a different hash size")
+        return cls({int(k): v for k, v in data['weights'].items()}, data.get('trained_on', 0))
+
+
+def load_default_model():
+    """학습된 모델 파일이 있으면 선형 모델을, 없으면 사전 모델을 반환합니다."""
+    if os.path.exists(EMOTION_MODEL_PATH):
+        try:
+            model = LinearEmotionModel.load(EMOTION_MODEL_PATH)
+            print(f"[감정분석] 로컬 모델 로드: {EMOTION_MODEL_PATH} ({model.trained_on}개 샘플로 학습)")
+            return model
+        except Exception as e:
+            print(f"[감정분석] 로컬 모델 로드 실패, 사전 모델 사용: {e}")
+    return LexiconEmotionModel()
+
+
+class EmotionScorer:
+    """로컬 모델로 먼저 점수를 매기고, 확신도가 낮을 때만 GPT를 호출합니다."""
+
+    def __init__(self, model=None, threshold: float = EMOTION_CONFIDENCE_THRESHOLD):
+        self.model = model or load_default_model()
+        self.threshold = threshold
+        self.metrics = {'local': 0, 'gpt': 0, 'gpt_errors': 0}
+
+    async def score(self, message: str) -> int:
+        local_score, confidence = self.model.predict(message)
+        if confidence >= self.threshold:
+            self.metrics['local'] += 1
+            print(f"[감정분석] 입력: {message[:50]}... | 로컬({self.model.name}): {local_score} ({confidence:.2f})")
+            return local_score
+
+        self.metrics['gpt'] += 1
+        try:
+            gpt_score = await analyze_emotion_with_gpt(message)
+        except Exception as e:
+            self.metrics['gpt_errors'] += 1
+            print(f"[감정분석] GPT 실패, 로컬 점수 사용: {e}")
+            return local_score
+        await record_gpt_label(message, gpt_score)
+
+        # 기존과 같은 70/30 가중 평균 (GPT 70% + 패턴 30%)
+        pattern_score = analyze_emotion_with_patterns(message)
+        final_score = round(gpt_score * 0.7 + pattern_score * 0.3)
+        print(f"[감정분석] 입력: {message[:50]}... | 로컬: {local_score} ({confidence:.2f}) | GPT: {gpt_score} | 패턴: {pattern_score:.2f} | 최종: {final_score}")
+        return final_score
+
+    def get_metrics(self) -> dict:
+        total = self.metrics['local'] + self.metrics['gpt']
+        return {
+            **self.metrics,
+            'model': self.model.name,
+            'threshold': self.threshold,
+            'local_ratio': round(self.metrics['local'] / total, 3) if total else 0.0,
+        }
+
+
+async def record_gpt_label(message: str, score: int):
+    """GPT가 매긴 점수를 emotion_log에 남겨 다음 학습/평가에 사용합니다. (큐가 가득 차도 이벤트 루프를 막지 않음)"""
+    try:
+        from database_manager import get_write_queue
+        await get_write_queue().enqueue('emotion_label', (score, message))
+    except Exception as e:
+        print(f"[감정분석] GPT 라벨 기록 실패: {e}")
+
+
+_scorer = None
+
+
+def get_scorer() -> EmotionScorer:
+    global _scorer
+    if _scorer is None:
+        _scorer = EmotionScorer()
+    return _scorer
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+로컬 감정 분류기 학습 / 오프라인 평가 스크립트
+GPT 라벨과 로컬 모델의 일치율, 확신도 기준별 GPT 호출 감소율, 분류 속도를 측정합니다.
+
+사용법:
+    python emotion_eval.py train                      # DB 라벨로 학습 후 emotion_model.json 저장
+    python emotion_eval.py evaluate                   # 80/20 분할로 평가 (사전/패턴/선형 모델 비교)
+    python emotion_eval.py evaluate --gpt-only        # emotion_log의 GPT 라벨만 사용
+    python emotion_eval.py evaluate --relabel 200     # 최근 메시지 200개를 GPT로 다시 라벨링해서 평가
+    python emotion_eval.py evaluate --file samples.jsonl  # DB 없이 {"message": ..., "score": ...} 파일로 평가
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import zlib
+
+from emotion_classifier import (
+    LABELS, EMOTION_MODEL_PATH, EMOTION_CONFIDENCE_THRESHOLD, LexiconEmotionModel, LinearEmotionModel,
+)
+from openai_manager import analyze_emotion_with_patterns, analyze_emotion_with_gpt
+
+
+class PatternBaseline:
+    """기존 analyze_emotion_with_patterns를 반올림한 점수 (비교용)."""
+
+    name = 'pattern'
+
+    def predict(self, text: str):
+        score = analyze_emotion_with_patterns(text)
+        return round(score), abs(score)
+
+
+def load_samples(args) -> list:
+    if args.file:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        return [(row['message'], int(row['score'])) for row in rows]
+    from database_manager import get_db_manager
+    return get_db_manager().get_emotion_training_samples(limit=args.limit, gpt_only=args.gpt_only)
+
+
+async def relabel_with_gpt(samples: list, count: int, concurrency: int = 8) -> list:
+    """samples 중 count개를 GPT로 다시 라벨링합니다."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def label(text):
+        async with semaphore:
+            return text, await analyze_emotion_with_gpt(text)
+
+    return await asyncio.gather(*(label(text) for text, _ in samples[:count]))
+
+
+def split(samples: list, holdout: float):
+    """메시지 해시로 학습/평가 세트를 나눕니다. (실행할 때마다 같은 분할)"""
+    train, test = [], []
+    for text, score in samples:
+        bucket = zlib.crc32(text.encode('utf-8')) % 1000
+        (test if bucket < holdout * 1000 else train).append((text, score))
+    return train, test
+
+
+def evaluate(model, samples: list, threshold: float) -> dict:
+    confusion = {(gold, pred): 0 for gold in LABELS for pred in LABELS}
+    confident = confident_correct = correct = 0
+    start = time.perf_counter()
+    for text, gold in samples:
+        pred, confidence = model.predict(text)
+        confusion[(gold, pred)] += 1
+        correct += pred == gold
+        if confidence >= threshold:
+            confident += 1
+            confident_correct += pred == gold
+    elapsed = time.perf_counter() - start
+    total = len(samples)
+    return {
+        'agreement': correct / total if total else 0.0,
+        'coverage': confident / total if total else 0.0,
+        'confident_agreement': confident_correct / confident if confident else 0.0,
+        'us_per_message': elapsed / total * 1e6 if total else 0.0,
+        'confusion': confusion,
+    }
+
+
+def print_report(name: str, result: dict, threshold: float):
+    print(f"\n[{name}]")
+    print(f"  GPT 라벨 일치율:            {result['agreement']:.1%}")
+    print(f"  확신도 ≥ {threshold:.2f} 비율 (GPT 생략): {result['coverage']:.1%}")
+    print(f"  확신한 메시지의 일치율:      {result['confident_agreement']:.1%}")
+    print(f"  분류 속도:                  {result['us_per_message']:.0f} µs/메시지")
+    print("  혼동 행렬 (행: GPT, 열: 로컬)")
+    print("          " + "".join(f"{pred:>7}" for pred in LABELS))
+    for gold in LABELS:
+        print(f"    {gold:>4}  " + "".join(f"{result['confusion'][(gold, pred)]:>7}" for pred in LABELS))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="로컬 감정 분류기 학습/평가")
+    parser.add_argument("command", choices=["train", "evaluate"])
+    parser.add_argument("--limit", type=int, default=50000, help="사용할 최근 라벨 수")
+    parser.add_argument("--gpt-only", action="store_true", help="emotion_log의 GPT 라벨만 사용합니다")
+    parser.add_argument("--file", help="DB 대신 사용할 JSONL 파일 ({\"message\", \"score\"})")
+    parser.add_argument("--relabel", type=int, default=0, help="최근 메시지 N개를 GPT로 다시 라벨링합니다")
+    parser.add_argument("--holdout", type=float, default=0.2, help="평가용으로 떼어둘 비율")
+    parser.add_argument("--threshold", type=float, default=EMOTION_CONFIDENCE_THRESHOLD)
+    parser.add_argument("--output", default=EMOTION_MODEL_PATH, help="학습된 모델 저장 경로")
+    args = parser.parse_args()
+
+    samples = load_samples(args)
+    if args.relabel:
+        samples = asyncio.run(relabel_with_gpt(samples, args.relabel))
+    if not samples:
+        print("⚠️ 라벨이 있는 메시지가 없습니다.")
+        sys.exit(1)
+    counts = {label: sum(1 for _, score in samples if score == label) for label in LABELS}
+    print(f"📊 샘플 {len(samples)}개 (라벨 분포: {counts})")
+
+    if args.command == "train":
+        model = LinearEmotionModel.train(samples)
+        model.save(args.output)
+        print(f"✅ {model.trained_on}개 샘플로 학습한 모델을 저장했습니다: {args.output}")
+        return
+
+    train, test = split(samples, args.holdout)
+    if not test:
+        print("⚠️ 평가 세트가 비어 있습니다. (--holdout을 늘려보세요)")
+        sys.exit(1)
+    print(f"   학습 {len(train)}개 / 평가 {len(test)}개")
+    for model in (PatternBaseline(), LexiconEmotionModel(), LinearEmotionModel.train(train)):
+        print_report(model.name, evaluate(model, test, args.threshold), args.threshold)
+
+
+if __name__ == "__main__":
+    main()
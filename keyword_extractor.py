@@ -0,0 +1,175 @@
+"""
+키워드 추출 엔진
+사용자 메시지에서 취미/음식/가족/날짜/직업/위치 키워드를 찾습니다.
+
+- 언어별로 모든 타입의 패턴을 모듈을 불러올 때 한 번만 컴파일
+- 패턴들의 앞부분(트리거)을 하나로 합친 정규식으로 메시지를 한 번만 훑고,
+  트리거가 나온 위치에서만 각 패턴을 확인 (패턴마다 re.finditer로 전체를 다시 훑지 않음)
+- 결과는 패턴마다 finditer를 돌리던 기존 방식과 같음 (순서 포함)
+- extract_batch로 여러 메시지를 한 번에 처리 (과거 대화 백필용, backfill_keywords.py)
+- format_keyword_parts: 저장된 키워드를 대화 컨텍스트용 "타입: 값1, 값2" 항목으로 변환
+"""
+import re
+from typing import Dict, List
+
+import language_id
+
+# 키워드 값: 트리거 뒤부터 문장 끝(. ? !) 전까지
+VALUE_TAIL = r'([^\.\?\!]+)'
+# 너무 짧거나 긴 값은 제외
+MIN_VALUE_LENGTH = 2
+MAX_VALUE_LENGTH = 99
+CONTEXT_CHARS = 200
+# 대화 컨텍스트에 넣는 타입별 최대 키워드 수 (신뢰도 순)
+KEYWORDS_PER_TYPE = 3
+
+KEYWORD_TYPE_NAMES = {
+    'hobby': '취미',
+    'food': '음식',
+    'family': '가족',
+    'date': '중요한 날짜',
+    'relationship': '관계',
+    'preference': '선호도',
+    'work': '직업/학업',
+    'location': '위치'
+}
+
+KEYWORD_PATTERNS = {
+    'hobby': {
+        'ko': [r'취미[는\s가]?\s*([^\.\?\!]+)', r'좋아하는\s*것[은\s가]?\s*([^\.\?\!]+)', r'즐겨하는\s*것[은\s가]?\s*([^\.\?\!]+)'],
+        'en': [r'hobby[:\s]*([^\.\?\!]+)', r'like\s+to\s+([^\.\?\!]+)', r'enjoy\s+([^\.\?\!]+)', r'love\s+([^\.\?\!]+)'],
+        'zh': [r'爱好[是\s]*([^\.\?\!]+)', r'喜欢[的\s]*([^\.\?\!]+)', r'享受[的\s]*([^\.\?\!]+)'],
+        'ja': [r'趣味[は\s]*([^\.\?\!]+)', r'好き[な\s]*([^\.\?\!]+)', r'楽しむ[の\s]*([^\.\?\!]+)']
+    },
+    'food': {
+        'ko': [r'좋아하는\s*음식[은\s가]?\s*([^\.\?\!]+)', r'먹고\s*싶은\s*것[은\s가]?\s*([^\.\?\!]+)', r'선호하는\s*음식[은\s가]?\s*([^\.\?\!]+)'],
+        'en': [r'favorite\s+food[:\s]*([^\.\?\!]+)', r'like\s+to\s+eat\s+([^\.\?\!]+)', r'prefer\s+([^\.\?\!]+)'],
+        'zh': [r'喜欢[的\s]*食物[是\s]*([^\.\?\!]+)', r'爱吃[的\s]*([^\.\?\!]+)', r'偏好[的\s]*([^\.\?\!]+)'],
+        'ja': [r'好き[な\s]*食べ物[は\s]*([^\.\?\!]+)', r'食べたい[もの\s]*([^\.\?\!]+)', r'好む[の\s]*([^\.\?\!]+)']
+    },
+    'family': {
+        'ko': [r'가족[은\s가]?\s*([^\.\?\!]+)', r'부모[는\s가]?\s*([^\.\?\!]+)', r'형제[는\s가]?\s*([^\.\?\!]+)', r'자매[는\s가]?\s*([^\.\?\!]+)'],
+        'en': [r'family[:\s]*([^\.\?\!]+)', r'parents[:\s]*([^\.\?\!]+)', r'brother[:\s]*([^\.\?\!]+)', r'sister[:\s]*([^\.\?\!]+)'],
+        'zh': [r'家庭[是\s]*([^\.\?\!]+)', r'父母[是\s]*([^\.\?\!]+)', r'兄弟[是\s]*([^\.\?\!]+)', r'姐妹[是\s]*([^\.\?\!]+)'],
+        'ja': [r'家族[は\s]*([^\.\?\!]+)', r'両親[は\s]*([^\.\?\!]+)', r'兄弟[は\s]*([^\.\?\!]+)', r'姉妹[は\s]*([^\.\?\!]+)']
+    },
+    'date': {
+        'ko': [r'생일[은\s가]?\s*([^\.\?\!]+)', r'기념일[은\s가]?\s*([^\.\?\!]+)', r'(\d{1,2}월\s*\d{1,2}일)', r'(\d{4}년\s*\d{1,2}월\s*\d{1,2}일)'],
+        'en': [r'birthday[:\s]*([^\.\?\!]+)', r'anniversary[:\s]*([^\.\?\!]+)', r'(\w+\s+\d{1,2})', r'(\d{1,2}/\d{1,2})'],
+        'zh': [r'生日[是\s]*([^\.\?\!]+)', r'纪念日[是\s]*([^\.\?\!]+)', r'(\d{1,2}月\s*\d{1,2}日)', r'(\d{4}年\s*\d{1,2}月\s*\d{1,2}日)'],
+        'ja': [r'誕生日[は\s]*([^\.\?\!]+)', r'記念日[は\s]*([^\.\?\!]+)', r'(\d{1,2}月\s*\d{1,2}日)', r'(\d{4}年\s*\d{1,2}月\s*\d{1,2}日)']
+    },
+    'work': {
+        'ko': [r'직업[은\s가]?\s*([^\.\?\!]+)', r'일[은\s가]?\s*([^\.\?\!]+)', r'학생[은\s가]?\s*([^\.\?\!]+)', r'회사[는\s가]?\s*([^\.\?\!]+)'],
+        'en': [r'job[:\s]*([^\.\?\!]+)', r'work[:\s]*([^\.\?\!]+)', r'student[:\s]*([^\.\?\!]+)', r'company[:\s]*([^\.\?\!]+)'],
+        'zh': [r'职业[是\s]*([^\.\?\!]+)', r'工作[是\s]*([^\.\?\!]+)', r'学生[是\s]*([^\.\?\!]+)', r'公司[是\s]*([^\.\?\!]+)'],
+        'ja': [r'職業[は\s]*([^\.\?\!]+)', r'仕事[は\s]*([^\.\?\!]+)', r'学生[は\s]*([^\.\?\!]+)', r'会社[は\s]*([^\.\?\!]+)']
+    },
+    'location': {
+        'ko': [r'사는\s*곳[은\s가]?\s*([^\.\?\!]+)', r'거주지[는\s가]?\s*([^\.\?\!]+)', r'고향[은\s가]?\s*([^\.\?\!]+)'],
+        'en': [r'live[:\s]*([^\.\?\!]+)', r'from[:\s]*([^\.\?\!]+)', r'hometown[:\s]*([^\.\?\!]+)'],
+        'zh': [r'住在[的\s]*地方[是\s]*([^\.\?\!]+)', r'来自[的\s]*([^\.\?\!]+)', r'家乡[是\s]*([^\.\?\!]+)'],
+        'ja': [r'住んで[いる\s]*ところ[は\s]*([^\.\?\!]+)', r'出身[は\s]*([^\.\?\!]+)', r'故郷[は\s]*([^\.\?\!]+)']
+    }
+}
+
+
+def format_keyword_parts(keywords: List[Dict]) -> List[str]:
+    """
+    키워드({'type', 'value', ...})를 타입별 "타입: 값1, 값2" 항목 목록으로 변환합니다.
+    keywords는 신뢰도 순이어야 하며, 타입은 처음 나온 순서대로, 값은 타입별 KEYWORDS_PER_TYPE개까지 사용합니다.
+    """
+    grouped = {}
+    for keyword in keywords:
+        grouped.setdefault(keyword['type'], []).append(keyword['value'])
+    return [
+        f"{KEYWORD_TYPE_NAMES.get(keyword_type, keyword_type)}: {', '.join(values[:KEYWORDS_PER_TYPE])}"
+        for keyword_type, values in grouped.items()
+    ]
+
+
+class KeywordExtractor:
+    """언어별 통합 패턴으로 키워드를 추출합니다."""
+
+    def __init__(self, patterns: Dict[str, Dict[str, List[str]]] = KEYWORD_PATTERNS):
+        # 언어 -> (통합 트리거 정규식, [(키워드 타입, 컴파일된 패턴), ...], 첫 글자 -> 확인할 패턴 번호)
+        # 패턴 순서는 기존 방식의 결과 순서(타입 순 -> 패턴 순)와 같음
+        self._engines = {}
+        by_language = {}
+        for keyword_type, languages in patterns.items():
+            for language, sources in languages.items():
+                by_language.setdefault(language, []).extend((keyword_type, source) for source in sources)
+        for language, entries in by_language.items():
+            triggers = [source[:-len(VALUE_TAIL)] if source.endswith(VALUE_TAIL) else source for _, source in entries]
+            combined = re.compile('|'.join(f'(?:{trigger})' for trigger in triggers), re.IGNORECASE)
+            compiled = [(keyword_type, re.compile(source, re.IGNORECASE)) for keyword_type, source in entries]
+            self._engines[language] = (combined, compiled, self._dispatch_table(triggers))
+
+    @staticmethod
+    def _dispatch_table(triggers: List[str]) -> dict:
+        """
+        트리거가 글자로 시작하면 그 글자가 나온 위치에서만 해당 패턴을 확인합니다.
+        (\\d, \\w, 괄호 등으로 시작하는 패턴은 모든 후보 위치에서 확인, 키 None)
+        """
+        literal = {}
+        anywhere = []
+        for index, trigger in enumerate(triggers):
+            first = trigger[0]
+            if first in '\\([.^$':
+                anywhere.append(index)
+            else:
+                literal.setdefault(first.lower(), []).append(index)
+        table = {char: sorted(indices + anywhere) for char, indices in literal.items()}
+        table[None] = anywhere
+        return table
+
+    def extract(self, text: str, language: str = None) -> List[Dict]:
+        """텍스트에서 키워드를 추출합니다. language를 주지 않으면 감지합니다."""
+        if not text:
+            return []
+        if language is None:
+            language = language_id.detect_language(text, supported=language_id.SUPPORTED_LANGUAGES)
+        engine = self._engines.get(language)
+        if engine is None:
+            return []
+        combined, compiled, dispatch = engine
+        anywhere = dispatch[None]
+
+        found = []
+        # 패턴별로 마지막 매치가 끝난 위치 (finditer처럼 같은 패턴의 매치는 겹치지 않게)
+        ends = [0] * len(compiled)
+        match = combined.search(text)
+        while match:
+            start = match.start()
+            for index in dispatch.get(text[start].lower(), anywhere):
+                if start < ends[index]:
+                    continue
+                keyword_type, pattern = compiled[index]
+                hit = pattern.match(text, start)
+                if hit is None:
+                    continue
+                ends[index] = hit.end()
+                value = hit.group(1).strip()
+                if MIN_VALUE_LENGTH <= len(value) <= MAX_VALUE_LENGTH:
+                    found.append((index, start, {
+                        'type': keyword_type,
+                        'value': value,
+                        'language': language,
+                        'context': text[:CONTEXT_CHARS],
+                    }))
+            match = combined.search(text, start + 1)
+        found.sort(key=lambda item: item[:2])
+        return [keyword for _, _, keyword in found]
+
+    def extract_batch(self, texts: List[str], languages: List[str] = None) -> List[List[Dict]]:
+        """여러 텍스트를 한 번에 처리합니다. 결과는 texts와 같은 순서입니다."""
+        languages = languages or [None] * len(texts)
+        return [self.extract(text, language) for text, language in zip(texts, languages)]
+
+
+# 시작할 때 한 번만 컴파일
+_extractor = KeywordExtractor()
+
+
+def get_extractor() -> KeywordExtractor:
+    return _extractor
@@ -0,0 +1,127 @@
+"""
+언어 감지 (모든 봇/매니저가 공유)
+메시지마다 여러 곳에서 langdetect를 따로 돌리던 것을 한 곳으로 모았습니다.
+
+- 빠른 경로: 한글/가나/한자가 글자의 일정 비율 이상이면 문자 범위만으로 결정 (ko/ja/zh)
+- 나머지는 통계 모델(langdetect)로 감지. 프로필은 모듈을 불러올 때 미리 적재하고 seed를 고정해 결과가 항상 같음
+- 정규화한 텍스트를 키로 LRU 캐시 (같은 메시지/응답을 반복 감지해도 한 번만 계산)
+"""
+import os
+import re
+from functools import lru_cache
+
+try:
+    import langdetect
+    from langdetect import DetectorFactory, detector_factory
+    from langdetect.lang_detect_exception import LangDetectException
+except ImportError:
+    langdetect = None
+
+LANGUAGE_ID_CACHE_SIZE = int(os.environ.get("LANGUAGE_ID_CACHE_SIZE", 4096))
+# 한글/가나/한자 글자가 전체 글자 중 이 비율 이상이면 통계 모델 없이 문자 범위로 결정
+SCRIPT_MIN_SHARE = float(os.environ.get("LANGUAGE_ID_SCRIPT_MIN_SHARE", 0.3))
+# 감지에 사용하는 최대 글자 수 (긴 텍스트도 앞부분이면 충분)
+MAX_DETECT_CHARS = 500
+
+DEFAULT_LANGUAGE = 'en'
+SUPPORTED_LANGUAGES = ('ko', 'ja', 'zh', 'en')
+_LANG_MAP = {'zh-cn': 'zh', 'zh-tw': 'zh'}
+
+_BRACKETS = re.compile(r'\([^)]*\)|（[^）]*）|\[[^\]]*\]')
+_NON_LETTER = re.compile(r'[\W\d_]+')
+_SPACES = re.compile(r'\s+')
+_HANGUL = re.compile(r'[가-힣ㄱ-ㅎㅏ-ㅣ]')
+_KANA = re.compile(r'[ぁ-んァ-ンー]')
+_HAN = re.compile(r'[㐀-䶿一-鿿]')
+
+metrics = {
+    'calls': 0,
+    'empty': 0,
+    'script': 0,
+    'model': 0,
+    'model_errors': 0,
+}
+
+
+def _load_model() -> bool:
+    """langdetect 언어 프로필을 미리 적재합니다. (첫 메시지에서 수백 ms 멈추지 않도록)"""
+    if langdetect is None:
+        print("[LanguageID] langdetect not installed, using script ranges only")
+        return False
+    DetectorFactory.seed = 0  # 매번 같은 결과가 나오도록 고정
+    detector_factory.init_factory()
+    return True
+
+
+_model_loaded = _load_model()
+
+
+def normalize(text: str) -> str:
+    """괄호 속 행동 묘사, 숫자, 기호를 빼고 공백을 정리해 소문자로 만듭니다. (캐시 키)"""
+    if not text:
+        return ""
+    stripped = _BRACKETS.sub(' ', text)
+    if not _NON_LETTER.sub('', stripped):
+        stripped = text  # 괄호 안에만 글자가 있으면 원문 사용
+    return _SPACES.sub(' ', _NON_LETTER.sub(' ', stripped)).strip().lower()[:MAX_DETECT_CHARS]
+
+
+def script_language(text: str):
+    """한글/가나/한자가 있으면 문자 범위로 언어를 고릅니다. 없으면 None."""
+    hangul = len(_HANGUL.findall(text))
+    kana = len(_KANA.findall(text))
+    han = len(_HAN.findall(text))
+    if not (hangul or kana or han):
+        return None
+    if hangul >= kana + han:
+        return 'ko'
+    # 일본어는 한자와 가나를 섞어 쓰므로 가나가 있으면 일본어
+    return 'ja' if kana else 'zh'
+
+
+@lru_cache(maxsize=LANGUAGE_ID_CACHE_SIZE)
+def _detect_normalized(text: str) -> str:
+    letters = text.replace(' ', '')
+    script = script_language(letters)
+    if script is not None:
+        cjk = len(_HANGUL.findall(letters)) + len(_KANA.findall(letters)) + len(_HAN.findall(letters))
+        if cjk / len(letters) >= SCRIPT_MIN_SHARE or not _model_loaded:
+            metrics['script'] += 1
+            return script
+    if not _model_loaded:
+        metrics['script'] += 1
+        return DEFAULT_LANGUAGE
+    metrics['model'] += 1
+    try:
+        detected = langdetect.detect(text)
+    except LangDetectException:
+        metrics['model_errors'] += 1
+        return script or DEFAULT_LANGUAGE
+    return _LANG_MAP.get(detected, detected)
+
+
+def detect_language(text: str, supported=None, default: str = DEFAULT_LANGUAGE) -> str:
+    """
+    텍스트의 언어 코드(ko, ja, zh, en, fr, ...)를 반환합니다.
+    supported를 주면 그 밖의 언어는 default로 바꿉니다. 글자가 없으면 default.
+    """
+    metrics['calls'] += 1
+    normalized = normalize(text)
+    if not normalized:
+        metrics['empty'] += 1
+        return default
+    language = _detect_normalized(normalized)
+    if supported is not None and language not in supported:
+        return default
+    return language
+
+
+def get_metrics() -> dict:
+    cache = _detect_normalized.cache_info()
+    return {
+        **metrics,
+        'model_loaded': _model_loaded,
+        'cache_hits': cache.hits,
+        'cache_misses': cache.misses,
+        'cache_size': cache.currsize,
+    }
@@ -0,0 +1,146 @@
+"""
+메모리 내 랭킹(리더보드)
+affinity 테이블을 한 번 읽어 캐릭터별/전체 점수를 정렬 배열에 올려두고,
+update_affinity가 점수를 바꿀 때마다 해당 항목만 갱신합니다.
+
+- 상위 N명: 정렬 배열 앞부분을 잘라서 반환 (DB 조회 없음)
+- 내 순위: bisect로 O(log n) (나보다 점수가 높은 사용자 수 + 1, 기존 SQL과 같은 규칙)
+"""
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+
+# 랭킹에서 제외하는 봇 계정
+EXCLUDE_BOT_IDS = (1363156675959460061,)
+# 다른 프로세스/관리 스크립트가 affinity를 직접 고친 경우를 대비해 이 주기(초)마다 다시 적재
+LEADERBOARD_RESEED_SECONDS = float(os.environ.get("LEADERBOARD_RESEED_SECONDS", 3600))
+
+TOTAL = None  # 전체 랭킹을 나타내는 키
+
+
+class SortedLeaderboard:
+    """
+    (-점수, user_id) 정렬 배열 + user_id -> (점수, 메시지 수) 사전.
+    점수가 같으면 user_id 순으로 정렬됩니다.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def set(self, user_id: int, score: int, messages: int = 0):
+        old = self._entries.get(user_id)
+        if old is not None:
+            if old[0] == score:
+                self._entries[user_id] = (score, messages)
+                return
+            index = bisect_left(self._keys, (-old[0], user_id))
+            del self._keys[index]
+        insort(self._keys, (-score, user_id))
+        self._entries[user_id] = (score, messages)
+
+    def remove(self, user_id: int):
+        old = self._entries.pop(user_id, None)
+        if old is not None:
+            del self._keys[bisect_left(self._keys, (-old[0], user_id))]
+
+    def get(self, user_id: int):
+        return self._entries.get(user_id)
+
+    def rank(self, user_id: int):
+        """순위(1부터)를 반환합니다. 점수가 없으면 None."""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        # (-score,)는 같은 점수의 모든 (-score, user_id)보다 앞에 오므로 '나보다 높은 점수'의 개수가 됨
+        return bisect_left(self._keys, (-entry[0],)) + 1
+
+    def top(self, n: int) -> list:
+        """[(user_id, 점수, 메시지 수), ...]를 점수 내림차순으로 반환합니다."""
+        return [(user_id, -neg_score, self._entries[user_id][1]) for neg_score, user_id in self._keys[:n]]
+
+
+class LeaderboardEngine:
+    """캐릭터별 리더보드와 전체 리더보드를 함께 관리합니다. (스레드 안전)"""
+
+    def __init__(self, load_rows, reseed_seconds: float = LEADERBOARD_RESEED_SECONDS):
+        """load_rows()는 affinity의 (user_id, character_name, emotion_score, daily_message_count) 목록을 반환해야 합니다."""
+        self._load_rows = load_rows
+        self.reseed_seconds = reseed_seconds
+        self._boards = {}
+        self._user_scores = {}  # user_id -> {character_name: (점수, 메시지 수)}
+        self._lock = threading.RLock()
+        self._seeded_at = None
+        self.metrics = {'seeds': 0, 'updates': 0, 'reads': 0, 'last_seed_ms': 0.0}
+
+    def _ensure_seeded(self):
+        if self._seeded_at is None or (self.reseed_seconds > 0 and time.monotonic() - self._seeded_at > self.reseed_seconds):
+            self.seed()
+
+    def seed(self):
+        """affinity 전체를 읽어 리더보드를 다시 만듭니다."""
+        # 적재 중에 들어온 update가 덮어써지지 않도록 적재가 끝날 때까지 잠금 유지
+        with self._lock:
+            start = time.perf_counter()
+            rows = self._load_rows()
+            boards = {TOTAL: SortedLeaderboard()}
+            user_scores = {}
+            for user_id, character_name, score, messages in rows:
+                if user_id in EXCLUDE_BOT_IDS:
+                    continue
+                user_scores.setdefault(user_id, {})[character_name] = (score or 0, messages or 0)
+            for user_id, scores in user_scores.items():
+                for character_name, (score, messages) in scores.items():
+                    boards.setdefault(character_name, SortedLeaderboard()).set(user_id, score, messages)
+                boards[TOTAL].set(user_id, sum(s for s, _ in scores.values()), sum(m for _, m in scores.values()))
+            self._boards = boards
+            self._user_scores = user_scores
+            self._seeded_at = time.monotonic()
+            self.metrics['seeds'] += 1
+            self.metrics['last_seed_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        print(f"[Leaderboard] Seeded {len(user_scores)} users in {self.metrics['last_seed_ms']}ms")
+
+    def update(self, user_id: int, character_name: str, score: int, messages: int):
+        """update_affinity가 커밋한 새 점수를 반영합니다. (아직 적재 전이면 다음 적재에 포함되므로 무시)"""
+        if user_id in EXCLUDE_BOT_IDS:
+            return
+        with self._lock:
+            if self._seeded_at is None:
+                return
+            scores = self._user_scores.setdefault(user_id, {})
+            scores[character_name] = (score, messages)
+            self._boards.setdefault(character_name, SortedLeaderboard()).set(user_id, score, messages)
+            self._boards[TOTAL].set(user_id, sum(s for s, _ in scores.values()), sum(m for _, m in scores.values()))
+            self.metrics['updates'] += 1
+
+    def top(self, character_name: str = TOTAL, n: int = 20) -> list:
+        with self._lock:
+            self._ensure_seeded()
+            self.metrics['reads'] += 1
+            board = self._boards.get(character_name)
+            return board.top(n) if board else []
+
+    def rank(self, user_id: int, character_name: str = TOTAL):
+        with self._lock:
+            self._ensure_seeded()
+            self.metrics['reads'] += 1
+            board = self._boards.get(character_name)
+            return board.rank(user_id) if board else None
+
+    def entry(self, user_id: int, character_name: str = TOTAL):
+        """(점수, 메시지 수)를 반환합니다. 점수가 없으면 None."""
+        with self._lock:
+            self._ensure_seeded()
+            board = self._boards.get(character_name)
+            return board.get(user_id) if board else None
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            return {
+                **self.metrics,
+                'boards': {name or 'total': len(board) for name, board in self._boards.items()},
+            }
@@ -0,0 +1,248 @@
+"""
+LLM 게이트웨이
+모든 OpenAI 호출이 지나가는 단일 경로입니다.
+
+- 프로세스 전체에서 하나의 AsyncOpenAI 클라이언트(keep-alive 연결 풀)를 공유
+- 요청별 타임아웃
+- 타입이 지정된 예외(openai.APIConnectionError 등)로 재시도 여부를 판단하는
+  지수 백오프 재시도 (문자열 매칭 없음)
+- llm_scheduler를 통한 동시 실행/속도 제한과 우선순위 (대화 응답 > 백그라운드 작업)
+- 스트리밍 응답 (stream_chat_completion)
+"""
+import asyncio
+import os
+import random
+
+import httpx
+import openai
+
+from llm_scheduler import scheduler, estimate_tokens, LLMOverloadedError, PRIORITY_INTERACTIVE
+
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 60))
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", 10))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 3))
+LLM_BASE_DELAY = float(os.environ.get("LLM_BASE_DELAY", 1.0))
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", 50))
+LLM_MAX_KEEPALIVE = int(os.environ.get("LLM_MAX_KEEPALIVE", 20))
+LLM_KEEPALIVE_EXPIRY = float(os.environ.get("LLM_KEEPALIVE_EXPIRY", 60))
+
+# 재시도할 가치가 있는 오류 (일시적인 네트워크/서버/속도 제한 문제)
+NETWORK_ERRORS = (openai.APIConnectionError, openai.APITimeoutError, httpx.TransportError, asyncio.TimeoutError)
+RETRYABLE_ERRORS = NETWORK_ERRORS + (openai.RateLimitError, openai.InternalServerError, openai.ConflictError)
+
+
+class LLMError(Exception):
+    """재시도 후에도 LLM 호출이 실패했을 때 발생합니다. 원래 예외는 __cause__에 있습니다."""
+
+    def __init__(self, message: str, is_network_error: bool = False, is_retryable: bool = False):
+        super().__init__(message)
+        self.is_network_error = is_network_error
+        self.is_retryable = is_retryable
+
+
+class LLMOverloaded(LLMError):
+    """스케줄러 대기열이 가득 차서 요청이 거절되었습니다. queue_position은 대기 순번입니다."""
+
+    def __init__(self, queue_position: int):
+        super().__init__(f"LLM queue is full (position {queue_position})", is_retryable=True)
+        self.queue_position = queue_position
+
+
+_client = None
+
+metrics = {
+    'requests': 0,
+    'successes': 0,
+    'retries': 0,
+    'failures': 0,
+    'timeouts': 0,
+    'total_latency_seconds': 0.0,
+    'streams': 0,
+    'stream_first_chunk_seconds': 0.0,
+}
+
+
+def get_client() -> openai.AsyncOpenAI:
+    """공유 AsyncOpenAI 클라이언트를 반환합니다. (최초 호출 시 생성)"""
+    global _client
+    if _client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        )
+        # 재시도는 게이트웨이가 직접 처리하므로 SDK 내부 재시도는 끔
+        _client = openai.AsyncOpenAI(http_client=http_client, max_retries=0)
+    return _client
+
+
+def _retry_delay(error: Exception, attempt: int, base_delay: float) -> float:
+    """지수 백오프 + 지터. 서버가 Retry-After를 주면 그 값을 우선합니다."""
+    response = getattr(error, 'response', None)
+    if response is not None:
+        retry_after = response.headers.get('retry-after')
+        if retry_after:
+            try:
+                return min(float(retry_after), 30.0)
+            except ValueError:
+                pass
+    return base_delay * (2 ** attempt) * (0.5 + random.random() / 2)
+
+
+async def chat_completion(messages: list, model: str = "gpt-4o", max_retries: int = None,
+                          base_delay: float = None, timeout: float = None,
+                          priority: int = PRIORITY_INTERACTIVE, on_queued=None, **params) -> str:
+    """
+    채팅 완성 응답의 본문을 반환합니다.
+    일시적인 오류는 max_retries번까지 재시도하고, 그래도 실패하면 LLMError를 발생시킵니다.
+    priority는 llm_scheduler의 PRIORITY_* 값이며, 대기해야 하면 on_queued(순번) 코루틴을 호출합니다.
+    대기열이 가득 차면 LLMOverloaded를 발생시킵니다.
+    params는 chat.completions.create에 그대로 전달됩니다. (temperature, max_tokens 등)
+    """
+    max_retries = LLM_MAX_RETRIES if max_retries is None else max_retries
+    base_delay = LLM_BASE_DELAY if base_delay is None else base_delay
+    timeout = LLM_TIMEOUT if timeout is None else timeout
+    client = get_client()
+    loop = asyncio.get_running_loop()
+    estimated_tokens = estimate_tokens(messages, params.get("max_tokens"))
+
+    async def _create():
+        return await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            timeout=timeout,
+            **params
+        )
+
+    for attempt in range(max_retries):
+        metrics['requests'] += 1
+        start = loop.time()
+        try:
+            response = await scheduler.run(
+                model, priority, estimated_tokens, _create,
+                on_queued=on_queued if attempt == 0 else None
+            )
+            metrics['successes'] += 1
+            metrics['total_latency_seconds'] += loop.time() - start
+            usage = getattr(response, 'usage', None)
+            scheduler.record_usage(model, estimated_tokens, getattr(usage, 'total_tokens', None))
+            return response.choices[0].message.content
+        except LLMOverloadedError as e:
+            metrics['failures'] += 1
+            print(f"[LLM] Request shed (model={model}, priority={priority}, position={e.queue_position})")
+            raise LLMOverloaded(e.queue_position) from e
+        except RETRYABLE_ERRORS as e:
+            if isinstance(e, (openai.APITimeoutError, asyncio.TimeoutError)):
+                metrics['timeouts'] += 1
+            is_network_error = isinstance(e, NETWORK_ERRORS)
+            print(f"[LLM] {type(e).__name__} (attempt {attempt + 1}/{max_retries}, model={model}): {e}")
+            if attempt < max_retries - 1:
+                delay = _retry_delay(e, attempt, base_delay)
+                metrics['retries'] += 1
+                print(f"[LLM] Retrying in {delay:.1f} seconds...")
+                await asyncio.sleep(delay)
+                continue
+            metrics['failures'] += 1
+            raise LLMError(str(e), is_network_error=is_network_error, is_retryable=True) from e
+        except openai.OpenAIError as e:
+            # 잘못된 요청/인증 오류 등은 재시도해도 같은 결과이므로 바로 실패
+            print(f"[LLM] {type(e).__name__} (model={model}): {e}")
+            metrics['failures'] += 1
+            raise LLMError(str(e)) from e
+
+    metrics['failures'] += 1
+    raise LLMError("LLM request was not attempted (max_retries=0)")
+
+
+async def stream_chat_completion(messages: list, model: str = "gpt-4o", max_retries: int = None,
+                                 base_delay: float = None, timeout: float = None,
+                                 priority: int = PRIORITY_INTERACTIVE, on_queued=None, **params):
+    """
+    응답 본문을 생성되는 대로 조각(str)씩 내보내는 비동기 제너레이터입니다.
+    첫 조각이 나오기 전의 일시적인 오류만 재시도합니다. (이미 보낸 텍스트를 다시 만들 수 없으므로)
+    실패하면 LLMError, 대기열이 가득 차면 LLMOverloaded를 발생시킵니다.
+    """
+    max_retries = LLM_MAX_RETRIES if max_retries is None else max_retries
+    base_delay = LLM_BASE_DELAY if base_delay is None else base_delay
+    timeout = LLM_TIMEOUT if timeout is None else timeout
+    client = get_client()
+    loop = asyncio.get_running_loop()
+    estimated_tokens = estimate_tokens(messages, params.get("max_tokens"))
+
+    for attempt in range(max_retries):
+        metrics['requests'] += 1
+        start = loop.time()
+        started = False
+        used_tokens = None
+        try:
+            async with scheduler.slot(model, priority, estimated_tokens,
+                                      on_queued=on_queued if attempt == 0 else None):
+                stream = await client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    timeout=timeout,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    **params
+                )
+                async for chunk in stream:
+                    if chunk.usage is not None:
+                        used_tokens = chunk.usage.total_tokens
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        if not started:
+                            started = True
+                            metrics['stream_first_chunk_seconds'] += loop.time() - start
+                        yield delta
+            metrics['successes'] += 1
+            metrics['streams'] += 1
+            metrics['total_latency_seconds'] += loop.time() - start
+            scheduler.record_usage(model, estimated_tokens, used_tokens)
+            return
+        except LLMOverloadedError as e:
+            metrics['failures'] += 1
+            print(f"[LLM] Request shed (model={model}, priority={priority}, position={e.queue_position})")
+            raise LLMOverloaded(e.queue_position) from e
+        except RETRYABLE_ERRORS as e:
+            if isinstance(e, (openai.APITimeoutError, asyncio.TimeoutError)):
+                metrics['timeouts'] += 1
+            is_network_error = isinstance(e, NETWORK_ERRORS)
+            print(f"[LLM] {type(e).__name__} while streaming (attempt {attempt + 1}/{max_retries}, model={model}): {e}")
+            if not started and attempt < max_retries - 1:
+                delay = _retry_delay(e, attempt, base_delay)
+                metrics['retries'] += 1
+                print(f"[LLM] Retrying in {delay:.1f} seconds...")
+                await asyncio.sleep(delay)
+                continue
+            metrics['failures'] += 1
+            raise LLMError(str(e), is_network_error=is_network_error, is_retryable=not started) from e
+        except openai.OpenAIError as e:
+            print(f"[LLM] {type(e).__name__} while streaming (model={model}): {e}")
+            metrics['failures'] += 1
+            raise LLMError(str(e)) from e
+
+    metrics['failures'] += 1
+    raise LLMError("LLM request was not attempted (max_retries=0)")
+
+
+def get_metrics() -> dict:
+    successes = metrics['successes']
+    return {
+        **metrics,
+        'avg_latency_ms': round(metrics['total_latency_seconds'] / successes * 1000, 1) if successes else 0.0,
+        'avg_stream_first_chunk_ms': round(metrics['stream_first_chunk_seconds'] / metrics['streams'] * 1000, 1) if metrics['streams'] else 0.0,
+        'scheduler': scheduler.get_metrics(),
+    }
+
+
+async def close():
+    """공유 클라이언트의 연결을 닫습니다. (종료 시 호출)"""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -0,0 +1,232 @@
+"""
+LLM 요청 스케줄러
+llm_gateway의 모든 요청은 이 스케줄러를 거쳐 실행됩니다.
+
+- 전역 / 모델별 동시 실행 수 제한 (우선순위 큐: 대기 중이면 높은 우선순위부터 실행)
+- 모델별 토큰 버킷 속도 제한 (RPM: 분당 요청 수, TPM: 분당 토큰 수)
+- 대기열이 너무 길면 새 요청을 거절(load shedding)하고 대기 순번을 알려줌
+"""
+import asyncio
+import contextlib
+import heapq
+import itertools
+import json
+import os
+import time
+
+# 우선순위 (숫자가 작을수록 먼저 실행)
+PRIORITY_INTERACTIVE = 0  # 사용자에게 바로 보이는 응답
+PRIORITY_NORMAL = 1       # 응답 직전에 필요한 보조 호출 (감정 분석 등)
+PRIORITY_BACKGROUND = 2   # 요약 등 늦어져도 되는 작업
+
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 16))
+LLM_MODEL_CONCURRENCY = int(os.environ.get("LLM_MODEL_CONCURRENCY", 8))
+LLM_RPM = int(os.environ.get("LLM_RPM", 500))
+LLM_TPM = int(os.environ.get("LLM_TPM", 150000))
+# 모델별 설정 덮어쓰기, 예: {"gpt-4": {"concurrency": 4, "rpm": 200, "tpm": 40000}}
+LLM_MODEL_LIMITS = json.loads(os.environ.get("LLM_MODEL_LIMITS", "{}"))
+# 대기열 길이가 이 값을 넘으면 새 요청을 거절 (백그라운드 작업은 더 일찍 거절)
+LLM_MAX_QUEUE = int(os.environ.get("LLM_MAX_QUEUE", 100))
+LLM_MAX_BACKGROUND_QUEUE = int(os.environ.get("LLM_MAX_BACKGROUND_QUEUE", 20))
+
+
+class LLMOverloadedError(Exception):
+    """대기열이 가득 차서 요청이 거절되었을 때 발생합니다."""
+
+    def __init__(self, queue_position: int, priority: int):
+        super().__init__(f"LLM queue is full (position {queue_position}, priority {priority})")
+        self.queue_position = queue_position
+        self.priority = priority
+
+
+class PriorityLimiter:
+    """동시 실행 수를 제한하는 세마포어. 대기자는 (우선순위, 도착 순서)대로 깨웁니다."""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.in_use = 0
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    def position(self, priority: int) -> int:
+        """지금 이 우선순위로 들어오면 몇 번째로 실행될지 반환합니다. (1부터)"""
+        return 1 + sum(1 for p, _, fut in self._waiters if p <= priority and not fut.done())
+
+    async def acquire(self, priority: int):
+        if self.in_use < self.limit and not self.waiting:
+            self.in_use += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            # 슬롯을 넘겨받은 직후 취소되었다면 다음 대기자에게 돌려줌
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                # 슬롯을 그대로 다음 대기자에게 넘김 (in_use 유지)
+                fut.set_result(None)
+                return
+        self.in_use -= 1
+
+
+class TokenBucket:
+    """분당 허용량을 연속적으로 채우는 토큰 버킷."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def take(self, amount: float) -> float:
+        """amount만큼 가져갈 수 있을 때까지 기다립니다. 기다린 시간(초)을 반환합니다."""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+    def refund(self, amount: float):
+        """추정보다 적게 사용했을 때 차이를 돌려줍니다."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class _ModelLimits:
+    def __init__(self, model: str):
+        overrides = LLM_MODEL_LIMITS.get(model, {})
+        self.limiter = PriorityLimiter(model, overrides.get("concurrency", LLM_MODEL_CONCURRENCY))
+        self.requests = TokenBucket(overrides.get("rpm", LLM_RPM))
+        self.tokens = TokenBucket(overrides.get("tpm", LLM_TPM))
+
+
+def estimate_tokens(messages: list, max_tokens: int = None) -> int:
+    """프롬프트 + 최대 응답 길이로 사용 토큰 수를 대략 추정합니다. (문자 4개 ≈ 1토큰)"""
+    chars = 0
+    for message in messages:
+        content = message.get("content", "")
+        if isinstance(content, list):
+            # 멀티모달 메시지는 텍스트 부분만 계산하고 이미지는 고정값으로 추정
+            for part in content:
+                chars += len(part.get("text", "")) if part.get("type") == "text" else 3000
+        else:
+            chars += len(content or "")
+    return chars // 4 + (max_tokens or 256)
+
+
+class LLMScheduler:
+    def __init__(self):
+        self.global_limiter = PriorityLimiter("global", LLM_MAX_CONCURRENCY)
+        self._models = {}
+        self.metrics = {
+            'scheduled': 0,
+            'queued': 0,
+            'shed': 0,
+            'queue_wait_seconds': 0.0,
+            'rate_limit_wait_seconds': 0.0,
+            'by_priority': {PRIORITY_INTERACTIVE: 0, PRIORITY_NORMAL: 0, PRIORITY_BACKGROUND: 0},
+        }
+
+    def _limits(self, model: str) -> _ModelLimits:
+        if model not in self._models:
+            self._models[model] = _ModelLimits(model)
+        return self._models[model]
+
+    def queue_position(self, model: str, priority: int) -> int:
+        """지금 요청하면 대기할 순번을 반환합니다. (0이면 바로 실행)"""
+        limits = self._limits(model)
+        if limits.limiter.in_use < limits.limiter.limit and self.global_limiter.in_use < self.global_limiter.limit \
+                and not limits.limiter.waiting and not self.global_limiter.waiting:
+            return 0
+        return max(limits.limiter.position(priority), self.global_limiter.position(priority))
+
+    async def run(self, model: str, priority: int, estimated_tokens: int, func, on_queued=None):
+        """
+        슬롯과 속도 제한 토큰을 확보한 뒤 func()를 실행합니다.
+        대기해야 하면 on_queued(순번)를 호출하고, 대기열이 가득 차면 LLMOverloadedError를 발생시킵니다.
+        """
+        async with self.slot(model, priority, estimated_tokens, on_queued=on_queued):
+            return await func()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, model: str, priority: int, estimated_tokens: int, on_queued=None):
+        """run()과 같지만 블록이 끝날 때까지 슬롯을 잡아둡니다. (스트리밍 응답용)"""
+        limits = self._limits(model)
+        position = self.queue_position(model, priority)
+        max_queue = LLM_MAX_BACKGROUND_QUEUE if priority >= PRIORITY_BACKGROUND else LLM_MAX_QUEUE
+        if position > max_queue:
+            self.metrics['shed'] += 1
+            raise LLMOverloadedError(position, priority)
+
+        self.metrics['scheduled'] += 1
+        self.metrics['by_priority'][priority] = self.metrics['by_priority'].get(priority, 0) + 1
+        if position:
+            self.metrics['queued'] += 1
+            if on_queued:
+                try:
+                    await on_queued(position)
+                except Exception as e:
+                    print(f"[LLM Scheduler] on_queued callback failed: {e}")
+
+        start = time.monotonic()
+        await limits.limiter.acquire(priority)
+        try:
+            await self.global_limiter.acquire(priority)
+            try:
+                self.metrics['queue_wait_seconds'] += time.monotonic() - start
+                waited = await limits.requests.take(1)
+                waited += await limits.tokens.take(estimated_tokens)
+                self.metrics['rate_limit_wait_seconds'] += waited
+                yield
+            finally:
+                self.global_limiter.release()
+        finally:
+            limits.limiter.release()
+
+    def record_usage(self, model: str, estimated_tokens: int, used_tokens: int):
+        """실제 사용 토큰이 추정치보다 적으면 TPM 버킷에 차이를 돌려줍니다."""
+        if used_tokens is not None and used_tokens < estimated_tokens:
+            self._limits(model).tokens.refund(estimated_tokens - used_tokens)
+
+    def get_metrics(self) -> dict:
+        return {
+            **self.metrics,
+            'global_in_use': self.global_limiter.in_use,
+            'global_waiting': self.global_limiter.waiting,
+            'models': {
+                model: {
+                    'in_use': limits.limiter.in_use,
+                    'waiting': limits.limiter.waiting,
+                    'rpm_available': round(limits.requests.tokens, 1),
+                    'tpm_available': round(limits.tokens.tokens),
+                }
+                for model, limits in self._models.items()
+            },
+        }
+
+
+scheduler = LLMScheduler()
@@ -1,11 +1,14 @@
 import os
 from dotenv import load_dotenv
 import asyncio
+import llm_gateway
+import context_budget
+import session_snapshots
 from flask import Flask
 from threading import Thread
 from bot_selector import BotSelector
 from run_bots import CharacterBot
-from database_manager import DatabaseManager
+from database_manager import DatabaseManager, get_write_queue
 from config import CHARACTER_INFO
 from typing import Dict
 
@@ -52,6 +55,8 @@ async def run_bot(bot, token, name):
                 raise
 
 async def run_all_bots():
+    # 토큰 카운터 인코딩을 한 번만 불러옴 (처음에는 내려받을 수 있으므로 이벤트 루프 밖에서)
+    await asyncio.to_thread(context_budget.load_encoding)
     db = DatabaseManager()
     character_bots = {}
 
@@ -63,6 +68,9 @@ async def run_all_bots():
     selector_bot = BotSelector()
     selector_bot.character_bots = character_bots
 
+    # 재시작 전 세션 스냅샷을 봇이 세션을 사용하기 전에 이벤트 루프 밖에서 읽어 둠
+    await session_snapshots.restore()
+
     try:
         print("Starting bot initialization...")
         tasks = []
@@ -94,6 +102,9 @@ async def run_all_bots():
             if 'character_bots' in locals():
                 for bot in character_bots.values():
                     await bot.close()
+            # 대기 중인 로그 쓰기를 모두 기록
+            await get_write_queue().aclose()
+            await llm_gateway.close()
         except Exception as e:
             print(f"Error during cleanup: {e}")
 
@@ -0,0 +1,334 @@
+"""
+메모리 검색 인덱스 (관련도 순 메모리 선택)
+메모리 요약과 에피소드를 로컬에서 벡터로 만들어 (사용자, 캐릭터)별 인덱스에 저장하고,
+대화 컨텍스트에는 품질 점수 순이 아니라 현재 메시지와 관련 있는 메모리를 토큰 예산 안에서 넣습니다.
+
+- 임베딩: 해싱 트릭 TF-IDF (외부 모델/네트워크 없음)
+  영문/숫자는 단어, 한글은 단어 + 글자 2-gram, 일본어/한자는 글자 2-gram을 crc32로 MEMORY_INDEX_DIM개 버킷에 해싱
+  문서 벡터는 (1 + log tf)를 L2 정규화해 저장하고, 질의 벡터에 인덱스 안의 문서 빈도로 계산한 idf를 곱해 비교
+- 저장: MEMORY_INDEX_DIR/<user_id>/<캐릭터>.vec (버킷 x 문서 float32 행렬, np.memmap으로 읽기 전용 매핑) + .json (id, 내용, 토큰 수, 시각)
+  질의 벡터는 특징 버킷 몇 개만 0이 아니므로 버킷별로 연속 저장해 두고 그 행만 곱함 (전체 행렬 곱보다 몇 배 빠름)
+  파일이 없거나 깨졌으면 DB(get_memory_documents)에서 다시 만듦. 기록은 임시 파일에 쓴 뒤 교체
+- 갱신: 요약이 저장되면 refresh로 DB와 비교해 새 문서만 임베딩하고 지워진 문서는 제외 (스레드에서 실행)
+- 열린 인덱스는 session_registry의 'memory_index' 맵에 보관 (오래 쓰지 않으면 닫힘)
+- numpy가 없거나 검색에 실패하면 None을 반환하고, 호출하는 쪽은 기존처럼 품질 점수 순 요약을 사용
+"""
+import asyncio
+import json
+import math
+import os
+import re
+import time
+import zlib
+from datetime import datetime
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from context_budget import count_tokens
+from session_registry import get_session_map
+from user_actors import UserActors
+
+MEMORY_INDEX_DIR = os.environ.get("MEMORY_INDEX_DIR", "memory_index")
+MEMORY_INDEX_DIM = int(os.environ.get("MEMORY_INDEX_DIM", 256))
+MEMORY_RETRIEVAL_K = int(os.environ.get("MEMORY_RETRIEVAL_K", 3))
+# 이보다 유사도가 낮은 메모리는 관련 없는 것으로 보고 넣지 않음
+MEMORY_MIN_SIMILARITY = float(os.environ.get("MEMORY_MIN_SIMILARITY", 0.05))
+# 토큰 예산 때문에 건너뛸 수 있으므로 k의 몇 배까지 후보로 봄
+CANDIDATE_FACTOR = 4
+
+_TOKEN = re.compile(r'[가-힣]+|[ぁ-んァ-ン一-龯]+|[a-z0-9]+')
+
+
+def _features(text: str):
+    for token in _TOKEN.findall(text.lower()):
+        first = token[0]
+        if first.isascii():
+            if len(token) > 1:
+                yield token
+        elif '가' <= first <= '힣':
+            # 조사/어미가 붙어도 겹치도록 단어와 글자 2-gram을 함께 사용
+            yield token
+            for i in range(len(token) - 1):
+                yield token[i:i + 2]
+        elif len(token) == 1:
+            yield token
+        else:
+            for i in range(len(token) - 1):
+                yield token[i:i + 2]
+
+
+@lru_cache(maxsize=65536)
+def _bucket(feature: str, dim: int):
+    h = zlib.crc32(feature.encode('utf-8'))
+    return h % dim, (1.0 if h >> 31 else -1.0)
+
+
+def embed(text: str, dim: int = MEMORY_INDEX_DIM):
+    """텍스트를 L2 정규화한 float32 벡터로 만듭니다. (특징이 없으면 0 벡터)"""
+    counts = {}
+    for feature in _features(text or ""):
+        counts[feature] = counts.get(feature, 0) + 1
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature, count in counts.items():
+        bucket, sign = _bucket(feature, dim)
+        vector[bucket] += sign * (1.0 + math.log(count))
+    norm = float(np.linalg.norm(vector))
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+class MemoryIndex:
+    """(사용자, 캐릭터) 하나의 메모리 벡터와 메타데이터입니다. 만든 뒤에는 바꾸지 않습니다."""
+
+    def __init__(self, vectors, ids: list, texts: list, tokens: list, created: list):
+        self.vectors = vectors  # (dim, n) float32 (버킷별로 연속), 디스크에서 읽었으면 np.memmap
+        self.ids = ids
+        self.texts = texts
+        self.tokens = tokens
+        self.created = created  # ISO 문자열 또는 None
+        # 질의 가중치: 인덱스 안의 문서 빈도로 계산한 버킷별 idf
+        n = len(ids)
+        df = np.count_nonzero(vectors, axis=1) if n else np.zeros(vectors.shape[0])
+        self.idf = np.log((n + 1) / (df + 1)).astype(np.float32) + 1.0
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[0]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query: str, k: int = MEMORY_RETRIEVAL_K, token_budget: int = None,
+               min_similarity: float = MEMORY_MIN_SIMILARITY) -> list:
+        """관련도 순으로 최대 k개, 내용 토큰 합이 token_budget 이하인 [(내용, 시각, 유사도), ...]를 반환합니다."""
+        n = len(self.ids)
+        if n == 0 or k <= 0:
+            return []
+        q = embed(query, self.dim) * self.idf
+        norm = float(np.linalg.norm(q))
+        if norm == 0:
+            return []
+        buckets = np.flatnonzero(q)
+        scores = (q[buckets] / norm) @ self.vectors[buckets]
+        m = min(n, k * CANDIDATE_FACTOR)
+        candidates = np.argpartition(-scores, m - 1)[:m] if m < n else np.arange(n)
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        results, used = [], 0
+        for i in candidates.tolist():
+            score = float(scores[i])
+            if score < min_similarity:
+                break
+            if token_budget is not None and used + self.tokens[i] > token_budget:
+                continue
+            used += self.tokens[i]
+            created = self.created[i]
+            results.append((self.texts[i], datetime.fromisoformat(created) if created else None, score))
+            if len(results) >= k:
+                break
+        return results
+
+
+def build_index(documents: list, previous: MemoryIndex = None, dim: int = MEMORY_INDEX_DIM):
+    """
+    documents [(문서 id, 내용, 시각), ...]로 인덱스를 만듭니다.
+    previous에 같은 id가 있으면 그 벡터를 다시 쓰고, 새 문서만 임베딩합니다. (반환: (인덱스, 새로 임베딩한 수))
+    """
+    reuse = {}
+    if previous is not None and previous.dim == dim:
+        reuse = {doc_id: i for i, doc_id in enumerate(previous.ids)}
+    vectors = np.empty((dim, len(documents)), dtype=np.float32)
+    ids, texts, tokens, created = [], [], [], []
+    kept, kept_from = [], []
+    for column, (doc_id, text, timestamp) in enumerate(documents):
+        text = text or ""
+        i = reuse.get(doc_id)
+        if i is not None:
+            kept.append(column)
+            kept_from.append(i)
+            tokens.append(previous.tokens[i])
+        else:
+            vectors[:, column] = embed(text, dim)
+            tokens.append(count_tokens(text))
+        ids.append(doc_id)
+        texts.append(text)
+        created.append(timestamp.isoformat() if isinstance(timestamp, datetime) else timestamp)
+    if kept:
+        # 다시 쓰는 벡터는 한 번에 복사 (열 하나씩 읽으면 memmap에서 느림)
+        vectors[:, kept] = previous.vectors[:, kept_from]
+    return MemoryIndex(vectors, ids, texts, tokens, created), len(documents) - len(kept)
+
+
+def _paths(root: str, user_id: int, character: str):
+    safe = re.sub(r'[^\w가-힣-]', '_', character)
+    base = os.path.join(root, str(user_id), safe)
+    return base + '.vec', base + '.json'
+
+
+def save_index(index: MemoryIndex, root: str, user_id: int, character: str):
+    vec_path, meta_path = _paths(root, user_id, character)
+    os.makedirs(os.path.dirname(vec_path), exist_ok=True)
+    # 벡터를 먼저 교체하고 메타데이터를 나중에 교체 (중간에 멈추면 크기가 맞지 않아 다음에 다시 만듦)
+    np.ascontiguousarray(index.vectors, dtype=np.float32).tofile(vec_path + '.tmp')
+    os.replace(vec_path + '.tmp', vec_path)
+    with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'dim': index.dim, 'ids': index.ids, 'texts': index.texts,
+                   'tokens': index.tokens, 'created': index.created}, f, ensure_ascii=False)
+    os.replace(meta_path + '.tmp', meta_path)
+
+
+def load_index(root: str, user_id: int, character: str, dim: int = MEMORY_INDEX_DIM):
+    """디스크의 인덱스를 엽니다. 없거나 형식이 맞지 않으면 None."""
+    vec_path, meta_path = _paths(root, user_id, character)
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        n = len(meta['ids'])
+        if meta['dim'] != dim or os.path.getsize(vec_path) != n * dim * 4:
+            return None
+        if n == 0:
+            vectors = np.zeros((dim, 0), dtype=np.float32)
+        else:
+            vectors = np.memmap(vec_path, dtype=np.float32, mode='r', shape=(dim, n))
+        return MemoryIndex(vectors, meta['ids'], meta['texts'], meta['tokens'], meta['created'])
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[MemoryIndex] Ignoring unreadable index {vec_path}: {e}")
+        return None
+
+
+class MemoryRetriever:
+    """(사용자, 캐릭터)별 인덱스를 열고, 검색하고, 새 메모리를 반영합니다. (이벤트 루프 한 곳에서만 사용)"""
+
+    def __init__(self, db=None, root: str = MEMORY_INDEX_DIR, dim: int = MEMORY_INDEX_DIM):
+        self._db = db
+        self.root = root
+        self.dim = dim
+        self._indexes = get_session_map('memory_index')
+        # 같은 (사용자, 캐릭터)의 열기/갱신은 하나씩 순서대로 실행
+        self._serial = UserActors(max_depth=1 << 30)
+        self.metrics = {
+            'searches': 0, 'results': 0, 'empty': 0, 'errors': 0, 'opened': 0, 'rebuilt': 0,
+            'refreshed': 0, 'embedded': 0, 'search_seconds': 0.0, 'max_search_ms': 0.0,
+        }
+
+    @property
+    def db(self):
+        if self._db is None:
+            from database_manager import get_db_manager
+            self._db = get_db_manager()
+        return self._db
+
+    @property
+    def available(self) -> bool:
+        return np is not None
+
+    def _open(self, user_id: int, character: str):
+        index = load_index(self.root, user_id, character, self.dim)
+        if index is not None:
+            self.metrics['opened'] += 1
+            return index
+        documents = self.db.get_memory_documents(user_id, character)
+        if documents is None:
+            return None
+        index, embedded = build_index(documents, dim=self.dim)
+        save_index(index, self.root, user_id, character)
+        self.metrics['rebuilt'] += 1
+        self.metrics['embedded'] += embedded
+        return index
+
+    def _rebuild(self, user_id: int, character: str, current: MemoryIndex):
+        documents = self.db.get_memory_documents(user_id, character)
+        if documents is None:
+            return current
+        if current is None:
+            current = load_index(self.root, user_id, character, self.dim)
+        if current is not None and current.ids == [doc_id for doc_id, _, _ in documents]:
+            return current
+        index, embedded = build_index(documents, current, self.dim)
+        save_index(index, self.root, user_id, character)
+        self.metrics['refreshed'] += 1
+        self.metrics['embedded'] += embedded
+        return index
+
+    async def get_index(self, user_id: int, character: str):
+        key = (user_id, character)
+        index = self._indexes.get(key)
+        if index is not None:
+            return index
+
+        async def open_once():
+            index = self._indexes.get(key)
+            if index is None:
+                index = await asyncio.to_thread(self._open, user_id, character)
+                if index is not None:
+                    self._indexes[key] = index
+            return index
+
+        return await self._serial.run(key, open_once)
+
+    async def refresh(self, user_id: int, character: str):
+        """DB의 메모리 요약/에피소드를 인덱스에 반영합니다. (요약을 저장한 뒤 호출)"""
+        if not self.available:
+            return
+        key = (user_id, character)
+
+        async def rebuild():
+            index = await asyncio.to_thread(self._rebuild, user_id, character, self._indexes.peek(key))
+            if index is not None:
+                self._indexes[key] = index
+
+        await self._serial.run(key, rebuild)
+
+    async def search(self, user_id: int, character: str, query: str, k: int = MEMORY_RETRIEVAL_K,
+                     token_budget: int = None):
+        """관련 메모리 [(내용, 시각), ...]를 관련도 순으로 반환합니다. 인덱스를 쓸 수 없으면 None."""
+        if not self.available:
+            return None
+        try:
+            index = await self.get_index(user_id, character)
+            if index is None:
+                return None
+            start = time.perf_counter()
+            results = index.search(query, k, token_budget)
+            elapsed = time.perf_counter() - start
+        except Exception as e:
+            self.metrics['errors'] += 1
+            print(f"[MemoryIndex] Search failed for {user_id}/{character}: {e}")
+            return None
+        self.metrics['searches'] += 1
+        self.metrics['results'] += len(results)
+        if not results:
+            self.metrics['empty'] += 1
+        self.metrics['search_seconds'] += elapsed
+        self.metrics['max_search_ms'] = max(self.metrics['max_search_ms'], round(elapsed * 1000, 3))
+        return [(text, created_at) for text, created_at, _ in results]
+
+    def get_metrics(self) -> dict:
+        searches = self.metrics['searches']
+        return {
+            'available': self.available,
+            'open_indexes': len(self._indexes),
+            'searches': searches,
+            'avg_results': round(self.metrics['results'] / searches, 2) if searches else 0.0,
+            'empty': self.metrics['empty'],
+            'errors': self.metrics['errors'],
+            'opened': self.metrics['opened'],
+            'rebuilt': self.metrics['rebuilt'],
+            'refreshed': self.metrics['refreshed'],
+            'embedded': self.metrics['embedded'],
+            'avg_search_ms': round(self.metrics['search_seconds'] / searches * 1000, 3) if searches else 0.0,
+            'max_search_ms': self.metrics['max_search_ms'],
+        }
+
+
+memory_retriever = MemoryRetriever()
+
+
+def get_metrics() -> dict:
+    return memory_retriever.get_metrics()
@@ -0,0 +1,106 @@
+"""
+메시지 묶기 (디바운스)
+사용자가 짧은 메시지를 연달아 보내면 (사용자, 채널)별로 COALESCE_WINDOW초 동안 더 오는지 기다렸다가
+한 턴으로 묶어 LLM 호출과 답장을 한 번만 합니다.
+
+- 첫 메시지를 받은 핸들러가 묶음을 처리하고, 그 사이 도착한 메시지의 핸들러는 None을 받고 바로 끝남
+- 새 메시지가 올 때마다 대기 시간이 다시 시작되지만, 첫 메시지부터 COALESCE_MAX_WAIT초가 지나거나
+  COALESCE_MAX_MESSAGES개가 모이면 바로 처리
+- COALESCE_WINDOW=0이면 묶지 않음 (메시지마다 한 턴)
+- 메시지 한도는 묶은 뒤에도 메시지마다 차감 (CharacterBot.process_normal_message 참고)
+"""
+import asyncio
+import os
+import time
+
+COALESCE_WINDOW = float(os.environ.get("COALESCE_WINDOW", 1.5))
+COALESCE_MAX_WAIT = float(os.environ.get("COALESCE_MAX_WAIT", 5))
+COALESCE_MAX_MESSAGES = int(os.environ.get("COALESCE_MAX_MESSAGES", 8))
+
+
+class _Burst:
+    __slots__ = ('messages', 'first_at', 'last_at', 'full')
+
+    def __init__(self, message, now: float):
+        self.messages = [message]
+        self.first_at = now
+        self.last_at = now
+        self.full = asyncio.Event()  # 최대 개수가 모이면 기다리는 핸들러를 바로 깨움
+
+
+class MessageCoalescer:
+    """키별로 연달아 온 메시지를 묶습니다. (이벤트 루프 한 곳에서만 사용)"""
+
+    def __init__(self, window: float = COALESCE_WINDOW, max_wait: float = COALESCE_MAX_WAIT,
+                 max_messages: int = COALESCE_MAX_MESSAGES, clock=time.monotonic):
+        self.window = window
+        self.max_wait = max_wait
+        self.max_messages = max_messages
+        self._clock = clock
+        self._bursts = {}
+        self.metrics = {'messages': 0, 'turns': 0, 'llm_calls_saved': 0, 'max_burst': 0, 'wait_seconds': 0.0}
+
+    async def submit(self, key, message):
+        """
+        메시지를 key의 묶음에 넣습니다.
+        묶음을 처리할 핸들러에는 [메시지, ...](도착 순)를, 이미 처리 중인 묶음에 합쳐진 경우에는 None을 반환합니다.
+        """
+        self.metrics['messages'] += 1
+        now = self._clock()
+        burst = self._bursts.get(key)
+        if burst is not None:
+            burst.messages.append(message)
+            burst.last_at = now
+            if len(burst.messages) >= self.max_messages:
+                # 가득 찬 묶음은 더 받지 않고, 다음 메시지부터 새 묶음 시작
+                del self._bursts[key]
+                burst.full.set()
+            return None
+        if self.window <= 0:
+            self._record([message], 0.0)
+            return [message]
+
+        burst = self._bursts[key] = _Burst(message, now)
+        try:
+            while True:
+                now = self._clock()
+                if len(burst.messages) >= self.max_messages or now - burst.first_at >= self.max_wait:
+                    break
+                remaining = min(burst.last_at + self.window, burst.first_at + self.max_wait) - now
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(burst.full.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # 취소되어도 다음 메시지가 새 묶음을 시작할 수 있도록 정리
+            if self._bursts.get(key) is burst:
+                del self._bursts[key]
+        self._record(burst.messages, self._clock() - burst.first_at)
+        return burst.messages
+
+    def _record(self, messages: list, waited: float):
+        self.metrics['turns'] += 1
+        self.metrics['llm_calls_saved'] += len(messages) - 1
+        self.metrics['max_burst'] = max(self.metrics['max_burst'], len(messages))
+        self.metrics['wait_seconds'] += waited
+
+    def get_metrics(self) -> dict:
+        turns = self.metrics['turns']
+        return {
+            'messages': self.metrics['messages'],
+            'turns': turns,
+            'llm_calls_saved': self.metrics['llm_calls_saved'],
+            'max_burst': self.metrics['max_burst'],
+            'avg_burst': round(self.metrics['messages'] / turns, 2) if turns else 0.0,
+            'avg_wait_ms': round(self.metrics['wait_seconds'] / turns * 1000, 1) if turns else 0.0,
+            'pending_bursts': len(self._bursts),
+        }
+
+
+coalescer = MessageCoalescer()
+
+
+def get_metrics() -> dict:
+    return coalescer.get_metrics()
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
 데이터베이스 마이그레이션 스크립트
-기존 데이터베이스에 is_daily_message 컬럼을 추가합니다.
+아직 적용되지 않은 스키마 마이그레이션(schema_migrations.py)을 적용합니다.
 """
 
 import os
@@ -1,53 +1,24 @@
      # openai_manager.py
-import openai
+import llm_gateway
+from llm_scheduler import PRIORITY_NORMAL
 import re
 import asyncio
-import langdetect
+import language_id
 from typing import Dict, List, Tuple
 
-client = openai.AsyncOpenAI()
-
-async def call_openai(messages: list, model="gpt-4o"):
-    max_retries = 3
-    base_delay = 1.0
-    
-    for attempt in range(max_retries):
-        try:
-            response = await client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=150
-            )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            print(f"[OpenAI Error] (attempt {attempt + 1}/{max_retries}): {e}")
-            
-            # 네트워크 관련 에러인지 확인
-            is_network_error = (
-                "Connection reset by peer" in str(e) or
-                "Connection reset" in str(e) or
-                "Connection closed" in str(e) or
-                "Connection timeout" in str(e) or
-                "ClientOSError" in str(e) or
-                "aiohttp.client_exceptions.ClientOSError" in str(e) or
-                "aiohttp.client_exceptions.ClientConnectorError" in str(e) or
-                "aiohttp.client_exceptions.ServerDisconnectedError" in str(e) or
-                "aiohttp.client_exceptions.ClientResponseError" in str(e)
-            )
-            
-            # 마지막 시도가 아니고 네트워크 에러인 경우 재시도
-            if attempt < max_retries - 1 and is_network_error:
-                delay = base_delay * (2 ** attempt)  # 지수 백오프
-                print(f"[OpenAI] Network error detected, retrying in {delay} seconds...")
-                await asyncio.sleep(delay)
-                continue
-            else:
-                # 네트워크 에러가 아니거나 마지막 시도인 경우
-                print(f"[OpenAI] Failed after {max_retries} attempts, returning default value")
-                return None  # 기본값으로 None 반환
-    
-    return None  # 모든 재시도 실패 시 None 반환
+async def call_openai(messages: list, model="gpt-4o", priority=llm_gateway.PRIORITY_INTERACTIVE):
+    try:
+        response = await llm_gateway.chat_completion(
+            messages,
+            model=model,
+            temperature=0.7,
+            max_tokens=150,
+            priority=priority
+        )
+        return response.strip()
+    except llm_gateway.LLMError as e:
+        print(f"[OpenAI] Failed: {e}, returning default value")
+        return None  # 기본값으로 None 반환
 
 async def analyze_emotion_with_gpt(message: str) -> int:
     prompt = (
@@ -71,7 +42,7 @@ async def analyze_emotion_with_gpt(message: str) -> int:
         f"User: \"{message}\"\n"
         "Reply ONLY with [score:+1], [score:0], or [score:-1]."
     )
-    ai_reply = await call_openai([{"role": "user", "content": prompt}])
+    ai_reply = await call_openai([{"role": "user", "content": prompt}], priority=PRIORITY_NORMAL)
     match = re.search(r"\[score:([+-]?\d+)\]", ai_reply or "")
     try:
         return int(match.group(1)) if match else 0
@@ -80,31 +51,7 @@ async def analyze_emotion_with_gpt(message: str) -> int:
 
 def detect_language(text: str) -> str:
     """텍스트의 언어를 감지합니다."""
-    try:
-        # 괄호와 특수문자 제거
-        clean_text = re.sub(r'[\(\)\[\]\{\}\.\,\!\?\;\:\"\']', '', text)
-        clean_text = re.sub(r'[^\w\s가-힣一-龯あ-んア-ン]', '', clean_text)
-        
-        if not clean_text.strip():
-            return 'en'
-        
-        detected = langdetect.detect(clean_text)
-        lang_map = {
-            'zh-cn': 'zh', 'zh-tw': 'zh', 'zh': 'zh',
-            'ja': 'ja', 'ko': 'ko', 'en': 'en'
-        }
-        return lang_map.get(detected, 'en')
-    except Exception: # re.error 뿐만 아니라 모든 예외를 잡습니다.
-        # 오류 발생 시 원본 텍스트로 다시 시도 (괄호 제거 없이)
-        try:
-            detected = langdetect.detect(text)
-            lang_map = {
-                'zh-cn': 'zh', 'zh-tw': 'zh', 'zh': 'zh',
-                'ja': 'ja', 'ko': 'ko', 'en': 'en'
-            }
-            return lang_map.get(detected, 'en')
-        except:
-            return 'en' # 최종적으로 실패 시 'en' 반환
+    return language_id.detect_language(text, supported=language_id.SUPPORTED_LANGUAGES)
 
 def get_emotion_keywords() -> Dict[str, Dict[str, List[str]]]:
     """다국어 감정 키워드를 반환합니다."""
@@ -248,22 +195,14 @@ def analyze_message_length(message: str) -> Dict[str, int]:
         return {'positive': 0, 'negative': 0}
 
 async def analyze_emotion_with_gpt_and_pattern(message: str) -> int:
-    """개선된 70/30 감정 분석 (GPT 70% + 패턴 30%)"""
+    """
+    메시지의 감정 점수(-1, 0, +1)를 반환합니다.
+    로컬 분류기(emotion_classifier)가 먼저 판단하고, 확신도가 낮을 때만
+    기존 방식(GPT 70% + 패턴 30%)으로 계산합니다.
+    """
+    from emotion_classifier import get_scorer
     try:
-        # GPT 분석 (70%)
-        gpt_score = await analyze_emotion_with_gpt(message)
-        
-        # 패턴 분석 (30%)
-        pattern_score = analyze_emotion_with_patterns(message)
-        
-        # 가중 평균 계산
-        final_score = round(gpt_score * 0.7 + pattern_score * 0.3)
-        
-        # 디버그 정보 출력
-        print(f"[감정분석] 입력: {message[:50]}... | GPT: {gpt_score} | 패턴: {pattern_score:.2f} | 최종: {final_score}")
-        
-        return final_score
-        
+        return await get_scorer().score(message)
     except Exception as e:
         print(f"Error in combined emotion analysis: {e}")
         # 에러 시 GPT만 사용
@@ -325,25 +264,17 @@ async def get_roleplay_response(character_name: str, messages: list, roleplay_se
 
         formatted_messages = [system_message] + messages
 
-        for attempt in range(3):
-            try:
-                response = await client.chat.completions.create(
-                    model="gpt-4",
-                    messages=formatted_messages,
-                    temperature=0.7,
-                    max_tokens=150
-                )
-                return response.choices[0].message.content.strip()
-            except Exception as e:
-                print(f"Error in get_roleplay_response (attempt {attempt+1}): {e}")
-                if (hasattr(e, 'http_status') and e.http_status == 500) or \
-                   (hasattr(e, 'status_code') and e.status_code == 500) or \
-                   (hasattr(e, 'args') and 'server had an error' in str(e.args[0])):
-                    await asyncio.sleep(1.5)
-                    continue
-                break
-
-        return "There was a temporary issue with the AI server. Please try again in a moment."
+        try:
+            response = await llm_gateway.chat_completion(
+                formatted_messages,
+                model="gpt-4",
+                temperature=0.7,
+                max_tokens=150
+            )
+            return response.strip()
+        except llm_gateway.LLMError as e:
+            print(f"Error in get_roleplay_response: {e}")
+            return "There was a temporary issue with the AI server. Please try again in a moment."
 
     except Exception as e:
         print(f"Error in get_roleplay_response: {e}")
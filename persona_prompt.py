@@ -0,0 +1,98 @@
+"""
+캐릭터 페르소나 프롬프트 블록
+CharacterBot.build_conversation_context가 ContextBuilder에 넘기는 (우선순위, 텍스트) 블록을 만듭니다.
+봇 밖에서도(check_persona_budget.py) 같은 블록으로 예산을 확인할 수 있도록 분리했습니다.
+"""
+import random
+
+from config import (
+    CHARACTER_PROMPTS, CHARACTER_AFFINITY_SPEECH, CHARACTER_PERSONALITIES, CHARACTER_EMOTION_REACTIONS,
+    CHARACTER_TOPIC_REACTIONS, CHARACTER_TIME_REACTIONS,
+)
+
+
+def build_persona_blocks(character: str, nickname, affinity_grade: str, user_emotion: str, detected_topic: str,
+                         time_period: str, time_question: bool = False, time_info: dict = None,
+                         call_nickname: bool = False, pick=random.choice) -> list:
+    """
+    페르소나 블록 [(우선순위, 텍스트), ...]를 반환합니다. (우선순위 0은 필수, 예산을 넘으면 숫자가 큰 블록부터 제외)
+    pick: 감정별 반응 문장 중 하나를 고르는 함수
+    """
+    character_prompt = CHARACTER_PROMPTS.get(character, "")
+    character_personality = CHARACTER_PERSONALITIES.get(character, {})
+    affinity_speech = CHARACTER_AFFINITY_SPEECH.get(character, {}).get(affinity_grade, {})
+    tone = affinity_speech.get("tone", "")
+    example = affinity_speech.get("example", "")
+
+    # 캐릭터 개성 정보 추출
+    core_traits = character_personality.get("core_traits", [])
+    speech_patterns = character_personality.get("speech_patterns", [])
+    interests = character_personality.get("interests", [])
+    quirks = character_personality.get("quirks", [])
+    response_style = character_personality.get("response_style", "")
+
+    # 감정별 반응 정보
+    emotion_reactions = CHARACTER_EMOTION_REACTIONS.get(character, {}).get(user_emotion, {})
+    emotion_reaction = ""
+    if emotion_reactions:
+        emotion_reaction = pick(emotion_reactions.get("reactions", [""]))
+
+    # 주제별 반응 정보
+    topic_reaction = CHARACTER_TOPIC_REACTIONS.get(character, {}).get(detected_topic, "")
+
+    # 시간대별 반응 정보
+    time_reactions = CHARACTER_TIME_REACTIONS.get(character, {}).get(time_period, {})
+    time_greeting = time_reactions.get("greeting", "")
+    time_mood = time_reactions.get("mood", "")
+    time_activity = time_reactions.get("activity", "")
+
+    nickname_instruction = f"In this response, naturally incorporate the user's nickname '{nickname}' in a way that feels genuine and matches the emotional context. Only use the nickname if it flows naturally with your response." if nickname and call_nickname else "For this response, avoid using the user's nickname and focus on creating a natural conversation flow."
+
+    time_lines = ""
+    if time_info:
+        time_lines = f"\n- Current time: {time_info['time']} ({time_info['period_kr']})\n- Date: {time_info['date']}\n- Timezone: {time_info['timezone']}"
+
+    return [
+        (0, character_prompt),
+        (0, f"""Character Status:
+- User's nickname: {nickname if nickname else 'Not set'}
+- Affinity grade: {affinity_grade}
+- Current tone: {tone}
+- Example response: {example}"""),
+        (2, f"""Character Personality:
+- Core traits: {', '.join(core_traits)}
+- Speech patterns: {', '.join(speech_patterns)}
+- Interests: {', '.join(interests)}
+- Quirks: {', '.join(quirks)}
+- Response style: {response_style}"""),
+        (0 if time_question else 3, f"""Context Analysis:
+- User's detected emotion: {user_emotion}
+- Detected topic: {detected_topic}
+- Current time period: {time_period}{time_lines}"""),
+        (4, f"""Emotion-based Response:
+{emotion_reaction if emotion_reaction else "Respond naturally to the user's emotional state"}"""),
+        (4, f"""Topic-based Response:
+{topic_reaction if topic_reaction else "Respond naturally to the conversation topic"}"""),
+        (5, f"""Time-based Response:
+- Time greeting: {time_greeting}
+- Time mood: {time_mood}
+- Time activity: {time_activity}"""),
+        (1, nickname_instruction),
+        (0, f"""[IMPORTANT] For this conversation:
+1. Use the specified tone and nuance based on affinity level
+2. Keep responses natural and in character - embody the core traits and quirks
+3. Show appropriate emotions and actions in parentheses
+4. Maintain the character's unique personality and speech patterns
+5. Reference the character's interests when relevant
+6. Respond to the user's emotional state with empathy and understanding
+7. Incorporate topic-specific responses when relevant
+8. Consider the time of day in your response
+9. NEVER mention being an AI, bot, or program
+10. Always respond in the same language as the user
+11. Use informal speech style
+12. Add emotional expressions in parentheses like (smiles), (looks away), etc.
+13. Follow the character's response style and incorporate their quirks naturally
+14. Pay attention to the user's message context and respond appropriately
+15. Make the conversation feel personal and engaging
+{f"16. TIME QUESTION DETECTED: The user is asking about the current time. Provide the specific time information naturally in your response: {time_info['time']} ({time_info['period_kr']}) on {time_info['date']}" if time_question and time_info else ""}"""),
+    ]
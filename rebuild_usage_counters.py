@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+일일 사용량 카운터 백필/복구 스크립트
+conversations 테이블로부터 user_daily_usage 카운터를 다시 계산합니다.
+
+사용법:
+    python rebuild_usage_counters.py            # 전체 재구성 (최초 배포 시)
+    python rebuild_usage_counters.py --days 2   # 최근 2일만 복구
+"""
+
+import argparse
+import sys
+from database_manager import get_db_manager
+
+def main():
+    parser = argparse.ArgumentParser(description="user_daily_usage 카운터 재구성")
+    parser.add_argument("--days", type=int, default=None, help="최근 N일만 다시 계산합니다 (기본: 전체)")
+    args = parser.parse_args()
+
+    print("🔄 일일 사용량 카운터 재구성을 시작합니다...")
+    print("=" * 50)
+
+    db = get_db_manager()
+    rebuilt = db.rebuild_daily_usage_counters(days=args.days)
+    if rebuilt == 0:
+        print("⚠️ 재구성된 카운터가 없습니다. (대화 기록이 없거나 오류가 발생했습니다)")
+        sys.exit(1)
+
+    print("=" * 50)
+    print(f"✅ {rebuilt}개의 카운터 행이 재구성되었습니다.")
+
+if __name__ == "__main__":
+    main()
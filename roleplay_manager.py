@@ -1,5 +1,8 @@
 import discord
-import openai
+import llm_gateway
+import session_history
+from session_registry import get_session_map
+from streaming_reply import STREAM_REPLIES, stream_to_channel
 import re
 import time
 import uuid
@@ -10,7 +13,7 @@ from config import OPENAI_API_KEY, CHARACTER_INFO, ROLEPLAY_MODE_IMAGES
 class RoleplayManager:
     def __init__(self, bot_selector):
         self.bot_selector = bot_selector
-        self.roleplay_sessions = {}
+        self.roleplay_sessions = get_session_map('roleplay')
     
     async def create_roleplay_session(self, interaction: discord.Interaction, character_name: str, mode: str, 
                                     user_role: str, character_role: str, story_line: str):
@@ -44,7 +47,7 @@ class RoleplayManager:
             try:
                 if hasattr(self.bot_selector, 'db') and self.bot_selector.db:
                     print(f"[DEBUG] Attempting to create roleplay session in database...")
-                    db_session_id = self.bot_selector.db.create_roleplay_session(
+                    db_session_id = await self.bot_selector.db.acreate_roleplay_session(
                         interaction.user.id,
                         character_name,
                         mode,
@@ -261,7 +264,7 @@ class RoleplayManager:
             # 데이터베이스에 메시지 카운트 업데이트
             session_id = session.get("session_id")
             if session_id and hasattr(self.bot_selector, 'db') and self.bot_selector.db:
-                self.bot_selector.db.update_roleplay_message_count(session_id, session["turn_count"])
+                await self.bot_selector.db.aupdate_roleplay_message_count(session_id, session["turn_count"])
 
             turn_str = f"({session['turn_count']}/{max_turns})"
 
@@ -289,50 +292,59 @@ class RoleplayManager:
                 story_line, turn_str, mode_context, story_seeds, story_progression, tonal_enhancement
             )
 
-            # 대화 기록 세션에 저장
-            if "history" not in session:
-                session["history"] = []
-            session["history"].append({"role": "user", "content": message.content})
+            # OpenAI 호출 (롤플레잉 모드 전용, 최근 대화 + 이전 줄거리 요약만 전송)
+            messages = session_history.build_messages(session, system_prompt, message.content)
+            error_text = f"I'm having trouble responding right now. Please try again.\n__________________\n{character_name}: \"I apologize, but I'm experiencing some difficulties. Could you please try again?\" {turn_str}"
 
-            # OpenAI 호출 (롤플레잉 모드 전용)
-            try:
-                response = openai.chat.completions.create(
+            def finalize(ai_response):
+                ai_response = ai_response.strip()
+                # 새로운 형식에 맞게 응답 처리
+                # 이미 올바른 형식인지 확인 (분위기 설명 + 구분선 + 캐릭터 대화)
+                if "__________________" not in ai_response:
+                    # 기존 형식인 경우 새 형식으로 변환
+                    if ai_response.strip().startswith(f"{character_name}:"):
+                        # 캐릭터 이름 제거하고 새 형식으로 변환
+                        dialogue_part = ai_response.replace(f"{character_name}:", "").strip()
+                        # 간단한 분위기 설명 추가 (실제로는 AI가 생성해야 함)
+                        ai_response = f"The scene unfolds naturally as the moment develops.\n__________________\n{character_name}: {dialogue_part}"
+                    else:
+                        # 캐릭터 이름이 없는 경우 추가
+                        ai_response = f"The scene unfolds naturally as the moment develops.\n__________________\n{character_name}: {ai_response.strip()}"
+
+                # (n/100) 중복 방지
+                ai_response = re.sub(r"(\(\d{1,2}/100\))(?=.*\(\d{1,2}/100\))", "", ai_response)
+                if not re.search(r"\(\d{1,2}/100\)", ai_response):
+                    ai_response = f"{ai_response} {turn_str}"
+                return ai_response
+
+            if STREAM_REPLIES:
+                chunks = llm_gateway.stream_chat_completion(
+                    messages,
                     model="gpt-4o",
-                    messages=[
-                        {"role": "system", "content": system_prompt}
-                    ] + session["history"],
                     temperature=0.7,
                     max_tokens=300
                 )
-                ai_response = response.choices[0].message.content.strip()
-            except Exception as e:
-                print(f"Error in roleplay AI response: {e}")
-                ai_response = f"I'm having trouble responding right now. Please try again.\n__________________\n{character_name}: \"I apologize, but I'm experiencing some difficulties. Could you please try again?\" {turn_str}"
-
-            # 새로운 형식에 맞게 응답 처리
-            # 이미 올바른 형식인지 확인 (분위기 설명 + 구분선 + 캐릭터 대화)
-            if "__________________" not in ai_response:
-                # 기존 형식인 경우 새 형식으로 변환
-                if ai_response.strip().startswith(f"{character_name}:"):
-                    # 캐릭터 이름 제거하고 새 형식으로 변환
-                    dialogue_part = ai_response.replace(f"{character_name}:", "").strip()
-                    # 간단한 분위기 설명 추가 (실제로는 AI가 생성해야 함)
-                    ai_response = f"The scene unfolds naturally as the moment develops.\n__________________\n{character_name}: {dialogue_part}"
-                else:
-                    # 캐릭터 이름이 없는 경우 추가
-                    ai_response = f"The scene unfolds naturally as the moment develops.\n__________________\n{character_name}: {ai_response.strip()}"
-
-            # (n/100) 중복 방지
-            ai_response = re.sub(r"(\(\d{1,2}/100\))(?=.*\(\d{1,2}/100\))", "", ai_response)
-            if not re.search(r"\(\d{1,2}/100\)", ai_response):
-                ai_response = f"{ai_response} {turn_str}"
-
-            await message.channel.send(ai_response)
-            session["history"].append({"role": "assistant", "content": ai_response})
+                ai_response = await stream_to_channel(
+                    message.channel, chunks, finalize=finalize, error_text=lambda e: error_text
+                )
+            else:
+                try:
+                    ai_response = await llm_gateway.chat_completion(
+                        messages,
+                        model="gpt-4o",
+                        temperature=0.7,
+                        max_tokens=300
+                    )
+                    ai_response = finalize(ai_response)
+                except Exception as e:
+                    print(f"Error in roleplay AI response: {e}")
+                    ai_response = error_text
+                await message.channel.send(ai_response)
+            session_history.append_turn(session, message.content, ai_response)
             
             # 데이터베이스에 대화 저장
             if session_id and hasattr(self.bot_selector, 'db') and self.bot_selector.db:
-                self.bot_selector.db.save_roleplay_message(session_id, message.content, ai_response, session["turn_count"])
+                await self.bot_selector.db.asave_roleplay_message(session_id, message.content, ai_response, session["turn_count"])
 
             # 100턴 종료 처리
             if session["turn_count"] >= 100:
@@ -373,7 +385,7 @@ class RoleplayManager:
         # 데이터베이스 세션 종료
         session_id = session.get("session_id")
         if session_id and hasattr(self.bot_selector, 'db') and self.bot_selector.db:
-            self.bot_selector.db.end_roleplay_session(session_id)
+            await self.bot_selector.db.aend_roleplay_session(session_id)
         
         # 세션 정리
         if message.channel.id in self.roleplay_sessions:
@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
 import asyncio
+import llm_gateway
 from bot_selector import BotSelector
 from character_bot import CharacterBot
 import discord
@@ -9,7 +10,10 @@ import openai
 from discord import app_commands
 from typing import Dict, Any
 from datetime import datetime
-import langdetect
+import language_id  # 언어 프로필을 시작할 때 미리 적재
+import session_snapshots
+import context_budget
+import background_jobs
 from config import (
     CHARACTER_PROMPTS, 
     OPENAI_API_KEY, 
@@ -21,7 +25,7 @@ from config import (
 )
 import setuptools
 from openai_manager import analyze_emotion_with_gpt_and_pattern
-from database_manager import DatabaseManager
+from database_manager import DatabaseManager, get_write_queue
 from vision_manager import VisionManager
 
 # Load environment variables
@@ -41,6 +45,9 @@ async def run_bot(bot, token):
 
 async def run_all_bots():
     try:
+        # 토큰 카운터 인코딩을 한 번만 불러옴 (처음에는 내려받을 수 있으므로 이벤트 루프 밖에서)
+        await asyncio.to_thread(context_budget.load_encoding)
+
         # Initialize selector bot
         selector_bot = BotSelector()
 
@@ -63,6 +70,9 @@ async def run_all_bots():
         # Set character_bots in selector_bot
         selector_bot.character_bots = character_bots
 
+        # 재시작 전 세션 스냅샷을 봇이 세션을 사용하기 전에 이벤트 루프 밖에서 읽어 둠
+        await session_snapshots.restore()
+
         # Create tasks for all bots
         tasks = [
             run_bot(selector_bot, SELECTOR_TOKEN),
@@ -81,6 +91,12 @@ async def run_all_bots():
         await selector_bot.close()
         for bot in character_bots.values():
             await bot.close()
+        # 남은 백그라운드 작업을 마치고 마지막 세션 변경을 스냅샷으로 저장
+        await background_jobs.aclose()
+        await session_snapshots.aclose()
+        # 대기 중인 로그 쓰기를 모두 기록
+        await get_write_queue().aclose()
+        await llm_gateway.close()
 
 async def call_openai(prompt):
     # 실제 OpenAI API 연동 코드로 대체 필요
@@ -0,0 +1,173 @@
+"""
+메시지 안전장치 (스팸 감지)
+CharacterBot.process_normal_message가 LLM을 호출하기 전에 is_safe_to_process로 확인합니다.
+
+스팸 감지는 메시지당 비용이 대화 기록 길이나 활성 사용자 수와 무관하게 일정합니다.
+- 사용자별 고정 크기 링 버퍼(최근 SPAM_HISTORY_SIZE개)만 유지
+- 유사도: 글자 3-gram 집합의 bottom-k MinHash 스케치로 자카드 유사도 추정
+  (스케치는 메시지마다 한 번 만들고, 비교는 메시지 길이와 무관하게 O(k))
+- 정규식은 모듈을 불러올 때 한 번만 컴파일
+- SPAM_IDLE_SECONDS 동안 메시지가 없는 사용자는 주기적으로 제거 (최근 활동 순 사전이라 제거 비용은 제거한 수만큼)
+"""
+import os
+import re
+import time
+from collections import OrderedDict, deque
+
+# 사용자별로 기억하는 최근 메시지 수
+SPAM_HISTORY_SIZE = int(os.environ.get("SPAM_HISTORY_SIZE", 10))
+# 이 시간(초) 안에 비슷한 메시지를 다시 보내면 스팸
+SPAM_SIMILAR_WINDOW = float(os.environ.get("SPAM_SIMILAR_WINDOW", 5))
+# 3-gram 자카드 유사도 기준 (기존 SequenceMatcher 0.85와 비슷한 수준)
+SPAM_SIMILARITY_THRESHOLD = float(os.environ.get("SPAM_SIMILARITY_THRESHOLD", 0.7))
+# 최근 기록 안에서 똑같은 메시지가 이만큼 있으면 스팸
+SPAM_REPEAT_LIMIT = int(os.environ.get("SPAM_REPEAT_LIMIT", 5))
+# 최근 기록 안에서 이모지/기호만 있는 메시지가 이만큼 있으면 스팸
+SPAM_EMOJI_LIMIT = int(os.environ.get("SPAM_EMOJI_LIMIT", 5))
+# 1~5글자 메시지를 스팸으로 볼지 여부 (인사 등 정상 메시지도 막히므로 기본은 끔)
+SPAM_BLOCK_SHORT_MESSAGES = os.environ.get("SPAM_BLOCK_SHORT_MESSAGES", "0").lower() in ("1", "true", "yes")
+SPAM_IDLE_SECONDS = float(os.environ.get("SPAM_IDLE_SECONDS", 600))
+SPAM_EVICT_INTERVAL = float(os.environ.get("SPAM_EVICT_INTERVAL", 60))
+
+SKETCH_SIZE = 32
+SHINGLE_SIZE = 3
+# 유사도 계산에 사용하는 최대 글자 수
+MAX_SHINGLE_CHARS = 1000
+
+_SPACES = re.compile(r'\s+')
+_EMOJI_ONLY = re.compile(r'[\U00010000-\U0010ffff\u2600-\u27bf\u2b00-\u2bff\ufe0f\u200d\W_]+')
+
+SPAM_MESSAGES = {
+    'similar': "Spam detected: Repeated or similar message in a short time interval.",
+    'repeated': f"Spam detected: Same message repeated {SPAM_REPEAT_LIMIT} or more times.",
+    'short': "Spam detected: Message too short (1-5 characters).",
+    'emoji': f"Spam detected: Emoji or special character repeated {SPAM_EMOJI_LIMIT} or more times.",
+}
+
+
+def sketch(text: str) -> frozenset:
+    """정규화한 텍스트의 3-gram 해시 중 가장 작은 SKETCH_SIZE개 (bottom-k MinHash)."""
+    text = _SPACES.sub(' ', text.lower()).strip()[:MAX_SHINGLE_CHARS]
+    if len(text) <= SHINGLE_SIZE:
+        return frozenset((hash(text),))
+    hashes = {hash(text[i:i + SHINGLE_SIZE]) for i in range(len(text) - SHINGLE_SIZE + 1)}
+    if len(hashes) <= SKETCH_SIZE:
+        return frozenset(hashes)
+    return frozenset(sorted(hashes)[:SKETCH_SIZE])
+
+
+def similarity(a: frozenset, b: frozenset) -> float:
+    """두 스케치의 자카드 유사도 추정치. (두 집합이 SKETCH_SIZE 이하면 정확한 값)"""
+    union = a | b
+    if not union:
+        return 0.0
+    if len(union) > SKETCH_SIZE:
+        union = sorted(union)[:SKETCH_SIZE]
+    return len((a & b).intersection(union)) / len(union)
+
+
+class SpamDetector:
+    """사용자별 링 버퍼로 반복/유사/이모지 도배를 감지합니다. (이벤트 루프 한 곳에서만 사용)"""
+
+    def __init__(self, history_size: int = SPAM_HISTORY_SIZE, idle_seconds: float = SPAM_IDLE_SECONDS,
+                 clock=time.monotonic):
+        self.history_size = history_size
+        self.idle_seconds = idle_seconds
+        self._clock = clock
+        # user_id -> deque[(시각, 원문 해시, 스케치, 이모지만 있는지)], 최근 활동 순
+        self._users = OrderedDict()
+        self._last_seen = {}
+        self._last_evict = clock()
+        self.metrics = {
+            'checks': 0,
+            'blocked': {'similar': 0, 'repeated': 0, 'short': 0, 'emoji': 0},
+            'evicted_users': 0,
+            'check_seconds': 0.0,
+        }
+
+    def check(self, user_id: int, message: str):
+        """(스팸 여부, 사유)를 반환하고 메시지를 기록합니다."""
+        start = time.perf_counter()
+        now = self._clock()
+        self._evict_idle(now)
+
+        history = self._users.get(user_id)
+        if history is None:
+            history = self._users[user_id] = deque(maxlen=self.history_size)
+        else:
+            self._users.move_to_end(user_id)
+        self._last_seen[user_id] = now
+
+        stripped = message.strip()
+        exact = hash(message)
+        shingles = sketch(message)
+        emoji_only = bool(stripped) and _EMOJI_ONLY.fullmatch(stripped) is not None
+
+        reason = None
+        if any(now - ts < SPAM_SIMILAR_WINDOW and similarity(shingles, other) >= SPAM_SIMILARITY_THRESHOLD
+               for ts, _, other, _ in history):
+            reason = 'similar'
+        elif sum(1 for _, other, _, _ in history if other == exact) >= SPAM_REPEAT_LIMIT:
+            reason = 'repeated'
+        elif SPAM_BLOCK_SHORT_MESSAGES and 1 <= len(stripped) <= 5:
+            reason = 'short'
+        elif sum(1 for _, _, _, flag in history if flag) >= SPAM_EMOJI_LIMIT:
+            reason = 'emoji'
+
+        history.append((now, exact, shingles, emoji_only))
+        self.metrics['checks'] += 1
+        self.metrics['check_seconds'] += time.perf_counter() - start
+        if reason is None:
+            return False, ""
+        self.metrics['blocked'][reason] += 1
+        return True, SPAM_MESSAGES[reason]
+
+    def _evict_idle(self, now: float):
+        if now - self._last_evict < SPAM_EVICT_INTERVAL:
+            return
+        self._last_evict = now
+        # 가장 오래 활동하지 않은 사용자부터 확인하므로 활동 중인 사용자를 만나면 멈춤
+        while self._users:
+            user_id = next(iter(self._users))
+            if now - self._last_seen[user_id] < self.idle_seconds:
+                break
+            del self._users[user_id]
+            del self._last_seen[user_id]
+            self.metrics['evicted_users'] += 1
+
+    def forget(self, user_id: int):
+        self._users.pop(user_id, None)
+        self._last_seen.pop(user_id, None)
+
+    def get_metrics(self) -> dict:
+        checks = self.metrics['checks']
+        return {
+            'checks': checks,
+            'blocked': dict(self.metrics['blocked']),
+            'tracked_users': len(self._users),
+            'evicted_users': self.metrics['evicted_users'],
+            'avg_check_us': round(self.metrics['check_seconds'] / checks * 1e6, 1) if checks else 0.0,
+        }
+
+
+class SafetyGuard:
+    """메시지를 처리해도 되는지 확인합니다. 차단 사유는 blocked_reasons에 담깁니다."""
+
+    def __init__(self, spam_detector: SpamDetector = None):
+        self.spam_detector = spam_detector or SpamDetector()
+
+    async def is_safe_to_process(self, user_id: int, guild_id: int, content: str) -> dict:
+        blocked_reasons = []
+        details = {}
+        is_spam, message = self.spam_detector.check(user_id, content or "")
+        if is_spam:
+            blocked_reasons.append('spam_detection')
+            details['spam_detection'] = message
+            print(f"[SafetyGuard] Blocked user {user_id} in guild {guild_id}: {message}")
+        return {'safe': not blocked_reasons, 'blocked_reasons': blocked_reasons, 'details': details}
+
+    def get_metrics(self) -> dict:
+        return {'spam': self.spam_detector.get_metrics()}
+
+
+safety_guard = SafetyGuard()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+버전 기반 스키마 마이그레이션
+schema_migrations 테이블에 적용된 버전을 기록하고, 아직 적용되지 않은 마이그레이션만 실행합니다.
+스키마가 최신이면 부팅 시 DDL을 전혀 실행하지 않습니다.
+
+새 컬럼/인덱스/테이블은 MIGRATIONS 끝에 새 버전으로 추가하세요. (기존 항목은 수정하지 않습니다)
+
+사용법:
+    python schema_migrations.py            # 마이그레이션 적용 후 핫 쿼리 인덱스 사용 여부 확인
+    python schema_migrations.py --explain  # 인덱스 사용 여부만 확인
+"""
+
+import argparse
+import os
+import sys
+
+import psycopg2
+
+# 동시에 여러 봇 프로세스가 부팅해도 한 번만 적용되도록 사용하는 advisory lock 키
+MIGRATION_LOCK_KEY = 611501
+
+# (버전, 설명, SQL 목록)
+MIGRATIONS = [
+    (1, "부팅 시마다 확인하던 컬럼 추가를 마이그레이션으로 이전", [
+        "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS is_daily_message BOOLEAN DEFAULT TRUE",
+        "UPDATE conversations SET is_daily_message = TRUE WHERE is_daily_message IS NULL",
+        "ALTER TABLE affinity ADD COLUMN IF NOT EXISTS last_quest_reward_date DATE",
+        "ALTER TABLE affinity ADD COLUMN IF NOT EXISTS highest_milestone_achieved INTEGER DEFAULT 0",
+        "ALTER TABLE user_cards ADD COLUMN IF NOT EXISTS acquired_at TIMESTAMP WITH TIME ZONE",
+        "ALTER TABLE user_quest_events ADD COLUMN IF NOT EXISTS character_name TEXT",
+        "ALTER TABLE user_quest_events ADD COLUMN IF NOT EXISTS card_id TEXT",
+        # KeywordManager가 사용하는 컬럼 (init_db의 초기 정의에는 keyword만 있었음)
+        "ALTER TABLE user_keywords ADD COLUMN IF NOT EXISTS keyword_type TEXT",
+        "ALTER TABLE user_keywords ADD COLUMN IF NOT EXISTS keyword_value TEXT",
+        "ALTER TABLE user_keywords ADD COLUMN IF NOT EXISTS confidence_score FLOAT DEFAULT 1.0",
+        "ALTER TABLE user_keywords ADD COLUMN IF NOT EXISTS language TEXT",
+        "ALTER TABLE user_keywords ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP",
+        """
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM information_schema.columns
+                       WHERE table_name = 'user_keywords' AND column_name = 'keyword') THEN
+                ALTER TABLE user_keywords ALTER COLUMN keyword DROP NOT NULL;
+            END IF;
+        END $$
+        """,
+    ]),
+    (2, "핫 쿼리용 보조 인덱스", [
+        "CREATE INDEX IF NOT EXISTS idx_conversations_user_character_ts ON conversations (user_id, character_name, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_emotion_log_timestamp ON emotion_log (timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_user_cards_user_upper_card ON user_cards (user_id, UPPER(card_id))",
+        "CREATE INDEX IF NOT EXISTS idx_user_keywords_lookup ON user_keywords (user_id, character_name, keyword_type, keyword_value)",
+        "CREATE INDEX IF NOT EXISTS idx_blacklist_active_expires ON blacklist (is_active, expires_at)",
+        "CREATE INDEX IF NOT EXISTS idx_payment_transactions_user ON payment_transactions (user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_memory_summaries_user_character ON memory_summaries (user_id, character_name, quality_score DESC, created_at DESC)",
+    ]),
+    (3, "키워드 식별자 유니크 제약 (INSERT ... ON CONFLICT 업서트용)", [
+        # 기존 중복 키워드는 신뢰도가 가장 높은 행(같으면 먼저 생긴 행)만 남김
+        """
+        DELETE FROM user_keywords a USING user_keywords b
+         WHERE a.user_id = b.user_id AND a.character_name = b.character_name
+           AND a.keyword_type = b.keyword_type AND a.keyword_value = b.keyword_value
+           AND (COALESCE(a.confidence_score, 1.0) < COALESCE(b.confidence_score, 1.0)
+                OR (COALESCE(a.confidence_score, 1.0) = COALESCE(b.confidence_score, 1.0) AND a.id > b.id))
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_user_keywords_identity ON user_keywords (user_id, character_name, keyword_type, keyword_value)",
+        # 유니크 인덱스와 같은 컬럼이므로 v2의 조회용 인덱스는 제거
+        "DROP INDEX IF EXISTS idx_user_keywords_lookup",
+    ]),
+    (4, "재시작 후 세션 복원용 스냅샷 테이블", [
+        """
+        CREATE TABLE IF NOT EXISTS session_snapshots (
+            map_name TEXT NOT NULL,
+            session_key TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            last_access DOUBLE PRECISION NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (map_name, session_key)
+        )
+        """,
+    ]),
+    (5, "메모리 요약 워터마크 (마지막으로 요약한 대화 id)", [
+        """
+        CREATE TABLE IF NOT EXISTS memory_summary_watermarks (
+            user_id BIGINT NOT NULL,
+            character_name TEXT NOT NULL,
+            last_message_id BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, character_name)
+        )
+        """,
+    ]),
+]
+
+LATEST_SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# EXPLAIN으로 인덱스 사용 여부를 확인할 핫 쿼리 (이름, SQL, 파라미터)
+HOT_QUERIES = [
+    ("recent messages by user/character",
+     "SELECT message_role, content FROM conversations WHERE user_id = %s AND character_name = %s ORDER BY timestamp DESC LIMIT 5",
+     (0, 'Kagari')),
+    ("emotion log by time range",
+     "SELECT * FROM emotion_log WHERE timestamp >= NOW() - INTERVAL '1 day'",
+     ()),
+    ("user card lookup (case-insensitive)",
+     "SELECT 1 FROM user_cards WHERE user_id = %s AND UPPER(card_id) = UPPER(%s)",
+     (0, 'kagari_card_1')),
+    ("keywords by user/character",
+     "SELECT keyword_type, keyword_value, confidence_score FROM user_keywords WHERE user_id = %s AND character_name = %s",
+     (0, 'Kagari')),
+    ("expired blacklist cleanup",
+     "SELECT user_id FROM blacklist WHERE is_active = TRUE AND expires_at IS NOT NULL AND expires_at < NOW()",
+     ()),
+    ("payment history by user",
+     "SELECT * FROM payment_transactions WHERE user_id = %s",
+     (0,)),
+    ("memory summaries by user/character",
+     "SELECT summary, created_at, quality_score FROM memory_summaries WHERE user_id = %s AND character_name = %s ORDER BY quality_score DESC, created_at DESC LIMIT 5",
+     (0, 'Kagari')),
+    ("daily usage counter",
+     "SELECT COALESCE(SUM(daily_count), 0) FROM user_daily_usage WHERE user_id = %s AND calendar = 'UTC' AND usage_date = CURRENT_DATE",
+     (0,)),
+]
+
+
+def _ensure_version_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        )
+    ''')
+
+
+def get_schema_version(cursor) -> int:
+    """적용된 최신 스키마 버전을 반환합니다. (버전 테이블이 없으면 0)"""
+    cursor.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    if not cursor.fetchone()[0]:
+        return 0
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+    return cursor.fetchone()[0]
+
+
+def is_schema_current(conn) -> bool:
+    """스키마가 최신 버전인지 확인합니다. (읽기 전용, DDL 없음)"""
+    with conn.cursor() as cursor:
+        current = get_schema_version(cursor) >= LATEST_SCHEMA_VERSION
+    conn.commit()
+    return current
+
+
+def run_migrations(conn) -> list:
+    """
+    아직 적용되지 않은 마이그레이션을 버전 순서대로 적용합니다.
+    각 버전은 하나의 트랜잭션으로 적용되며, 적용된 버전 목록을 반환합니다.
+    """
+    if is_schema_current(conn):
+        return []
+
+    applied = []
+    with conn.cursor() as cursor:
+        _ensure_version_table(cursor)
+        conn.commit()
+        for version, description, statements in MIGRATIONS:
+            try:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+                cursor.execute("SELECT 1 FROM schema_migrations WHERE version = %s", (version,))
+                if cursor.fetchone():
+                    conn.commit()
+                    continue
+                for statement in statements:
+                    cursor.execute(statement)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                    (version, description)
+                )
+                conn.commit()
+                applied.append(version)
+                print(f"[Migration] Applied v{version}: {description}")
+            except Exception as e:
+                conn.rollback()
+                print(f"[Migration] Failed at v{version}: {e}")
+                raise
+    return applied
+
+
+def explain_hot_queries(conn) -> list:
+    """
+    HOT_QUERIES 각각의 실행 계획을 확인합니다.
+    테이블이 작으면 플래너가 순차 스캔을 고르므로 enable_seqscan을 끄고 인덱스 사용 가능 여부를 봅니다.
+    (이름, 인덱스 사용 여부, 실행 계획) 목록을 반환합니다.
+    """
+    results = []
+    with conn.cursor() as cursor:
+        for name, sql, params in HOT_QUERIES:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("EXPLAIN " + sql, params)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+            uses_index = "Index" in plan or "Bitmap" in plan
+            results.append((name, uses_index, plan))
+            conn.rollback()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="스키마 마이그레이션 및 인덱스 사용 확인")
+    parser.add_argument("--explain", action="store_true", help="마이그레이션 없이 인덱스 사용 여부만 확인합니다")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ.get("DATABASE_URL"))
+    try:
+        if not args.explain:
+            applied = run_migrations(conn)
+            if applied:
+                print(f"✅ 적용된 마이그레이션: {applied}")
+            else:
+                print(f"✅ 스키마가 최신입니다 (v{LATEST_SCHEMA_VERSION})")
+
+        failures = 0
+        for name, uses_index, plan in explain_hot_queries(conn):
+            print(f"{'✅' if uses_index else '❌'} {name}")
+            if not uses_index:
+                failures += 1
+                print("   " + plan.replace("\n", "\n   "))
+        if failures:
+            print(f"❌ {failures}개의 핫 쿼리가 인덱스를 사용하지 않습니다.")
+            sys.exit(1)
+        print("✅ 모든 핫 쿼리가 인덱스를 사용합니다.")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+롤플레잉/스토리 세션 대화 기록 관리
+세션의 최근 대화만 그대로 보내고, 오래된 턴은 백그라운드에서 요약(session["history_summary"])으로 접습니다.
+세션이 길어져도 프롬프트 크기(=응답 지연)가 일정하게 유지됩니다.
+
+세션 dict의 "history" 리스트를 그대로 사용하므로 기존 코드와 호환됩니다.
+"""
+import asyncio
+import os
+
+import llm_gateway
+from llm_scheduler import PRIORITY_BACKGROUND
+
+# 요약하지 않고 그대로 보내는 최근 메시지 수 (user/assistant 각각 1개씩 = 1턴은 2개)
+HISTORY_WINDOW_MESSAGES = int(os.environ.get("HISTORY_WINDOW_MESSAGES", 12))
+# 창 밖으로 이만큼 쌓이면 한 번에 요약 (매 턴마다 요약하지 않도록)
+HISTORY_COMPACT_BATCH = int(os.environ.get("HISTORY_COMPACT_BATCH", 8))
+# 요약이 계속 실패해도 이 이상은 보내지 않음 (가장 오래된 메시지부터 버림)
+HISTORY_HARD_LIMIT = int(os.environ.get("HISTORY_HARD_LIMIT", 40))
+HISTORY_SUMMARY_MODEL = os.environ.get("HISTORY_SUMMARY_MODEL", "gpt-4o-mini")
+HISTORY_SUMMARY_MAX_TOKENS = int(os.environ.get("HISTORY_SUMMARY_MAX_TOKENS", 300))
+
+_compacting = {}  # id(session) -> asyncio.Task
+
+metrics = {
+    'compactions': 0,
+    'compaction_failures': 0,
+    'messages_compacted': 0,
+    'messages_dropped': 0,
+}
+
+
+def build_messages(session: dict, system_prompt: str, user_message: str = None) -> list:
+    """[시스템 프롬프트, (지난 줄거리 요약), 최근 대화..., (현재 메시지)] 목록을 만듭니다."""
+    messages = [{"role": "system", "content": system_prompt}]
+    summary = session.get("history_summary")
+    if summary:
+        messages.append({"role": "system", "content": f"Story so far (earlier turns, summarized):\n{summary}"})
+    messages.extend(session.get("history", []))
+    if user_message is not None:
+        messages.append({"role": "user", "content": user_message})
+    return messages
+
+
+def append_turn(session: dict, user_message: str, assistant_message: str):
+    """한 턴을 기록하고, 창을 넘친 오래된 메시지가 충분히 쌓였으면 백그라운드 요약을 예약합니다."""
+    history = session.setdefault("history", [])
+    history.append({"role": "user", "content": user_message})
+    history.append({"role": "assistant", "content": assistant_message})
+
+    if len(history) > HISTORY_HARD_LIMIT:
+        overflow = len(history) - HISTORY_HARD_LIMIT
+        del history[:overflow]
+        metrics['messages_dropped'] += overflow
+
+    if len(history) - HISTORY_WINDOW_MESSAGES >= HISTORY_COMPACT_BATCH and id(session) not in _compacting:
+        try:
+            task = asyncio.get_running_loop().create_task(_compact(session))
+        except RuntimeError:
+            return  # 이벤트 루프 밖에서 호출된 경우 (요약은 다음 턴에)
+        _compacting[id(session)] = task
+        task.add_done_callback(lambda _: _compacting.pop(id(session), None))
+
+
+def reset(session: dict):
+    """대화 기록과 요약을 모두 비웁니다."""
+    session["history"] = []
+    session["history_summary"] = ""
+
+
+async def _compact(session: dict):
+    history = session.get("history", [])
+    old = history[:len(history) - HISTORY_WINDOW_MESSAGES]
+    if not old:
+        return
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in old)
+    previous = session.get("history_summary") or "(none)"
+    prompt = (
+        "You maintain a running summary of an ongoing roleplay/story conversation.\n"
+        "Update the summary with the new turns below. Keep names, roles, promises, clues, "
+        "decisions and the emotional state of the relationship. Write in the language of the conversation, "
+        "in at most 8 sentences, third person, no commentary.\n\n"
+        f"Current summary:\n{previous}\n\nNew turns:\n{transcript}"
+    )
+    try:
+        summary = await llm_gateway.chat_completion(
+            [{"role": "system", "content": prompt}],
+            model=HISTORY_SUMMARY_MODEL,
+            max_tokens=HISTORY_SUMMARY_MAX_TOKENS,
+            temperature=0.3,
+            priority=PRIORITY_BACKGROUND,
+        )
+    except llm_gateway.LLMError as e:
+        metrics['compaction_failures'] += 1
+        print(f"[History] Compaction failed, keeping raw turns: {e}")
+        return
+
+    # 요약하는 동안 기록이 바뀌었을 수 있으므로 요약한 메시지가 아직 맨 앞에 있을 때만 제거
+    history = session.get("history", [])
+    count = 0
+    while count < len(old) and count < len(history) and history[count] is old[count]:
+        count += 1
+    if count == 0:
+        return
+    del history[:count]
+    session["history_summary"] = summary.strip()
+    metrics['compactions'] += 1
+    metrics['messages_compacted'] += count
+
+
+def get_metrics() -> dict:
+    return {**metrics, 'in_flight': len(_compacting)}
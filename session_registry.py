@@ -0,0 +1,310 @@
+"""
+인메모리 세션 레지스트리
+스토리/롤플레잉/DM 세션, 캐릭터 봇의 활성 채널, 최근 봇 메시지처럼 프로세스가 살아 있는 동안
+계속 쌓이기만 하던 사전들을 한 곳에서 관리합니다.
+
+- SessionMap은 dict처럼 쓸 수 있음 (in, get, [], del, len, items ...) → 기존 코드는 거의 그대로 사용
+- 항목은 __slots__ 레코드(값, 생성 시각, 마지막 사용 시각)로 저장하고 최근 사용 순으로 정렬
+- 유휴 TTL: 백그라운드 스위퍼가 SESSION_SWEEP_INTERVAL초마다 오래 쓰지 않은 항목을 제거
+  (최근 사용 순이므로 제거 비용은 제거한 항목 수만큼). 조회 시점에 만료된 항목도 없는 것으로 취급
+- 크기 상한: 넘으면 가장 오래 쓰지 않은 항목부터 제거
+- get_metrics: 맵별 항목 수, 제거 수(유휴/상한), 대략적인 메모리 사용량
+- set_loader: 처음 사용할 때 한 번 불러올 항목을 지정 (재시작 후 스냅샷 복원, session_snapshots 참고)
+
+TTL/상한은 SESSION_TTL_<이름>, SESSION_MAX_<이름> 환경변수로 바꿀 수 있습니다. (예: SESSION_TTL_STORY=3600)
+"""
+import asyncio
+import os
+import sys
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+SESSION_SWEEP_INTERVAL = float(os.environ.get("SESSION_SWEEP_INTERVAL", 60))
+
+# 이름 -> (유휴 TTL 초, 최대 항목 수)
+SESSION_DEFAULTS = {
+    'story': (6 * 3600, 10000),
+    'roleplay': (6 * 3600, 10000),
+    'dm': (1800, 50000),  # 기존 DM 세션 만료 시간(30분)과 같음
+    'active_channels': (7 * 24 * 3600, 50000),
+    'last_bot_messages': (3600, 50000),
+    'summary_counts': (24 * 3600, 100000),
+    'memory_index': (3600, 2000),  # 열린 메모리 검색 인덱스 (memory_index 참고)
+}
+DEFAULT_TTL = 3600
+DEFAULT_MAX_SIZE = 10000
+# 메모리 사용량을 계산할 때 실제로 재는 최대 항목 수 (나머지는 평균으로 추정)
+MEMORY_SAMPLE_SIZE = 200
+
+
+class SessionEntry:
+    __slots__ = ('value', 'created_at', 'last_access')
+
+    def __init__(self, value, now: float):
+        self.value = value
+        self.created_at = now
+        self.last_access = now
+
+
+def _limits(name: str):
+    base = name.split(':', 1)[0]
+    ttl, max_size = SESSION_DEFAULTS.get(base, (DEFAULT_TTL, DEFAULT_MAX_SIZE))
+    key = base.upper()
+    return (float(os.environ.get(f"SESSION_TTL_{key}", ttl)),
+            int(os.environ.get(f"SESSION_MAX_{key}", max_size)))
+
+
+def _deep_size(value, depth: int = 4) -> int:
+    """값의 대략적인 메모리 크기 (dict/list/tuple/set은 depth 단계까지 내려가며 합산)."""
+    size = sys.getsizeof(value)
+    if depth <= 0:
+        return size
+    if isinstance(value, dict):
+        size += sum(_deep_size(k, depth - 1) + _deep_size(v, depth - 1) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(_deep_size(item, depth - 1) for item in value)
+    return size
+
+
+class SessionMap(MutableMapping):
+    """유휴 TTL과 크기 상한이 있는 dict 호환 세션 저장소입니다. (이벤트 루프 한 곳에서만 사용)"""
+
+    def __init__(self, name: str, ttl: float, max_size: int, registry=None, clock=time.monotonic):
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+        self._registry = registry
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> SessionEntry, 오래 쓰지 않은 것부터
+        self._loader = None
+        self.metrics = {'hits': 0, 'misses': 0, 'expired': 0, 'evicted_capacity': 0, 'restored': 0}
+
+    def set_loader(self, loader):
+        """처음 사용할 때 loader()가 돌려주는 [(키, 값, 유휴 초), ...]로 항목을 채웁니다."""
+        self._loader = loader
+
+    def _load(self):
+        loader, self._loader = self._loader, None
+        try:
+            items = loader()
+        except Exception as e:
+            print(f"[Sessions] Restore failed for {self.name}: {e}")
+            return
+        now = self._clock()
+        # 오래 쓰지 않은 것부터 넣어 최근 사용 순서를 유지
+        for key, value, idle in sorted(items, key=lambda item: -item[2]):
+            if key in self._entries or (self.ttl > 0 and idle > self.ttl):
+                continue
+            entry = SessionEntry(value, now - idle)
+            self._entries[key] = entry
+            self.metrics['restored'] += 1
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.metrics['evicted_capacity'] += 1
+        if self._entries and self._registry is not None:
+            self._registry.ensure_sweeper()
+
+    def _alive(self, key, touch: bool):
+        if self._loader is not None:
+            self._load()
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        now = self._clock()
+        if self.ttl > 0 and now - entry.last_access > self.ttl:
+            del self._entries[key]
+            self.metrics['expired'] += 1
+            return None
+        if touch:
+            entry.last_access = now
+            self._entries.move_to_end(key)
+        return entry
+
+    def __getitem__(self, key):
+        entry = self._alive(key, touch=True)
+        if entry is None:
+            self.metrics['misses'] += 1
+            raise KeyError(key)
+        self.metrics['hits'] += 1
+        return entry.value
+
+    def __setitem__(self, key, value):
+        if self._loader is not None:
+            self._load()
+        entry = self._entries.get(key)
+        now = self._clock()
+        if entry is None:
+            self._entries[key] = SessionEntry(value, now)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.metrics['evicted_capacity'] += 1
+        else:
+            entry.value = value
+            entry.last_access = now
+            self._entries.move_to_end(key)
+        if self._registry is not None:
+            self._registry.ensure_sweeper()
+
+    def __delitem__(self, key):
+        if self._loader is not None:
+            self._load()
+        del self._entries[key]
+
+    def __contains__(self, key):
+        # 기존 코드는 `if key in sessions:`로 활동 여부를 확인하므로 in도 사용으로 봄
+        return self._alive(key, touch=True) is not None
+
+    def _live(self) -> list:
+        """만료되지 않은 [(키, SessionEntry), ...] (사용 시각 갱신 없음, 만료된 항목은 스위퍼가 제거)"""
+        if self._loader is not None:
+            self._load()
+        if self.ttl <= 0:
+            return list(self._entries.items())
+        now = self._clock()
+        return [(key, entry) for key, entry in self._entries.items() if now - entry.last_access <= self.ttl]
+
+    def __iter__(self):
+        # 순회 중에 항목이 추가/삭제되어도 괜찮도록 키 목록을 복사. 순회는 사용으로 보지 않음 (TTL 유지)
+        return iter([key for key, _ in self._live()])
+
+    def items(self):
+        return [(key, entry.value) for key, entry in self._live()]
+
+    def values(self):
+        return [entry.value for _, entry in self._live()]
+
+    def __len__(self):
+        if self._loader is not None:
+            self._load()
+        return len(self._entries)
+
+    def __repr__(self):
+        return f"SessionMap({self.name!r}, {{{', '.join(f'{k!r}: {e.value!r}' for k, e in self._entries.items())}}})"
+
+    def peek(self, key, default=None):
+        """마지막 사용 시각을 바꾸지 않고 값을 반환합니다."""
+        entry = self._alive(key, touch=False)
+        return default if entry is None else entry.value
+
+    @property
+    def loaded(self) -> bool:
+        return self._loader is None
+
+    def entries(self):
+        """[(키, SessionEntry), ...] (오래 쓰지 않은 것부터, 사용 시각 갱신 없음, 아직 복원 전이면 빈 목록)"""
+        return list(self._entries.items())
+
+    def sweep(self, now: float = None) -> int:
+        """유휴 TTL이 지난 항목을 제거하고 제거한 수를 반환합니다."""
+        if self.ttl <= 0:
+            return 0
+        now = self._clock() if now is None else now
+        removed = 0
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry.last_access <= self.ttl:
+                break
+            del self._entries[key]
+            removed += 1
+        self.metrics['expired'] += removed
+        return removed
+
+    def memory_bytes(self) -> int:
+        """항목들이 차지하는 대략적인 메모리 (MEMORY_SAMPLE_SIZE개를 재고 나머지는 평균으로 추정)."""
+        count = len(self._entries)
+        if not count:
+            return sys.getsizeof(self._entries)
+        sample = [entry for _, entry in zip(range(MEMORY_SAMPLE_SIZE), reversed(self._entries.values()))]
+        measured = sum(sys.getsizeof(entry) + _deep_size(entry.value) for entry in sample)
+        return sys.getsizeof(self._entries) + round(measured / len(sample) * count)
+
+    def get_metrics(self) -> dict:
+        return {
+            **self.metrics,
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'memory_bytes': self.memory_bytes(),
+        }
+
+
+class SessionRegistry:
+    """이름별 SessionMap을 만들고, 하나의 백그라운드 스위퍼로 모두 정리합니다."""
+
+    def __init__(self, sweep_interval: float = SESSION_SWEEP_INTERVAL):
+        self.sweep_interval = sweep_interval
+        self._maps = {}
+        self._create_hooks = []
+        self._sweeper = None
+        self.metrics = {'sweeps': 0, 'swept': 0, 'last_sweep_ms': 0.0}
+
+    def create(self, name: str, ttl: float = None, max_size: int = None) -> SessionMap:
+        """name의 SessionMap을 반환합니다. (이미 있으면 같은 객체)"""
+        session_map = self._maps.get(name)
+        if session_map is None:
+            default_ttl, default_max = _limits(name)
+            session_map = SessionMap(
+                name,
+                default_ttl if ttl is None else ttl,
+                default_max if max_size is None else max_size,
+                registry=self,
+            )
+            self._maps[name] = session_map
+            for hook in self._create_hooks:
+                hook(session_map)
+        return session_map
+
+    def add_create_hook(self, hook):
+        """이미 만든 맵과 앞으로 만들 맵 모두에 hook(session_map)을 적용합니다."""
+        self._create_hooks.append(hook)
+        for session_map in list(self._maps.values()):
+            hook(session_map)
+
+    def maps(self) -> dict:
+        return dict(self._maps)
+
+    def sweep(self) -> int:
+        start = time.perf_counter()
+        removed = sum(session_map.sweep() for session_map in self._maps.values())
+        self.metrics['sweeps'] += 1
+        self.metrics['swept'] += removed
+        self.metrics['last_sweep_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        return removed
+
+    def ensure_sweeper(self):
+        """이벤트 루프 안에서 처음 세션이 만들어질 때 스위퍼를 시작합니다."""
+        if self._sweeper is not None and not self._sweeper.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # 이벤트 루프 밖 (스크립트 등): 조회 시점 만료만 적용
+        self._sweeper = loop.create_task(self._sweep_loop())
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                removed = self.sweep()
+                if removed:
+                    print(f"[Sessions] Swept {removed} idle sessions in {self.metrics['last_sweep_ms']}ms")
+            except Exception as e:
+                print(f"[Sessions] Sweep failed: {e}")
+
+    def get_metrics(self) -> dict:
+        return {
+            **self.metrics,
+            'maps': {name: session_map.get_metrics() for name, session_map in self._maps.items()},
+        }
+
+
+session_registry = SessionRegistry()
+
+
+def get_session_map(name: str, ttl: float = None, max_size: int = None) -> SessionMap:
+    return session_registry.create(name, ttl, max_size)
+
+
+def get_metrics() -> dict:
+    return session_registry.get_metrics()
@@ -0,0 +1,358 @@
+"""
+세션 스냅샷 (재시작 후 바로 이어서 대화)
+스토리/롤플레잉/DM 세션과 캐릭터 봇의 활성 채널(session_registry의 SessionMap)을 주기적으로 저장하고,
+재시작 후 복원합니다. (/bot, /story를 다시 실행할 필요 없음)
+
+- 증분 저장: SESSION_SNAPSHOT_INTERVAL초마다 최근 두 주기 안에 사용된(새로 만들거나 조회한) 세션만 다시 직렬화해
+  저장된 값과 비교하고, 바뀌었거나 그 사이 사용된 세션만 업서트. 사라진 세션은 삭제
+  (직렬화는 이벤트 루프에서, 기록은 스레드에서). 종료할 때는 모든 세션을 비교
+- 복원: 봇을 시작하기 전에 restore()로 모든 스냅샷을 스레드에서 쿼리 한 번으로 읽어 두고,
+  각 맵은 처음 접근할 때 그 내용으로 채움. 저장 당시의 유휴 시간을 이어서 TTL 적용
+- 저장소: SESSION_SNAPSHOT_BACKEND = postgres(기본, session_snapshots 테이블) | disk(SQLite 파일) | off
+- 값은 JSON으로 저장 (dict의 정수 키, set/tuple, datetime 포함). 그 밖의 객체가 들어 있는 세션은 저장하지 않음
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+
+from session_registry import session_registry
+
+SESSION_SNAPSHOT_BACKEND = os.environ.get("SESSION_SNAPSHOT_BACKEND", "postgres").lower()
+SESSION_SNAPSHOT_PATH = os.environ.get("SESSION_SNAPSHOT_PATH", "session_snapshots.sqlite3")
+SESSION_SNAPSHOT_INTERVAL = float(os.environ.get("SESSION_SNAPSHOT_INTERVAL", 30))
+
+# 저장할 맵 (session_registry 이름의 ':' 앞부분)
+PERSISTED_MAPS = ('story', 'roleplay', 'dm', 'active_channels')
+
+
+def _encode(value):
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, dict):
+        if '__t' not in value and all(isinstance(k, str) for k in value):
+            return {k: _encode(v) for k, v in value.items()}
+        # 정수 키 등 JSON 객체로 표현할 수 없는 키는 [키, 값] 목록으로 저장
+        return {'__t': 'map', 'v': [[_encode(k), _encode(v)] for k, v in value.items()]}
+    if isinstance(value, list):
+        return [_encode(item) for item in value]
+    if isinstance(value, tuple):
+        return {'__t': 'tuple', 'v': [_encode(item) for item in value]}
+    if isinstance(value, (set, frozenset)):
+        return {'__t': 'set', 'v': [_encode(item) for item in value]}
+    if isinstance(value, datetime):
+        return {'__t': 'datetime', 'v': value.isoformat()}
+    if isinstance(value, date):
+        return {'__t': 'date', 'v': value.isoformat()}
+    raise TypeError(f"{type(value).__name__} is not snapshot-serializable")
+
+
+def _decode(value):
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    kind = value.get('__t')
+    if kind == 'map':
+        return {_decode(k): _decode(v) for k, v in value['v']}
+    if kind == 'tuple':
+        return tuple(_decode(item) for item in value['v'])
+    if kind == 'set':
+        return {_decode(item) for item in value['v']}
+    if kind == 'datetime':
+        return datetime.fromisoformat(value['v'])
+    if kind == 'date':
+        return date.fromisoformat(value['v'])
+    return {k: _decode(v) for k, v in value.items()}
+
+
+def dumps(value) -> str:
+    return json.dumps(_encode(value), ensure_ascii=False, separators=(',', ':'))
+
+
+def loads(payload: str):
+    return _decode(json.loads(payload))
+
+
+class PostgresSnapshotStore:
+    """DatabaseManager의 session_snapshots 테이블을 사용합니다."""
+
+    def __init__(self, db=None):
+        self._db = db
+
+    @property
+    def db(self):
+        if self._db is None:
+            from database_manager import get_db_manager
+            self._db = get_db_manager()
+        return self._db
+
+    def load(self, map_name: str) -> list:
+        return self.db.load_session_snapshots(map_name)
+
+    def load_all(self) -> list:
+        return self.db.load_all_session_snapshots()
+
+    def save(self, map_name: str, upserts: list, deletes: list) -> bool:
+        return self.db.save_session_snapshots(map_name, upserts, deletes)
+
+
+class SqliteSnapshotStore:
+    """로컬 디스크의 SQLite 파일에 저장합니다. (DB 없이 단일 프로세스로 운영할 때)"""
+
+    def __init__(self, path: str = SESSION_SNAPSHOT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS session_snapshots (
+                map_name TEXT NOT NULL,
+                session_key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (map_name, session_key)
+            )
+        """)
+        self._conn.commit()
+
+    def load(self, map_name: str) -> list:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT session_key, payload, last_access FROM session_snapshots WHERE map_name = ?",
+                (map_name,)
+            ).fetchall()
+
+    def load_all(self) -> list:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT map_name, session_key, payload, last_access FROM session_snapshots"
+            ).fetchall()
+
+    def save(self, map_name: str, upserts: list, deletes: list) -> bool:
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO session_snapshots (map_name, session_key, payload, last_access) VALUES (?, ?, ?, ?)",
+                    [(map_name, key, payload, last_access) for key, payload, last_access in upserts]
+                )
+                self._conn.executemany(
+                    "DELETE FROM session_snapshots WHERE map_name = ? AND session_key = ?",
+                    [(map_name, key) for key in deletes]
+                )
+            return True
+        except sqlite3.Error as e:
+            print(f"[Snapshots] SQLite save failed for {map_name}: {e}")
+            return False
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SessionSnapshotter:
+    """레지스트리의 저장 대상 맵에 복원 로더를 붙이고, 주기적으로 바뀐 세션만 저장합니다."""
+
+    def __init__(self, store, registry=session_registry, interval: float = SESSION_SNAPSHOT_INTERVAL,
+                 persisted=PERSISTED_MAPS):
+        self.store = store
+        self.registry = registry
+        self.interval = interval
+        self.persisted = persisted
+        # 맵 이름 -> {세션 키: (저장된 키 문자열, 저장된 값의 해시)} (복원했거나 저장한 맵만)
+        self._written = {}
+        # 맵 이름 -> 복원할 [(키, 값, 유휴 초), ...] (restore()로 미리 읽어 둔 것 중 아직 맵이 채우지 않은 것)
+        self._preloaded = None
+        # 맵 이름 -> 다음 저장 때 지울 키 문자열 (읽을 수 없는 행, 저장 실패한 삭제)
+        self._stale = {}
+        self._last_flush = time.monotonic()
+        self._task = None
+        self._flush_lock = asyncio.Lock()
+        self.metrics = {
+            'flushes': 0, 'upserted': 0, 'deleted': 0, 'skipped_unserializable': 0,
+            'restored_maps': 0, 'restored_sessions': 0, 'restore_ms': 0.0, 'last_flush_ms': 0.0,
+        }
+
+    def install(self):
+        self.registry.add_create_hook(self._attach)
+        return self
+
+    def _attach(self, session_map):
+        if session_map.name.split(':', 1)[0] in self.persisted:
+            session_map.set_loader(lambda: self._restore(session_map.name))
+
+    def _decode_rows(self, map_name: str, rows: list) -> list:
+        wall = time.time()
+        written = self._written.setdefault(map_name, {})
+        items = []
+        for session_key, payload, last_access in rows:
+            try:
+                key = loads(session_key)
+                items.append((key, loads(payload), max(0.0, wall - last_access)))
+                written[key] = (session_key, hash(payload))
+            except (ValueError, TypeError) as e:
+                self._stale.setdefault(map_name, []).append(session_key)  # 다음 저장 때 삭제
+                print(f"[Snapshots] Skipping unreadable session {map_name}/{session_key}: {e}")
+        return items
+
+    def _preload(self) -> dict:
+        rows_by_map = {}
+        for map_name, session_key, payload, last_access in self.store.load_all():
+            if map_name.split(':', 1)[0] in self.persisted:
+                rows_by_map.setdefault(map_name, []).append((session_key, payload, last_access))
+        return {map_name: self._decode_rows(map_name, rows) for map_name, rows in rows_by_map.items()}
+
+    async def restore(self):
+        """저장된 세션을 스레드에서 한 번에 읽어 둡니다. (봇을 시작하기 전, 세션을 사용하기 전에 호출)"""
+        if self._preloaded is not None:
+            return
+        start = time.perf_counter()
+        try:
+            preloaded = await asyncio.to_thread(self._preload)
+        except Exception as e:
+            print(f"[Snapshots] Restore failed: {e}")  # 맵마다 처음 사용할 때 다시 시도
+            return
+        # 아직 채우지 않은 맵은 이제 메모리에서 채움 (이벤트 루프에서 쿼리하지 않음)
+        self._preloaded = preloaded
+        elapsed = (time.perf_counter() - start) * 1000
+        self.metrics['restore_ms'] += elapsed
+        print(f"[Snapshots] Loaded {sum(map(len, preloaded.values()))} sessions "
+              f"for {len(preloaded)} maps in {elapsed:.1f}ms")
+
+    def _restore(self, map_name: str) -> list:
+        start = time.perf_counter()
+        if self._preloaded is not None:
+            items = self._preloaded.pop(map_name, [])
+        else:
+            # restore()를 호출하지 않은 경우 (스크립트 등): 이 맵만 바로 쿼리
+            items = self._decode_rows(map_name, self.store.load(map_name))
+        elapsed = (time.perf_counter() - start) * 1000
+        self.metrics['restored_maps'] += 1
+        self.metrics['restored_sessions'] += len(items)
+        self.metrics['restore_ms'] += elapsed
+        print(f"[Snapshots] Restored {len(items)} sessions for {map_name} in {elapsed:.1f}ms")
+        return items
+
+    def collect(self, full: bool = False) -> list:
+        """[(맵 이름, upserts, deletes, 업서트한 키), ...] 바뀐 것만 모읍니다. (이벤트 루프에서 호출)
+
+        세션 값은 조회(get/[]/in) 후에 바꾸므로, 최근에 사용된 세션만 다시 직렬화해 저장된 값의 해시와 비교합니다.
+        조회한 직후 저장이 끼어들고 그 뒤에 값을 바꾼 경우도 잡도록 한 주기 전까지 사용된 세션을 비교하고,
+        full이면 모든 세션을 비교합니다. (종료할 때)
+        """
+        now_mono = time.monotonic()
+        now_wall = time.time()
+        since = self._last_flush
+        window = since - self.interval
+        self._last_flush = now_mono
+        changes = []
+        for name, session_map in self.registry.maps().items():
+            if name.split(':', 1)[0] not in self.persisted or not session_map.loaded:
+                continue  # 아직 복원하지 않은 맵은 저장된 내용을 그대로 둠
+            written = self._written.setdefault(name, {})
+            entries = session_map.entries()
+            upserts, keys = [], []
+            for key, entry in entries:
+                record = written.get(key)
+                if record is not None and not full and entry.last_access < window:
+                    continue
+                try:
+                    session_key = record[0] if record is not None else dumps(key)
+                    payload = dumps(entry.value)
+                except TypeError:
+                    self.metrics['skipped_unserializable'] += 1
+                    continue
+                digest = hash(payload)
+                if record is not None and record[1] == digest and entry.last_access < since:
+                    continue  # 값이 그대로이고 지난 저장 이후 사용하지도 않음
+                written[key] = (session_key, digest)
+                upserts.append((session_key, payload, now_wall - (now_mono - entry.last_access)))
+                keys.append(key)
+            live = {key for key, _ in entries}
+            deletes = [written.pop(key)[0] for key in list(written) if key not in live]
+            deletes.extend(self._stale.pop(name, ()))
+            if upserts or deletes:
+                changes.append((name, upserts, deletes, keys))
+        return changes
+
+    def write(self, changes: list):
+        for name, upserts, deletes, keys in changes:
+            if self.store.save(name, upserts, deletes):
+                self.metrics['upserted'] += len(upserts)
+                self.metrics['deleted'] += len(deletes)
+            else:
+                # 다음 주기에 다시 저장하도록 기록을 되돌림
+                written = self._written.get(name, {})
+                for key in keys:
+                    written.pop(key, None)
+                self._stale.setdefault(name, []).extend(deletes)
+
+    async def flush(self, full: bool = False):
+        async with self._flush_lock:
+            start = time.perf_counter()
+            changes = self.collect(full)
+            if changes:
+                await asyncio.to_thread(self.write, changes)
+            self.metrics['flushes'] += 1
+            self.metrics['last_flush_ms'] = round((time.perf_counter() - start) * 1000, 2)
+
+    def start(self):
+        """주기적 저장 작업을 시작합니다. (이벤트 루프 안에서 호출)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"[Snapshots] Flush failed: {e}")
+
+    async def aclose(self):
+        """주기 작업을 멈추고 마지막 변경을 저장합니다. (모든 세션을 저장된 값과 비교)"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush(full=True)
+
+    def get_metrics(self) -> dict:
+        return dict(self.metrics)
+
+
+def _make_store():
+    if SESSION_SNAPSHOT_BACKEND == 'off':
+        return None
+    if SESSION_SNAPSHOT_BACKEND == 'disk':
+        return SqliteSnapshotStore(SESSION_SNAPSHOT_PATH)
+    return PostgresSnapshotStore()
+
+
+_store = _make_store()
+_snapshotter = SessionSnapshotter(_store).install() if _store is not None else None
+
+
+def get_snapshotter():
+    return _snapshotter
+
+
+async def restore():
+    if _snapshotter is not None:
+        await _snapshotter.restore()
+
+
+def start():
+    if _snapshotter is not None:
+        _snapshotter.start()
+
+
+async def aclose():
+    if _snapshotter is not None:
+        await _snapshotter.aclose()
+
+
+def get_metrics() -> dict:
+    return _snapshotter.get_metrics() if _snapshotter is not None else {}
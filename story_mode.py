@@ -6,6 +6,8 @@ from config import STORY_CHAPTERS, CHARACTER_INFO, CLOUDFLARE_IMAGE_BASE_URL, CH
 import re
 from database_manager import get_db_manager
 from openai_manager import call_openai, analyze_emotion_with_gpt_and_pattern
+import session_history
+from session_registry import get_session_map
 from gift_manager import get_gifts_by_rarity_v2, get_gift_details, ALL_GIFTS, GIFT_RARITY
 from typing import TYPE_CHECKING, Dict, Any
 
@@ -15,8 +17,8 @@ if TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 db_manager = get_db_manager()
 
-# 인메모리 세션 저장소
-story_sessions: Dict[int, Dict[str, Any]] = {}
+# 인메모리 세션 저장소 (유휴 TTL/크기 상한은 session_registry 참고)
+story_sessions: Dict[int, Dict[str, Any]] = get_session_map('story')
 
 # --- Eros 손님별 리액션 데이터 ---
 EROS_CUSTOMER_REACTIONS = [
@@ -116,7 +118,7 @@ class KagariStage1CompleteView(discord.ui.View):
             return await interaction.response.send_message("This is not for you.", ephemeral=True)
 
         await interaction.response.defer()
-        db_manager.complete_story_stage(self.session['user_id'], self.session['character_name'], self.session['stage_num'])
+        await db_manager.acomplete_story_stage(self.session['user_id'], self.session['character_name'], self.session['stage_num'])
 
         # 2장 시작 로직 또는 안내
         await interaction.message.edit(content="**Chapter 2 is now unlocked!**\n(The story continues in a new channel...)\n👉 `/story` Continue with Chapter 2 by entering the command!\n\n⏰ This channel will be automatically deleted in 5 seconds.", view=None)
@@ -138,7 +140,7 @@ class KagariStage1CompleteView(discord.ui.View):
             return await interaction.response.send_message("This is not for you.", ephemeral=True)
 
         await interaction.response.defer()
-        db_manager.complete_story_stage(self.session['user_id'], self.session['character_name'], self.session['stage_num'])
+        await db_manager.acomplete_story_stage(self.session['user_id'], self.session['character_name'], self.session['stage_num'])
         await interaction.message.edit(content="Understood. The story channel will be closed. You can continue to Chapter 2 from the `/story` command later.\n\n⏰ This channel will be automatically deleted in 5 seconds.", view=None)
         
         # 5초 후 채널 삭제
@@ -181,7 +183,7 @@ class KagariStage2QuizView(discord.ui.View):
 
             if is_correct:
                 self.style = discord.ButtonStyle.success
-                db_manager.complete_story_stage(session['user_id'], session['character_name'], session['stage_num'])
+                await db_manager.acomplete_story_stage(session['user_id'], session['character_name'], session['stage_num'])
                 # 보상 지급 로직 (챕터1과 동일하게, 랜덤 커먼 Gift 3개)
                 chapter_info = get_chapter_info(session['character_name'], session['stage_num'])
                 rewards_info = chapter_info['rewards']
@@ -190,7 +192,7 @@ class KagariStage2QuizView(discord.ui.View):
                     gift_ids = get_gifts_by_rarity_v2(rewards_info['rarity'].upper(), rewards_info['quantity'])
                     if gift_ids:
                         for gift_id in gift_ids:
-                            db_manager.add_user_gift(session['user_id'], gift_id, 1)
+                            await db_manager.aadd_user_gift(session['user_id'], gift_id, 1)
                         gift_names = [get_gift_details(g)['name'] for g in gift_ids if get_gift_details(g)]
                         reward_text = f"You received: **{', '.join(gift_names)}**\nCheck your inventory with `/inventory`."
                     else:
@@ -201,7 +203,7 @@ class KagariStage2QuizView(discord.ui.View):
                     gift_ids = get_gifts_by_rarity_v2(rarity_str, rewards_info['quantity'])
                     if gift_ids:
                         for gift_id in gift_ids:
-                            db_manager.add_user_gift(session['user_id'], gift_id, 1)
+                            await db_manager.aadd_user_gift(session['user_id'], gift_id, 1)
                         gift_names = [get_gift_details(g)['name'] for g in gift_ids if get_gift_details(g)]
                         reward_text = f"You received: **{', '.join(gift_names)}**\nCheck your inventory with `/inventory`."
                     else:
@@ -485,7 +487,7 @@ class ErosChapter3CulpritSelectView(discord.ui.View):
             rewards = chapter_info['rewards']['success']
             reward_text = ""
             if rewards['type'] == 'specific_card':
-                self.bot.db.add_user_card(self.session['user_id'], rewards['card'], 1)
+                await self.bot.db.aadd_user_card(self.session['user_id'], rewards['card'], 1)
                 # 퀘스트 진행률 업데이트 트리거
                 try:
                     from bot_selector import BotSelector
@@ -521,7 +523,7 @@ class ErosChapter3CulpritSelectView(discord.ui.View):
                     
                     # 실제로 DB에 카드 저장
                     try:
-                        success = self.bot.db.add_user_card(self.user_id, "Eros", self.card_id)
+                        success = await self.bot.db.aadd_user_card(self.user_id, "Eros", self.card_id)
                         if success:
                             # 퀘스트 진행률 업데이트 트리거
                             try:
@@ -573,7 +575,7 @@ class ErosChapter3CulpritSelectView(discord.ui.View):
             await interaction.followup.send(embed=card_embed, view=ClaimCardView(self.session['user_id'], rewards['card'], self.bot))
 
             # 스토리 완료 처리
-            self.bot.db.complete_story_stage(self.session['user_id'], self.session['character_name'], self.session['stage_num'])
+            await self.bot.db.acomplete_story_stage(self.session['user_id'], self.session['character_name'], self.session['stage_num'])
             self.session['is_active'] = False
 
         else:
@@ -746,17 +748,14 @@ async def handle_kagari_story(bot: "BotSelector", message: discord.Message, sess
             chapter_info = get_chapter_info(session['character_name'], session['stage_num'])
             system_prompt = chapter_info['prompt']
 
-            # 대화 히스토리 구성
-            messages = [{"role": "system", "content": system_prompt}]
-            messages.extend(session.get('history', []))
-            messages.append({"role": "user", "content": message.content})
+            # 대화 히스토리 구성 (최근 대화 + 이전 줄거리 요약)
+            messages = session_history.build_messages(session, system_prompt, message.content)
 
             # OpenAI 호출
             ai_response_text = await call_openai(messages)
 
-            # 히스토리 업데이트
-            session['history'].append({"role": "user", "content": message.content})
-            session['history'].append({"role": "assistant", "content": ai_response_text})
+            # 히스토리 업데이트 (오래된 턴은 백그라운드에서 요약)
+            session_history.append_turn(session, message.content, ai_response_text)
 
             # 임베드로 몰입감 있게 출력
             char_info = CHARACTER_INFO[session['character_name']]
@@ -804,7 +803,7 @@ async def handle_kagari_story(bot: "BotSelector", message: discord.Message, sess
             gift_ids = get_gifts_by_rarity_v2(rewards_info['rarity'].upper(), rewards_info['quantity'])
             if gift_ids:
                 for gift_id in gift_ids:
-                    db_manager.add_user_gift(session['user_id'], gift_id, 1)
+                    await db_manager.aadd_user_gift(session['user_id'], gift_id, 1)
                 gift_names = [get_gift_details(g)['name'] for g in gift_ids if get_gift_details(g)]
                 reward_text = f"You received: **{', '.join(gift_names)}**\nCheck your inventory with `/inventory`."
             else:
@@ -815,7 +814,7 @@ async def handle_kagari_story(bot: "BotSelector", message: discord.Message, sess
             gift_ids = get_gifts_by_rarity_v2(rarity_str, rewards_info['quantity'])
             if gift_ids:
                 for gift_id in gift_ids:
-                    db_manager.add_user_gift(session['user_id'], gift_id, 1)
+                    await db_manager.aadd_user_gift(session['user_id'], gift_id, 1)
                 gift_names = [get_gift_details(g)['name'] for g in gift_ids if get_gift_details(g)]
                 reward_text = f"You received: **{', '.join(gift_names)}**\nCheck your inventory with `/inventory`."
             else:
@@ -909,7 +908,7 @@ async def handle_chapter3_gift_usage(bot: "BotSelector", user_id: int, character
     print(f"[DEBUG] Reward card: {reward_card}, rarity text: {reward_rarity_text}")
 
     # 카드 보상 지급
-    bot.db.add_user_card(user_id, character_name, reward_card)
+    await bot.db.aadd_user_card(user_id, character_name, reward_card)
     # 퀘스트 진행률 업데이트 트리거
     try:
         from bot_selector import BotSelector
@@ -920,7 +919,7 @@ async def handle_chapter3_gift_usage(bot: "BotSelector", user_id: int, character
     print(f"[DEBUG] Card added to user: {reward_card}")
 
     # 스토리 완료 처리
-    bot.db.complete_story_stage(user_id, character_name, 3)
+    await bot.db.acomplete_story_stage(user_id, character_name, 3)
     session["is_active"] = False
     session["waiting_for_gift"] = False
     print(f"[DEBUG] Story stage completed and session updated")
@@ -1026,7 +1025,7 @@ class ElysiaStage1StartView(discord.ui.View):
         self.session['turn'] = 0
         self.session['hints_shown'] = [0]  # 힌트1은 바로 출력되므로 0번 인덱스 추가
         self.session['awaiting_answer'] = False
-        self.session['history'] = []
+        session_history.reset(self.session)
 
         # 세션을 story_sessions에 명시적으로 저장
         story_sessions[interaction.channel.id] = self.session
@@ -1093,7 +1092,7 @@ async def handle_elysia_story(bot, message, session):
                 gift_ids = get_gifts_by_rarity_v2(rarity_str, 2)
                 if gift_ids:
                     for gift_id in gift_ids:
-                        bot.db.add_user_gift(session['user_id'], gift_id, 1)
+                        await bot.db.aadd_user_gift(session['user_id'], gift_id, 1)
                     gift_names = [get_gift_details(g)['name'] for g in gift_ids if get_gift_details(g)]
                     reward_text = f"You received: **{', '.join(gift_names)}**\nCheck your inventory with `/inventory`."
                 else:
@@ -1104,7 +1103,7 @@ async def handle_elysia_story(bot, message, session):
                     color=discord.Color.green()
                 )
                 await message.channel.send(embed=embed)
-                bot.db.complete_story_stage(session['user_id'], session['character_name'], session['stage_num'])
+                await bot.db.acomplete_story_stage(session['user_id'], session['character_name'], session['stage_num'])
                 session['is_active'] = False
                 story_sessions[message.channel.id] = session
                 print(f"[DEBUG][Elysia] 챕터1 완료 - 세션 종료")
@@ -1325,12 +1324,9 @@ async def handle_eros_story(bot: "BotSelector", message, session):
         try:
             async with message.channel.typing():
                 system_prompt = chapter_info['prompt']
-                messages = [{"role": "system", "content": system_prompt}]
-                messages.extend(session.get('history', []))
-                messages.append({"role": "user", "content": message.content})
+                messages = session_history.build_messages(session, system_prompt, message.content)
                 ai_response_text = await call_openai(messages)
-                session['history'].append({"role": "user", "content": message.content})
-                session['history'].append({"role": "assistant", "content": ai_response_text})
+                session_history.append_turn(session, message.content, ai_response_text)
                 embed = discord.Embed(
                     description=f"{ai_response_text}",
                     color=char_info.get('color', discord.Color.blue())
@@ -1437,7 +1433,7 @@ async def handle_serve_command(bot, interaction, character, drink):
             gift_ids = get_gifts_by_rarity_v2(rarity_str, 2)
             if gift_ids:
                 for gift_id in gift_ids:
-                    bot.db.add_user_gift(user_id, gift_id, 1)
+                    await bot.db.aadd_user_gift(user_id, gift_id, 1)
                 gift_names = [get_gift_details(g)['name'] for g in gift_ids if get_gift_details(g)]
                 reward_text = f"You have received: **{', '.join(gift_names)}**\nUse the `/inventory` command to check your gifts!"
             else:
@@ -1449,7 +1445,7 @@ async def handle_serve_command(bot, interaction, character, drink):
             )
             await interaction.followup.send(embed=complete_embed)
             # --- 챕터1 클리어 기록 및 챕터2 오픈 안내 ---
-            bot.db.complete_story_stage(user_id, 'Eros', 1)
+            await bot.db.acomplete_story_stage(user_id, 'Eros', 1)
             transition_embed = discord.Embed(
                 title="🍯 Chapter 2 is now unlocked!",
                 description="Congratulations! You have unlocked Chapter 2: Gifts for the Team.\nUse `/story` to start Chapter 2!",
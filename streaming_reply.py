@@ -0,0 +1,149 @@
+"""
+스트리밍 응답 표시
+LLM 응답을 받는 대로 Discord 메시지 하나를 보내고, 모아둔 조각을 주기적으로 편집해 보여줍니다.
+
+- 편집은 STREAM_EDIT_INTERVAL초에 한 번으로 합침 (Discord 편집 속도 제한: 채널당 5초에 5회 정도)
+- 완성된 줄마다 line_filter(줄)로 중복 줄을 걸러냄 (send_bot_message와 같은 규칙을 점진적으로 적용)
+- 2000자를 넘으면 다음 메시지로 이어서 표시
+- STREAM_REPLIES=1일 때만 사용 (기본은 기존처럼 완성된 응답을 한 번에 전송)
+"""
+import asyncio
+import os
+
+import discord
+
+import llm_gateway
+
+STREAM_REPLIES = os.environ.get("STREAM_REPLIES", "0").lower() in ("1", "true", "yes")
+STREAM_EDIT_INTERVAL = float(os.environ.get("STREAM_EDIT_INTERVAL", 1.2))
+# 첫 메시지를 보내기 전에 모을 최소 글자 수 (한두 글자만 보였다가 편집되는 깜빡임 방지)
+STREAM_MIN_FIRST_CHARS = int(os.environ.get("STREAM_MIN_FIRST_CHARS", 20))
+DISCORD_MESSAGE_LIMIT = 2000
+
+metrics = {
+    'streams': 0,
+    'edits': 0,
+    'messages_sent': 0,
+    'first_visible_seconds': 0.0,
+    'errors': 0,
+}
+
+
+class _LineBuffer:
+    """조각을 모아 완성된 줄만 필터에 통과시키고, 마지막 미완성 줄은 따로 보관합니다."""
+
+    def __init__(self, line_filter=None):
+        self.line_filter = line_filter
+        self.lines = []
+        self.partial = ""
+
+    def feed(self, text: str):
+        self.partial += text
+        *complete, self.partial = self.partial.split("\n")
+        for line in complete:
+            self._accept(line)
+
+    def finish(self):
+        if self.partial:
+            self._accept(self.partial)
+            self.partial = ""
+
+    def _accept(self, line: str):
+        line = line.strip()
+        if not line:
+            return
+        if self.line_filter is None or self.line_filter(line):
+            self.lines.append(line)
+
+    def render(self, include_partial: bool = True) -> str:
+        parts = list(self.lines)
+        if include_partial and self.partial.strip():
+            parts.append(self.partial.strip())
+        return "\n".join(parts)
+
+
+async def stream_to_channel(channel, chunks, line_filter=None, prefix: str = "", finalize=None,
+                            error_text=None) -> str:
+    """
+    chunks(비동기 제너레이터)의 텍스트를 channel에 점진적으로 표시하고 최종 텍스트를 반환합니다.
+    finalize(text)를 주면 완료 후 최종 텍스트를 가공해 마지막 편집에 사용합니다.
+    아무것도 표시하기 전에 LLMError가 나면 error_text(e)를 표시합니다.
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    buffer = _LineBuffer(line_filter)
+    sent = []  # [(discord.Message, 표시 중인 텍스트)]
+    last_edit = 0.0
+    metrics['streams'] += 1
+
+    async def show(text: str):
+        nonlocal last_edit
+        pages = [text[i:i + DISCORD_MESSAGE_LIMIT] for i in range(0, len(text), DISCORD_MESSAGE_LIMIT)] or [""]
+        for index, page in enumerate(pages):
+            if index < len(sent):
+                message, shown = sent[index]
+                if shown != page and page:
+                    await message.edit(content=page)
+                    sent[index] = (message, page)
+                    metrics['edits'] += 1
+            elif page:
+                message = await channel.send(page)
+                if not sent:
+                    metrics['first_visible_seconds'] += loop.time() - start
+                sent.append((message, page))
+                metrics['messages_sent'] += 1
+        # 필터/가공으로 텍스트가 줄어 남는 메시지는 삭제
+        while len(sent) > len(pages) or (sent and not pages[-1]):
+            message, _ = sent.pop()
+            await message.delete()
+        last_edit = loop.time()
+
+    text = ""
+    try:
+        async for piece in chunks:
+            buffer.feed(piece)
+            visible = buffer.render()
+            if not sent and len(visible) < STREAM_MIN_FIRST_CHARS:
+                continue
+            if loop.time() - last_edit >= STREAM_EDIT_INTERVAL:
+                try:
+                    await show(prefix + visible)
+                except discord.HTTPException as e:
+                    # 속도 제한 등으로 편집이 실패해도 스트림은 계속 받고 다음 주기에 다시 시도
+                    metrics['errors'] += 1
+                    print(f"[Stream] Edit failed: {e}")
+        buffer.finish()
+        text = buffer.render(include_partial=False)
+    except llm_gateway.LLMError as e:
+        metrics['errors'] += 1
+        buffer.finish()
+        text = buffer.render(include_partial=False)
+        if not text:
+            text = error_text(e) if error_text else ""
+        else:
+            print(f"[Stream] Stream interrupted, keeping partial reply: {e}")
+    finally:
+        # 취소되거나 표시 중 다른 예외가 나도 제너레이터를 닫아 LLM 동시 실행 슬롯을 바로 반환
+        aclose = getattr(chunks, 'aclose', None)
+        if aclose is not None:
+            await aclose()
+
+    if finalize and text:
+        text = finalize(text)
+    final = prefix + text if text else ""
+    if final or sent:
+        try:
+            await show(final)
+        except discord.HTTPException as e:
+            # 토큰은 이미 썼으므로 마지막 편집이 실패해도 응답 텍스트는 반환해 턴을 이어감
+            metrics['errors'] += 1
+            print(f"[Stream] Final edit failed: {e}")
+    return text
+
+
+def get_metrics() -> dict:
+    streams = metrics['streams']
+    return {
+        **metrics,
+        'avg_first_visible_ms': round(metrics['first_visible_seconds'] / streams * 1000, 1) if streams else 0.0,
+    }
@@ -0,0 +1,209 @@
+"""
+메모리 요약 스케줄러 (워터마크 기반)
+(사용자, 캐릭터)별로 마지막으로 요약한 대화 id(memory_summary_watermarks)를 기억하고,
+그 뒤로 사용자 메시지가 SUMMARY_MESSAGE_THRESHOLD개 쌓였을 때만 요약합니다.
+(이전에는 최근 10개 메시지가 있는지만 보았기 때문에 10개를 넘긴 뒤로는 매 턴 GPT 요약을 호출했음)
+
+- 워터마크 이후 메시지 수는 메모리(session_registry)에서 세고, 처음 보는 (사용자, 캐릭터)만 DB에서 한 번 셈
+- 같은 (사용자, 캐릭터)의 요약은 한 번에 하나만 대기/실행 (중복 제거)
+- 사용량이 많은 시간에는 요약을 미뤄 두었다가 한가한 시간(SUMMARY_OFFPEAK_HOURS, UTC)에
+  SUMMARY_BATCH_SIZE개씩 백그라운드 작업으로 처리. 쌓인 메시지가 SUMMARY_BACKLOG_LIMIT개를 넘으면 바로 처리
+- 워터마크 이후 대화를 오래된 것부터 SUMMARY_MAX_MESSAGES개씩 요약하고, 워터마크는 요약한 마지막 대화 id로 이동
+  (한 번에 다 읽지 못했으면 밀린 대화가 SUMMARY_MESSAGE_THRESHOLD개 아래로 줄 때까지 이어서 요약)
+- 저장한 요약은 메모리 검색 인덱스(memory_index)에도 반영
+"""
+import asyncio
+import os
+from collections import OrderedDict
+from datetime import datetime
+
+import background_jobs
+from context_budget import count_tokens
+from memory_index import memory_retriever
+from session_registry import get_session_map
+
+SUMMARY_MESSAGE_THRESHOLD = int(os.environ.get("SUMMARY_MESSAGE_THRESHOLD", 10))
+SUMMARY_BACKLOG_LIMIT = int(os.environ.get("SUMMARY_BACKLOG_LIMIT", SUMMARY_MESSAGE_THRESHOLD * 3))
+# 요약 한 번에 읽는 대화 행 수 (사용자 메시지 + 봇 답장이므로 밀린 사용자 메시지 수의 2배 이상)
+SUMMARY_MAX_MESSAGES = max(int(os.environ.get("SUMMARY_MAX_MESSAGES", 40)), SUMMARY_BACKLOG_LIMIT * 2)
+# 컨텍스트에는 memory_index가 관련 있는 요약만 골라 넣으므로 예전(5개)보다 많이 보관
+SUMMARY_KEEP_COUNT = int(os.environ.get("SUMMARY_KEEP_COUNT", 200))
+# 한가한 시간대 (UTC 시, 시작-끝, 끝은 포함하지 않음; 기본값은 중국 표준시 새벽 1~7시). 비워 두면 항상 바로 요약
+SUMMARY_OFFPEAK_HOURS = os.environ.get("SUMMARY_OFFPEAK_HOURS", "17-23")
+SUMMARY_BATCH_SIZE = int(os.environ.get("SUMMARY_BATCH_SIZE", 20))
+SUMMARY_CHECK_INTERVAL = float(os.environ.get("SUMMARY_CHECK_INTERVAL", 300))
+
+
+def _parse_hours(spec: str):
+    if not spec.strip():
+        return None
+    start, end = (int(part) % 24 for part in spec.split('-', 1))
+    return start, end
+
+
+class SummaryScheduler:
+    """요약이 필요한 (사용자, 캐릭터)를 골라 백그라운드 작업으로 요약합니다. (이벤트 루프 한 곳에서만 사용)"""
+
+    def __init__(self, db=None, threshold: int = SUMMARY_MESSAGE_THRESHOLD, backlog_limit: int = SUMMARY_BACKLOG_LIMIT,
+                 offpeak_hours: str = SUMMARY_OFFPEAK_HOURS, batch_size: int = SUMMARY_BATCH_SIZE,
+                 submit=background_jobs.submit, clock=datetime.utcnow):
+        self._db = db
+        self.threshold = threshold
+        self.backlog_limit = backlog_limit
+        self.offpeak = _parse_hours(offpeak_hours)
+        self.batch_size = batch_size
+        self._submit = submit
+        self._clock = clock
+        # (user_id, character) -> 워터마크 이후 사용자 메시지 수 (오래 대화가 없으면 제거되고 다음에 DB에서 다시 셈)
+        self._counts = get_session_map('summary_counts')
+        self._due = OrderedDict()   # 한가한 시간까지 미뤄 둔 (user_id, character)
+        self._in_flight = {}        # (user_id, character) -> 예약 시점의 메시지 수
+        self._summarizers = {}      # character -> async (messages) -> summary
+        self._task = None
+        self.metrics = {
+            'noted_messages': 0, 'scheduled': 0, 'deferred': 0, 'deduplicated': 0,
+            'completed': 0, 'failed': 0, 'empty': 0,
+        }
+
+    @property
+    def db(self):
+        if self._db is None:
+            from database_manager import get_db_manager
+            self._db = get_db_manager()
+        return self._db
+
+    def register(self, character: str, summarizer):
+        """캐릭터별 요약 함수(CharacterBot.summarize_messages)를 등록합니다."""
+        self._summarizers[character] = summarizer
+
+    def is_off_peak(self) -> bool:
+        if self.offpeak is None:
+            return True
+        start, end = self.offpeak
+        hour = self._clock().hour
+        return start <= hour < end if start <= end else (hour >= start or hour < end)
+
+    async def note_messages(self, user_id: int, character: str, count: int = 1):
+        """턴에서 저장한 사용자 메시지 수를 알려 줍니다. 요약할 때가 되면 예약하거나 한가한 시간으로 미룹니다."""
+        key = (user_id, character)
+        self.metrics['noted_messages'] += count
+        if key in self._counts:
+            self._counts[key] += count
+        else:
+            # 재시작 후 처음 보는 대화: 방금 저장한 메시지까지 DB에서 셈
+            self._counts[key] = await self.db.acount_messages_since_summary(user_id, character)
+        pending = self._counts[key]
+        if pending < self.threshold:
+            return
+        if key in self._in_flight:
+            self.metrics['deduplicated'] += 1
+            return
+        if self.is_off_peak() or pending >= self.backlog_limit:
+            self._due.pop(key, None)
+            self._schedule(key)
+        elif key not in self._due:
+            self._due[key] = None
+            self.metrics['deferred'] += 1
+            self._ensure_task()
+
+    def _schedule(self, key):
+        self._in_flight[key] = self._counts.get(key, 0)
+        self.metrics['scheduled'] += 1
+        # 실패하면 in-flight를 풀고 다음 턴/한가한 시간에 다시 예약하므로 파이프라인 재시도는 쓰지 않음
+        if not self._submit('memory_summary', self._summarize, key, retries=0):
+            self._in_flight.pop(key, None)
+
+    async def _summarize(self, key):
+        user_id, character = key
+        try:
+            summarizer = self._summarizers.get(character)
+            if summarizer is None:
+                return
+            summarized = False
+            while True:
+                messages = await self.db.aget_messages_since_summary(user_id, character, SUMMARY_MAX_MESSAGES)
+                if not messages:
+                    if not summarized:
+                        self.metrics['empty'] += 1
+                    break
+                if not await self._summarize_chunk(user_id, character, summarizer, messages):
+                    self.metrics['failed'] += 1
+                    break
+                summarized = True
+                self.metrics['completed'] += 1
+                if len(messages) < SUMMARY_MAX_MESSAGES:
+                    break
+                # 한 번에 다 읽지 못한 밀린 대화: 남은 사용자 메시지가 충분하면 이어서 요약
+                if await self.db.acount_messages_since_summary(user_id, character) < self.threshold:
+                    break
+            if summarized:
+                self._submit('memory_index', memory_retriever.refresh, user_id, character)
+            # 요약하지 못했거나 요약하는 동안 들어온 메시지 수 (다음 턴에 다시 판단)
+            self._counts[key] = await self.db.acount_messages_since_summary(user_id, character)
+        except Exception as e:
+            self.metrics['failed'] += 1
+            print(f"[Summary] Failed for {user_id}/{character}: {e}")
+        finally:
+            self._in_flight.pop(key, None)
+
+    async def _summarize_chunk(self, user_id: int, character: str, summarizer, messages: list) -> bool:
+        """대화 묶음 하나를 요약해 저장하고 워터마크를 그 마지막 대화 id로 옮깁니다."""
+        summary = await summarizer(messages)
+        if not summary:
+            return False
+        # 품질 점수 계산 (간단한 휴리스틱)
+        quality_score = min(1.0, len(summary) / 200.0)  # 200자 기준
+        if not await self.db.aadd_memory_summary(user_id, character, summary, quality_score, count_tokens(summary)):
+            return False
+        await self.db.adelete_old_memory_summaries(user_id, character, SUMMARY_KEEP_COUNT)
+        return await self.db.aadvance_summary_watermark(user_id, character, messages[-1]['id'])
+
+    async def summarize_now(self, user_id: int, character: str):
+        """워터마크 이후 대화를 바로 요약합니다. (이미 진행 중이면 건너뜀)"""
+        key = (user_id, character)
+        if key in self._in_flight:
+            self.metrics['deduplicated'] += 1
+            return
+        self._due.pop(key, None)
+        self._in_flight[key] = self._counts.get(key, 0)
+        await self._summarize(key)
+
+    def flush_due(self, limit: int = None) -> int:
+        """미뤄 둔 요약을 최대 limit개 예약하고 예약한 수를 반환합니다."""
+        limit = self.batch_size if limit is None else limit
+        scheduled = 0
+        while self._due and scheduled < limit:
+            key, _ = self._due.popitem(last=False)
+            if key in self._in_flight:
+                continue
+            self._schedule(key)
+            scheduled += 1
+        return scheduled
+
+    def _ensure_task(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._offpeak_loop())
+
+    async def _offpeak_loop(self):
+        while self._due:
+            await asyncio.sleep(SUMMARY_CHECK_INTERVAL)
+            if self.is_off_peak():
+                scheduled = self.flush_due()
+                if scheduled:
+                    print(f"[Summary] Off-peak batch: scheduled {scheduled}, {len(self._due)} still due")
+
+    def get_metrics(self) -> dict:
+        return {
+            **self.metrics,
+            'tracked': len(self._counts),
+            'due': len(self._due),
+            'in_flight': len(self._in_flight),
+            'off_peak': self.is_off_peak(),
+        }
+
+
+summary_scheduler = SummaryScheduler()
+
+
+def get_metrics() -> dict:
+    return summary_scheduler.get_metrics()
@@ -0,0 +1,80 @@
+"""session_registry.SessionMap: 유휴 TTL, 크기 상한, 순회."""
+from session_registry import SessionMap
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_map(ttl=60, max_size=100):
+    clock = FakeClock()
+    return SessionMap('test', ttl, max_size, clock=clock), clock
+
+
+def test_idle_entries_expire_on_lookup():
+    sessions, clock = make_map()
+    sessions['a'] = 1
+    clock.now += 61
+    assert 'a' not in sessions
+    assert sessions.get('a') is None
+    assert sessions.metrics['expired'] == 1
+
+
+def test_lookup_keeps_entry_alive():
+    sessions, clock = make_map()
+    sessions['a'] = 1
+    clock.now += 50
+    assert sessions['a'] == 1
+    clock.now += 50
+    assert 'a' in sessions
+
+
+def test_capacity_evicts_least_recently_used():
+    sessions, _ = make_map(max_size=2)
+    sessions['a'] = 1
+    sessions['b'] = 2
+    assert sessions['a'] == 1  # b가 가장 오래 쓰지 않은 항목이 됨
+    sessions['c'] = 3
+    assert 'b' not in sessions
+    assert sorted(sessions) == ['a', 'c']
+    assert sessions.metrics['evicted_capacity'] == 1
+
+
+def test_iteration_skips_expired_entries_not_yet_swept():
+    sessions, clock = make_map()
+    sessions['old'] = 1
+    clock.now += 30
+    sessions['new'] = 2
+    clock.now += 40  # old만 만료 (스위퍼는 아직 돌지 않음)
+    assert list(sessions) == ['new']
+    assert sessions.items() == [('new', 2)]
+    assert sessions.values() == [2]
+    assert dict(sessions) == {'new': 2}
+
+
+def test_iteration_does_not_touch_entries():
+    sessions, clock = make_map(ttl=90)
+    sessions['a'] = 1
+    for _ in range(3):
+        clock.now += 25
+        assert sessions.items() == [('a', 1)]
+        assert list(sessions) == ['a']
+    clock.now += 25  # 마지막 사용 후 100초 (TTL 90초): 순회만으로는 연장되지 않음
+    assert list(sessions) == []
+    assert sessions.sweep() == 1
+
+
+def test_sweep_removes_only_idle_entries():
+    sessions, clock = make_map()
+    sessions['a'] = 1
+    sessions['b'] = 2
+    clock.now += 50
+    sessions['b'] = 3
+    clock.now += 20
+    assert sessions.sweep() == 1
+    assert len(sessions) == 1
+    assert sessions.peek('b') == 3
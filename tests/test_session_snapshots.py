@@ -0,0 +1,104 @@
+"""session_snapshots: 조회 후 바꾼 세션 저장, 시작 전 복원."""
+import asyncio
+import threading
+import time
+
+from session_registry import SessionRegistry
+from session_snapshots import SessionSnapshotter, dumps
+
+
+class FakeStore:
+    def __init__(self, rows=()):
+        self.rows = {(map_name, key): (payload, last_access) for map_name, key, payload, last_access in rows}
+        self.load_calls = []
+        self.load_all_threads = []
+
+    def load(self, map_name):
+        self.load_calls.append(map_name)
+        return [(key, payload, last_access) for (name, key), (payload, last_access) in self.rows.items()
+                if name == map_name]
+
+    def load_all(self):
+        self.load_all_threads.append(threading.current_thread())
+        return [(name, key, payload, last_access) for (name, key), (payload, last_access) in self.rows.items()]
+
+    def save(self, map_name, upserts, deletes):
+        for key, payload, last_access in upserts:
+            self.rows[(map_name, key)] = (payload, last_access)
+        for key in deletes:
+            self.rows.pop((map_name, key), None)
+        return True
+
+    def payload(self, map_name, key):
+        return self.rows[(map_name, dumps(key))][0]
+
+
+def make_snapshotter(store, interval=30):
+    registry = SessionRegistry()
+    return registry, SessionSnapshotter(store, registry=registry, interval=interval).install()
+
+
+def test_mutation_after_lookup_and_flush_is_saved():
+    async def scenario():
+        store = FakeStore()
+        registry, snapshotter = make_snapshotter(store)
+        sessions = registry.create('story')
+        sessions[1] = {'turn': 0}
+        await snapshotter.flush()
+        assert store.payload('story', 1) == dumps({'turn': 0})
+
+        session = sessions[1]  # 조회
+        await snapshotter.flush()  # 조회와 변경 사이에 저장이 끼어듦
+        session['turn'] = 1
+        await snapshotter.flush()
+        assert store.payload('story', 1) == dumps({'turn': 1})
+
+    asyncio.run(scenario())
+
+
+def test_unchanged_idle_sessions_are_not_rewritten():
+    async def scenario():
+        store = FakeStore()
+        registry, snapshotter = make_snapshotter(store, interval=0)
+        registry.create('story')[1] = {'turn': 0}
+        await snapshotter.flush()
+        await snapshotter.flush()
+        return snapshotter.get_metrics()
+
+    assert asyncio.run(scenario())['upserted'] == 1
+
+
+def test_close_saves_every_changed_session():
+    async def scenario():
+        store = FakeStore()
+        registry, snapshotter = make_snapshotter(store, interval=0)
+        sessions = registry.create('story')
+        sessions[1] = {'turn': 0}
+        session = sessions[1]
+        await snapshotter.flush()
+        session['turn'] = 2  # 마지막 사용 후 한참 뒤에 바뀐 값도 종료할 때는 저장
+        await snapshotter.aclose()
+        assert store.payload('story', 1) == dumps({'turn': 2})
+
+    asyncio.run(scenario())
+
+
+def test_restore_reads_snapshots_off_the_event_loop():
+    store = FakeStore([
+        ('story', dumps(1), dumps({'turn': 3}), time.time() - 5),
+        ('active_channels:Kagari', dumps(42), dumps({'user_id': 7}), time.time() - 5),
+    ])
+
+    async def scenario():
+        registry, snapshotter = make_snapshotter(store)
+        story = registry.create('story')
+        await snapshotter.restore()
+        channels = registry.create('active_channels:Kagari')  # 복원 뒤에 만든 맵도 미리 읽은 내용으로 채움
+        return story, channels
+
+    story, channels = asyncio.run(scenario())
+    assert story[1] == {'turn': 3}
+    assert 42 in channels
+    assert store.load_calls == []
+    assert len(store.load_all_threads) == 1
+    assert store.load_all_threads[0] is not threading.main_thread()
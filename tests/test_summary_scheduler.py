@@ -0,0 +1,110 @@
+"""summary_scheduler: 한가한 시간까지 미뤄 둔 대화가 빠짐없이 요약되는지 확인합니다."""
+import asyncio
+from datetime import datetime
+
+import summary_scheduler
+from summary_scheduler import SummaryScheduler
+
+
+class FakeDB:
+    """conversations + memory_summary_watermarks 한 쌍만 흉내 냅니다."""
+
+    def __init__(self):
+        self.rows = []  # (id, role, content)
+        self.watermark = 0
+        self.summaries = []
+
+    def add_turn(self, n: int):
+        self.rows.append((len(self.rows) + 1, 'user', f"user {n}"))
+        self.rows.append((len(self.rows) + 1, 'assistant', f"bot {n}"))
+
+    async def acount_messages_since_summary(self, user_id, character):
+        return sum(1 for id_, role, _ in self.rows if role == 'user' and id_ > self.watermark)
+
+    async def aget_messages_since_summary(self, user_id, character, limit):
+        rows = [row for row in self.rows if row[0] > self.watermark][:limit]
+        return [{"id": id_, "role": role, "content": content} for id_, role, content in rows]
+
+    async def aadd_memory_summary(self, user_id, character, summary, quality_score, token_count):
+        self.summaries.append(summary)
+        return True
+
+    async def adelete_old_memory_summaries(self, user_id, character, keep_count):
+        return True
+
+    async def aadvance_summary_watermark(self, user_id, character, message_id):
+        self.watermark = max(self.watermark, message_id)
+        return True
+
+
+def make_scheduler(db, hour: int):
+    jobs = []
+
+    def submit(name, func, *args, retries=None, **kwargs):
+        jobs.append((name, func, args))
+        return True
+
+    clock = {'now': datetime(2025, 1, 1, hour)}
+    scheduler = SummaryScheduler(db=db, threshold=10, backlog_limit=30, offpeak_hours="17-23",
+                                 submit=submit, clock=lambda: clock['now'])
+    scheduler._counts.clear()  # summary_counts 맵은 모듈 전역으로 공유됨
+    summarized = []
+
+    async def summarizer(messages):
+        summarized.append([m['id'] for m in messages])
+        return "summary of " + ",".join(m['content'] for m in messages)
+
+    scheduler.register('Kagari', summarizer)
+    return scheduler, jobs, clock, summarized
+
+
+async def run_jobs(jobs, name='memory_summary'):
+    while any(job[0] == name for job in jobs):
+        index = next(i for i, job in enumerate(jobs) if job[0] == name)
+        _, func, args = jobs.pop(index)
+        await func(*args)
+
+
+def test_deferred_backlog_is_summarized_without_gaps(monkeypatch):
+    monkeypatch.setattr(summary_scheduler, 'SUMMARY_MAX_MESSAGES', 20)
+
+    async def scenario():
+        db = FakeDB()
+        scheduler, jobs, clock, summarized = make_scheduler(db, hour=12)  # 사용량이 많은 시간
+        for n in range(29):
+            db.add_turn(n)
+            await scheduler.note_messages(1, 'Kagari', 1)
+        assert scheduler.get_metrics()['due'] == 1
+        assert not [job for job in jobs if job[0] == 'memory_summary']
+
+        clock['now'] = datetime(2025, 1, 1, 18)  # 한가한 시간
+        assert scheduler.flush_due() == 1
+        await run_jobs(jobs)
+        return db, scheduler, summarized
+
+    db, scheduler, summarized = asyncio.run(scenario())
+    # 오래된 대화부터 순서대로, 빠지거나 겹치는 행 없이 20행씩 요약
+    assert summarized == [list(range(1, 21)), list(range(21, 41))]
+    assert db.watermark == 40
+    # 남은 사용자 메시지 9개는 건너뛰지 않고 다음 요약을 기다림
+    assert scheduler._counts[(1, 'Kagari')] == 9
+    assert scheduler.get_metrics()['in_flight'] == 0
+
+
+def test_small_remainder_waits_for_next_threshold(monkeypatch):
+    monkeypatch.setattr(summary_scheduler, 'SUMMARY_MAX_MESSAGES', 20)
+
+    async def scenario():
+        db = FakeDB()
+        scheduler, jobs, _, summarized = make_scheduler(db, hour=18)
+        for n in range(12):
+            db.add_turn(n)
+        await scheduler.note_messages(1, 'Kagari', 0)  # 재시작 후 처음: DB에서 12개를 셈
+        await run_jobs(jobs)
+        return db, scheduler, summarized
+
+    db, scheduler, summarized = asyncio.run(scenario())
+    # 첫 20행(사용자 메시지 10개)만 요약하고, 남은 2개는 다음에 쌓이면 요약
+    assert summarized == [list(range(1, 21))]
+    assert db.watermark == 20
+    assert scheduler._counts[(1, 'Kagari')] == 2
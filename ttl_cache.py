@@ -0,0 +1,87 @@
+"""
+프로세스 내 TTL/LRU 캐시
+사용자가 직접 바꾸기 전까지 거의 변하지 않는 값(닉네임, 언어, 시간대 등)을
+DB 왕복 없이 돌려주기 위해 사용합니다.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+# 캐시에 값이 없음을 나타내는 표식 (None도 캐시할 수 있도록 별도 객체 사용)
+MISSING = object()
+
+
+class TTLCache:
+    """
+    키별 만료 시간을 가진 크기 제한 LRU 캐시입니다. (스레드 안전)
+    가득 차면 가장 오래 사용되지 않은 항목부터 제거합니다.
+    """
+
+    def __init__(self, name: str, maxsize: int = 10000, ttl: float = 300.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """값을 반환합니다. 없거나 만료되었으면 MISSING을 반환합니다."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        """값을 저장합니다. ttl을 주면 이 키에만 다른 만료 시간을 적용합니다."""
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def invalidate_where(self, predicate):
+        """predicate(key)가 참인 모든 키를 제거합니다."""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def get_metrics(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 3) if total else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
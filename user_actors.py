@@ -0,0 +1,89 @@
+"""
+사용자별 순서 보장 큐 (액터/메일박스)
+같은 사용자의 대화 턴을 도착 순서대로 하나씩 실행합니다.
+호감도 조회 → update_affinity(SELECT ... FOR UPDATE) → 마일스톤 확인이 같은 사용자 안에서 서로 끼어들지 않아
+마일스톤 보상이 사라지거나 DB 행 잠금을 기다리며 커넥션을 붙잡는 일이 없어집니다.
+
+- 전역 잠금 없이 사용자마다 asyncio.Lock(대기 순서대로 획득) 하나만 사용하고, 대기 중인 턴이 없으면 바로 제거
+- 사용자별로 대기+실행 중인 턴이 USER_MAILBOX_DEPTH개를 넘으면 MailboxFull
+- get_metrics: 큐 대기 시간(평균/최대), 거절 수, 현재 메일박스 수
+  (DB 행 잠금 대기 시간은 DatabaseManager.get_affinity_lock_metrics)
+"""
+import asyncio
+import os
+import time
+
+USER_MAILBOX_DEPTH = int(os.environ.get("USER_MAILBOX_DEPTH", 4))
+
+
+class MailboxFull(Exception):
+    """사용자의 메일박스에 대기 중인 턴이 너무 많습니다."""
+
+
+class _Mailbox:
+    __slots__ = ('lock', 'depth')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.depth = 0
+
+
+class UserActors:
+    """키(사용자)별로 코루틴을 순서대로 하나씩 실행합니다. (이벤트 루프 한 곳에서만 사용)"""
+
+    def __init__(self, max_depth: int = USER_MAILBOX_DEPTH):
+        self.max_depth = max_depth
+        self._mailboxes = {}
+        self.metrics = {
+            'turns': 0, 'rejected': 0, 'queued': 0, 'max_depth_seen': 0,
+            'queue_wait_seconds': 0.0, 'max_queue_wait_ms': 0.0,
+        }
+
+    async def run(self, key, func, *args, **kwargs):
+        """key의 앞선 턴이 모두 끝난 뒤 func(*args, **kwargs)를 실행하고 결과를 반환합니다."""
+        mailbox = self._mailboxes.get(key)
+        if mailbox is None:
+            mailbox = self._mailboxes[key] = _Mailbox()
+        if mailbox.depth >= self.max_depth:
+            self.metrics['rejected'] += 1
+            raise MailboxFull(f"{mailbox.depth} turns already pending for {key}")
+
+        mailbox.depth += 1
+        self.metrics['max_depth_seen'] = max(self.metrics['max_depth_seen'], mailbox.depth)
+        if mailbox.lock.locked():
+            self.metrics['queued'] += 1
+        enqueued = time.perf_counter()
+        try:
+            async with mailbox.lock:
+                waited = time.perf_counter() - enqueued
+                self.metrics['turns'] += 1
+                self.metrics['queue_wait_seconds'] += waited
+                self.metrics['max_queue_wait_ms'] = max(self.metrics['max_queue_wait_ms'], round(waited * 1000, 1))
+                return await func(*args, **kwargs)
+        finally:
+            mailbox.depth -= 1
+            if mailbox.depth == 0 and self._mailboxes.get(key) is mailbox:
+                del self._mailboxes[key]
+
+    def pending(self, key) -> int:
+        mailbox = self._mailboxes.get(key)
+        return mailbox.depth if mailbox is not None else 0
+
+    def get_metrics(self) -> dict:
+        turns = self.metrics['turns']
+        return {
+            'turns': turns,
+            'queued': self.metrics['queued'],
+            'rejected': self.metrics['rejected'],
+            'mailboxes': len(self._mailboxes),
+            'max_depth_seen': self.metrics['max_depth_seen'],
+            'avg_queue_wait_ms': round(self.metrics['queue_wait_seconds'] / turns * 1000, 1) if turns else 0.0,
+            'max_queue_wait_ms': self.metrics['max_queue_wait_ms'],
+        }
+
+
+user_actors = UserActors()
+
+
+def get_metrics() -> dict:
+    return user_actors.get_metrics()
@@ -1,8 +1,7 @@
 import os
 import base64
-from openai import AsyncOpenAI
 from typing import Optional, Dict
-import openai
+import llm_gateway
 from config import CHARACTER_PROMPTS
 import aiohttp
 
@@ -14,8 +13,9 @@ BOT_TOKENS = {
 }
 
 class VisionManager:
-    def __init__(self, api_key: str):
-        self.client = AsyncOpenAI(api_key=api_key)
+    def __init__(self, api_key: str = None):
+        # API 호출은 공유 LLM 게이트웨이 클라이언트를 사용합니다. (api_key는 하위 호환용)
+        self.api_key = api_key
 
     async def analyze_image(self, attachment_or_url, prompt: str = None, character_name: str = "selector") -> dict:
         """
@@ -45,9 +45,8 @@ class VisionManager:
             # 프롬프트를 간결하게 변경 (2~3문장, 핵심만, 친근하게)
             prompt_text = prompt or "Please describe this image in 2-3 short, friendly sentences. Only mention the most important things you see."
             print("[VisionManager] Calling OpenAI Vision API...")
-            response = await self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
+            description = await llm_gateway.chat_completion(
+                [
                     {
                         "role": "user",
                         "content": [
@@ -56,11 +55,12 @@ class VisionManager:
                         ]
                     }
                 ],
+                model="gpt-4o",
                 max_tokens=300
             )
-            print(f"[VisionManager] Vision API response: {response.choices[0].message.content}")
+            print(f"[VisionManager] Vision API response: {description}")
             return {
-                "description": response.choices[0].message.content,
+                "description": description,
                 "success": True
             }
         except Exception as e:
@@ -82,16 +82,15 @@ class VisionManager:
         )
 
         try:
-            client = openai.AsyncOpenAI()
-            response = await client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
+            response = await llm_gateway.chat_completion(
+                [
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
+                model="gpt-4o",
                 max_tokens=300
             )
-            return response.choices[0].message.content.strip()
+            return response.strip()
         except Exception as e:
             print(f"[VisionManager] Error in generate_character_response: {e}")
             return description + "\n(이 이미지에 대해 어떻게 생각하시나요?)" 
\ No newline at end of file
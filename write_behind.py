@@ -0,0 +1,235 @@
+"""
+Write-behind 큐
+대화 로그, 감정 로그, 키워드처럼 추가만 하는(append-only) 쓰기를 모아두었다가
+전용 스레드에서 executemany로 한 번에 기록합니다.
+
+- flush_interval 초마다, 또는 batch_size만큼 쌓이면 즉시 기록
+- max_pending을 넘으면 생산자를 잠시 대기시키고(backpressure),
+  그래도 자리가 나지 않으면 생산자 스레드에서 직접 기록
+- 종료 시(close/aclose, atexit) 남은 항목을 모두 기록
+
+메시지 한도처럼 즉시 반영되어야 하는 쓰기는 이 큐를 사용하지 않습니다.
+"""
+import asyncio
+import atexit
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+from psycopg2.extras import execute_values
+
+WRITE_BEHIND_INTERVAL = float(os.environ.get("WRITE_BEHIND_INTERVAL", 1.0))
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get("WRITE_BEHIND_BATCH_SIZE", 500))
+WRITE_BEHIND_MAX_PENDING = int(os.environ.get("WRITE_BEHIND_MAX_PENDING", 10000))
+WRITE_BEHIND_PUT_TIMEOUT = float(os.environ.get("WRITE_BEHIND_PUT_TIMEOUT", 2.0))
+
+
+class WriteBehindQueue:
+    """
+    종류(kind)별 SQL을 등록해 두고, submit()으로 넣은 행들을 묶어서 기록합니다.
+    getconn/putconn은 연결 풀의 대여/반환 함수입니다.
+    """
+
+    def __init__(self, getconn, putconn, flush_interval: float = WRITE_BEHIND_INTERVAL,
+                 batch_size: int = WRITE_BEHIND_BATCH_SIZE, max_pending: int = WRITE_BEHIND_MAX_PENDING,
+                 put_timeout: float = WRITE_BEHIND_PUT_TIMEOUT):
+        self._getconn = getconn
+        self._putconn = putconn
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.put_timeout = put_timeout
+
+        self._handlers = {}  # kind -> (statements, prepare, after_write, multi_row)
+        self._pending = deque()  # (kind, row)
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+
+        self.metrics = {
+            'rows_queued': 0,
+            'rows_written': 0,
+            'rows_dropped': 0,
+            'batches_written': 0,
+            'flush_errors': 0,
+            'backpressure_waits': 0,
+            'inline_writes': 0,
+            'last_flush_ms': 0.0,
+            'peak_pending': 0,
+        }
+
+    def register(self, kind: str, statements, prepare=None, after_write=None, multi_row: bool = False):
+        """
+        kind에 대해 각 행마다 실행할 SQL 목록을 등록합니다. (executemany로 순서대로 실행)
+        prepare(rows)를 주면 기록 전에 행 목록을 가공(중복 제거 등)할 수 있습니다.
+        after_write(rows)를 주면 커밋 후 기록된 행으로 호출합니다. (캐시 무효화 등)
+        multi_row=True면 SQL의 'VALUES %s'에 배치 전체를 넣어 문장 하나로 실행합니다. (execute_values)
+        """
+        if isinstance(statements, str):
+            statements = [statements]
+        self._handlers[kind] = (list(statements), prepare, after_write, multi_row)
+
+    # --- 생산자 API ---
+    def submit(self, kind: str, row: tuple):
+        """행을 큐에 넣습니다. (스레드 안전) 큐가 가득 차면 put_timeout까지 기다립니다."""
+        if kind not in self._handlers:
+            raise KeyError(f"Unknown write-behind kind: {kind}")
+        if self._closed:
+            self._write({kind: [row]})
+            return
+        with self._cond:
+            if len(self._pending) >= self.max_pending:
+                self.metrics['backpressure_waits'] += 1
+                deadline = time.monotonic() + self.put_timeout
+                while len(self._pending) >= self.max_pending and not self._closed:
+                    self._cond.notify_all()
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            if len(self._pending) >= self.max_pending or self._closed:
+                inline = True
+            else:
+                inline = False
+                self._pending.append((kind, row))
+                self.metrics['rows_queued'] += 1
+                self.metrics['peak_pending'] = max(self.metrics['peak_pending'], len(self._pending))
+                if len(self._pending) >= self.batch_size:
+                    self._cond.notify_all()
+        if inline:
+            # 기록이 밀려 있으면 생산자가 직접 기록 (데이터 유실 대신 지연을 선택)
+            self.metrics['inline_writes'] += 1
+            self._write({kind: [row]})
+            return
+        self._ensure_started()
+
+    async def enqueue(self, kind: str, row: tuple):
+        """코루틴용 submit. 큐가 가득 차 있으면 이벤트 루프를 막지 않도록 워커 스레드에서 기다립니다."""
+        if len(self._pending) < self.max_pending:
+            self.submit(kind, row)
+        else:
+            await asyncio.get_running_loop().run_in_executor(None, self.submit, kind, row)
+
+    # --- 기록 ---
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._cond:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # 배치가 차거나 flush_interval이 지날 때까지 모음
+                deadline = time.monotonic() + self.flush_interval
+                while not self._closed and len(self._pending) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed and not self._pending:
+                    return
+            self.flush()
+
+    def _drain(self) -> dict:
+        batches = defaultdict(list)
+        with self._cond:
+            count = min(len(self._pending), self.batch_size)
+            for _ in range(count):
+                kind, row = self._pending.popleft()
+                batches[kind].append(row)
+            self._cond.notify_all()
+        return batches
+
+    def flush(self):
+        """대기 중인 행을 모두 기록합니다."""
+        with self._flush_lock:
+            while self._pending:
+                self._write(self._drain())
+
+    def _write(self, batches: dict):
+        start = time.perf_counter()
+        for kind, rows in batches.items():
+            statements, prepare, after_write, multi_row = self._handlers[kind]
+            if prepare:
+                rows = prepare(rows)
+            if not rows:
+                continue
+            for attempt in (1, 2):
+                conn = None
+                try:
+                    conn = self._getconn()
+                    with conn.cursor() as cursor:
+                        for statement in statements:
+                            if multi_row:
+                                execute_values(cursor, statement, rows, page_size=len(rows))
+                            else:
+                                cursor.executemany(statement, rows)
+                    conn.commit()
+                    self.metrics['rows_written'] += len(rows)
+                    self.metrics['batches_written'] += 1
+                    if after_write:
+                        try:
+                            after_write(rows)
+                        except Exception as e:
+                            print(f"[WriteBehind] after_write for '{kind}' failed: {e}")
+                    break
+                except Exception as e:
+                    self.metrics['flush_errors'] += 1
+                    if conn:
+                        try:
+                            conn.rollback()
+                        except Exception:
+                            pass
+                    if attempt == 2:
+                        self.metrics['rows_dropped'] += len(rows)
+                        print(f"[WriteBehind] Dropped {len(rows)} '{kind}' rows after retry: {e}")
+                    else:
+                        print(f"[WriteBehind] Error writing {len(rows)} '{kind}' rows, retrying: {e}")
+                finally:
+                    if conn:
+                        self._putconn(conn)
+        self.metrics['last_flush_ms'] = round((time.perf_counter() - start) * 1000, 2)
+
+    # --- 종료 ---
+    def close(self):
+        """새 행을 더 받지 않고 남은 행을 모두 기록합니다."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=30)
+        self.flush()
+
+    async def aclose(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def get_metrics(self) -> dict:
+        return {**self.metrics, 'pending': len(self._pending)}
+
+
+# --- 프로세스 전역 큐 ---
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_write_behind(getconn=None, putconn=None, setup=None) -> WriteBehindQueue:
+    """
+    전역 write-behind 큐를 반환합니다.
+    최초 호출 시 연결 함수를 받아 생성하고, setup(queue)로 기본 kind들을 등록합니다.
+    """
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                if getconn is None or putconn is None:
+                    raise RuntimeError("write-behind queue is not initialized")
+                queue = WriteBehindQueue(getconn, putconn)
+                if setup:
+                    setup(queue)
+                atexit.register(queue.close)
+                _queue = queue
+    return _queue